@@ -5,3 +5,13 @@ from django.apps import AppConfig
 class BaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'djangosige.apps.base'  # Nome completo do módulo
+
+    def ready(self):
+        from djangosige.apps.base.dashboard import conectar_sinais_dashboard
+        from djangosige.apps.base.permissoes import conectar_sinais_permissoes
+        from djangosige.apps.base.cache_pedidos import conectar_sinais_cache_pedidos
+        from djangosige.apps.base.totais_pedidos import conectar_sinal_controle_estoque
+        conectar_sinais_dashboard()
+        conectar_sinais_permissoes()
+        conectar_sinais_cache_pedidos()
+        conectar_sinal_controle_estoque()
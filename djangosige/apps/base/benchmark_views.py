@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import statistics
+import time
+from datetime import datetime
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+
+from djangosige.apps.base.dados_benchmark import gerar_dados_benchmark
+from djangosige.apps.base.desempenho import ColetorConsultas
+
+# (nome, metodo, url_name, funcao que recebe os ids de referencia e
+# retorna (args da url, dados do POST)); None quando nao ha parametros
+ENDPOINTS = (
+    ('dashboard', 'get', 'base:index', None),
+    ('lista_clientes', 'get', 'cadastro:listaclientesview', None),
+    ('lista_produtos', 'get', 'cadastro:listaprodutosview', None),
+    ('lista_produtos_baixo_estoque', 'get', 'cadastro:listaprodutosbaixoestoqueview', None),
+    ('lista_pedidos_venda', 'get', 'vendas:listapedidovendaview', None),
+    ('lista_orcamentos_venda', 'get', 'vendas:listaorcamentovendaview', None),
+    ('lista_pedidos_compra', 'get', 'compras:listapedidocompraview', None),
+    ('lista_lancamentos', 'get', 'financeiro:listalancamentoview', None),
+    ('lista_contas_receber', 'get', 'financeiro:listacontareceberview', None),
+    ('fluxo_caixa', 'get', 'financeiro:fluxodecaixaview', None),
+    ('consulta_estoque', 'get', 'estoque:consultaestoqueview', None),
+    ('lista_movimentos_estoque_json', 'get', 'estoque:listamovimentoestoquejson', None),
+    ('info_venda', 'post', 'vendas:infovenda', lambda ids: ((), {'vendaId': ids['pedido_venda']})),
+    ('info_compra', 'post', 'compras:infocompra', lambda ids: ((), {'compraId': ids['pedido_compra']})),
+    ('info_cliente', 'post', 'cadastro:infocliente', lambda ids: ((), {'pessoaId': ids['cliente']})),
+    ('info_produto', 'post', 'cadastro:infoproduto', lambda ids: ((), {'produtoId': ids['produto']})),
+    ('pdf_pedido_venda', 'get', 'vendas:gerarpdfpedidovenda', lambda ids: ((ids['pedido_venda'],), {})),
+)
+
+
+def contar_volumes():
+    from djangosige.apps.cadastro.models import Cliente, Fornecedor, Produto
+    from djangosige.apps.vendas.models import Venda, ItensVenda
+    from djangosige.apps.compras.models import Compra, ItensCompra
+    from djangosige.apps.financeiro.models import Lancamento, MovimentoCaixa
+    from djangosige.apps.estoque.models import MovimentoEstoque, ItensMovimento
+
+    return dict((modelo.__name__, modelo.objects.count()) for modelo in (
+        Cliente, Fornecedor, Produto, Venda, ItensVenda, Compra, ItensCompra,
+        Lancamento, MovimentoCaixa, MovimentoEstoque, ItensMovimento))
+
+
+def ids_referencia():
+    """Ultimos registros de cada tipo, usados pelos endpoints com parametros."""
+    from djangosige.apps.cadastro.models import Cliente, Produto
+    from djangosige.apps.vendas.models import PedidoVenda
+    from djangosige.apps.compras.models import PedidoCompra
+
+    return {
+        'pedido_venda': PedidoVenda.objects.order_by('-pk').values_list('pk', flat=True).first(),
+        'pedido_compra': PedidoCompra.objects.order_by('-pk').values_list('pk', flat=True).first(),
+        'cliente': Cliente.objects.order_by('-pk').values_list('pk', flat=True).first(),
+        'produto': Produto.objects.order_by('-pk').values_list('pk', flat=True).first(),
+    }
+
+
+def medir_endpoint(client, metodo, url, dados, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        coletor = ColetorConsultas()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(coletor):
+            response = getattr(client, metodo)(url, dados)
+            tamanho = len(b''.join(response.streaming_content)) if response.streaming else len(response.content)
+        tempos.append(time.perf_counter() - inicio)
+    # Consultas e repeticoes da ultima execucao (com os caches ja aquecidos)
+    return {
+        'status': response.status_code,
+        'consultas': coletor.consultas,
+        'tempo_db_ms': coletor.tempo_db * 1000,
+        'repeticoes_max': max(coletor.digitais.values()) if coletor.digitais else 0,
+        'tempo_primeiro_ms': tempos[0] * 1000,
+        'tempo_min_ms': min(tempos) * 1000,
+        'tempo_mediana_ms': statistics.median(tempos) * 1000,
+        'tempo_max_ms': max(tempos) * 1000,
+        'tamanho': tamanho,
+    }
+
+
+def medir_endpoints(repeticoes=3, nomes=None):
+    cache.clear()
+    user = User.objects.create_superuser(
+        username='benchmark_%s' % int(time.time() * 1000), email='benchmark@localhost', password=None)
+    client = Client()
+    client.force_login(user)
+
+    ids = ids_referencia()
+    resultados = []
+    for nome, metodo, url_name, parametros in ENDPOINTS:
+        if nomes and nome not in nomes:
+            continue
+        args, dados = parametros(ids) if parametros else ((), {})
+        if None in args or None in dados.values():
+            resultados.append({'nome': nome, 'erro': u'Sem registros para o endpoint.'})
+            continue
+        url = reverse(url_name, args=args)
+        try:
+            resultado = medir_endpoint(client, metodo, url, dados, repeticoes)
+        except Exception as e:
+            resultado = {'erro': u'%s: %s' % (type(e).__name__, e)}
+        resultado.update({'nome': nome, 'url': url, 'metodo': metodo.upper()})
+        resultados.append(resultado)
+    return resultados
+
+
+def executar_benchmark_views(escalas=None, repeticoes=3, semente=0, nomes=None, saida=None):
+    """
+    Mede os endpoints de ENDPOINTS. Com escalas, cada escala e gerada e
+    medida dentro de uma transacao desfeita ao final, partindo sempre do
+    banco atual; sem escalas mede o banco como esta. Nada e gravado.
+    Retorna o relatorio (serializavel em JSON).
+    """
+    relatorio = {
+        'data': datetime.now().isoformat(),
+        'django': django.get_version(),
+        'banco': connection.vendor,
+        'repeticoes': repeticoes,
+        'semente': semente,
+        'escalas': [],
+    }
+    for escala in escalas or [None]:
+        with transaction.atomic():
+            resultado = {'escala': escala}
+            if escala:
+                inicio = time.perf_counter()
+                resultado['parametros'] = gerar_dados_benchmark(escala, semente, saida=saida)
+                resultado['tempo_geracao_s'] = time.perf_counter() - inicio
+            resultado['volumes'] = contar_volumes()
+            resultado['endpoints'] = medir_endpoints(repeticoes, nomes)
+            relatorio['escalas'].append(resultado)
+            transaction.set_rollback(True)
+    cache.clear()
+    return relatorio
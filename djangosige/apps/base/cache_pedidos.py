@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+
+from djangosige.apps.base.permissoes import cache_compartilhado
+
+PEDIDO_VERSAO_KEY = 'pedido_versao_%s_%s'
+CADASTROS_PEDIDO_VERSAO_KEY = 'pedido_versao_cadastros'
+PEDIDO_JSON_CACHE_KEY = 'pedido_json_%s_%s_%s_%s'
+PEDIDO_JSON_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _get_versao(chave):
+    versao = cache.get(chave)
+    if versao is None:
+        # Mesmo esquema de base.permissoes: uma versao descartada pelo cache
+        # recomeca do horario atual e nao reaproveita entradas antigas
+        cache.add(chave, int(time.time() * 1000), None)
+        versao = cache.get(chave)
+    return versao
+
+
+def _incrementar_versao(chave):
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.delete(chave)
+
+
+def get_versao_pedido(tipo, pk):
+    return _get_versao(PEDIDO_VERSAO_KEY % (tipo, pk))
+
+
+def get_versao_cadastros_pedido():
+    return _get_versao(CADASTROS_PEDIDO_VERSAO_KEY)
+
+
+def invalidar_pedido(tipo, pk):
+    if pk is not None:
+        _incrementar_versao(PEDIDO_VERSAO_KEY % (tipo, pk))
+
+
+def invalidar_cadastros_pedido(sender=None, **kwargs):
+    # Produtos, unidades, CFOPs, condicoes e tributos aparecem em todos os pedidos
+    _incrementar_versao(CADASTROS_PEDIDO_VERSAO_KEY)
+
+
+def _serializar_pedido(serializar, pk):
+    try:
+        return json.dumps(serializar(pk))
+    except ObjectDoesNotExist:
+        raise Http404
+
+
+def resposta_json_pedido(request, tipo, pk, serializar):
+    """
+    JSON do pedido tipo/pk gerado por serializar(pk), guardado no cache
+    pela versao do pedido e dos cadastros. A versao tambem e o ETag: um
+    If-None-Match igual responde 304 sem consultar o banco. Sem um cache
+    compartilhado entre os processos o JSON e sempre gerado do banco.
+    """
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise Http404
+    if not cache_compartilhado():
+        response = HttpResponse(_serializar_pedido(serializar, pk),
+                                content_type='application/json')
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    versao = (get_versao_pedido(tipo, pk), get_versao_cadastros_pedido())
+    etag = quote_etag(u'%s-%s-%s-%s' % ((tipo, pk) + versao))
+
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        chave = PEDIDO_JSON_CACHE_KEY % ((tipo, pk) + versao)
+        conteudo = cache.get(chave)
+        if conteudo is None:
+            conteudo = _serializar_pedido(serializar, pk)
+            cache.set(chave, conteudo, PEDIDO_JSON_CACHE_TIMEOUT)
+        response = HttpResponse(conteudo, content_type='application/json')
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _conectar_pedido(tipo, model, campo_pk):
+    from django.db.models.signals import post_save, post_delete
+
+    def invalidar(sender, instance, **kwargs):
+        invalidar_pedido(tipo, getattr(instance, campo_pk))
+
+    for sinal, nome in ((post_save, 'post_save'), (post_delete, 'post_delete')):
+        sinal.connect(invalidar, sender=model, weak=False,
+                      dispatch_uid='cache_pedidos_%s_%s' % (nome, model.__name__))
+
+
+def conectar_sinais_cache_pedidos():
+    from django.db.models.signals import post_save, post_delete
+    from djangosige.apps.cadastro.models import Produto, Unidade
+    from djangosige.apps.fiscal.models import NaturezaOperacao, GrupoFiscal
+    from djangosige.apps.fiscal.perfil_tributario import TRIBUTOS_PERFIL
+    from djangosige.apps.vendas.models import Venda, OrcamentoVenda, PedidoVenda, ItensVenda, CondicaoPagamento
+    from djangosige.apps.vendas.models import Pagamento as PagamentoVenda
+    from djangosige.apps.compras.models import Compra, OrcamentoCompra, PedidoCompra, ItensCompra
+    from djangosige.apps.compras.models import Pagamento as PagamentoCompra
+
+    for model in (Venda, OrcamentoVenda, PedidoVenda):
+        _conectar_pedido('venda', model, 'pk')
+    _conectar_pedido('venda', ItensVenda, 'venda_id_id')
+    _conectar_pedido('venda', PagamentoVenda, 'venda_id_id')
+    for model in (Compra, OrcamentoCompra, PedidoCompra):
+        _conectar_pedido('compra', model, 'pk')
+    _conectar_pedido('compra', ItensCompra, 'compra_id_id')
+    _conectar_pedido('compra', PagamentoCompra, 'compra_id_id')
+
+    for model in [Produto, Unidade, NaturezaOperacao, CondicaoPagamento, GrupoFiscal] + \
+            [modelo for _, modelo in TRIBUTOS_PERFIL]:
+        post_save.connect(invalidar_cadastros_pedido, sender=model,
+                          dispatch_uid='cache_pedidos_post_save_%s' % model.__name__)
+        post_delete.connect(invalidar_cadastros_pedido, sender=model,
+                            dispatch_uid='cache_pedidos_post_delete_%s' % model.__name__)
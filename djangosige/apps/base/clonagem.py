@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+from django.db import transaction
+
+TAMANHO_LOTE_CLONAGEM = 500
+
+
+def _copiar_campos(origem, destino, campos):
+    for campo in campos:
+        if not campo.primary_key:
+            setattr(destino, campo.attname, getattr(origem, campo.attname))
+
+
+def clonar_documento(origem, modelo, modelo_base, relacionados, **valores):
+    """
+    Cria um documento modelo (subclasse de modelo_base, ex.: PedidoVenda de
+    Venda) a partir de origem: copia os campos de modelo_base, os campos
+    proprios da subclasse quando origem e do mesmo modelo, e aplica valores.
+    As linhas de cada (model, campo_fk) de relacionados (itens e parcelas)
+    sao copiadas com bulk_create, tudo em uma transacao: o numero de
+    consultas nao depende da quantidade de linhas. Retorna o novo documento.
+
+    bulk_create nao chama save() nem envia sinais das linhas; os valores
+    gravados na origem (subtotais, impostos) sao copiados como estao.
+    """
+    novo = modelo()
+    _copiar_campos(origem, novo, modelo_base._meta.concrete_fields)
+    if isinstance(origem, modelo):
+        _copiar_campos(origem, novo, [campo for campo in modelo._meta.local_concrete_fields
+                                      if not campo.remote_field or not campo.remote_field.parent_link])
+    for nome, valor in valores.items():
+        setattr(novo, nome, valor)
+
+    with transaction.atomic():
+        novo.save()
+        for model, campo_fk in relacionados:
+            attname = model._meta.get_field(campo_fk).attname
+            copias = []
+            for linha in model.objects.filter(**{attname: origem.pk}).order_by('pk'):
+                linha.pk = None
+                linha._state.adding = True
+                setattr(linha, attname, novo.pk)
+                copias.append(linha)
+            model.objects.bulk_create(copias, batch_size=TAMANHO_LOTE_CLONAGEM)
+    return novo
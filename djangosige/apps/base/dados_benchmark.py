@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+
+import random
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from djangosige.apps.base.dashboard import invalidar_metricas_dashboard
+
+# Volumes de cada escala. itens_* sao medias por documento.
+ESCALAS = {
+    'pequena': {
+        'clientes': 500, 'fornecedores': 100, 'produtos': 200,
+        'vendas': 1000, 'itens_venda': 5, 'compras': 200, 'itens_compra': 5,
+        'lancamentos': 2000, 'dias': 90, 'movimentos': 500, 'itens_movimento': 5,
+    },
+    'media': {
+        'clientes': 5000, 'fornecedores': 1000, 'produtos': 2000,
+        'vendas': 10000, 'itens_venda': 5, 'compras': 2000, 'itens_compra': 5,
+        'lancamentos': 20000, 'dias': 365, 'movimentos': 5000, 'itens_movimento': 5,
+    },
+    'grande': {
+        'clientes': 50000, 'fornecedores': 5000, 'produtos': 20000,
+        'vendas': 100000, 'itens_venda': 5, 'compras': 20000, 'itens_compra': 5,
+        'lancamentos': 200000, 'dias': 730, 'movimentos': 50000, 'itens_movimento': 5,
+    },
+}
+
+TAMANHO_LOTE = 2000
+CENTAVO = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+def _lotes(quantidade, tamanho=TAMANHO_LOTE):
+    for inicio in range(0, quantidade, tamanho):
+        yield inicio, min(inicio + tamanho, quantidade)
+
+
+def _valor(rnd, minimo, maximo):
+    return Decimal(rnd.randint(minimo * 100, maximo * 100)) / 100
+
+
+def bulk_create_multitabela(model, objs):
+    """
+    bulk_create para modelos com heranca multi-tabela (Cliente, PedidoVenda,
+    Entrada, EntradaEstoque...), que o Django nao aceita: grava as linhas
+    da tabela pai com bulk_create e em seguida apenas as colunas da filha.
+    """
+    if not objs:
+        return objs
+    ptr = model._meta.pk
+    pai = ptr.remote_field.model
+    campos_pai = [f for f in pai._meta.concrete_fields if not f.primary_key]
+    pais = pai.objects.bulk_create([
+        pai(**dict((f.attname, getattr(obj, f.attname)) for f in campos_pai)) for obj in objs])
+    for obj, obj_pai in zip(objs, pais):
+        setattr(obj, pai._meta.pk.attname, obj_pai.pk)
+        setattr(obj, ptr.attname, obj_pai.pk)
+    model._base_manager._insert(objs, fields=model._meta.local_concrete_fields, using=connection.alias)
+    return objs
+
+
+class GeradorDadosBenchmark(object):
+    """
+    Gera uma empresa sintetica deterministica (mesma semente e mesma
+    data_final geram os mesmos dados) com os volumes de uma escala.
+    """
+
+    def __init__(self, volumes, semente=0, data_final=None, saida=None):
+        self.volumes = volumes
+        self.semente = semente
+        self.rnd = random.Random(semente)
+        self.data_final = data_final or date.today()
+        self.saida = saida
+        self.prefixo = u'BENCH%s' % semente
+
+    def log(self, mensagem):
+        if self.saida is not None:
+            self.saida(mensagem)
+
+    def data_aleatoria(self):
+        return self.data_final - timedelta(days=self.rnd.randrange(self.volumes['dias']))
+
+    def quantidade_itens(self, media):
+        return self.rnd.randint(1, 2 * media - 1)
+
+    def gerar(self):
+        with transaction.atomic():
+            self.gerar_base()
+            self.gerar_pessoas()
+            self.gerar_produtos()
+            self.gerar_vendas()
+            self.gerar_compras()
+            self.gerar_financeiro()
+            self.gerar_estoque()
+
+        # bulk_create nao dispara os sinais que mantem os caches
+        from djangosige.apps.fiscal.perfil_tributario import cache_perfis_tributarios
+        from djangosige.apps.estoque.fechamento import invalidar_fechamentos
+        cache_perfis_tributarios.limpar()
+        invalidar_fechamentos(self.data_final - timedelta(days=self.volumes['dias']))
+        invalidar_metricas_dashboard()
+
+    def gerar_base(self):
+        from djangosige.apps.cadastro.models import Categoria, Unidade
+        from djangosige.apps.estoque.models import LocalEstoque
+        from djangosige.apps.financeiro.models import PlanoContasGrupo
+        from djangosige.apps.fiscal.models import GrupoFiscal, TributoICMS, TributoIPI, TributoPIS, TributoCOFINS
+        from djangosige.apps.vendas.models import CondicaoPagamento
+
+        self.local = LocalEstoque.objects.create(descricao=u'%s Depósito' % self.prefixo)
+        self.categorias = Categoria.objects.bulk_create([
+            Categoria(categoria_desc=u'%s Categoria %s' % (self.prefixo, i)) for i in range(10)])
+        self.unidade = Unidade.objects.create(sigla_unidade=u'UN', unidade_desc=u'Unidade')
+
+        # Grupos com a descricao unica: reaproveitados em uma nova geracao com a mesma semente
+        self.grupos_fiscais = []
+        novos = []
+        for i, p_icms in enumerate((18, 12, 7)):
+            grupo, criado = GrupoFiscal.objects.get_or_create(
+                descricao=u'%s Grupo %s' % (self.prefixo, i), defaults={'regime_trib': '2'})
+            self.grupos_fiscais.append(grupo)
+            if criado:
+                novos.append((grupo, Decimal(p_icms)))
+        TributoICMS.objects.bulk_create([
+            TributoICMS(grupo_fiscal=grupo, cst='00', mod_bc='3', p_icms=p_icms) for grupo, p_icms in novos])
+        TributoIPI.objects.bulk_create([
+            TributoIPI(grupo_fiscal=grupo, cst='50', p_ipi=Decimal('5.00')) for grupo, _ in novos])
+        TributoPIS.objects.bulk_create([
+            TributoPIS(grupo_fiscal=grupo, cst='01', p_pis=Decimal('1.65')) for grupo, _ in novos])
+        TributoCOFINS.objects.bulk_create([
+            TributoCOFINS(grupo_fiscal=grupo, cst='01', p_cofins=Decimal('7.60')) for grupo, _ in novos])
+
+        self.condicoes = CondicaoPagamento.objects.bulk_create([
+            CondicaoPagamento(descricao=u'%s À vista' % self.prefixo, forma='01', n_parcelas=1),
+            CondicaoPagamento(descricao=u'%s 3x' % self.prefixo, forma='03', n_parcelas=3,
+                              dias_recorrencia=30, parcela_inicial=30),
+        ])
+        self.plano_entrada = PlanoContasGrupo.objects.create(
+            codigo=u'9001', tipo_grupo='0', descricao=u'%s Receitas' % self.prefixo)
+        self.plano_saida = PlanoContasGrupo.objects.create(
+            codigo=u'9002', tipo_grupo='1', descricao=u'%s Despesas' % self.prefixo)
+
+    def gerar_pessoas(self):
+        from djangosige.apps.cadastro.models import Cliente, Fornecedor, PessoaFisica, PessoaJuridica
+
+        agora = timezone.now()
+        self.clientes = []
+        for inicio, fim in _lotes(self.volumes['clientes']):
+            clientes = bulk_create_multitabela(Cliente, [
+                Cliente(nome_razao_social=u'%s Cliente %s' % (self.prefixo, i), tipo_pessoa='PF',
+                        documento_digitos=u'%011d' % (self.semente * 10 ** 8 + i),
+                        data_criacao=agora, data_edicao=agora) for i in range(inicio, fim)])
+            PessoaFisica.objects.bulk_create([
+                PessoaFisica(pessoa_id_id=cliente.pk, cpf=cliente.documento_digitos) for cliente in clientes])
+            self.clientes.extend(cliente.pk for cliente in clientes)
+
+        self.fornecedores = []
+        for inicio, fim in _lotes(self.volumes['fornecedores']):
+            fornecedores = bulk_create_multitabela(Fornecedor, [
+                Fornecedor(nome_razao_social=u'%s Fornecedor %s' % (self.prefixo, i), tipo_pessoa='PJ',
+                           documento_digitos=u'%014d' % (self.semente * 10 ** 8 + i),
+                           data_criacao=agora, data_edicao=agora) for i in range(inicio, fim)])
+            PessoaJuridica.objects.bulk_create([
+                PessoaJuridica(pessoa_id_id=fornecedor.pk, cnpj=fornecedor.documento_digitos,
+                               nome_fantasia=fornecedor.nome_razao_social) for fornecedor in fornecedores])
+            self.fornecedores.extend(fornecedor.pk for fornecedor in fornecedores)
+        self.log(u'Pessoas: %s clientes, %s fornecedores' % (len(self.clientes), len(self.fornecedores)))
+
+    def gerar_produtos(self):
+        from djangosige.apps.cadastro.models import Produto
+
+        # pk -> (custo, venda)
+        self.produtos = {}
+        for inicio, fim in _lotes(self.volumes['produtos']):
+            novos = []
+            for i in range(inicio, fim):
+                custo = _valor(self.rnd, 1, 500)
+                novos.append(Produto(
+                    codigo=u'B%s-%s' % (self.semente, i), descricao=u'%s Produto %s' % (self.prefixo, i),
+                    categoria=self.rnd.choice(self.categorias), unidade=self.unidade,
+                    grupo_fiscal=self.rnd.choice(self.grupos_fiscais), ncm=u'84713012',
+                    custo=custo, venda=(custo * Decimal('1.4')).quantize(CENTAVO),
+                    estoque_minimo=Decimal(self.rnd.randint(0, 20)), custo_medio=custo))
+            for produto in Produto.objects.bulk_create(novos):
+                self.produtos[produto.pk] = (produto.custo, produto.venda)
+        self.produtos_ids = sorted(self.produtos)
+        self.log(u'Produtos: %s' % len(self.produtos))
+
+    def _gerar_documentos(self, modelos, modelo_item, modelo_pagamento, campo_documento,
+                          campo_pessoa, pessoas, quantidade, media_itens, preco, extra, recalcular_totais):
+        """
+        Vendas ou compras: pedidos (70%) e orcamentos, com itens e parcelas.
+        O bulk_create nao dispara sinais, entao os totais de cada lote sao
+        recalculados em seguida.
+        """
+        total_itens = 0
+        for inicio, fim in _lotes(quantidade):
+            documentos = defaultdict(list)
+            itens_por_documento = []
+            for _ in range(inicio, fim):
+                data = self.data_aleatoria()
+                cond = self.rnd.choice(self.condicoes)
+                itens = []
+                for produto_id in self.rnd.sample(self.produtos_ids, min(
+                        self.quantidade_itens(media_itens), len(self.produtos_ids))):
+                    quantidade_item = Decimal(self.rnd.randint(1, 10))
+                    valor_unit = self.produtos[produto_id][preco]
+                    itens.append((produto_id, quantidade_item, valor_unit, quantidade_item * valor_unit))
+                pedido = self.rnd.random() < 0.7
+                modelo = modelos[0] if pedido else modelos[1]
+                dados = {
+                    campo_pessoa: self.rnd.choice(pessoas), 'data_emissao': data,
+                    'valor_total': sum(item[3] for item in itens), 'cond_pagamento_id': cond.pk,
+                    'status': self.rnd.choice('0001112'),
+                }
+                dados.update(extra)
+                if pedido:
+                    dados['data_entrega'] = data + timedelta(days=self.rnd.randint(0, 15))
+                else:
+                    dados['data_vencimento'] = data + timedelta(days=self.rnd.randint(0, 30))
+                documento = modelo(**dados)
+                documentos[modelo].append(documento)
+                itens_por_documento.append((documento, cond, itens))
+
+            for modelo, objs in documentos.items():
+                bulk_create_multitabela(modelo, objs)
+
+            novos_itens = []
+            parcelas = []
+            for documento, cond, itens in itens_por_documento:
+                for produto_id, quantidade_item, valor_unit, subtotal in itens:
+                    novos_itens.append(modelo_item(**{
+                        campo_documento: documento.pk, 'produto_id': produto_id,
+                        'quantidade': quantidade_item, 'valor_unit': valor_unit, 'subtotal': subtotal}))
+                valor_parcela = (documento.valor_total / cond.n_parcelas).quantize(CENTAVO)
+                for indice in range(cond.n_parcelas):
+                    parcelas.append(modelo_pagamento(**{
+                        campo_documento: documento.pk, 'indice_parcela': indice + 1,
+                        'valor_parcela': valor_parcela,
+                        'vencimento': documento.data_emissao + timedelta(
+                            days=cond.parcela_inicial + indice * cond.dias_recorrencia)}))
+            modelo_item.objects.bulk_create(novos_itens, batch_size=TAMANHO_LOTE)
+            modelo_pagamento.objects.bulk_create(parcelas, batch_size=TAMANHO_LOTE)
+            recalcular_totais([documento.pk for documento, _, _ in itens_por_documento])
+            total_itens += len(novos_itens)
+        return total_itens
+
+    def gerar_vendas(self):
+        from djangosige.apps.vendas.models import PedidoVenda, OrcamentoVenda, ItensVenda, Pagamento
+        from djangosige.apps.vendas.totais import recalcular_totais_vendas
+
+        itens = self._gerar_documentos(
+            (PedidoVenda, OrcamentoVenda), ItensVenda, Pagamento, 'venda_id_id', 'cliente_id',
+            self.clientes, self.volumes['vendas'], self.volumes['itens_venda'], 1,
+            {'local_orig_id': self.local.pk}, recalcular_totais_vendas)
+        self.log(u'Vendas: %s (%s itens)' % (self.volumes['vendas'], itens))
+
+    def gerar_compras(self):
+        from djangosige.apps.compras.models import PedidoCompra, OrcamentoCompra, ItensCompra, Pagamento
+        from djangosige.apps.compras.totais import recalcular_totais_compras
+
+        itens = self._gerar_documentos(
+            (PedidoCompra, OrcamentoCompra), ItensCompra, Pagamento, 'compra_id_id', 'fornecedor_id',
+            self.fornecedores, self.volumes['compras'], self.volumes['itens_compra'], 0,
+            {'local_dest_id': self.local.pk}, recalcular_totais_compras)
+        self.log(u'Compras: %s (%s itens)' % (self.volumes['compras'], itens))
+
+    def gerar_financeiro(self):
+        from djangosige.apps.financeiro.models import Entrada, Saida, MovimentoCaixa, ResumoMovimentoCaixa
+
+        # Contas pagas/recebidas entram no movimento de caixa do dia do pagamento
+        lancamentos = []
+        entradas_dia = defaultdict(lambda: ZERO)
+        saidas_dia = defaultdict(lambda: ZERO)
+        for i in range(self.volumes['lancamentos']):
+            entrada = i % 2 == 0
+            vencimento = self.data_aleatoria()
+            valor = _valor(self.rnd, 10, 5000)
+            status = self.rnd.choice('0012')
+            pagamento = vencimento if status == '0' else None
+            if pagamento:
+                (entradas_dia if entrada else saidas_dia)[pagamento] += valor
+            lancamentos.append((entrada, vencimento, pagamento, valor, status))
+
+        # Um movimento por dia, como o get_or_create(data_movimento=...) das
+        # views espera: dias ja existentes (de outra geracao ou da empresa)
+        # recebem os valores, e os saldos seguem do ultimo saldo_final
+        movimentos = {}
+        dias = sorted(set(entradas_dia) | set(saidas_dia))
+        if dias:
+            anterior = MovimentoCaixa.objects.filter(data_movimento__lt=dias[0]).order_by(
+                '-data_movimento', '-pk').first()
+            saldo = anterior.saldo_final if anterior else ZERO
+            existentes = list(MovimentoCaixa.objects.filter(
+                data_movimento__gte=dias[0]).order_by('data_movimento', 'pk'))
+            for movimento in existentes:
+                movimentos.setdefault(movimento.data_movimento, movimento)
+            for dia in dias:
+                if dia not in movimentos:
+                    movimentos[dia] = MovimentoCaixa(data_movimento=dia)
+                movimentos[dia].entradas += entradas_dia[dia]
+                movimentos[dia].saidas += saidas_dia[dia]
+
+            novos = [movimentos[dia] for dia in dias if movimentos[dia].pk is None]
+            for movimento in sorted(existentes + novos, key=lambda m: (m.data_movimento, m.pk is None, m.pk)):
+                movimento.saldo_inicial = saldo
+                movimento.saldo_final = saldo = saldo + movimento.entradas - movimento.saidas
+            for inicio, fim in _lotes(len(existentes)):
+                MovimentoCaixa.objects.bulk_update(existentes[inicio:fim], [
+                    'saldo_inicial', 'saldo_final', 'entradas', 'saidas'])
+            for inicio, fim in _lotes(len(novos)):
+                MovimentoCaixa.objects.bulk_create(novos[inicio:fim])
+        movimentos = {dia: movimento.pk for dia, movimento in movimentos.items()}
+
+        for inicio, fim in _lotes(len(lancamentos)):
+            entradas = []
+            saidas = []
+            for entrada, vencimento, pagamento, valor, status in lancamentos[inicio:fim]:
+                dados = {
+                    'descricao': u'%s Lançamento' % self.prefixo, 'data_vencimento': vencimento,
+                    'data_pagamento': pagamento, 'valor_total': valor, 'valor_liquido': valor,
+                    'movimento_caixa_id': movimentos.get(pagamento), 'status': status,
+                }
+                if entrada:
+                    entradas.append(Entrada(cliente_id=self.rnd.choice(self.clientes),
+                                            grupo_plano=self.plano_entrada, **dados))
+                else:
+                    saidas.append(Saida(fornecedor_id=self.rnd.choice(self.fornecedores),
+                                        grupo_plano=self.plano_saida, **dados))
+            bulk_create_multitabela(Entrada, entradas)
+            bulk_create_multitabela(Saida, saidas)
+        ResumoMovimentoCaixa.reconstruir()
+        self.log(u'Lançamentos: %s, movimentos de caixa: %s' % (len(lancamentos), len(dias)))
+
+    def gerar_estoque(self):
+        from djangosige.apps.cadastro.models import Produto
+        from djangosige.apps.estoque.models import EntradaEstoque, SaidaEstoque, ItensMovimento, ProdutoEstocado
+
+        # Em ordem cronologica, para que as saidas nunca deixem saldo negativo
+        datas = sorted(self.data_aleatoria() for _ in range(self.volumes['movimentos']))
+        saldos = defaultdict(lambda: ZERO)
+        for inicio, fim in _lotes(len(datas)):
+            movimentos = {EntradaEstoque: [], SaidaEstoque: []}
+            itens_por_movimento = []
+            for data in datas[inicio:fim]:
+                entrada = self.rnd.random() < 0.6
+                itens = []
+                for produto_id in self.rnd.sample(self.produtos_ids, min(
+                        self.quantidade_itens(self.volumes['itens_movimento']), len(self.produtos_ids))):
+                    quantidade = Decimal(self.rnd.randint(1, 50))
+                    if not entrada:
+                        quantidade = min(quantidade, saldos[produto_id])
+                        if not quantidade:
+                            continue
+                    saldos[produto_id] += quantidade if entrada else -quantidade
+                    itens.append((produto_id, quantidade, self.produtos[produto_id][0]))
+                if not itens:
+                    continue
+                dados = {'data_movimento': data, 'quantidade_itens': len(itens),
+                         'valor_total': sum(q * custo for _, q, custo in itens)}
+                if entrada:
+                    movimento = EntradaEstoque(local_dest=self.local, tipo_movimento='0', **dados)
+                else:
+                    movimento = SaidaEstoque(local_orig=self.local, tipo_movimento='0', **dados)
+                movimentos[type(movimento)].append(movimento)
+                itens_por_movimento.append((movimento, itens))
+
+            for modelo, objs in movimentos.items():
+                bulk_create_multitabela(modelo, objs)
+            ItensMovimento.objects.bulk_create([
+                ItensMovimento(movimento_id_id=movimento.pk, produto_id=produto_id, quantidade=quantidade,
+                               valor_unit=custo, subtotal=quantidade * custo, custo_unitario=custo)
+                for movimento, itens in itens_por_movimento for produto_id, quantidade, custo in itens],
+                batch_size=TAMANHO_LOTE)
+
+        ProdutoEstocado.objects.bulk_create([
+            ProdutoEstocado(produto_id=produto_id, local=self.local, quantidade=quantidade,
+                            valor_estoque=(quantidade * self.produtos[produto_id][0]).quantize(CENTAVO))
+            for produto_id, quantidade in saldos.items() if quantidade], batch_size=TAMANHO_LOTE)
+        Produto.objects.bulk_update([
+            Produto(pk=produto_id, estoque_atual=quantidade,
+                    valor_estoque=(quantidade * self.produtos[produto_id][0]).quantize(CENTAVO))
+            for produto_id, quantidade in saldos.items()], ['estoque_atual', 'valor_estoque'],
+            batch_size=TAMANHO_LOTE)
+        self.log(u'Movimentos de estoque: %s' % len(datas))
+
+
+def gerar_dados_benchmark(escala='pequena', semente=0, data_final=None, saida=None, **volumes):
+    """
+    Gera a empresa sintetica da escala (chave de ESCALAS); volumes
+    informados sobrescrevem os da escala.
+    """
+    valores = dict(ESCALAS[escala])
+    valores.update((chave, valor) for chave, valor in volumes.items() if valor is not None)
+    GeradorDadosBenchmark(valores, semente, data_final, saida).gerar()
+    return valores
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, F
+
+from datetime import datetime
+
+DASHBOARD_CACHE_KEY = 'dashboard_metricas_%s'
+# Curto: com um cache por processo a invalidacao pelos sinais so alcanca o
+# processo que gravou, os demais enxergam a mudanca quando a entrada expira
+DASHBOARD_CACHE_TIMEOUT = 60
+
+
+def calcular_metricas_dashboard(data_atual):
+    """
+    Calcula os contadores da pagina inicial com agregacao condicional,
+    uma query por hierarquia de modelos.
+    """
+    from djangosige.apps.cadastro.models import Pessoa, Produto
+    from djangosige.apps.vendas.models import Venda
+    from djangosige.apps.compras.models import Compra
+    from djangosige.apps.financeiro.models import Lancamento, MovimentoCaixa
+
+    contas_abertas = ['1', '2']
+
+    pessoas = Pessoa.objects.aggregate(
+        clientes=Count('cliente'),
+        fornecedores=Count('fornecedor'),
+        empresas=Count('empresa'),
+        transportadoras=Count('transportadora'),
+    )
+    produtos = Produto.objects.aggregate(
+        produtos=Count('pk'),
+        produtos_baixo_estoque=Count('pk', filter=Q(
+            estoque_atual__lte=F('estoque_minimo'))),
+    )
+    vendas = Venda.objects.aggregate(
+        orcamento_venda_hoje=Count('pk', filter=Q(
+            orcamentovenda__data_vencimento=data_atual, orcamentovenda__status='0')),
+        orcamentos_venda_vencidos=Count('pk', filter=Q(
+            orcamentovenda__data_vencimento__lte=data_atual, orcamentovenda__status='0')),
+        pedido_venda_hoje=Count('pk', filter=Q(
+            pedidovenda__data_entrega=data_atual, pedidovenda__status='0')),
+        pedidos_venda_atrasados=Count('pk', filter=Q(
+            pedidovenda__data_entrega__lte=data_atual, pedidovenda__status='0')),
+    )
+    compras = Compra.objects.aggregate(
+        orcamento_compra_hoje=Count('pk', filter=Q(
+            orcamentocompra__data_vencimento=data_atual, orcamentocompra__status='0')),
+        orcamentos_compra_vencidos=Count('pk', filter=Q(
+            orcamentocompra__data_vencimento__lte=data_atual, orcamentocompra__status='0')),
+        pedido_compra_hoje=Count('pk', filter=Q(
+            pedidocompra__data_entrega=data_atual, pedidocompra__status='0')),
+        pedidos_compra_atrasados=Count('pk', filter=Q(
+            pedidocompra__data_entrega__lte=data_atual, pedidocompra__status='0')),
+    )
+    lancamentos = Lancamento.objects.aggregate(
+        contas_receber_hoje=Count('pk', filter=Q(
+            data_vencimento=data_atual, entrada__status__in=contas_abertas)),
+        contas_receber_atrasadas=Count('pk', filter=Q(
+            data_vencimento__lte=data_atual, entrada__status__in=contas_abertas)),
+        contas_pagar_hoje=Count('pk', filter=Q(
+            data_vencimento=data_atual, saida__status__in=contas_abertas)),
+        contas_pagar_atrasadas=Count('pk', filter=Q(
+            data_vencimento__lte=data_atual, saida__status__in=contas_abertas)),
+    )
+
+    metricas = {
+        'quantidade_cadastro': {
+            'clientes': pessoas['clientes'],
+            'fornecedores': pessoas['fornecedores'],
+            'produtos': produtos['produtos'],
+            'empresas': pessoas['empresas'],
+            'transportadoras': pessoas['transportadoras'],
+        },
+        'agenda_hoje': {
+            'orcamento_venda_hoje': vendas['orcamento_venda_hoje'],
+            'orcamento_compra_hoje': compras['orcamento_compra_hoje'],
+            'pedido_venda_hoje': vendas['pedido_venda_hoje'],
+            'pedido_compra_hoje': compras['pedido_compra_hoje'],
+            'contas_receber_hoje': lancamentos['contas_receber_hoje'],
+            'contas_pagar_hoje': lancamentos['contas_pagar_hoje'],
+        },
+        'alertas': {
+            'produtos_baixo_estoque': produtos['produtos_baixo_estoque'],
+            'orcamentos_venda_vencidos': vendas['orcamentos_venda_vencidos'],
+            'pedidos_venda_atrasados': vendas['pedidos_venda_atrasados'],
+            'orcamentos_compra_vencidos': compras['orcamentos_compra_vencidos'],
+            'pedidos_compra_atrasados': compras['pedidos_compra_atrasados'],
+            'contas_receber_atrasadas': lancamentos['contas_receber_atrasadas'],
+            'contas_pagar_atrasadas': lancamentos['contas_pagar_atrasadas'],
+        },
+    }
+
+    movimento_dia = MovimentoCaixa.objects.filter(
+        data_movimento__lte=data_atual).order_by('-data_movimento').first()
+    if movimento_dia and movimento_dia.data_movimento == data_atual:
+        metricas['movimento_dia'] = movimento_dia
+    elif movimento_dia:
+        metricas['saldo'] = movimento_dia.saldo_final
+    else:
+        metricas['saldo'] = '0,00'
+
+    return metricas
+
+
+def get_metricas_dashboard(data_atual):
+    chave = DASHBOARD_CACHE_KEY % data_atual.isoformat()
+    metricas = cache.get(chave)
+    if metricas is None:
+        metricas = calcular_metricas_dashboard(data_atual)
+        cache.set(chave, metricas, getattr(
+            settings, 'DASHBOARD_CACHE_TIMEOUT', DASHBOARD_CACHE_TIMEOUT))
+    return metricas
+
+
+def invalidar_metricas_dashboard(sender=None, **kwargs):
+    cache.delete(DASHBOARD_CACHE_KEY % datetime.now().date().isoformat())
+
+
+def conectar_sinais_dashboard():
+    from django.db.models.signals import post_save, post_delete
+    from djangosige.apps.cadastro.models import Cliente, Fornecedor, Produto, Empresa, Transportadora
+    from djangosige.apps.vendas.models import OrcamentoVenda, PedidoVenda
+    from djangosige.apps.compras.models import OrcamentoCompra, PedidoCompra
+    from djangosige.apps.financeiro.models import Entrada, Saida, MovimentoCaixa
+
+    for model in (Cliente, Fornecedor, Produto, Empresa, Transportadora,
+                  OrcamentoVenda, PedidoVenda, OrcamentoCompra, PedidoCompra,
+                  Entrada, Saida, MovimentoCaixa):
+        post_save.connect(invalidar_metricas_dashboard, sender=model,
+                          dispatch_uid='dashboard_post_save_%s' % model.__name__)
+        post_delete.connect(invalidar_metricas_dashboard, sender=model,
+                            dispatch_uid='dashboard_post_delete_%s' % model.__name__)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+
+# Ultimas requisicoes guardadas por view (janela movel)
+AMOSTRAS_POR_VIEW = 200
+# Intervalo minimo entre gravacoes do arquivo deste processo
+INTERVALO_GRAVACAO = 30
+# Uma consulta repetida ao menos este numero de vezes na mesma requisicao
+# e tratada como suspeita de N+1
+MINIMO_DUPLICADAS = 2
+
+ORDENACOES = {
+    'db': lambda r: r['tempo_db_total'],
+    'consultas': lambda r: r['consultas_media'],
+    'tempo': lambda r: r['tempo_total_medio'],
+    'duplicadas': lambda r: r['duplicadas_max'],
+    'requisicoes': lambda r: r['requisicoes'],
+}
+
+_lock = threading.Lock()
+_amostras = defaultdict(lambda: deque(maxlen=AMOSTRAS_POR_VIEW))
+_ultima_gravacao = [0.0]
+
+_RE_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_LISTA = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+
+
+def impressao_digital(sql):
+    """SQL sem valores literais: consultas que diferem apenas nos parametros coincidem."""
+    sql = _RE_NUMERO.sub('?', _RE_TEXTO.sub('?', sql))
+    return _RE_LISTA.sub('(...)', sql)
+
+
+class ColetorConsultas(object):
+    """execute_wrapper que conta as consultas, o tempo de banco e as repeticoes."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.digitais = defaultdict(int)
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo_db += time.perf_counter() - inicio
+            self.consultas += 1
+            self.digitais[impressao_digital(sql)] += 1
+
+    def duplicadas(self):
+        return dict((digital, total) for digital, total in self.digitais.items()
+                    if total >= MINIMO_DUPLICADAS)
+
+
+def diretorio_desempenho():
+    return getattr(settings, 'MONITOR_DESEMPENHO_DIR', None)
+
+
+def registrar_amostra(view, amostra):
+    with _lock:
+        _amostras[view].append(amostra)
+        gravar = time.monotonic() - _ultima_gravacao[0] >= INTERVALO_GRAVACAO
+        if gravar:
+            _ultima_gravacao[0] = time.monotonic()
+    if gravar:
+        gravar_amostras()
+
+
+def amostras_do_processo():
+    with _lock:
+        return dict((view, list(amostras)) for view, amostras in _amostras.items())
+
+
+def gravar_amostras(diretorio=None):
+    """
+    Grava as amostras deste processo em <diretorio>/<pid>.json, para que o
+    comando relatorio_desempenho junte todos os processos do servidor.
+    """
+    diretorio = diretorio or diretorio_desempenho()
+    if not diretorio:
+        return
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, '%s.json' % os.getpid())
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w') as arquivo:
+        json.dump(amostras_do_processo(), arquivo)
+    os.replace(temporario, caminho)
+
+
+def carregar_amostras(diretorio=None, incluir_processo=True):
+    """Amostras gravadas por todos os processos (e as deste, ainda em memoria)."""
+    diretorio = diretorio or diretorio_desempenho()
+    amostras = defaultdict(list)
+    if diretorio and os.path.isdir(diretorio):
+        proprio = '%s.json' % os.getpid()
+        for nome in os.listdir(diretorio):
+            if not nome.endswith('.json') or (incluir_processo and nome == proprio):
+                continue
+            try:
+                with open(os.path.join(diretorio, nome)) as arquivo:
+                    dados = json.load(arquivo)
+            except (OSError, ValueError):
+                continue
+            for view, lista in dados.items():
+                amostras[view].extend(lista)
+    if incluir_processo:
+        for view, lista in amostras_do_processo().items():
+            amostras[view].extend(lista)
+    return amostras
+
+
+def limpar_amostras(diretorio=None):
+    with _lock:
+        _amostras.clear()
+    diretorio = diretorio or diretorio_desempenho()
+    if diretorio and os.path.isdir(diretorio):
+        for nome in os.listdir(diretorio):
+            if nome.endswith('.json'):
+                os.remove(os.path.join(diretorio, nome))
+
+
+def _media(valores):
+    valores = [v for v in valores if v is not None]
+    return sum(valores) / len(valores) if valores else None
+
+
+def resumir_amostras(amostras, ordenar_por='db'):
+    """
+    Uma linha por view, da mais pesada para a mais leve segundo
+    ordenar_por (chave de ORDENACOES). Tempos em milissegundos.
+    """
+    relatorio = []
+    for view, lista in amostras.items():
+        if not lista:
+            continue
+        duplicadas = defaultdict(int)
+        for amostra in lista:
+            for digital, total in amostra['duplicadas'].items():
+                duplicadas[digital] = max(duplicadas[digital], total)
+        relatorio.append({
+            'view': view,
+            'requisicoes': len(lista),
+            'consultas_media': _media([a['consultas'] for a in lista]),
+            'consultas_max': max(a['consultas'] for a in lista),
+            'tempo_db_medio': _media([a['tempo_db'] for a in lista]) * 1000,
+            'tempo_db_total': sum(a['tempo_db'] for a in lista) * 1000,
+            'tempo_total_medio': _media([a['tempo_total'] for a in lista]) * 1000,
+            'tempo_render_medio': (_media([a['tempo_render'] for a in lista]) or 0) * 1000,
+            'tamanho_medio': _media([a['tamanho'] for a in lista]),
+            'duplicadas_max': max(duplicadas.values()) if duplicadas else 0,
+            'duplicadas': sorted(duplicadas.items(), key=lambda d: -d[1])[:5],
+        })
+    relatorio.sort(key=ORDENACOES[ordenar_por], reverse=True)
+    return relatorio
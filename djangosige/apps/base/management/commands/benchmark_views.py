@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from djangosige.apps.base.benchmark_views import executar_benchmark_views, ENDPOINTS
+from djangosige.apps.base.dados_benchmark import ESCALAS
+
+
+class Command(BaseCommand):
+    help = (u'Mede tempo e consultas das principais listas, relatórios, dashboard e endpoints ajax. '
+            u'Com --escala os dados são gerados e descartados ao final de cada medição.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', action='append', choices=sorted(ESCALAS),
+                            help=u'Pode ser repetido. Sem escala, mede o banco atual.')
+        parser.add_argument('--repeticoes', type=int, default=3)
+        parser.add_argument('--semente', type=int, default=0)
+        parser.add_argument('--endpoint', action='append', choices=[e[0] for e in ENDPOINTS],
+                            help=u'Limita a medição aos endpoints informados.')
+        parser.add_argument('--saida', default=None, help=u'Arquivo JSON do relatório.')
+
+    def handle(self, *args, **options):
+        relatorio = executar_benchmark_views(
+            options['escala'], options['repeticoes'], options['semente'], options['endpoint'])
+
+        for resultado in relatorio['escalas']:
+            self.stdout.write(u'Escala: %s %s' % (resultado['escala'] or u'banco atual', resultado['volumes']))
+            for endpoint in resultado['endpoints']:
+                if 'erro' in endpoint:
+                    self.stdout.write(u'  %-32s erro: %s' % (endpoint['nome'], endpoint['erro']))
+                    continue
+                self.stdout.write(u'  %-32s %s %4d consultas  mediana %8.1fms  máx. %8.1fms' % (
+                    endpoint['nome'], endpoint['status'], endpoint['consultas'],
+                    endpoint['tempo_mediana_ms'], endpoint['tempo_max_ms']))
+
+        if options['saida']:
+            with open(options['saida'], 'w') as arquivo:
+                json.dump(relatorio, arquivo, indent=2)
+            self.stdout.write(u'Relatório gravado em %s' % options['saida'])
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosige.apps.base.relatorios_pdf import limpar_relatorios
+
+
+class Command(BaseCommand):
+    help = u'Remove do cache em disco os PDFs de vendas e compras gerados há mais de N dias.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30,
+                            help=u'Idade mínima, em dias, dos PDFs removidos.')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 0:
+            raise CommandError(u'O número de dias não pode ser negativo.')
+        removidos = limpar_relatorios(options['dias'])
+        self.stdout.write(u'PDFs removidos: %s' % removidos)
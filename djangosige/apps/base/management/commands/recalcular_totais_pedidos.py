@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosige.apps.base.totais_pedidos import TAMANHO_LOTE_TOTAIS
+from djangosige.apps.compras.totais import recalcular_totais_compras
+from djangosige.apps.vendas.totais import recalcular_totais_vendas
+
+
+class Command(BaseCommand):
+    help = u'Recalcula os totais gravados em vendas e compras a partir dos itens, corrigindo divergências.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_TOTAIS,
+                            help=u'Quantidade de documentos processados por vez.')
+
+    def handle(self, *args, **options):
+        if options['lote'] <= 0:
+            raise CommandError(u'O tamanho do lote deve ser maior que zero.')
+        vendas = recalcular_totais_vendas(tamanho_lote=options['lote'])
+        compras = recalcular_totais_compras(tamanho_lote=options['lote'])
+        self.stdout.write(u'Vendas corrigidas: %s' % vendas)
+        self.stdout.write(u'Compras corrigidas: %s' % compras)
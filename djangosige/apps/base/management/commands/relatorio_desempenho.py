@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosige.apps.base.desempenho import carregar_amostras, resumir_amostras, limpar_amostras, \
+    diretorio_desempenho, ORDENACOES
+
+
+class Command(BaseCommand):
+    help = u'Lista as views mais pesadas registradas pelo MonitorDesempenhoMiddleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ordem', default='db', choices=sorted(ORDENACOES),
+                            help=u'Critério de ordenação (padrão: tempo total de banco).')
+        parser.add_argument('--limite', type=int, default=20)
+        parser.add_argument('--diretorio', default=None,
+                            help=u'Diretório das amostras (padrão: MONITOR_DESEMPENHO_DIR).')
+        parser.add_argument('--limpar', action='store_true',
+                            help=u'Apaga as amostras gravadas após o relatório.')
+
+    def handle(self, *args, **options):
+        diretorio = options['diretorio'] or diretorio_desempenho()
+        if not diretorio:
+            raise CommandError(u'Defina MONITOR_DESEMPENHO_DIR ou informe --diretorio.')
+
+        relatorio = resumir_amostras(carregar_amostras(diretorio, incluir_processo=False), options['ordem'])
+        if not relatorio:
+            self.stdout.write(u'Nenhuma requisição registrada em %s.' % diretorio)
+
+        for posicao, linha in enumerate(relatorio[:options['limite']], 1):
+            self.stdout.write(
+                u'%2d. %s: %s req, %.1f consultas (máx. %s), banco %.1fms (total %.0fms), '
+                u'total %.1fms, render %.1fms' % (
+                    posicao, linha['view'], linha['requisicoes'], linha['consultas_media'],
+                    linha['consultas_max'], linha['tempo_db_medio'], linha['tempo_db_total'],
+                    linha['tempo_total_medio'], linha['tempo_render_medio']))
+            for digital, total in linha['duplicadas']:
+                self.stdout.write(u'      %sx %s' % (total, digital[:160]))
+
+        if options['limpar']:
+            limpar_amostras(diretorio)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosige.apps.base.dados_benchmark import gerar_dados_benchmark, ESCALAS
+
+
+class Command(BaseCommand):
+    help = u'Gera uma empresa sintética (pessoas, produtos, vendas, compras, financeiro e estoque) para benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', default='pequena', choices=sorted(ESCALAS))
+        parser.add_argument('--semente', type=int, default=0,
+                            help=u'Mesma semente e mesma data final geram os mesmos dados.')
+        parser.add_argument('--data-final', default=None,
+                            help=u'Data do movimento mais recente (dd/mm/aaaa). Padrão: hoje.')
+        for volume in sorted(ESCALAS['pequena']):
+            parser.add_argument('--%s' % volume.replace('_', '-'), dest=volume, type=int, default=None,
+                                help=u'Sobrescreve o volume da escala.')
+
+    def handle(self, *args, **options):
+        data_final = None
+        if options['data_final']:
+            try:
+                data_final = datetime.strptime(options['data_final'], '%d/%m/%Y').date()
+            except ValueError:
+                raise CommandError(u'Data inválida: %s' % options['data_final'])
+
+        volumes = dict((volume, options[volume]) for volume in ESCALAS['pequena'])
+        volumes = gerar_dados_benchmark(
+            options['escala'], options['semente'], data_final, saida=self.stdout.write, **volumes)
+        self.stdout.write(u'Dados gerados: %s' % u', '.join(
+            u'%s=%s' % item for item in sorted(volumes.items())))
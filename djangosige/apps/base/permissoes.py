@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+PERMISSOES_VERSAO_KEY = 'permissoes_versao'
+PERMISSOES_CACHE_KEY = 'permissoes_usuario_%s_%s'
+PERMISSOES_CACHE_TIMEOUT = 60
+
+# Backends que guardam os dados na memoria de cada processo: uma revogacao
+# feita em um worker nao chegaria aos outros
+CACHES_POR_PROCESSO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_compartilhado():
+    backend = settings.CACHES.get('default', {}).get('BACKEND', CACHES_POR_PROCESSO[0])
+    return backend not in CACHES_POR_PROCESSO
+
+
+def get_versao_permissoes():
+    versao = cache.get(PERMISSOES_VERSAO_KEY)
+    if versao is None:
+        # Sem versao (primeiro acesso ou chave descartada pelo cache): parte
+        # do horario atual para nunca reaproveitar entradas de uma versao antiga
+        cache.add(PERMISSOES_VERSAO_KEY, int(time.time() * 1000), None)
+        versao = cache.get(PERMISSOES_VERSAO_KEY)
+    return versao
+
+
+def get_permissoes_usuario(user):
+    """
+    Conjunto 'app_label.codename' das permissoes do usuario (diretas e
+    pelos grupos), guardado no cache entre requisicoes. Sem um cache
+    compartilhado entre os processos as permissoes sao sempre lidas do banco.
+    """
+    if not user.is_authenticated or not user.is_active:
+        return frozenset()
+    if not cache_compartilhado():
+        return frozenset(user.get_all_permissions())
+    chave = PERMISSOES_CACHE_KEY % (user.pk, get_versao_permissoes())
+    permissoes = cache.get(chave)
+    if permissoes is None:
+        permissoes = frozenset(user.get_all_permissions())
+        cache.set(chave, permissoes, getattr(
+            settings, 'PERMISSOES_CACHE_TIMEOUT', PERMISSOES_CACHE_TIMEOUT))
+    return permissoes
+
+
+def usuario_tem_permissoes(user, perms):
+    if user.is_active and user.is_superuser:
+        return True
+    return set(perms) <= get_permissoes_usuario(user)
+
+
+def invalidar_permissoes(sender=None, **kwargs):
+    # Nova versao: as entradas de todos os usuarios deixam de ser lidas
+    try:
+        cache.incr(PERMISSOES_VERSAO_KEY)
+    except ValueError:
+        cache.delete(PERMISSOES_VERSAO_KEY)
+
+
+def conectar_sinais_permissoes():
+    from django.db.models.signals import post_save, post_delete, m2m_changed
+    from django.contrib.auth.models import User, Group, Permission
+
+    for through in (User.groups.through, User.user_permissions.through, Group.permissions.through):
+        m2m_changed.connect(invalidar_permissoes, sender=through,
+                            dispatch_uid='permissoes_m2m_changed_%s' % through.__name__)
+    for model in (Group, Permission):
+        post_save.connect(invalidar_permissoes, sender=model,
+                          dispatch_uid='permissoes_post_save_%s' % model.__name__)
+        post_delete.connect(invalidar_permissoes, sender=model,
+                            dispatch_uid='permissoes_post_delete_%s' % model.__name__)
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from datetime import date, datetime
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import FileResponse, HttpResponse
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Image
+
+# Alterar quando o layout mudar: os PDFs ja gravados deixam de ser usados
+VERSAO_LAYOUT_PDF = 1
+
+RELATORIOS_PDF_WORKERS = 2
+# Segundos que a requisicao espera pelo PDF antes de responder 202
+RELATORIOS_PDF_ESPERA = 2
+RELATORIOS_PDF_RETRY_AFTER = 2
+
+_lock = threading.Lock()
+_executor = None
+_em_andamento = {}
+_estilos = {}
+_logos = {}
+
+
+def diretorio_relatorios():
+    return getattr(settings, 'RELATORIOS_PDF_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'relatorios_pdf')
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'RELATORIOS_PDF_WORKERS', RELATORIOS_PDF_WORKERS),
+                thread_name_prefix='relatorios_pdf')
+        return _executor
+
+
+def get_estilos(nome, configurar):
+    """
+    Folha de estilos do relatorio nome, montada uma vez por processo com
+    configurar(styles) e compartilhada pelas renderizacoes (os estilos nao
+    sao alterados durante o build).
+    """
+    estilos = _estilos.get(nome)
+    if estilos is None:
+        estilos = getSampleStyleSheet()
+        configurar(estilos)
+        estilos = _estilos.setdefault(nome, estilos)
+    return estilos
+
+
+def imagem_logo(caminho, largura, altura):
+    """
+    Flowable do logo. O arquivo e lido uma vez (por caminho e mtime) e
+    cada renderizacao recebe um Image novo sobre os mesmos bytes.
+    """
+    try:
+        mtime = os.path.getmtime(caminho)
+    except OSError:
+        return None
+    chave = (caminho, mtime)
+    conteudo = _logos.get(chave)
+    if conteudo is None:
+        with open(caminho, 'rb') as arquivo:
+            conteudo = arquivo.read()
+        _logos.clear()
+        _logos[chave] = conteudo
+    return Image(BytesIO(conteudo), width=largura, height=altura)
+
+
+def dados_empresa_relatorio(user):
+    """Cabecalho dos relatorios: dados da empresa do usuario, ou None."""
+    from djangosige.apps.cadastro.models import MinhaEmpresa
+
+    m_empresa = MinhaEmpresa.objects.select_related(
+        'm_empresa__endereco_padrao', 'm_empresa__telefone_padrao', 'm_empresa__pessoa_jur_info').filter(
+        m_usuario__user=user, m_empresa__isnull=False).first()
+    if m_empresa is None:
+        return None
+    empresa = m_empresa.m_empresa
+    logo = empresa.caminho_completo_logo if empresa.logo_file else ''
+    try:
+        inscricao_estadual = empresa.inscricao_estadual or ''
+    except ObjectDoesNotExist:
+        inscricao_estadual = ''
+    return {
+        'nome': empresa.nome_razao_social,
+        'endereco': empresa.endereco_padrao.format_endereco_completo if empresa.endereco_padrao else '',
+        'telefone': empresa.telefone_padrao.telefone if empresa.telefone_padrao else '',
+        'ie': inscricao_estadual,
+        'logo': logo if logo and os.path.exists(logo) else '',
+        # O arquivo do logo pode mudar sem mudar o caminho
+        'logo_mtime': os.path.getmtime(logo) if logo and os.path.exists(logo) else None,
+    }
+
+
+def data_relatorio(valor):
+    """Data dos relatorios em lote (dd/mm/aaaa ou aaaa-mm-dd); hoje se vazio, None se invalida."""
+    if not valor:
+        return date.today()
+    for formato in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            pass
+    return None
+
+
+def chave_conteudo(dados):
+    """Hash do conteudo do relatorio: dados iguais produzem o mesmo PDF."""
+    serializado = json.dumps([VERSAO_LAYOUT_PDF, dados], sort_keys=True, default=str)
+    return hashlib.sha1(serializado.encode('utf-8')).hexdigest()
+
+
+def construir_pdf(titulo, story, margem):
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=margem, rightMargin=margem,
+                            topMargin=margem, bottomMargin=margem, title=titulo)
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def juntar_pdfs(caminhos):
+    from pypdf import PdfWriter
+
+    escritor = PdfWriter()
+    for caminho in caminhos:
+        escritor.append(caminho)
+    buffer = BytesIO()
+    escritor.write(buffer)
+    escritor.close()
+    return buffer.getvalue()
+
+
+def caminho_relatorio(nome_arquivo):
+    return os.path.join(diretorio_relatorios(), nome_arquivo)
+
+
+def _gravar(caminho, conteudo):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = '%s.%s.tmp' % (caminho, threading.get_ident())
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    # Quem le o arquivo nunca ve um PDF pela metade
+    os.replace(temporario, caminho)
+
+
+def _renderizar(caminho, renderizar):
+    try:
+        if not os.path.exists(caminho):
+            _gravar(caminho, renderizar())
+        return caminho
+    finally:
+        with _lock:
+            _em_andamento.pop(caminho, None)
+
+
+def agendar_relatorio(nome_arquivo, renderizar):
+    """
+    Agenda renderizar() (que retorna os bytes do PDF) no pool, a menos que
+    o arquivo ja exista ou ja esteja sendo gerado. Retorna o Future, ou
+    None se o PDF ja esta pronto.
+    """
+    caminho = caminho_relatorio(nome_arquivo)
+    if os.path.exists(caminho):
+        return None
+    executor = get_executor()
+    with _lock:
+        futuro = _em_andamento.get(caminho)
+        if futuro is None:
+            futuro = _em_andamento[caminho] = executor.submit(_renderizar, caminho, renderizar)
+    return futuro
+
+
+def agendar_lote(nome_arquivo, relatorios):
+    """
+    Um PDF com todos os relatorios [(nome_arquivo, renderizar), ...]: cada
+    um e gerado em paralelo no pool (e fica no cache individual) e o lote
+    junta os arquivos na ordem recebida.
+    """
+    caminhos = [caminho_relatorio(nome) for nome, _ in relatorios]
+    # Os relatorios entram na fila antes do lote, que so espera tarefas ja iniciadas
+    futuros = [agendar_relatorio(nome, renderizar) for nome, renderizar in relatorios]
+
+    def renderizar_lote():
+        for futuro in futuros:
+            if futuro is not None:
+                futuro.result()
+        return juntar_pdfs(caminhos)
+
+    return agendar_relatorio(nome_arquivo, renderizar_lote)
+
+
+def aguardar_relatorio(nome_arquivo, futuro, espera=None):
+    """Caminho do PDF se ficar pronto em ate espera segundos, senao None."""
+    if futuro is not None:
+        if espera is None:
+            espera = getattr(settings, 'RELATORIOS_PDF_ESPERA', RELATORIOS_PDF_ESPERA)
+        try:
+            futuro.result(timeout=espera)
+        except FuturesTimeoutError:
+            return None
+    return caminho_relatorio(nome_arquivo)
+
+
+def resposta_relatorio_pdf(titulo, nome_arquivo, futuro):
+    """
+    O PDF, se pronto; senao 202 com Refresh/Retry-After para o navegador
+    repetir a mesma URL (que entao encontra o arquivo no cache).
+    """
+    caminho = aguardar_relatorio(nome_arquivo, futuro)
+    if caminho is None:
+        response = HttpResponse(u'Gerando o PDF, aguarde...', status=202)
+        response['Retry-After'] = str(RELATORIOS_PDF_RETRY_AFTER)
+        response['Refresh'] = str(RELATORIOS_PDF_RETRY_AFTER)
+        return response
+    return FileResponse(open(caminho, 'rb'), content_type='application/pdf',
+                        filename=u'%s.pdf' % titulo)
+
+
+def limpar_relatorios(dias):
+    """Remove os PDFs gerados ha mais de dias dias. Retorna quantos foram removidos."""
+    diretorio = diretorio_relatorios()
+    if not os.path.isdir(diretorio):
+        return 0
+    limite = time.time() - dias * 24 * 60 * 60
+    removidos = 0
+    for nome in os.listdir(diretorio):
+        caminho = os.path.join(diretorio, nome)
+        if os.path.isfile(caminho) and os.path.getmtime(caminho) < limite:
+            os.remove(caminho)
+            removidos += 1
+    return removidos
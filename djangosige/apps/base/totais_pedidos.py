@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+
+ZERO = Decimal('0.00')
+CENTAVO = Decimal('0.01')
+
+# Colunas de Venda e Compra mantidas a partir dos itens
+CAMPOS_TOTAIS = ('total_produtos', 'total_impostos', 'total_produtos_estoque', 'total_itens', 'quantidade_itens')
+
+TAMANHO_LOTE_TOTAIS = 500
+
+
+def _decimal(expressao):
+    return Coalesce(expressao, Value(ZERO), output_field=DecimalField(max_digits=15, decimal_places=2))
+
+
+def expressoes_totais(campos_impostos, campos=CAMPOS_TOTAIS):
+    """
+    Agregados dos itens de um documento. vprod e o desconto do item sao
+    arredondados por item, como em vprod e get_valor_desconto dos itens;
+    total_itens e a soma de get_total() (vprod menos o desconto do item).
+    """
+    moeda = DecimalField(max_digits=15, decimal_places=2)
+    vprod = Round(F('quantidade') * F('valor_unit'), 2, output_field=moeda)
+    impostos = sum((_decimal(F(campo)) for campo in campos_impostos[1:]), _decimal(F(campos_impostos[0])))
+    desconto = Case(
+        When(tipo_desconto='0', then=Round(_decimal(F('desconto')), 2, output_field=moeda)),
+        When(tipo_desconto='1', then=Round(vprod * _decimal(F('desconto')) / 100, 2, output_field=moeda)),
+        default=Value(ZERO), output_field=moeda)
+    expressoes = {
+        'total_produtos': _decimal(Sum(vprod)),
+        'total_impostos': _decimal(Sum(impostos)),
+        'total_produtos_estoque': _decimal(Sum(vprod, filter=Q(produto__controlar_estoque=True))),
+        'total_itens': _decimal(Sum(vprod - desconto)),
+        'quantidade_itens': Count('pk'),
+    }
+    return dict((campo, expressoes[campo]) for campo in campos)
+
+
+def _normalizar(totais, campos=CAMPOS_TOTAIS):
+    valores = dict((campo, Decimal(totais.get(campo) or ZERO).quantize(CENTAVO))
+                   for campo in campos if campo != 'quantidade_itens')
+    valores['quantidade_itens'] = totais.get('quantidade_itens') or 0
+    return valores
+
+
+def atualizar_totais_documento(modelo_documento, modelo_item, campo_documento, campos_impostos, documento_id):
+    """Recalcula os totais de um documento: um aggregate nos itens e um UPDATE."""
+    totais = modelo_item.objects.filter(**{campo_documento: documento_id}).aggregate(
+        **expressoes_totais(campos_impostos))
+    modelo_documento.objects.filter(pk=documento_id).update(**_normalizar(totais))
+
+
+def recalcular_totais_documentos(modelo_documento, modelo_item, campo_documento, campos_impostos,
+                                 documento_ids=None, tamanho_lote=TAMANHO_LOTE_TOTAIS, campos=CAMPOS_TOTAIS):
+    """
+    Recalcula os totais de todos os documentos (ou de documento_ids, lista
+    ou queryset) em lotes: por lote, uma consulta agrupada nos itens e um
+    bulk_update. campos restringe as colunas (migrations antigas).
+    Retorna o numero de documentos com totais alterados.
+    """
+    documentos = modelo_documento.objects.order_by('pk')
+    if documento_ids is not None:
+        documentos = documentos.filter(pk__in=documento_ids)
+
+    alterados = 0
+    ultimo = 0
+    while True:
+        lote = list(documentos.filter(pk__gt=ultimo).only('pk', *campos)[:tamanho_lote])
+        if not lote:
+            break
+        ultimo = lote[-1].pk
+        agregados = dict(
+            (linha.pop(campo_documento), linha) for linha in modelo_item.objects.filter(
+                **{'%s__in' % campo_documento: [documento.pk for documento in lote]}).order_by().values(
+                campo_documento).annotate(**expressoes_totais(campos_impostos, campos)))
+
+        atualizar = []
+        for documento in lote:
+            totais = _normalizar(agregados.get(documento.pk, {}), campos)
+            if any(getattr(documento, campo) != valor for campo, valor in totais.items()):
+                for campo, valor in totais.items():
+                    setattr(documento, campo, valor)
+                atualizar.append(documento)
+        modelo_documento.objects.bulk_update(atualizar, campos)
+        alterados += len(atualizar)
+    return alterados
+
+
+def conectar_sinais_totais(modelos_documento, modelo_item, campo_documento, atualizar, prefixo):
+    """
+    post_save/post_delete dos itens recalculam o documento. A exclusao do
+    proprio documento (cascata sobre os itens) nao recalcula nada.
+    """
+    from django.db.models.signals import post_save, post_delete
+
+    attname = modelo_item._meta.get_field(campo_documento).attname
+
+    def item_salvo(sender, instance, **kwargs):
+        atualizar(getattr(instance, attname))
+
+    def item_excluido(sender, instance, origin=None, **kwargs):
+        modelo_origem = getattr(origin, 'model', type(origin))
+        if isinstance(modelo_origem, type) and issubclass(modelo_origem, modelos_documento):
+            return
+        atualizar(getattr(instance, attname))
+
+    post_save.connect(item_salvo, sender=modelo_item, weak=False,
+                      dispatch_uid='%s_post_save_%s' % (prefixo, modelo_item.__name__))
+    post_delete.connect(item_excluido, sender=modelo_item, weak=False,
+                        dispatch_uid='%s_post_delete_%s' % (prefixo, modelo_item.__name__))
+
+
+def recalcular_totais_produtos(produto_ids):
+    """
+    Recalcula as vendas e compras com itens dos produtos: o
+    total_produtos_estoque depende de Produto.controlar_estoque.
+    """
+    from djangosige.apps.vendas.models import ItensVenda
+    from djangosige.apps.vendas.totais import recalcular_totais_vendas
+    from djangosige.apps.compras.models import ItensCompra
+    from djangosige.apps.compras.totais import recalcular_totais_compras
+
+    recalcular_totais_vendas(ItensVenda.objects.filter(produto_id__in=produto_ids).values('venda_id'))
+    recalcular_totais_compras(ItensCompra.objects.filter(produto_id__in=produto_ids).values('compra_id'))
+
+
+def produto_salvo(sender, instance, created=False, **kwargs):
+    if not created and instance.controlar_estoque_alterado:
+        recalcular_totais_produtos([instance.pk])
+
+
+def conectar_sinal_controle_estoque():
+    from django.db.models.signals import post_save
+    from djangosige.apps.cadastro.models import Produto
+
+    post_save.connect(produto_salvo, sender=Produto, dispatch_uid='totais_post_save_Produto')
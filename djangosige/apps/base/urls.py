@@ -8,6 +8,7 @@ from djangosige.configs import DEBUG
 app_name = 'base'
 urlpatterns = [
     path('', views.IndexView.as_view(), name='index'),
+    path('desempenho/', views.DesempenhoView.as_view(), name='desempenho'),
 ]
 
 if DEBUG:
@@ -5,6 +5,8 @@ from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.shortcuts import redirect
 
+from djangosige.apps.base.permissoes import usuario_tem_permissoes
+
 
 class SuperUserRequiredMixin(object):
 
@@ -34,20 +36,21 @@ class CheckPermissionMixin(object):
         return super(CheckPermissionMixin, self).dispatch(request, *args, **kwargs)
 
     def check_user_permissions(self, request):
-        if not isinstance(self.permission_codename, list):
-            self.permission_codename = [self.permission_codename]
+        codenames = self.permission_codename
+        if not isinstance(codenames, list):
+            codenames = [codenames]
         perms = []
-        for permission in self.permission_codename:
+        for permission in codenames:
             if '.' not in permission:
                 permission = str(
                     request.resolver_match.app_name) + '.' + str(permission)
             perms.append(permission)
-        return len(self.permission_codename) and (request.user.is_superuser or request.user.has_perms(perms))
+        return len(codenames) and usuario_tem_permissoes(request.user, perms)
 
     def check_user_delete_permission(self, request, object):
         codename = str(object._meta.app_label) + '.delete_' + \
             str(object.__name__.lower())
-        if not request.user.has_perm(codename):
+        if not usuario_tem_permissoes(request.user, [codename]):
             messages.add_message(
                 request,
                 messages.WARNING,
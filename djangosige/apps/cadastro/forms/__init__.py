@@ -8,4 +8,4 @@ from .cliente import ClienteForm
 from .fornecedor import FornecedorForm
 from .transportadora import TransportadoraForm, VeiculoFormSet
 
-from .produto import ProdutoForm, CategoriaForm, UnidadeForm, MarcaForm
+from .produto import ProdutoForm, CategoriaForm, UnidadeForm, MarcaForm, ImportarProdutosForm
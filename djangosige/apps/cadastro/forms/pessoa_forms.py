@@ -6,7 +6,29 @@ from django.utils.translation import gettext_lazy as _
 from djangosige.apps.cadastro.models import PessoaJuridica, PessoaFisica
 
 
-class PessoaJuridicaForm(forms.ModelForm):
+class DocumentoPessoaFormMixin(object):
+    """
+    Recusa CPF/CNPJ ja cadastrado para outra pessoa do mesmo tipo de
+    cadastro (cliente, fornecedor, ...), comparando apenas os digitos.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.pessoa = kwargs.pop('pessoa', None)
+        super(DocumentoPessoaFormMixin, self).__init__(*args, **kwargs)
+
+    def verificar_documento(self, documento, tipo_pessoa):
+        if self.pessoa is not None and documento:
+            duplicados = type(self.pessoa).objects.by_documento(
+                documento, tipo_pessoa)
+            if self.pessoa.pk:
+                duplicados = duplicados.exclude(pk=self.pessoa.pk)
+            if duplicados.exists():
+                raise forms.ValidationError(
+                    _('Já existe um cadastro com este documento.'))
+        return documento
+
+
+class PessoaJuridicaForm(DocumentoPessoaFormMixin, forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         if 'instance' in kwargs:
@@ -39,8 +61,11 @@ class PessoaJuridicaForm(forms.ModelForm):
             'suframa': _('Inscrição SUFRAMA'),
         }
 
+    def clean_cnpj(self):
+        return self.verificar_documento(self.cleaned_data['cnpj'], 'PJ')
+
 
-class PessoaFisicaForm(forms.ModelForm):
+class PessoaFisicaForm(DocumentoPessoaFormMixin, forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         if 'instance' in kwargs:
@@ -65,3 +90,6 @@ class PessoaFisicaForm(forms.ModelForm):
             'rg': _('RG'),
             'nascimento': _('Nascimento'),
         }
+
+    def clean_cpf(self):
+        return self.verificar_documento(self.cleaned_data['cpf'], 'PF')
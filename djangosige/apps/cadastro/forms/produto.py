@@ -106,3 +106,20 @@ class UnidadeForm(forms.ModelForm):
             'unidade_desc': _('Nome descritivo'),
             'sigla_unidade': _('Sigla'),
         }
+
+
+class ImportarProdutosForm(forms.Form):
+    arquivo = forms.FileField(label=_('Arquivo CSV ou XLSX'), widget=forms.ClearableFileInput(
+        attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}))
+    local_dest = forms.ModelChoiceField(queryset=LocalEstoque.objects.all(), required=False,
+                                        label=_('Local do estoque inicial (linhas sem a coluna local)'),
+                                        widget=forms.Select(attrs={'class': 'form-control'}))
+    simular = forms.BooleanField(required=False, initial=True,
+                                 label=_('Apenas validar (não grava nada)'),
+                                 widget=forms.CheckboxInput(attrs={'class': 'filled-in chk-col-blue'}))
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data['arquivo']
+        if not arquivo.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError(_('Envie um arquivo .csv ou .xlsx.'))
+        return arquivo
@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import io
+import itertools
+import os
+import unicodedata
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db import transaction
+
+from djangosige.apps.base.cache_pedidos import invalidar_cadastros_pedido
+from djangosige.apps.base.dashboard import invalidar_metricas_dashboard
+from djangosige.apps.base.totais_pedidos import recalcular_totais_produtos
+from djangosige.apps.estoque.lancamento import lancar_movimento_estoque
+from djangosige.apps.estoque.models import EntradaEstoque, ItensMovimento, LocalEstoque, DEFAULT_LOCAL_ID
+from djangosige.apps.fiscal.models import GrupoFiscal
+
+from .models import Produto, Unidade, Marca, Categoria
+from .models.produto import ORIGEM_ESCOLHAS
+
+ZERO = Decimal('0.00')
+CENTAVO = Decimal('0.01')
+LIMITE_DECIMAL = Decimal('1e14')
+
+TAMANHO_LOTE_IMPORTACAO = 1000
+# Mensagens de erro guardadas no relatorio; as demais so sao contadas
+MAX_ERROS_RELATORIO = 200
+
+# Colunas de texto do Produto e seus tamanhos maximos
+COLUNAS_TEXTO = OrderedDict([
+    ('codigo', 15), ('descricao', 255), ('codigo_barras', 16), ('ncm', 11), ('cest', 7),
+    ('inf_adicionais', 255),
+])
+COLUNAS_DECIMAIS = ('custo', 'venda', 'estoque_minimo')
+COLUNAS = tuple(COLUNAS_TEXTO) + COLUNAS_DECIMAIS + (
+    'categoria', 'marca', 'unidade', 'grupo_fiscal', 'origem', 'controlar_estoque', 'estoque_inicial', 'local')
+COLUNAS_OBRIGATORIAS = ('codigo', 'descricao')
+
+ORIGENS = set(codigo for codigo, _ in ORIGEM_ESCOLHAS)
+VERDADEIRO = ('s', 'sim', '1', 'true', 'x', 'verdadeiro')
+FALSO = ('n', 'nao', '0', 'false', 'falso')
+
+
+class RelatorioImportacao(object):
+    """Resumo da importacao (ou da simulacao) com as linhas recusadas."""
+
+    def __init__(self, simulacao=False):
+        self.simulacao = simulacao
+        self.linhas = 0
+        self.novos = 0
+        self.atualizados = 0
+        self.total_erros = 0
+        self.erros = []
+        # (local, quantidade de itens, valor total) das entradas de estoque inicial
+        self.entradas = []
+
+    def adicionar_erro(self, linha, mensagem):
+        self.total_erros += 1
+        if len(self.erros) < MAX_ERROS_RELATORIO:
+            self.erros.append((linha, u'%s' % mensagem))
+
+    @property
+    def erros_omitidos(self):
+        return self.total_erros - len(self.erros)
+
+    def resumo(self):
+        prefixo = u'Simulação: ' if self.simulacao else u''
+        linhas = [u'%s%s linha(s) lida(s), %s produto(s) novo(s), %s atualizado(s), %s linha(s) com erro.' % (
+            prefixo, self.linhas, self.novos, self.atualizados, self.total_erros)]
+        for local, itens, valor in self.entradas:
+            linhas.append(u'Estoque inicial em %s: %s item(ns), R$ %s.' % (local, itens, valor))
+        return linhas
+
+
+def _chave(valor):
+    """Texto sem acentos, minusculo e sem espacos extras: chave dos mapas e cabecalhos."""
+    valor = unicodedata.normalize('NFKD', u'%s' % valor)
+    valor = u''.join(c for c in valor if not unicodedata.combining(c))
+    return u' '.join(valor.lower().split())
+
+
+def _texto(valor):
+    if valor is None:
+        return u''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return (u'%s' % valor).strip()
+
+
+def _cabecalho(valores):
+    cabecalho = [_chave(_texto(valor)).replace(' ', '_') for valor in valores]
+    faltando = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in cabecalho]
+    if faltando:
+        raise ValueError(u'Coluna(s) obrigatória(s) ausente(s) no cabeçalho: %s.' % u', '.join(faltando))
+    return cabecalho
+
+
+def _linhas_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    try:
+        primeira = texto.readline()
+        delimitador = ';' if primeira.count(';') >= primeira.count(',') else ','
+        leitor = csv.reader(itertools.chain([primeira], texto), delimiter=delimitador)
+        cabecalho = _cabecalho(next(leitor, []))
+        for valores in leitor:
+            yield leitor.line_num, dict(zip(cabecalho, valores))
+    except UnicodeDecodeError:
+        raise ValueError(u'O arquivo CSV deve estar codificado em UTF-8.')
+    finally:
+        # O arquivo continua aberto para quem o passou
+        texto.detach()
+
+
+def _linhas_xlsx(arquivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError(u'A importação de planilhas XLSX requer o pacote openpyxl.')
+
+    livro = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = livro.active.iter_rows(values_only=True)
+        cabecalho = _cabecalho(next(linhas, ()))
+        for numero, valores in enumerate(linhas, start=2):
+            yield numero, dict(zip(cabecalho, valores))
+    finally:
+        livro.close()
+
+
+def ler_linhas(arquivo, nome_arquivo=''):
+    """
+    Gera (numero da linha, {coluna: valor}) do arquivo binario, uma linha
+    por vez: CSV (separado por ; ou ,) ou XLSX, pela extensao do nome.
+    """
+    if os.path.splitext(nome_arquivo)[1].lower() == '.xlsx':
+        return _linhas_xlsx(arquivo)
+    return _linhas_csv(arquivo)
+
+
+def _decimal(valor, coluna):
+    """Decimal de um numero da planilha ou de um texto como 1.234,56 ou 1234.56."""
+    if isinstance(valor, (int, float)):
+        numero = Decimal(str(valor))
+    else:
+        texto = _texto(valor).replace(' ', '')
+        if ',' in texto:
+            texto = texto.replace('.', '').replace(',', '.')
+        try:
+            numero = Decimal(texto)
+        except InvalidOperation:
+            raise ValueError(u'%s inválido: "%s".' % (coluna, valor))
+    if not numero.is_finite() or numero < 0 or numero >= LIMITE_DECIMAL:
+        raise ValueError(u'%s inválido: "%s".' % (coluna, valor))
+    return numero.quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+class _Cadastros(object):
+    """
+    Unidades, marcas, categorias, grupos fiscais e locais por nome
+    normalizado, carregados uma vez por importacao. Marcas e categorias
+    ausentes sao criadas; os demais devem existir.
+    """
+
+    def __init__(self, local_padrao):
+        self.unidades = dict((_chave(sigla), pk) for pk, sigla in Unidade.objects.values_list('pk', 'sigla_unidade'))
+        self.grupos = dict((_chave(desc), pk) for pk, desc in GrupoFiscal.objects.values_list('pk', 'descricao'))
+        self.marcas = dict((_chave(desc), pk) for pk, desc in Marca.objects.values_list('pk', 'marca_desc'))
+        self.categorias = dict((_chave(desc), pk) for pk, desc in Categoria.objects.values_list('pk', 'categoria_desc'))
+        self.locais = OrderedDict((pk, desc) for pk, desc in LocalEstoque.objects.order_by('pk').values_list(
+            'pk', 'descricao'))
+        self.locais_nome = dict((_chave(desc), pk) for pk, desc in self.locais.items())
+        self.local_padrao = local_padrao
+
+    def _existente(self, mapa, valor, nome):
+        pk = mapa.get(_chave(valor))
+        if pk is None:
+            raise ValueError(u'%s "%s" não cadastrado(a).' % (nome, valor))
+        return pk
+
+    def unidade(self, valor):
+        return self._existente(self.unidades, valor, u'Unidade')
+
+    def grupo_fiscal(self, valor):
+        return self._existente(self.grupos, valor, u'Grupo fiscal')
+
+    def _criar(self, mapa, modelo, campo, valor, nome):
+        chave = _chave(valor)
+        if chave not in mapa:
+            if len(valor) > modelo._meta.get_field(campo).max_length:
+                raise ValueError(u'%s "%s" excede o tamanho máximo.' % (nome, valor))
+            mapa[chave] = modelo.objects.create(**{campo: valor}).pk
+        return mapa[chave]
+
+    def marca(self, valor):
+        return self._criar(self.marcas, Marca, 'marca_desc', valor, u'Marca')
+
+    def categoria(self, valor):
+        return self._criar(self.categorias, Categoria, 'categoria_desc', valor, u'Categoria')
+
+    def local(self, valor):
+        if not valor:
+            if self.local_padrao not in self.locais:
+                raise ValueError(u'Local de estoque padrão não cadastrado.')
+            return self.local_padrao
+        pk = self.locais_nome.get(_chave(valor))
+        if pk is None and valor.isdigit() and int(valor) in self.locais:
+            pk = int(valor)
+        if pk is None:
+            raise ValueError(u'Local de estoque "%s" não cadastrado.' % valor)
+        return pk
+
+
+def _converter_linha(linha, cadastros):
+    """
+    Campos do Produto informados na linha (celulas vazias nao alteram o
+    produto), quantidade do estoque inicial e local. ValueError se invalida.
+    """
+    campos = {}
+    for coluna, tamanho in COLUNAS_TEXTO.items():
+        valor = _texto(linha.get(coluna))
+        if valor:
+            if len(valor) > tamanho:
+                raise ValueError(u'%s excede %s caracteres.' % (coluna, tamanho))
+            campos[coluna] = valor
+    for coluna in COLUNAS_OBRIGATORIAS:
+        if coluna not in campos:
+            raise ValueError(u'%s não informado(a).' % coluna)
+
+    for coluna in COLUNAS_DECIMAIS:
+        if _texto(linha.get(coluna)):
+            campos[coluna] = _decimal(linha[coluna], coluna)
+
+    for coluna in ('categoria', 'marca', 'unidade', 'grupo_fiscal'):
+        valor = _texto(linha.get(coluna))
+        if valor:
+            campos['%s_id' % coluna] = getattr(cadastros, coluna)(valor)
+
+    origem = _texto(linha.get('origem'))
+    if origem:
+        if origem not in ORIGENS:
+            raise ValueError(u'Origem inválida: "%s".' % origem)
+        campos['origem'] = origem
+
+    controlar = _chave(_texto(linha.get('controlar_estoque')))
+    if controlar:
+        if controlar not in VERDADEIRO + FALSO:
+            raise ValueError(u'controlar_estoque inválido: "%s".' % controlar)
+        campos['controlar_estoque'] = controlar in VERDADEIRO
+
+    quantidade = ZERO
+    local_id = None
+    if _texto(linha.get('estoque_inicial')):
+        quantidade = _decimal(linha['estoque_inicial'], 'estoque_inicial')
+        if quantidade:
+            local_id = cadastros.local(_texto(linha.get('local')))
+    return campos, quantidade, local_id
+
+
+def _lancar_estoque_inicial(estoque, entradas):
+    """
+    Itens de estoque inicial do lote [(produto, quantidade, local_id)]
+    entram pelo custo na EntradaEstoque do local (uma por importacao).
+    """
+    por_local = OrderedDict()
+    for produto, quantidade, local_id in estoque:
+        por_local.setdefault(local_id, []).append(ItensMovimento(
+            produto=produto, quantidade=quantidade, valor_unit=produto.custo,
+            subtotal=(quantidade * produto.custo).quantize(CENTAVO)))
+
+    for local_id, itens in por_local.items():
+        entrada = entradas.get(local_id)
+        if entrada is None:
+            entrada = entradas[local_id] = EntradaEstoque.objects.create(
+                data_movimento=date.today(), tipo_movimento=u'3', local_dest_id=local_id,
+                observacoes=u'Estoque inicial da importação de produtos')
+        # Entradas nao tem saldo a conferir: nao ha erros a tratar
+        lancar_movimento_estoque(itens, local_dest=local_id)
+        for item in itens:
+            item.movimento_id = entrada
+        ItensMovimento.objects.bulk_create(itens)
+        entrada.quantidade_itens += len(itens)
+        entrada.valor_total += sum((item.subtotal for item in itens), ZERO)
+
+
+def _importar_lote(lote, cadastros, relatorio, entradas, controle_alterado):
+    """
+    Grava um lote de linhas: uma consulta pelos codigos ja cadastrados, um
+    bulk_create dos produtos novos e um bulk_update dos existentes. Um
+    codigo repetido no lote vale pela ultima linha. Os produtos que mudam
+    controlar_estoque entram em controle_alterado.
+    """
+    convertidas = []
+    for numero, linha in lote:
+        try:
+            convertidas.append((numero,) + _converter_linha(linha, cadastros))
+        except ValueError as erro:
+            relatorio.adicionar_erro(numero, erro)
+
+    existentes = {}
+    for produto in Produto.objects.filter(codigo__in=set(campos['codigo'] for _, campos, _, _ in convertidas)):
+        existentes.setdefault(produto.codigo, []).append(produto)
+
+    novos = []
+    atualizados = OrderedDict()
+    campos_atualizados = set()
+    estoque = []
+    for numero, campos, quantidade, local_id in convertidas:
+        encontrados = existentes.get(campos['codigo'])
+        if encontrados is None:
+            produto = Produto(**campos)
+            novos.append(produto)
+            existentes[produto.codigo] = [produto]
+            if quantidade and produto.controlar_estoque:
+                estoque.append((produto, quantidade, local_id))
+        elif len(encontrados) > 1:
+            relatorio.adicionar_erro(numero, u'Código "%s" pertence a mais de um produto.' % campos['codigo'])
+        else:
+            produto = encontrados[0]
+            for campo, valor in campos.items():
+                setattr(produto, campo, valor)
+            if produto.pk is not None:
+                atualizados[produto.pk] = produto
+                campos_atualizados.update(campos)
+                if produto.controlar_estoque_alterado:
+                    controle_alterado.add(produto.pk)
+
+    Produto.objects.bulk_create(novos)
+    campos_atualizados.discard('codigo')
+    if atualizados and campos_atualizados:
+        Produto.objects.bulk_update(list(atualizados.values()), sorted(campos_atualizados))
+    relatorio.novos += len(novos)
+    relatorio.atualizados += len(atualizados)
+
+    _lancar_estoque_inicial(estoque, entradas)
+
+
+def _lotes(linhas, tamanho_lote):
+    lote = []
+    for numero, linha in linhas:
+        if any(_texto(valor) for valor in linha.values()):
+            lote.append((numero, linha))
+            if len(lote) >= tamanho_lote:
+                yield lote
+                lote = []
+    if lote:
+        yield lote
+
+
+def importar_produtos(arquivo, nome_arquivo='', simular=False, local_padrao=DEFAULT_LOCAL_ID,
+                      tamanho_lote=TAMANHO_LOTE_IMPORTACAO):
+    """
+    Importa o catalogo de produtos de um arquivo CSV/XLSX (binario), lido
+    linha a linha e gravado em lotes de tamanho_lote: produtos sao
+    identificados pelo codigo (novos sao criados, existentes atualizados
+    com as celulas preenchidas). O estoque inicial dos produtos novos entra
+    em uma EntradaEstoque de ajuste inicial por local.
+
+    Linhas invalidas sao recusadas e listadas no relatorio; as demais sao
+    gravadas em uma unica transacao. Com simular, tudo e validado e gravado
+    como na importacao real, e a transacao e desfeita no final.
+
+    Retorna o RelatorioImportacao; ValueError se o arquivo e invalido.
+    """
+    relatorio = RelatorioImportacao(simulacao=simular)
+    with transaction.atomic():
+        cadastros = _Cadastros(local_padrao)
+        entradas = OrderedDict()
+        controle_alterado = set()
+        for lote in _lotes(ler_linhas(arquivo, nome_arquivo), tamanho_lote):
+            relatorio.linhas += len(lote)
+            _importar_lote(lote, cadastros, relatorio, entradas, controle_alterado)
+
+        # bulk_update nao dispara o recalculo dos totais de estoque dos pedidos
+        if controle_alterado:
+            recalcular_totais_produtos(controle_alterado)
+
+        for local_id, entrada in entradas.items():
+            EntradaEstoque.objects.filter(pk=entrada.pk).update(
+                quantidade_itens=entrada.quantidade_itens, valor_total=entrada.valor_total)
+            relatorio.entradas.append((cadastros.locais[local_id], entrada.quantidade_itens, entrada.valor_total))
+
+        if simular:
+            transaction.set_rollback(True)
+        else:
+            # bulk_create/bulk_update nao disparam os sinais que limpam os caches
+            transaction.on_commit(invalidar_metricas_dashboard)
+            transaction.on_commit(invalidar_cadastros_pedido)
+    return relatorio
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosige.apps.cadastro.importacao_produtos import importar_produtos, TAMANHO_LOTE_IMPORTACAO
+from djangosige.apps.estoque.models import DEFAULT_LOCAL_ID
+
+
+class Command(BaseCommand):
+    help = (u'Importa (cria ou atualiza pelo código) produtos de um arquivo CSV ou XLSX. Colunas: '
+            u'codigo e descricao (obrigatórias), codigo_barras, categoria, marca, unidade, grupo_fiscal, '
+            u'custo, venda, ncm, origem, cest, inf_adicionais, estoque_minimo, controlar_estoque, '
+            u'estoque_inicial e local.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help=u'Caminho do arquivo .csv ou .xlsx.')
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_IMPORTACAO,
+                            help=u'Quantidade de linhas gravadas por vez.')
+        parser.add_argument('--local', type=int, default=DEFAULT_LOCAL_ID,
+                            help=u'Id do local de estoque das linhas sem a coluna local.')
+        parser.add_argument('--simular', '--dry-run', action='store_true', dest='simular',
+                            help=u'Valida o arquivo e mostra o relatório sem gravar nada.')
+
+    def handle(self, *args, **options):
+        if options['lote'] <= 0:
+            raise CommandError(u'O tamanho do lote deve ser maior que zero.')
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                relatorio = importar_produtos(arquivo, options['arquivo'], simular=options['simular'],
+                                              local_padrao=options['local'], tamanho_lote=options['lote'])
+        except (OSError, ValueError) as erro:
+            raise CommandError(u'%s' % erro)
+
+        for linha, mensagem in relatorio.erros:
+            self.stderr.write(u'Linha %s: %s' % (linha, mensagem))
+        if relatorio.erros_omitidos:
+            self.stderr.write(u'... e mais %s erro(s).' % relatorio.erros_omitidos)
+        for linha in relatorio.resumo():
+            self.stdout.write(linha)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import re
+
+from django.db import migrations, models
+
+
+def preencher_documento_digitos(apps, schema_editor):
+    Pessoa = apps.get_model('cadastro', 'Pessoa')
+    PessoaFisica = apps.get_model('cadastro', 'PessoaFisica')
+    PessoaJuridica = apps.get_model('cadastro', 'PessoaJuridica')
+
+    documentos = []
+    for pessoa_id, cpf in PessoaFisica.objects.values_list('pessoa_id', 'cpf').iterator():
+        documentos.append((pessoa_id, cpf))
+    for pessoa_id, cnpj in PessoaJuridica.objects.values_list('pessoa_id', 'cnpj').iterator():
+        documentos.append((pessoa_id, cnpj))
+
+    pessoas = []
+    for pessoa_id, documento in documentos:
+        digitos = re.sub(r'[^0-9]', '', documento or '')
+        if digitos:
+            pessoas.append(Pessoa(pk=pessoa_id, documento_digitos=digitos))
+    Pessoa.objects.bulk_update(pessoas, ['documento_digitos'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0003_auto_20170714_1703'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pessoa',
+            name='documento_digitos',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32, null=True),
+        ),
+        migrations.RunPython(preencher_documento_digitos,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0004_pessoa_documento_digitos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='custo_medio',
+            field=models.DecimalField(
+                decimal_places=4, default=Decimal('0.0000'), max_digits=16),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='valor_estoque',
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal('0.00'), max_digits=16),
+        ),
+    ]
@@ -100,6 +100,23 @@ COD_UF = [
 ]
 
 
+def apenas_digitos(documento):
+    return re.sub(r'[^0-9]', '', str(documento or ''))
+
+
+class PessoaQuerySet(models.QuerySet):
+
+    def by_documento(self, documento, tipo_pessoa=None):
+        # Busca pelo CPF/CNPJ usando a coluna indexada documento_digitos
+        digitos = apenas_digitos(documento)
+        if not digitos:
+            return self.none()
+        queryset = self.filter(documento_digitos=digitos)
+        if tipo_pessoa:
+            queryset = queryset.filter(tipo_pessoa=tipo_pessoa)
+        return queryset
+
+
 class Pessoa(models.Model):
     # Dados
     nome_razao_social = models.CharField(max_length=255)
@@ -108,6 +125,9 @@ class Pessoa(models.Model):
         max_length=32, null=True, blank=True)
     informacoes_adicionais = models.CharField(
         max_length=1055, null=True, blank=True)
+    # CPF/CNPJ apenas digitos, mantido por PessoaFisica/PessoaJuridica
+    documento_digitos = models.CharField(
+        max_length=32, null=True, blank=True, editable=False, db_index=True)
 
     # Dados padrao
     endereco_padrao = models.ForeignKey(
@@ -126,6 +146,8 @@ class Pessoa(models.Model):
     data_criacao = models.DateTimeField(editable=False)
     data_edicao = models.DateTimeField()
 
+    objects = PessoaQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         # Atualizar datas criacao edicao
         if not self.data_criacao:
@@ -135,6 +157,9 @@ class Pessoa(models.Model):
 
     @property
     def cpf_cnpj_apenas_digitos(self):
+        if self.documento_digitos:
+            return self.documento_digitos
+
         if self.tipo_pessoa == 'PF':
             if self.pessoa_fis_info.cpf:
                 return re.sub('[./-]', '', self.pessoa_fis_info.cpf)
@@ -146,6 +171,10 @@ class Pessoa(models.Model):
         else:
             return ''
 
+    @property
+    def cnpj_apenas_numeros(self):
+        return self.cpf_cnpj_apenas_digitos
+
     @property
     def inscricao_estadual(self):
         if self.tipo_pessoa == 'PF':
@@ -172,6 +201,14 @@ class Pessoa(models.Model):
         return s
 
 
+def atualizar_documento_pessoa(pessoa_info, documento):
+    digitos = apenas_digitos(documento) or None
+    Pessoa.objects.filter(pk=pessoa_info.pk).update(documento_digitos=digitos)
+    # Manter a instancia em memoria coerente para um save() posterior da pessoa
+    if pessoa_info._meta.get_field('pessoa_id').is_cached(pessoa_info):
+        pessoa_info.pessoa_id.documento_digitos = digitos
+
+
 class PessoaFisica(models.Model):
     pessoa_id = models.OneToOneField(
         Pessoa, on_delete=models.CASCADE, primary_key=True, related_name='pessoa_fis_info')
@@ -179,6 +216,10 @@ class PessoaFisica(models.Model):
     rg = models.CharField(max_length=32, null=True, blank=True)
     nascimento = models.DateField(null=True, blank=True)
 
+    def save(self, *args, **kwargs):
+        super(PessoaFisica, self).save(*args, **kwargs)
+        atualizar_documento_pessoa(self, self.cpf)
+
     @property
     def format_cpf(self):
         if self.cpf:
@@ -205,6 +246,10 @@ class PessoaJuridica(models.Model):
         max_length=2, null=True, blank=True, choices=ENQUADRAMENTO_FISCAL)
     suframa = models.CharField(max_length=16, null=True, blank=True)
 
+    def save(self, *args, **kwargs):
+        super(PessoaJuridica, self).save(*args, **kwargs)
+        atualizar_documento_pessoa(self, self.cnpj)
+
     @property
     def format_cnpj(self):
         if self.cnpj:
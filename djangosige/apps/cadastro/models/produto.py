@@ -118,10 +118,30 @@ class Produto(models.Model):
     estoque_atual = models.DecimalField(max_digits=16, decimal_places=2, validators=[
                                         MinValueValidator(Decimal('0.00'))], default=Decimal('0.00'))
     controlar_estoque = models.BooleanField(default=True)
+    # Custo medio ponderado, mantido pelos movimentos de estoque
+    custo_medio = models.DecimalField(
+        max_digits=16, decimal_places=4, default=Decimal('0.0000'))
+    valor_estoque = models.DecimalField(
+        max_digits=16, decimal_places=2, default=Decimal('0.00'))
 
     class Meta:
         verbose_name = "Produto"
 
+    def __init__(self, *args, **kwargs):
+        super(Produto, self).__init__(*args, **kwargs)
+        # Valor carregado, sem consultar o banco se o campo foi adiado
+        self._controlar_estoque_anterior = self.__dict__.get('controlar_estoque')
+
+    def save(self, *args, **kwargs):
+        super(Produto, self).save(*args, **kwargs)
+        self._controlar_estoque_anterior = self.controlar_estoque
+
+    @property
+    def controlar_estoque_alterado(self):
+        # Os totais de estoque das vendas e compras dependem deste campo
+        return self._controlar_estoque_anterior is not None and \
+            self._controlar_estoque_anterior != self.controlar_estoque
+
     @property
     def format_unidade(self):
         if self.unidade:
@@ -137,7 +157,7 @@ class Produto(models.Model):
 
     def get_cfop_padrao(self):
         if self.cfop_padrao:
-            return self.cfop_padrao.cfop
+            return self.cfop_padrao.codigo or ''
         else:
             return ''
 
@@ -53,6 +53,9 @@ urlpatterns = [
     # cadastro/produto/adicionar/
     path('produto/adicionar/',
         views.AdicionarProdutoView.as_view(), name='addprodutoview'),
+    # cadastro/produto/importar/
+    path('produto/importar/',
+        views.ImportarProdutosView.as_view(), name='importarprodutosview'),
     # cadastro/produto/listaprodutos
     path('produto/listaprodutos/',
         views.ProdutosListView.as_view(), name='listaprodutosview'),
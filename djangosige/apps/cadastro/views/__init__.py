@@ -4,7 +4,7 @@ from .empresa import AdicionarEmpresaView, EmpresasListView, EditarEmpresaView
 from .cliente import AdicionarClienteView, ClientesListView, EditarClienteView
 from .fornecedor import AdicionarFornecedorView, FornecedoresListView, EditarFornecedorView
 from .transportadora import AdicionarTransportadoraView, TransportadorasListView, EditarTransportadoraView
-from .produto import (AdicionarProdutoView, ProdutosListView, ProdutosBaixoEstoqueListView, EditarProdutoView,
+from .produto import (AdicionarProdutoView, ImportarProdutosView, ProdutosListView, ProdutosBaixoEstoqueListView, EditarProdutoView,
                       AdicionarCategoriaView, CategoriasListView, EditarCategoriaView,
                       AdicionarUnidadeView, UnidadesListView, EditarUnidadeView,
                       AdicionarMarcaView, MarcasListView, EditarMarcaView)
@@ -71,10 +71,10 @@ class AdicionarPessoaView(CustomCreateView):
             self.object = form.save(commit=False)
             if self.object.tipo_pessoa == 'PJ':
                 pessoa_form = PessoaJuridicaForm(
-                    request.POST, prefix='pessoa_jur_form')
+                    request.POST, prefix='pessoa_jur_form', pessoa=self.object)
             else:
                 pessoa_form = PessoaFisicaForm(
-                    request.POST, prefix='pessoa_fis_form')
+                    request.POST, prefix='pessoa_fis_form', pessoa=self.object)
 
             if (all(formset.is_valid() for formset in formsets) and
                 pessoa_form.is_valid() and
@@ -131,9 +131,9 @@ class AdicionarPessoaView(CustomCreateView):
                 return self.form_valid(form)
 
         pessoa_juridica_form = PessoaJuridicaForm(
-            request.POST, prefix='pessoa_jur_form')
+            request.POST, prefix='pessoa_jur_form', pessoa=form.instance)
         pessoa_fisica_form = PessoaFisicaForm(
-            request.POST, prefix='pessoa_fis_form')
+            request.POST, prefix='pessoa_fis_form', pessoa=form.instance)
 
         return self.form_invalid(form=form,
                                  pessoa_juridica_form=pessoa_juridica_form,
@@ -150,6 +150,11 @@ class PessoasListView(CustomListView):
     def __init__(self, *args, **kwargs):
         super(PessoasListView, self).__init__(*args, **kwargs)
 
+    def get_queryset(self):
+        # Documento e endereco de cada linha da tabela sem consultas por pessoa
+        return super(PessoasListView, self).get_queryset().select_related(
+            'pessoa_fis_info', 'pessoa_jur_info').prefetch_related('endereco')
+
 
 class EditarPessoaView(CustomUpdateView):
 
@@ -236,10 +241,10 @@ class EditarPessoaView(CustomUpdateView):
             self.object = form.save(commit=False)
             if self.object.tipo_pessoa == 'PJ':
                 pessoa_form = PessoaJuridicaForm(
-                    request.POST, prefix='pessoa_jur_form')
+                    request.POST, prefix='pessoa_jur_form', pessoa=self.object)
             else:
                 pessoa_form = PessoaFisicaForm(
-                    request.POST, prefix='pessoa_fis_form')
+                    request.POST, prefix='pessoa_fis_form', pessoa=self.object)
 
             if (all(formset.is_valid() for formset in formsets) and
                 pessoa_form.is_valid() and
@@ -309,14 +314,16 @@ class EditarPessoaView(CustomUpdateView):
 
         if self.object.tipo_pessoa == 'PJ':
             pessoa_juridica_form = PessoaJuridicaForm(
-                request.POST, prefix='pessoa_jur_form', instance=self.object)
+                request.POST, prefix='pessoa_jur_form', instance=self.object,
+                pessoa=self.object)
             pessoa_fisica_form = PessoaFisicaForm(
-                request.POST, prefix='pessoa_fis_form')
+                request.POST, prefix='pessoa_fis_form', pessoa=self.object)
         else:
             pessoa_juridica_form = PessoaJuridicaForm(
-                request.POST, prefix='pessoa_jur_form')
+                request.POST, prefix='pessoa_jur_form', pessoa=self.object)
             pessoa_fisica_form = PessoaFisicaForm(
-                request.POST, prefix='pessoa_fis_form', instance=self.object)
+                request.POST, prefix='pessoa_fis_form', instance=self.object,
+                pessoa=self.object)
 
         return self.form_invalid(form=form,
                                  pessoa_juridica_form=pessoa_juridica_form,
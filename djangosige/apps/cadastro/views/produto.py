@@ -2,11 +2,13 @@
 
 from django.urls import reverse_lazy
 from django.db.models import F
+from django.shortcuts import render
 
-from djangosige.apps.base.custom_views import CustomCreateView, CustomListView, CustomUpdateView
-from djangosige.apps.cadastro.forms import ProdutoForm, CategoriaForm, UnidadeForm, MarcaForm
+from djangosige.apps.base.custom_views import CustomView, CustomCreateView, CustomListView, CustomUpdateView
+from djangosige.apps.cadastro.forms import ProdutoForm, CategoriaForm, UnidadeForm, MarcaForm, ImportarProdutosForm
+from djangosige.apps.cadastro.importacao_produtos import importar_produtos, COLUNAS
 from djangosige.apps.cadastro.models import Produto, Categoria, Unidade, Marca, Fornecedor
-from djangosige.apps.estoque.models import ItensMovimento, EntradaEstoque, ProdutoEstocado
+from djangosige.apps.estoque.models import ItensMovimento, EntradaEstoque, ProdutoEstocado, DEFAULT_LOCAL_ID
 
 from datetime import datetime
 
@@ -79,12 +81,18 @@ class AdicionarProdutoView(CustomCreateView):
                 item_entrada.quantidade = form.cleaned_data['estoque_inicial']
                 item_entrada.valor_unit = self.object.venda
                 item_entrada.subtotal = mov_inicial.valor_total
+                # Estoque inicial entra pelo custo cadastrado
+                item_entrada.custo_unitario = self.object.custo
 
                 prod_estocado.local = mov_inicial.local_dest
                 prod_estocado.quantidade = form.cleaned_data['estoque_inicial']
+                prod_estocado.valor_estoque = round(
+                    self.object.custo * form.cleaned_data['estoque_inicial'], 2)
 
                 self.object.estoque_atual = form.cleaned_data[
                     'estoque_inicial']
+                self.object.custo_medio = self.object.custo
+                self.object.valor_estoque = prod_estocado.valor_estoque
                 self.object.save()
                 mov_inicial.save()
 
@@ -103,6 +111,41 @@ class AdicionarProdutoView(CustomCreateView):
         return self.form_invalid(form)
 
 
+class ImportarProdutosView(CustomView):
+    template_name = "cadastro/produto/produto_importar.html"
+    # A importacao tambem altera produtos existentes e lanca o estoque inicial
+    permission_codename = ['add_produto', 'change_produto', 'estoque.add_movimentoestoque']
+
+    def render_importacao(self, request, form, relatorio=None):
+        context = {
+            'title_complete': 'IMPORTAR PRODUTOS',
+            'return_url': reverse_lazy('cadastro:listaprodutosview'),
+            'form': form,
+            'colunas': COLUNAS,
+            'relatorio': relatorio,
+        }
+        return render(request, self.template_name, context)
+
+    def get(self, request, *args, **kwargs):
+        return self.render_importacao(request, ImportarProdutosForm())
+
+    def post(self, request, *args, **kwargs):
+        form = ImportarProdutosForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return self.render_importacao(request, form)
+
+        # Arquivos grandes sao gravados em disco pelo upload e lidos linha a linha
+        arquivo = form.cleaned_data['arquivo']
+        local = form.cleaned_data['local_dest']
+        try:
+            relatorio = importar_produtos(arquivo, arquivo.name, simular=form.cleaned_data['simular'],
+                                          local_padrao=local.pk if local else DEFAULT_LOCAL_ID)
+        except ValueError as erro:
+            form.add_error('arquivo', u'%s' % erro)
+            return self.render_importacao(request, form)
+        return self.render_importacao(request, form, relatorio)
+
+
 class ProdutosListView(CustomListView):
     template_name = 'cadastro/produto/produto_list.html'
     model = Produto
@@ -114,8 +157,12 @@ class ProdutosListView(CustomListView):
         context = super(ProdutosListView, self).get_context_data(**kwargs)
         context['title_complete'] = 'PRODUTOS CADASTRADOS'
         context['add_url'] = reverse_lazy('cadastro:addprodutoview')
+        context['importar_url'] = reverse_lazy('cadastro:importarprodutosview')
         return context
 
+    def get_queryset(self):
+        return Produto.objects.select_related('categoria')
+
 
 class ProdutosBaixoEstoqueListView(ProdutosListView):
     success_url = reverse_lazy('cadastro:listaprodutosbaixoestoqueview')
@@ -127,7 +174,7 @@ class ProdutosBaixoEstoqueListView(ProdutosListView):
         return context
 
     def get_queryset(self):
-        return Produto.objects.filter(estoque_atual__lte=F('estoque_minimo'))
+        return Produto.objects.filter(estoque_atual__lte=F('estoque_minimo')).select_related('categoria')
 
 
 class EditarProdutoView(CustomUpdateView):
@@ -7,3 +7,7 @@ class ComprasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'djangosige.apps.compras'  # Nome completo do módulo
     verbose_name = "Compras"  # Opcional
+
+    def ready(self):
+        from djangosige.apps.compras.totais import conectar_sinais_totais_compra
+        conectar_sinais_totais_compra()
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+from djangosige.apps.base.clonagem import clonar_documento
+
+from .models import Compra, ItensCompra, Pagamento
+
+RELACIONADOS_COMPRA = ((ItensCompra, 'compra_id'), (Pagamento, 'compra_id'))
+
+
+def clonar_compra(origem, modelo=None, **valores):
+    """Copia o orcamento/pedido origem (com itens e parcelas) para um novo modelo (o mesmo por padrao)."""
+    return clonar_documento(origem, modelo or type(origem), Compra, RELACIONADOS_COMPRA, **valores)
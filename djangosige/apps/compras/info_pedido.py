@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+from django.db.models import Prefetch
+
+from .models import PedidoCompra, ItensCompra, Pagamento
+
+
+def carregar_pedido_compra(pk):
+    """
+    PedidoCompra com a condicao de pagamento, os itens (produto e unidade)
+    e as parcelas em tres consultas.
+    """
+    return PedidoCompra.objects.select_related('cond_pagamento').prefetch_related(
+        Prefetch('itens_compra', queryset=ItensCompra.objects.select_related(
+            'produto__unidade').order_by('pk')),
+        Prefetch('parcela_pagamento', queryset=Pagamento.objects.order_by('pk'))).get(pk=pk)
+
+
+def serializar_pedido_compra(compra):
+    """Lista usada pelo JS das notas fiscais e movimentos de estoque (InfoCompra)."""
+    itens_compra = compra.itens_compra.all()
+    data = []
+
+    pedido_fields_dict = {
+        'emit': compra.fornecedor_id,
+        'local': compra.local_dest_id,
+        'status': compra.get_status_display(),
+        'desconto': compra.format_desconto(),
+        'frete': compra.format_frete(),
+        'despesas': compra.format_despesas(),
+        'seguro': compra.format_seguro(),
+        'total_icms': compra.format_vicms(),
+        'total_ipi': compra.format_vipi(),
+        'valor_total': compra.format_valor_total(),
+        'total_sem_desconto': compra.format_total_sem_desconto(),
+        'forma_pag': compra.get_forma_pagamento(),
+        'n_itens': str(len(itens_compra)),
+        'valor_total_produtos': compra.format_total_produtos(),
+        'n_parcelas': compra.cond_pagamento.n_parcelas if compra.cond_pagamento else 1,
+    }
+    data.append({'model': 'compras.pedidocompra', 'pk': compra.id, 'fields': pedido_fields_dict})
+
+    for item in itens_compra:
+        itens_fields_dict = {
+            'produto_id': item.produto.id,
+            'controlar_estoque': item.produto.controlar_estoque,
+            'produto': item.produto.descricao,
+            'quantidade': item.format_quantidade(),
+            'valor_unit': item.format_valor_unit(),
+            'desconto': item.format_desconto(),
+            'impostos': item.format_total_impostos(),
+            'total': item.format_total_com_imposto(),
+            'vprod': item.format_vprod(),
+        }
+        itens_hidden_fields_dict = {
+            'codigo': item.produto.codigo,
+            'unidade': item.produto.get_sigla_unidade(),
+            'ncm': item.produto.ncm,
+            'subtotal': item.format_valor_attr('subtotal'),
+            'vicms': item.format_valor_attr('vicms'),
+            'vipi': item.format_valor_attr('vipi'),
+        }
+        itens_editable_fields_dict = {
+            'editable_field_inf_ad_prod': item.inf_ad_prod,
+        }
+        data.append({'model': 'compras.itenscompra', 'pk': item.id, 'fields': itens_fields_dict,
+                     'hidden_fields': itens_hidden_fields_dict,
+                     'editable_fields': itens_editable_fields_dict})
+
+    for pagamento in compra.parcela_pagamento.all():
+        data.append({'model': 'compras.pagamento', 'pk': pagamento.id, 'fields': {
+            'id': pagamento.id,
+            'vencimento': pagamento.format_vencimento,
+            'valor_parcela': pagamento.format_valor_parcela,
+        }})
+
+    return data
+
+
+def info_pedido_compra(pk):
+    return serializar_pedido_compra(carregar_pedido_compra(pk))
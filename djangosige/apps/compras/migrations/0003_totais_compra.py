@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+from djangosige.apps.base.totais_pedidos import recalcular_totais_documentos
+
+IMPOSTOS_ITEM_COMPRA = ('vicms', 'vipi')
+
+
+# Colunas existentes nesta migration (total_itens veio depois)
+CAMPOS_TOTAIS = ('total_produtos', 'total_impostos', 'total_produtos_estoque', 'quantidade_itens')
+
+
+def preencher_totais(apps, schema_editor):
+    recalcular_totais_documentos(apps.get_model('compras', 'Compra'), apps.get_model('compras', 'ItensCompra'),
+                                 'compra_id', IMPOSTOS_ITEM_COMPRA, campos=CAMPOS_TOTAIS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compras', '0002_auto_20170625_1450'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compra',
+            name='total_produtos',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15),
+        ),
+        migrations.AddField(
+            model_name='compra',
+            name='total_impostos',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15),
+        ),
+        migrations.AddField(
+            model_name='compra',
+            name='total_produtos_estoque',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15),
+        ),
+        migrations.AddField(
+            model_name='compra',
+            name='quantidade_itens',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(preencher_totais, migrations.RunPython.noop),
+    ]
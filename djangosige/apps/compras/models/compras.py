@@ -238,25 +238,20 @@ class Compra(models.Model):
     cond_pagamento = models.ForeignKey(
         'vendas.CondicaoPagamento', related_name="compra_pagamento", on_delete=models.SET_NULL, null=True, blank=True)
     observacoes = models.CharField(max_length=1055, null=True, blank=True)
+    # Totais dos itens, mantidos por compras.totais a cada alteracao de item
+    total_produtos = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    total_impostos = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    total_produtos_estoque = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    total_itens = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    quantidade_itens = models.IntegerField(default=0)
 
-    # --- MÉTODO get_total_impostos ADICIONADO ---
     def get_total_impostos(self):
         """Soma o valor total de impostos (vicms + vipi) de todos os itens da compra."""
-        total_imp = Decimal('0.00')
-        # Usar prefetch_related na view pode otimizar isso para múltiplas compras
-        for item in self.itens_compra.all():
-            total_imp += item.get_total_impostos() # Usa o método do Item
-        return total_imp.quantize(Decimal('0.01'))
-    # --- FIM MÉTODO get_total_impostos ---
-
-    # --- MÉTODO get_total_sem_imposto ADICIONADO ---
+        return self.total_impostos
+
     def get_total_sem_imposto(self):
         """Soma o valor total (pós-desconto de item) de todos os itens."""
-        total_itens_liquido = Decimal('0.00')
-        for item in self.itens_compra.all():
-             total_itens_liquido += item.get_total() # Usa o get_total() do item
-        return total_itens_liquido.quantize(Decimal('0.01'))
-    # --- FIM MÉTODO get_total_sem_imposto ---
+        return self.total_itens
 
     # Método para calcular o valor do desconto GERAL da compra
     def get_valor_desconto_total(self):
@@ -290,18 +285,11 @@ class Compra(models.Model):
 
     def get_total_produtos(self):
         """Soma o valor bruto (Qtd*VlUnit) de todos os itens."""
-        tot = Decimal('0.00')
-        for it in self.itens_compra.all():
-            tot += it.vprod # Usa a property vprod do item
-        return tot.quantize(Decimal('0.01'))
+        return self.total_produtos
 
     def get_total_produtos_estoque(self):
         """Soma o valor bruto dos itens que controlam estoque."""
-        tot = Decimal('0.00')
-        for it in self.itens_compra.all():
-            if it.produto and it.produto.controlar_estoque:
-                tot += it.vprod
-        return tot.quantize(Decimal('0.01'))
+        return self.total_produtos_estoque
 
     @property
     def format_data_emissao(self):
@@ -341,6 +329,18 @@ class Compra(models.Model):
     def format_desconto(self):
         return self._format_decimal(self.get_valor_desconto_total())
 
+    def format_total_sem_desconto(self):
+        # Valor original da compra, antes do desconto geral
+        return self._format_decimal(self.calcular_total_geral() + self.get_valor_desconto_total())
+
+    def format_vicms(self):
+        return self._format_decimal(sum((item.vicms or Decimal('0.00') for item in self.itens_compra.all()),
+                                        Decimal('0.00')))
+
+    def format_vipi(self):
+        return self._format_decimal(sum((item.vipi or Decimal('0.00') for item in self.itens_compra.all()),
+                                        Decimal('0.00')))
+
     def format_seguro(self):
         return self._format_decimal(self.seguro)
 
@@ -359,6 +359,8 @@ class Compra(models.Model):
         return self.local_dest.id if self.local_dest else None
 
     def get_child(self):
+        # Instancias ja carregadas como filho (listas, selects) nao consultam o banco
+        if isinstance(self, (OrcamentoCompra, PedidoCompra)): return self
         if hasattr(self, 'orcamentocompra'): return self.orcamentocompra
         if hasattr(self, 'pedidocompra'): return self.pedidocompra
         try: return PedidoCompra.objects.get(pk=self.pk)
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+import locale
+from decimal import Decimal, InvalidOperation
+from functools import partial
+
+from django.db.models import Prefetch
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm, cm, inch
+from reportlab.platypus import Paragraph, Table, TableStyle, Spacer
+
+from djangosige.apps.base.relatorios_pdf import get_estilos, imagem_logo, chave_conteudo, construir_pdf, \
+    agendar_relatorio, agendar_lote
+
+from .models import OrcamentoCompra, PedidoCompra, ItensCompra, Pagamento
+
+MARGEM_PDF_COMPRA = 15 * mm
+LARGURA_PDF_COMPRA = A4[0] - 2 * MARGEM_PDF_COMPRA
+
+
+def _configurar_estilos(styles):
+    styles.add(ParagraphStyle(name='TituloCompra', parent=styles['Title'], fontSize=14,
+                              alignment=TA_CENTER, spaceAfter=8 * mm))
+    styles.add(ParagraphStyle(name='NormalSmall', parent=styles['Normal'], fontSize=9,
+                              alignment=TA_LEFT, leading=11))
+    styles.add(ParagraphStyle(name='NormalBold', parent=styles['NormalSmall'], fontName='Helvetica-Bold'))
+    styles.add(ParagraphStyle(name='DireitaSmall', parent=styles['NormalSmall'], alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='DireitaBoldSmall', parent=styles['NormalBold'], alignment=TA_RIGHT))
+    styles.add(ParagraphStyle(name='SecaoHeading', parent=styles['h5'], fontSize=10, alignment=TA_LEFT,
+                              spaceBefore=3 * mm, spaceAfter=3 * mm))
+
+
+def format_currency(value):
+    """Formata moeda BRL, tratando None."""
+    if value is None:
+        value = Decimal('0.00')
+    if not isinstance(value, Decimal):
+        try:
+            value = Decimal(value)
+        except (TypeError, InvalidOperation):
+            value = Decimal('0.00')
+    try:
+        return locale.format_string('%.2f', value, grouping=True)
+    except (TypeError, ValueError, locale.Error):
+        return "R$ {:,.2f}".format(value).replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def carregar_compras(queryset):
+    """Compras com fornecedor (CPF/CNPJ, endereco, telefone, email), condicao de pagamento, itens e parcelas."""
+    return queryset.select_related(
+        'fornecedor__endereco_padrao', 'fornecedor__telefone_padrao', 'fornecedor__email_padrao',
+        'fornecedor__pessoa_fis_info', 'fornecedor__pessoa_jur_info',
+        'cond_pagamento').prefetch_related(
+        Prefetch('itens_compra', queryset=ItensCompra.objects.select_related('produto').order_by('pk')),
+        Prefetch('parcela_pagamento', queryset=Pagamento.objects.order_by('pk')))
+
+
+def _data(data):
+    return data.strftime("%d/%m/%Y") if data else "N/I"
+
+
+def dados_pdf_compra(compra, titulo, empresa):
+    """
+    Tudo o que aparece no PDF, ja formatado: a renderizacao roda no pool
+    sem acessar o banco, e o hash destes dados e a chave do cache.
+    """
+    documento = [["Número:", str(compra.pk)], ["Data de Emissão:", _data(compra.data_emissao)]]
+    if isinstance(compra, OrcamentoCompra):
+        documento.append(["Data de Validade:", _data(compra.data_vencimento)])
+    elif isinstance(compra, PedidoCompra):
+        documento.append(["Data de Entrega:", _data(compra.data_entrega)])
+
+    fornecedor = None
+    if compra.fornecedor:
+        fornecedor = [
+            ["Nome/Razão Social:", compra.fornecedor.nome_razao_social or ''],
+            ["CPF/CNPJ:", compra.fornecedor.format_cpf_cnpj() if hasattr(
+                compra.fornecedor, 'format_cpf_cnpj') else '(N/D)'],
+        ]
+        if compra.fornecedor.endereco_padrao:
+            fornecedor.append(["Endereço:", compra.fornecedor.endereco_padrao.format_endereco_completo or ''])
+        if compra.fornecedor.telefone_padrao:
+            fornecedor.append(["Telefone:", compra.fornecedor.telefone_padrao.telefone or ''])
+        if compra.fornecedor.email_padrao:
+            fornecedor.append(["E-mail:", compra.fornecedor.email_padrao.email or ''])
+
+    itens = []
+    total_itens = Decimal('0.00')
+    for item in compra.itens_compra.all():
+        if not item.produto:
+            continue
+        total_item = item.get_total()
+        total_itens += total_item
+        itens.append([item.produto.descricao or 'N/D', str(item.quantidade or '0'),
+                      format_currency(item.valor_unit), format_currency(total_item)])
+
+    desconto_total = compra.get_valor_desconto_total()
+    total_geral = compra.valor_total
+    if total_geral is None:
+        total_geral = compra.get_total_sem_imposto() - desconto_total + compra.get_total_impostos() + \
+            (compra.frete or Decimal('0.00')) + (compra.seguro or Decimal('0.00')) + \
+            (compra.despesas or Decimal('0.00'))
+
+    parcelas = None
+    if compra.cond_pagamento:
+        parcelas = [[str(p.indice_parcela) if p.indice_parcela else "-",
+                     p.vencimento.strftime("%d/%m/%Y") if p.vencimento else "N/D",
+                     format_currency(p.valor_parcela)] for p in compra.parcela_pagamento.all()]
+
+    return {
+        'titulo': titulo,
+        'empresa': empresa,
+        'documento': documento,
+        'fornecedor': fornecedor,
+        'itens': itens,
+        'totais': [
+            ["Subtotal Itens:", format_currency(total_itens)],
+            ["Desconto Total:", "(-) %s" % format_currency(desconto_total)],
+            ["Frete:", "(+) %s" % format_currency(compra.frete)],
+            ["Seguro:", "(+) %s" % format_currency(compra.seguro)],
+            ["Despesas:", "(+) %s" % format_currency(compra.despesas)],
+            ["Impostos (Itens):", "(+) %s" % format_currency(compra.get_total_impostos())],
+            ["Total Geral:", format_currency(total_geral)],
+        ],
+        'cond_pagamento': (compra.cond_pagamento.descricao or "Não informado") if compra.cond_pagamento else None,
+        'parcelas': parcelas,
+        'observacoes': compra.observacoes.replace('\n', '<br/>') if compra.observacoes else None,
+    }
+
+
+def _tabela_pares(linhas, styles):
+    tabela = Table([[Paragraph("<b>%s</b>" % rotulo, styles['NormalBold']), Paragraph(valor, styles['NormalSmall'])]
+                    for rotulo, valor in linhas], colWidths=[4 * cm, None])
+    tabela.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP'), ('LEFTPADDING', (0, 0), (-1, -1), 0),
+                                ('BOTTOMPADDING', (0, 0), (-1, -1), 1), ('TOPPADDING', (0, 0), (-1, -1), 1)]))
+    return tabela
+
+
+def _cabecalho(empresa, styles):
+    if not empresa:
+        return [Paragraph(u"Dados da empresa emitente não configurados.", styles['NormalSmall']),
+                Spacer(1, 8 * mm)]
+
+    logo = imagem_logo(empresa['logo'], 1.5 * inch, 0.75 * inch) if empresa['logo'] else None
+    if logo is not None:
+        logo.hAlign = 'LEFT'
+    info_empresa = u"<b>%s</b><br/>" % empresa['nome']
+    if empresa['endereco']:
+        info_empresa += u"%s<br/>" % empresa['endereco']
+    if empresa['ie']:
+        info_empresa += u"IE: %s<br/>" % empresa['ie']
+    if empresa['telefone']:
+        info_empresa += u"Telefone: %s" % empresa['telefone']
+
+    largura_logo = 2 * inch if logo is not None else 0.1 * inch
+    tabela = Table([[logo or Paragraph("", styles['NormalSmall']), Paragraph(info_empresa, styles['NormalSmall'])]],
+                   colWidths=[largura_logo, LARGURA_PDF_COMPRA - largura_logo])
+    tabela.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP')]))
+    return [tabela, Spacer(1, 8 * mm)]
+
+
+def story_pdf_compra(dados):
+    styles = get_estilos('compra', _configurar_estilos)
+    style_normal = styles['NormalSmall']
+    style_direita = styles['DireitaSmall']
+    style_heading = styles['SecaoHeading']
+
+    # Cabeçalho: Logo e Dados da Empresa
+    story = _cabecalho(dados['empresa'], styles)
+    story.append(Paragraph(dados['titulo'], styles['TituloCompra']))
+
+    # Dados da Compra
+    story.append(Paragraph("<b>DADOS DA COMPRA</b>", style_heading))
+    story.append(_tabela_pares(dados['documento'], styles))
+    story.append(Spacer(1, 5 * mm))
+
+    # Dados do Fornecedor
+    if dados['fornecedor']:
+        story.append(Paragraph("<b>DADOS DO FORNECEDOR</b>", style_heading))
+        story.append(_tabela_pares(dados['fornecedor'], styles))
+    else:
+        story.append(Paragraph("Fornecedor não informado.", style_normal))
+    story.append(Spacer(1, 5 * mm))
+
+    # Itens da Compra
+    story.append(Paragraph("<b>ITENS DA COMPRA</b>", style_heading))
+    itens_data = [[Paragraph("<b>Produto</b>", styles['NormalBold']),
+                   Paragraph("<b>Qtd.</b>", styles['DireitaBoldSmall']),
+                   Paragraph("<b>Vl. Unit.</b>", styles['DireitaBoldSmall']),
+                   Paragraph("<b>Total Item</b>", styles['DireitaBoldSmall'])]]
+    for descricao, quantidade, valor_unit, total in dados['itens']:
+        itens_data.append([Paragraph(descricao, style_normal), Paragraph(quantidade, style_direita),
+                           Paragraph(valor_unit, style_direita), Paragraph(total, style_direita)])
+    itens_table = Table(itens_data, colWidths=[None, 2 * cm, 3 * cm, 3 * cm])
+    itens_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey), ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'), ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+        ('ALIGN', (0, 1), (0, -1), 'LEFT'), ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'), ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 4), ('TOPPADDING', (0, 0), (-1, 0), 4),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 2), ('TOPPADDING', (0, 1), (-1, -1), 2),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)]))
+    story.append(itens_table)
+    story.append(Spacer(1, 5 * mm))
+
+    # Totais
+    story.append(Paragraph("<b>TOTAIS</b>", style_heading))
+    totais_data = [[Paragraph(rotulo, style_direita), Paragraph(valor, style_direita)]
+                   for rotulo, valor in dados['totais'][:-1]]
+    rotulo, valor = dados['totais'][-1]
+    totais_data.append([Paragraph(rotulo, styles['DireitaBoldSmall']), Paragraph(valor, styles['DireitaBoldSmall'])])
+    totais_table = Table(totais_data, colWidths=[None, 3.5 * cm])
+    totais_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'), ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9), ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0), ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+        ('TOPPADDING', (0, 0), (-1, -1), 1), ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('LINEABOVE', (0, -1), (-1, -1), 0.5, colors.grey)]))
+    story.append(totais_table)
+    story.append(Spacer(1, 5 * mm))
+
+    # Condições de Pagamento
+    if dados['cond_pagamento']:
+        story.append(Paragraph("<b>CONDIÇÕES DE PAGAMENTO</b>", style_heading))
+        story.append(Paragraph(dados['cond_pagamento'], style_normal))
+        if dados['parcelas']:
+            story.append(Spacer(1, 2 * mm))
+            parcela_data = [[Paragraph("<b>P.</b>", styles['NormalBold']),
+                             Paragraph("<b>Venc.</b>", styles['NormalBold']),
+                             Paragraph("<b>Valor</b>", styles['DireitaBoldSmall'])]]
+            for indice, vencimento, valor in dados['parcelas']:
+                parcela_data.append([Paragraph(indice, style_normal), Paragraph(vencimento, style_normal),
+                                     Paragraph(valor, style_direita)])
+            parcela_table = Table(parcela_data, colWidths=[2 * cm, 4 * cm, 4 * cm])
+            parcela_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey), ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+                ('ALIGN', (0, 0), (-1, 0), 'CENTER'), ('ALIGN', (0, 1), (1, -1), 'CENTER'),
+                ('ALIGN', (2, 1), (2, -1), 'RIGHT'), ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'), ('FONTSIZE', (0, 0), (-1, -1), 8),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 4), ('TOPPADDING', (0, 0), (-1, 0), 4),
+                ('BOTTOMPADDING', (0, 1), (-1, -1), 2), ('TOPPADDING', (0, 1), (-1, -1), 2),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)]))
+            story.append(parcela_table)
+        story.append(Spacer(1, 5 * mm))
+
+    # Observações
+    if dados['observacoes']:
+        story.append(Paragraph("<b>OBSERVAÇÕES</b>", style_heading))
+        story.append(Paragraph(dados['observacoes'], style_normal))
+        story.append(Spacer(1, 5 * mm))
+    return story
+
+
+def renderizar_pdf_compra(dados):
+    return construir_pdf(dados['titulo'], story_pdf_compra(dados), MARGEM_PDF_COMPRA)
+
+
+def relatorio_pdf_compra(compra, titulo, empresa):
+    """(nome do arquivo, renderizar) do PDF da compra; o nome leva o hash do conteudo."""
+    dados = dados_pdf_compra(compra, titulo, empresa)
+    nome_arquivo = 'compra_%s_%s.pdf' % (compra.pk, chave_conteudo(dados))
+    return nome_arquivo, partial(renderizar_pdf_compra, dados)
+
+
+def agendar_pdf_compra(compra, titulo, empresa):
+    nome_arquivo, renderizar = relatorio_pdf_compra(compra, titulo, empresa)
+    return nome_arquivo, agendar_relatorio(nome_arquivo, renderizar)
+
+
+def agendar_pdf_pedidos_compra(data, empresa):
+    """
+    PDF unico com os pedidos de compra emitidos em data. Retorna
+    (nome do arquivo, Future), ou (None, None) se nao ha pedidos.
+    """
+    relatorios = [relatorio_pdf_compra(pedido, u'Pedido de Compra nº %s' % pedido.pk, empresa)
+                  for pedido in carregar_compras(PedidoCompra.objects.filter(data_emissao=data).order_by('pk'))]
+    if not relatorios:
+        return None, None
+    nome_arquivo = 'pedidos_compra_%s_%s.pdf' % (data.isoformat(), chave_conteudo([nome for nome, _ in relatorios]))
+    return nome_arquivo, agendar_lote(nome_arquivo, relatorios)
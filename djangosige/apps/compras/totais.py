@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+from djangosige.apps.base.totais_pedidos import atualizar_totais_documento, recalcular_totais_documentos, \
+    conectar_sinais_totais, TAMANHO_LOTE_TOTAIS
+
+from .models import Compra, ItensCompra
+
+IMPOSTOS_ITEM_COMPRA = ('vicms', 'vipi')
+
+
+def atualizar_totais_compra(compra_id):
+    atualizar_totais_documento(Compra, ItensCompra, 'compra_id', IMPOSTOS_ITEM_COMPRA, compra_id)
+
+
+def recalcular_totais_compras(compra_ids=None, tamanho_lote=TAMANHO_LOTE_TOTAIS):
+    return recalcular_totais_documentos(Compra, ItensCompra, 'compra_id', IMPOSTOS_ITEM_COMPRA,
+                                        compra_ids, tamanho_lote)
+
+
+def conectar_sinais_totais_compra():
+    conectar_sinais_totais(Compra, ItensCompra, 'compra_id', atualizar_totais_compra, 'totais_compra')
@@ -48,6 +48,9 @@ urlpatterns = [
     # Gerar pdf pedido
     path('gerarpdfpedidocompra/<int:pk>/',
         views.GerarPDFPedidoCompra.as_view(), name='gerarpdfpedidocompra'),
+    # Gerar pdf unico dos pedidos do dia (?data=dd/mm/aaaa)
+    path('gerarpdfpedidoscompradia/',
+        views.GerarPDFPedidosCompraDia.as_view(), name='gerarpdfpedidoscompradia'),
     # Gerar pedido a partir de um orçamento
     path('gerarpedidocompra/<int:pk>/',
         views.GerarPedidoCompraView.as_view(), name='gerarpedidocompra'),
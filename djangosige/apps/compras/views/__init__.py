@@ -5,5 +5,6 @@ from .compras import (AdicionarOrcamentoCompraView, AdicionarPedidoCompraView, O
                       PedidoCompraAtrasadosListView, PedidoCompraEntregaHojeListView, EditarOrcamentoCompraView,
                       EditarPedidoCompraView, GerarPedidoCompraView, CancelarOrcamentoCompraView,
                       CancelarPedidoCompraView, GerarCopiaOrcamentoCompraView, GerarCopiaPedidoCompraView,
-                      ReceberPedidoCompraView, GerarPDFOrcamentoCompra, GerarPDFPedidoCompra)
+                      ReceberPedidoCompraView, GerarPDFOrcamentoCompra, GerarPDFPedidoCompra,
+                      GerarPDFPedidosCompraDia)
 from .ajax_views import InfoCompra
@@ -7,3 +7,7 @@ class EstoqueConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'djangosige.apps.estoque'  # Nome completo obrigatório
     verbose_name = "Controle de Estoque"
+
+    def ready(self):
+        from djangosige.apps.estoque.fechamento import conectar_sinais_fechamento
+        conectar_sinais_fechamento()
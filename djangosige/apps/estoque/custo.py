@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum, OuterRef, Subquery, DecimalField
+
+from djangosige.apps.cadastro.models import Produto
+
+from .models import MovimentoEstoque, ItensMovimento, ProdutoEstocado
+
+ZERO = Decimal('0.00')
+CASAS_CUSTO = Decimal('0.0001')
+
+
+def calcular_custo_medio(quantidade, valor, custo_anterior):
+    """
+    Custo medio ponderado e valor do estoque apos um movimento. Sem saldo
+    o custo anterior e mantido (base das proximas saidas) e o valor zera.
+    """
+    if quantidade > 0:
+        return (valor / quantidade).quantize(CASAS_CUSTO), valor
+    return custo_anterior, ZERO
+
+
+def calcular_cmv(saidas):
+    """Custo das mercadorias vendidas para um queryset de SaidaEstoque."""
+    return ItensMovimento.objects.filter(movimento_id__in=saidas.values('pk')).aggregate(
+        cmv=Sum(F('quantidade') * F('custo_unitario'),
+                output_field=DecimalField(max_digits=16, decimal_places=2)))['cmv'] or ZERO
+
+
+def recalcular_custos(tamanho_lote=1000):
+    """
+    Refaz o custo medio de todos os produtos reprocessando o historico de
+    movimentos em ordem cronologica, em lotes de tamanho_lote movimentos:
+    apenas os itens do lote ficam em memoria. Grava custo_unitario nos
+    itens, custo_medio nos produtos e o valor do estoque (quantidade atual
+    x custo medio) nos produtos e locais. Retorna a quantidade de itens.
+    """
+    movimento_ids = list(MovimentoEstoque.objects.order_by(
+        F('data_movimento').asc(nulls_first=True), 'id').values_list('id', flat=True))
+
+    # produto_id -> [quantidade, valor, custo medio]
+    estado = {}
+    total_itens = 0
+    for inicio in range(0, len(movimento_ids), tamanho_lote):
+        lote = movimento_ids[inicio:inicio + tamanho_lote]
+        posicao = {movimento_id: i for i, movimento_id in enumerate(lote)}
+        itens = list(ItensMovimento.objects.filter(
+            movimento_id__in=lote, produto__isnull=False).values_list(
+            'id', 'movimento_id', 'produto_id', 'quantidade', 'valor_unit',
+            'movimento_id__entradaestoque', 'movimento_id__saidaestoque'))
+        itens.sort(key=lambda item: (posicao[item[1]], item[0]))
+
+        atualizados = []
+        for item_id, movimento_id, produto_id, quantidade, valor_unit, entrada, saida in itens:
+            quantidade = quantidade or ZERO
+            saldo = estado.setdefault(produto_id, [ZERO, ZERO, ZERO])
+            if entrada is not None:
+                custo = valor_unit if valor_unit is not None else saldo[2]
+                saldo[0] += quantidade
+                saldo[1] += (quantidade * custo).quantize(ZERO)
+            else:
+                custo = saldo[2]
+                if saida is not None:
+                    saldo[0] -= quantidade
+                    saldo[1] -= (quantidade * custo).quantize(ZERO)
+            saldo[2], saldo[1] = calcular_custo_medio(saldo[0], saldo[1], saldo[2])
+            atualizados.append(ItensMovimento(pk=item_id, custo_unitario=custo))
+
+        ItensMovimento.objects.bulk_update(atualizados, ['custo_unitario'])
+        total_itens += len(atualizados)
+
+    with transaction.atomic():
+        Produto.objects.bulk_update(
+            [Produto(pk=produto_id, custo_medio=saldo[2]) for produto_id, saldo in estado.items()],
+            ['custo_medio'], batch_size=tamanho_lote)
+        Produto.objects.update(valor_estoque=F('estoque_atual') * F('custo_medio'))
+        ProdutoEstocado.objects.filter(produto__isnull=False).update(valor_estoque=F('quantidade') * Subquery(
+            Produto.objects.filter(pk=OuterRef('produto_id')).values('custo_medio')[:1]))
+    return total_itens
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Min
+from django.db.models.signals import post_save
+
+from .models import FechamentoEstoque, SaldoFechamentoEstoque, MovimentoEstoque, ItensMovimento, \
+    EntradaEstoque, SaidaEstoque, TransferenciaEstoque, somar_itens_por_local
+
+
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
+
+
+def fim_do_mes(data):
+    return (data.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def saldos_em(data, produto=None, local=None):
+    """
+    Saldo de cada (produto_id, local_id) ao fim do dia data: saldos do
+    ultimo fechamento ate data mais o efeito dos movimentos posteriores a
+    ele. Movimentos sem data_movimento nao entram em nenhum periodo.
+    """
+    produto, local = _pk(produto), _pk(local)
+    fechamento = FechamentoEstoque.objects.filter(
+        data_fechamento__lte=data).order_by('-data_fechamento').first()
+
+    saldos = {}
+    if fechamento is not None:
+        base = fechamento.saldos.all()
+        if produto:
+            base = base.filter(produto_id=produto)
+        if local:
+            base = base.filter(local_id=local)
+        for produto_id, local_id, quantidade in base.values_list('produto_id', 'local_id', 'quantidade'):
+            saldos[(produto_id, local_id)] = quantidade
+
+    itens = ItensMovimento.objects.filter(movimento_id__data_movimento__lte=data)
+    if fechamento is not None:
+        itens = itens.filter(movimento_id__data_movimento__gt=fechamento.data_fechamento)
+    if produto:
+        itens = itens.filter(produto_id=produto)
+    delta_local = somar_itens_por_local(itens)[0]
+    for (produto_id, local_id), delta in delta_local.items():
+        if not local or local_id == local:
+            saldos[(produto_id, local_id)] = saldos.get((produto_id, local_id), Decimal('0.00')) + delta
+    return saldos
+
+
+def gerar_fechamento(data):
+    """Grava (ou regrava) o fechamento de estoque do dia data."""
+    with transaction.atomic():
+        saldos = saldos_em(data)
+        FechamentoEstoque.objects.filter(data_fechamento=data).delete()
+        fechamento = FechamentoEstoque.objects.create(data_fechamento=data)
+        SaldoFechamentoEstoque.objects.bulk_create([
+            SaldoFechamentoEstoque(fechamento=fechamento, produto_id=produto_id,
+                                   local_id=local_id, quantidade=quantidade)
+            for (produto_id, local_id), quantidade in saldos.items() if quantidade], batch_size=1000)
+    return fechamento
+
+
+def gerar_fechamentos_mensais(ate=None):
+    """
+    Gera os fechamentos de fim de mes que faltam ate o ultimo mes completo
+    antes de ate (hoje por padrao). Cada mes parte do fechamento anterior,
+    de modo que apenas os movimentos do proprio mes sao lidos.
+    """
+    limite = (ate or date.today()).replace(day=1) - timedelta(days=1)
+
+    ultimo = FechamentoEstoque.objects.order_by('-data_fechamento').first()
+    if ultimo is not None:
+        data = fim_do_mes(ultimo.data_fechamento + timedelta(days=1))
+    else:
+        primeira = MovimentoEstoque.objects.aggregate(
+            primeira=Min('data_movimento'))['primeira']
+        if primeira is None:
+            return []
+        data = fim_do_mes(primeira)
+
+    fechamentos = []
+    while data <= limite:
+        fechamentos.append(gerar_fechamento(data))
+        data = fim_do_mes(data + timedelta(days=1))
+    return fechamentos
+
+
+def invalidar_fechamentos(data):
+    """Movimento incluido ou excluido em data: os fechamentos a partir dela ficam desatualizados."""
+    if data:
+        FechamentoEstoque.objects.filter(data_fechamento__gte=data).delete()
+
+
+def invalidar_fechamentos_movimento(sender, instance, **kwargs):
+    invalidar_fechamentos(instance.data_movimento)
+
+
+def conectar_sinais_fechamento():
+    for model in (EntradaEstoque, SaidaEstoque, TransferenciaEstoque):
+        post_save.connect(invalidar_fechamentos_movimento, sender=model,
+                          dispatch_uid='fechamento_post_save_%s' % model.__name__)
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Min
+
+from djangosige.apps.base.dashboard import invalidar_metricas_dashboard
+from djangosige.apps.cadastro.models import Produto
+
+from .custo import calcular_custo_medio
+from .fechamento import invalidar_fechamentos
+from .models import ProdutoEstocado, ItensMovimento, MovimentoEstoque, EntradaEstoque, SaidaEstoque, \
+    TransferenciaEstoque, somar_itens_por_local
+
+ZERO = Decimal('0.00')
+
+# local_id None indica falta de saldo no estoque total do produto
+ErroEstoque = namedtuple('ErroEstoque', ['item', 'produto', 'local_id', 'disponivel'])
+
+
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
+
+
+def _somar(deltas, chave, valor):
+    deltas[chave] = deltas.get(chave, ZERO) + valor
+
+
+def _inverter(deltas):
+    return OrderedDict((chave, -delta) for chave, delta in deltas.items())
+
+
+def _gravar_saldos(estocados, produtos, delta_local, delta_produto, valor_local, valor_produto):
+    """
+    Grava os deltas de quantidade e de valor por (produto, local) e por
+    produto: um bulk_update por tabela e um bulk_create para os locais
+    inexistentes. Quantidades e valores dos locais vao com F(); o custo
+    medio do produto e recalculado a partir das linhas ja bloqueadas
+    (estocados e produtos).
+    """
+    novos = []
+    atualizados = []
+    for chave in set(delta_local) | set(valor_local):
+        delta = delta_local.get(chave, ZERO)
+        valor = valor_local.get(chave, ZERO)
+        prod_estocado = estocados.get(chave)
+        if prod_estocado is None:
+            if delta > 0:
+                novos.append(ProdutoEstocado(produto_id=chave[0], local_id=chave[1],
+                                             quantidade=delta, valor_estoque=valor))
+        elif delta or valor:
+            prod_estocado.quantidade = F('quantidade') + delta
+            prod_estocado.valor_estoque = F('valor_estoque') + valor
+            atualizados.append(prod_estocado)
+    ProdutoEstocado.objects.bulk_create(novos)
+    ProdutoEstocado.objects.bulk_update(atualizados, ['quantidade', 'valor_estoque'])
+
+    produtos_atualizados = []
+    for produto_id in set(delta_produto) | set(valor_produto):
+        delta = delta_produto.get(produto_id, ZERO)
+        valor = valor_produto.get(produto_id, ZERO)
+        if not delta and not valor:
+            continue
+        produto = produtos[produto_id]
+        custo_medio, valor_estoque = calcular_custo_medio(
+            produto.estoque_atual + delta, produto.valor_estoque + valor, produto.custo_medio)
+        produtos_atualizados.append(Produto(
+            pk=produto_id, estoque_atual=F('estoque_atual') + delta,
+            custo_medio=custo_medio, valor_estoque=valor_estoque))
+    Produto.objects.bulk_update(produtos_atualizados, ['estoque_atual', 'custo_medio', 'valor_estoque'])
+
+
+def _bloquear_produtos(produto_ids):
+    return {p.pk: p for p in Produto.objects.select_for_update().filter(
+        pk__in=produto_ids).order_by('pk')}
+
+
+def _bloquear_estocados(produto_ids, locais):
+    # Ordenado por pk para que movimentos concorrentes bloqueiem na mesma ordem
+    return {(pe.produto_id, pe.local_id): pe for pe in ProdutoEstocado.objects.select_for_update().filter(
+        produto_id__in=produto_ids, local_id__in=locais).order_by('pk')}
+
+
+def lancar_movimento_estoque(itens, local_orig=None, local_dest=None, limitar_ao_local=False):
+    """
+    Aplica ao estoque um movimento inteiro (lista de ItensMovimento):
+    entrada (apenas local_dest), saida (apenas local_orig) ou transferencia
+    (os dois locais, sem alterar o estoque_atual do produto).
+
+    As linhas de Produto e ProdutoEstocado afetadas sao bloqueadas com um
+    unico select_for_update por tabela; os saldos sao gravados com F() em
+    um bulk_update e os locais ainda inexistentes com um bulk_create. O
+    custo medio ponderado do produto e atualizado no mesmo bulk_update e
+    o custo usado fica em item.custo_unitario (base do estorno e do CMV).
+
+    Com limitar_ao_local a quantidade retirada de cada item e limitada ao
+    saldo do local de origem (item.quantidade e alterado). Retorna a lista
+    de ErroEstoque; havendo erros nada e gravado.
+
+    Deve ser chamada dentro do transaction.atomic() que grava o movimento,
+    para que os bloqueios durem ate o commit.
+    """
+    itens = [item for item in itens if item.produto_id is not None]
+    if not itens:
+        return []
+
+    orig_id = _pk(local_orig)
+    dest_id = _pk(local_dest)
+    transferencia = orig_id is not None and dest_id is not None
+    produto_ids = sorted(set(item.produto_id for item in itens))
+    locais = [local_id for local_id in (orig_id, dest_id) if local_id is not None]
+
+    with transaction.atomic():
+        produtos = _bloquear_produtos(produto_ids)
+        estocados = _bloquear_estocados(produto_ids, locais)
+
+        delta_local = OrderedDict()
+        delta_produto = OrderedDict()
+        valor_local = OrderedDict()
+        valor_produto = OrderedDict()
+        erros = []
+
+        def saldo_local(chave):
+            atual = estocados[chave].quantidade if chave in estocados else ZERO
+            return atual + delta_local.get(chave, ZERO)
+
+        for item in itens:
+            produto = produtos[item.produto_id]
+            quantidade = item.quantidade or ZERO
+
+            if orig_id is not None:
+                chave = (item.produto_id, orig_id)
+                disponivel = saldo_local(chave)
+                if quantidade > disponivel:
+                    if not limitar_ao_local:
+                        erros.append(ErroEstoque(item, produto, orig_id, disponivel))
+                        continue
+                    quantidade = item.quantidade = max(disponivel, ZERO)
+
+            if not transferencia and orig_id is not None:
+                disponivel = produto.estoque_atual + delta_produto.get(item.produto_id, ZERO)
+                if quantidade > disponivel:
+                    erros.append(ErroEstoque(item, produto, None, disponivel))
+                    continue
+
+            # Entradas valem pelo valor unitario informado; saidas e
+            # transferencias pelo custo medio atual do produto
+            if orig_id is None and item.valor_unit is not None:
+                item.custo_unitario = item.valor_unit
+            else:
+                item.custo_unitario = produto.custo_medio
+            valor = (quantidade * item.custo_unitario).quantize(ZERO)
+
+            if orig_id is not None:
+                _somar(delta_local, (item.produto_id, orig_id), -quantidade)
+                _somar(valor_local, (item.produto_id, orig_id), -valor)
+            if dest_id is not None:
+                _somar(delta_local, (item.produto_id, dest_id), quantidade)
+                _somar(valor_local, (item.produto_id, dest_id), valor)
+            if not transferencia:
+                sinal = 1 if dest_id is not None else -1
+                _somar(delta_produto, item.produto_id, sinal * quantidade)
+                _somar(valor_produto, item.produto_id, sinal * valor)
+
+        if erros:
+            return erros
+
+        _gravar_saldos(estocados, produtos, delta_local, delta_produto, valor_local, valor_produto)
+
+    invalidar_metricas_dashboard()
+    return []
+
+
+def estornar_movimentos_estoque(movimento_ids):
+    """
+    Desfaz no estoque os movimentos informados (antes da exclusao). Os
+    deltas por (produto, local) de todos os movimentos saem de uma unica
+    consulta agregada, e sao gravados com F() em uma transacao: o numero de
+    consultas nao depende da quantidade de movimentos nem de itens.
+    """
+    movimento_ids = list(movimento_ids)
+    if not movimento_ids:
+        return
+
+    itens = ItensMovimento.objects.filter(movimento_id__in=movimento_ids)
+    delta_local, delta_produto = somar_itens_por_local(itens)
+    valor_local, valor_produto = somar_itens_por_local(itens, valor=True)
+    if not delta_local:
+        return
+
+    # Estorno: efeito inverso ao do movimento, pelo custo gravado nos itens
+    with transaction.atomic():
+        produtos = _bloquear_produtos(sorted(delta_produto))
+        estocados = _bloquear_estocados(
+            set(produto_id for produto_id, local_id in delta_local),
+            set(local_id for produto_id, local_id in delta_local))
+        _gravar_saldos(estocados, produtos, _inverter(delta_local), _inverter(delta_produto),
+                       _inverter(valor_local), _inverter(valor_produto))
+
+    invalidar_metricas_dashboard()
+
+
+class _MovimentosEstornados(threading.local):
+
+    def __init__(self):
+        self.ids = set()
+
+
+_estornados = _MovimentosEstornados()
+
+
+@contextmanager
+def movimentos_ja_estornados(movimento_ids):
+    """
+    Exclusao em lote: o estoque ja foi desfeito por
+    estornar_movimentos_estoque e o sinal pre_delete deve ignorar estes ids.
+    """
+    movimento_ids = set(movimento_ids)
+    _estornados.ids |= movimento_ids
+    try:
+        yield
+    finally:
+        _estornados.ids -= movimento_ids
+
+
+def movimento_ja_estornado(movimento_id):
+    return movimento_id in _estornados.ids
+
+
+def excluir_movimentos_estoque(movimento_ids):
+    """Desfaz o estoque e exclui os movimentos com um numero fixo de consultas."""
+    movimento_ids = set(int(pk) for pk in movimento_ids)
+    with transaction.atomic():
+        estornar_movimentos_estoque(movimento_ids)
+        invalidar_fechamentos(MovimentoEstoque.objects.filter(
+            pk__in=movimento_ids).aggregate(data=Min('data_movimento'))['data'])
+        with movimentos_ja_estornados(movimento_ids):
+            # Excluir pelas subclasses evita uma consulta por movimento para
+            # carregar a linha de MovimentoEstoque de cada uma
+            for model in (EntradaEstoque, SaidaEstoque, TransferenciaEstoque, MovimentoEstoque):
+                model.objects.filter(pk__in=movimento_ids).delete()
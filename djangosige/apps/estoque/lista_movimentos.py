@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import F, Q
+
+from djangosige.apps.cadastro.models import Produto
+
+from .models import MovimentoEstoque, ItensMovimento, SUBTIPOS_MOVIMENTO
+
+TIPOS_FILTRO_MOVIMENTO = {
+    u'E': 'entradaestoque',
+    u'S': 'saidaestoque',
+    u'T': 'transferenciaestoque',
+}
+
+# Indice da coluna na tabela -> campo ordenavel no banco
+COLUNAS_ORDENAVEIS = {
+    0: 'id',
+    1: 'data_movimento',
+    3: 'quantidade_itens',
+    4: 'valor_total',
+}
+
+TAMANHO_PAGINA_PADRAO = 10
+TAMANHO_PAGINA_MAXIMO = 100
+
+# Sugestoes do filtro de produto (autocomplete)
+LIMITE_PRODUTOS_FILTRO = 20
+
+CONVERSORES_CURSOR = {
+    'id': int,
+    'data_movimento': date.fromisoformat,
+    'quantidade_itens': int,
+    'valor_total': Decimal,
+}
+
+
+def converter_data(valor):
+    try:
+        return datetime.strptime(valor, '%d/%m/%Y').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def filtrar_movimentos(data_inicial=None, data_final=None, tipo=None, local=None, produto=None, busca=None):
+    """
+    Movimentos de todos os tipos a partir da tabela base MovimentoEstoque,
+    com o subtipo resolvido por select_related.
+    """
+    movimentos = MovimentoEstoque.objects.select_related(*SUBTIPOS_MOVIMENTO)
+
+    if data_inicial:
+        movimentos = movimentos.filter(data_movimento__gte=data_inicial)
+    if data_final:
+        movimentos = movimentos.filter(data_movimento__lte=data_final)
+    if tipo in TIPOS_FILTRO_MOVIMENTO:
+        movimentos = movimentos.filter(
+            **{'%s__isnull' % TIPOS_FILTRO_MOVIMENTO[tipo]: False})
+    if local:
+        movimentos = movimentos.filter(
+            Q(entradaestoque__local_dest=local) |
+            Q(saidaestoque__local_orig=local) |
+            Q(transferenciaestoque__local_estoque_orig=local) |
+            Q(transferenciaestoque__local_estoque_dest=local))
+    if produto:
+        movimentos = movimentos.filter(pk__in=ItensMovimento.objects.filter(
+            produto=produto).values('movimento_id'))
+
+    if busca:
+        busca = busca.strip()
+        data_busca = converter_data(busca)
+        if data_busca:
+            movimentos = movimentos.filter(data_movimento=data_busca)
+        elif busca.isdigit():
+            movimentos = movimentos.filter(pk=busca)
+        else:
+            movimentos = movimentos.filter(
+                Q(observacoes__icontains=busca) |
+                Q(pk__in=ItensMovimento.objects.filter(
+                    produto__descricao__icontains=busca).values('movimento_id')))
+
+    return movimentos
+
+
+def ordenar_movimentos(movimentos, campo='id', decrescente=True):
+    # id desempata a ordenacao e completa a chave da paginacao
+    if decrescente:
+        return movimentos.order_by(F(campo).desc(nulls_last=True), '-id')
+    return movimentos.order_by(F(campo).asc(nulls_first=True), 'id')
+
+
+def codificar_cursor(movimento, campo):
+    valor = getattr(movimento, campo)
+    valor = valor.isoformat() if isinstance(valor, date) else valor
+    return u'%s|%s' % (u'' if valor is None else valor, movimento.pk)
+
+
+def decodificar_cursor(cursor, campo):
+    try:
+        valor, pk = cursor.rsplit(u'|', 1)
+        return (CONVERSORES_CURSOR[campo](valor) if valor else None), int(pk)
+    except (AttributeError, KeyError, ValueError, InvalidOperation):
+        return None
+
+
+def _apos_cursor(campo, decrescente, valor, pk):
+    # Mesma ordem de ordenar_movimentos: nulos no fim (desc) ou no inicio (asc)
+    if decrescente:
+        if valor is None:
+            return Q(**{'%s__isnull' % campo: True, 'id__lt': pk})
+        return (Q(**{'%s__lt' % campo: valor}) | Q(**{campo: valor, 'id__lt': pk}) |
+                Q(**{'%s__isnull' % campo: True}))
+    if valor is None:
+        return Q(**{'%s__isnull' % campo: True, 'id__gt': pk}) | Q(**{'%s__isnull' % campo: False})
+    return Q(**{'%s__gt' % campo: valor}) | Q(**{campo: valor, 'id__gt': pk})
+
+
+def paginar_movimentos(movimentos, campo='id', decrescente=True, cursor=None, inicio=0,
+                       tamanho=TAMANHO_PAGINA_PADRAO):
+    """
+    Retorna (pagina, proximo_cursor). Com cursor a pagina comeca logo apos
+    o ultimo movimento da pagina anterior (keyset), sem OFFSET; sem ele
+    cai no OFFSET inicio, usado apenas em saltos de pagina.
+    """
+    movimentos = ordenar_movimentos(movimentos, campo, decrescente)
+    chave = decodificar_cursor(cursor, campo) if cursor else None
+    if chave is not None:
+        pagina = list(movimentos.filter(_apos_cursor(campo, decrescente, *chave))[:tamanho])
+    else:
+        pagina = list(movimentos[inicio:inicio + tamanho])
+
+    proximo = codificar_cursor(pagina[-1], campo) if len(pagina) == tamanho else None
+    return pagina, proximo
+
+
+def buscar_produtos_filtro(termo, limite=LIMITE_PRODUTOS_FILTRO):
+    """
+    Produtos com controle de estoque cujo codigo ou descricao contem termo,
+    no formato do autocomplete do jQuery UI. Limitado para nao carregar o
+    catalogo inteiro na tela de movimentos.
+    """
+    termo = (termo or u'').strip()
+    if not termo:
+        return []
+    produtos = Produto.objects.filter(controlar_estoque=True).filter(
+        Q(codigo__istartswith=termo) | Q(descricao__icontains=termo)).order_by(
+        'descricao', 'pk').values_list('pk', 'codigo', 'descricao')[:limite]
+    return [{'value': pk, 'label': u'%s - %s' % (codigo, descricao) if codigo else descricao}
+            for pk, codigo, descricao in produtos]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import date
+
+from djangosige.apps.estoque.fechamento import gerar_fechamento, gerar_fechamentos_mensais
+
+
+def _data(valor):
+    try:
+        return datetime.strptime(valor, '%d/%m/%Y').date()
+    except ValueError:
+        raise CommandError(u'Data inválida: %s (use dd/mm/aaaa).' % valor)
+
+
+class Command(BaseCommand):
+    help = u'Gera os fechamentos mensais de estoque (saldo por produto e local) que ainda faltam.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ate', default=None,
+                            help=u'Fecha os meses completos antes desta data (dd/mm/aaaa). Padrão: hoje.')
+        parser.add_argument('--data', default=None,
+                            help=u'Gera (ou regrava) apenas o fechamento desta data (dd/mm/aaaa).')
+
+    def handle(self, *args, **options):
+        if options['data']:
+            fechamentos = [gerar_fechamento(_data(options['data']))]
+        else:
+            fechamentos = gerar_fechamentos_mensais(
+                _data(options['ate']) if options['ate'] else None)
+
+        for fechamento in fechamentos:
+            self.stdout.write(u'Fechamento de %s: %s saldos' % (
+                date(fechamento.data_fechamento, "d/m/Y"), fechamento.saldos.count()))
+        self.stdout.write(u'Fechamentos gerados: %s' % len(fechamentos))
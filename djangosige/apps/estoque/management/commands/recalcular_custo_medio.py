@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosige.apps.estoque.custo import recalcular_custos
+
+
+class Command(BaseCommand):
+    help = u'Recalcula o custo médio dos produtos reprocessando o histórico de movimentos de estoque.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help=u'Quantidade de movimentos processados por vez.')
+
+    def handle(self, *args, **options):
+        if options['lote'] <= 0:
+            raise CommandError(u'O tamanho do lote deve ser maior que zero.')
+        itens = recalcular_custos(options['lote'])
+        self.stdout.write(u'Itens de movimento reprocessados: %s' % itens)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0004_pessoa_documento_digitos'),
+        ('estoque', '0003_merge_20170625_1454'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FechamentoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True,
+                                           primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_fechamento', models.DateField(unique=True)),
+                ('data_geracao', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Fechamento de Estoque',
+                'ordering': ('-data_fechamento',),
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoFechamentoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True,
+                                           primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.DecimalField(
+                    decimal_places=2, default=Decimal('0.00'), max_digits=13)),
+                ('fechamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                                 related_name='saldos', to='estoque.FechamentoEstoque')),
+                ('local', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                            related_name='saldos_fechamento', to='estoque.LocalEstoque')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                              related_name='saldos_fechamento', to='cadastro.Produto')),
+            ],
+            options={
+                'verbose_name': 'Saldo de Fechamento de Estoque',
+                'unique_together': {('fechamento', 'produto', 'local')},
+            },
+        ),
+    ]
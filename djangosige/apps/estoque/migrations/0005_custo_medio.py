@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0004_fechamentoestoque_saldofechamentoestoque'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produtoestocado',
+            name='valor_estoque',
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal('0.00'), max_digits=16),
+        ),
+        migrations.AddField(
+            model_name='itensmovimento',
+            name='custo_unitario',
+            field=models.DecimalField(
+                blank=True, decimal_places=4, max_digits=16, null=True),
+        ),
+    ]
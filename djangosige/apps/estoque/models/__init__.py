@@ -2,3 +2,4 @@
 
 from .local import *
 from .movimento import *
+from .fechamento import *
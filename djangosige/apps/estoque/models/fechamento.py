@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+from django.db import models
+from decimal import Decimal
+from django.template.defaultfilters import date
+
+
+class FechamentoEstoque(models.Model):
+    data_fechamento = models.DateField(unique=True)
+    data_geracao = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Fechamento de Estoque"
+        ordering = ('-data_fechamento',)
+
+    def __str__(self):
+        s = u'Fechamento em %s' % (date(self.data_fechamento, "d/m/Y"))
+        return s
+
+
+class SaldoFechamentoEstoque(models.Model):
+    fechamento = models.ForeignKey(
+        'estoque.FechamentoEstoque', related_name="saldos", on_delete=models.CASCADE)
+    produto = models.ForeignKey(
+        'cadastro.Produto', related_name="saldos_fechamento", on_delete=models.CASCADE)
+    local = models.ForeignKey(
+        'estoque.LocalEstoque', related_name="saldos_fechamento", on_delete=models.CASCADE)
+    quantidade = models.DecimalField(
+        max_digits=13, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name = "Saldo de Fechamento de Estoque"
+        unique_together = (('fechamento', 'produto', 'local'),)
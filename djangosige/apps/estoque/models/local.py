@@ -16,6 +16,13 @@ class ProdutoEstocado(models.Model):
                                 on_delete=models.CASCADE, null=True, blank=True)
     quantidade = models.DecimalField(max_digits=13, decimal_places=2, validators=[
                                      MinValueValidator(Decimal('0.00'))], default=Decimal('0.00'))
+    valor_estoque = models.DecimalField(
+        max_digits=16, decimal_places=2, default=Decimal('0.00'))
+
+    def get_custo_medio(self):
+        if self.quantidade > 0:
+            return (self.valor_estoque / self.quantidade).quantize(Decimal('0.0001'))
+        return Decimal('0.0000')
 
 
 class LocalEstoque(models.Model):
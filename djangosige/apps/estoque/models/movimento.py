@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
-import operator
+from collections import OrderedDict
+
 from django.db import models
+from django.db.models import F, Sum
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from django.dispatch import receiver
@@ -27,6 +29,8 @@ TIPOS_MOVIMENTO_SAIDA = (
     (u'2', u'Saída por importação de nota fiscal'),
 )
 
+SUBTIPOS_MOVIMENTO = ('entradaestoque', 'saidaestoque', 'transferenciaestoque')
+
 
 class ItensMovimento(models.Model):
     produto = models.ForeignKey('cadastro.Produto', related_name="moviment_estoque_produto",
@@ -39,6 +43,9 @@ class ItensMovimento(models.Model):
                                      MinValueValidator(Decimal('0.00'))], null=True, blank=True)
     subtotal = models.DecimalField(max_digits=13, decimal_places=2, validators=[
                                    MinValueValidator(Decimal('0.00'))], null=True, blank=True)
+    # Custo unitario com que o item entrou (ou saiu) do estoque
+    custo_unitario = models.DecimalField(
+        max_digits=16, decimal_places=4, null=True, blank=True)
 
     def get_estoque_atual_produto(self):
         if self.produto:
@@ -79,6 +86,59 @@ class MovimentoEstoque(models.Model):
     def format_valor_total(self):
         return locale.format(u'%.2f', self.valor_total, 1)
 
+    def get_movimento_especifico(self):
+        # Sem consultas extras quando carregado com select_related(*SUBTIPOS_MOVIMENTO)
+        for subtipo in SUBTIPOS_MOVIMENTO:
+            if hasattr(self, subtipo):
+                return getattr(self, subtipo)
+        return self
+
+
+def somar_itens_por_local(itens, valor=False):
+    """
+    Efeito no estoque de um queryset de ItensMovimento, somado em uma
+    unica consulta agregada. Retorna (delta_local, delta_produto), com as
+    chaves (produto_id, local_id) e produto_id; entradas somam e saidas
+    subtraem, transferencias alteram apenas os locais. Com valor=True soma
+    o valor (quantidade x custo_unitario) em vez da quantidade.
+    """
+    if valor:
+        soma = Sum(F('quantidade') * F('custo_unitario'),
+                   output_field=models.DecimalField(max_digits=16, decimal_places=2))
+    else:
+        soma = Sum('quantidade')
+    totais = itens.filter(produto__isnull=False).values(
+        'produto_id',
+        'movimento_id__entradaestoque__local_dest_id',
+        'movimento_id__saidaestoque__local_orig_id',
+        'movimento_id__transferenciaestoque__local_estoque_orig_id',
+        'movimento_id__transferenciaestoque__local_estoque_dest_id',
+    ).annotate(total=soma).order_by()
+
+    delta_local = OrderedDict()
+    delta_produto = OrderedDict()
+
+    def somar(deltas, chave, valor):
+        deltas[chave] = deltas.get(chave, Decimal('0.00')) + valor
+
+    for linha in totais:
+        produto_id = linha['produto_id']
+        total = linha['total'] or Decimal('0.00')
+        if valor:
+            total = total.quantize(Decimal('0.01'))
+        if linha['movimento_id__entradaestoque__local_dest_id'] is not None:
+            somar(delta_local, (produto_id, linha['movimento_id__entradaestoque__local_dest_id']), total)
+            somar(delta_produto, produto_id, total)
+        elif linha['movimento_id__saidaestoque__local_orig_id'] is not None:
+            somar(delta_local, (produto_id, linha['movimento_id__saidaestoque__local_orig_id']), -total)
+            somar(delta_produto, produto_id, -total)
+        elif linha['movimento_id__transferenciaestoque__local_estoque_orig_id'] is not None:
+            somar(delta_local, (produto_id, linha[
+                'movimento_id__transferenciaestoque__local_estoque_orig_id']), -total)
+            somar(delta_local, (produto_id, linha[
+                'movimento_id__transferenciaestoque__local_estoque_dest_id']), total)
+    return delta_local, delta_produto
+
 
 @receiver(
     pre_delete,
@@ -86,19 +146,11 @@ class MovimentoEstoque(models.Model):
     dispatch_uid="movimento_estoque_delete"
 )
 def reajusta_estoque_produtos(sender, instance, using, **kwargs):
-    if hasattr(instance, "entradaestoque"):
-        operation = operator.sub
-    elif hasattr(instance, "saidaestoque"):
-        operation = operator.add
-    else:
-        return
-    for item in instance.itens_movimento.all():
-        produto = item.produto
-        produto.estoque_atual = operation(produto.estoque_atual, item.quantidade)
-        produto.save()
-        for produto_estocado in produto.produto_estocado.all():
-            produto_estocado.quantidade = operation(produto_estocado.quantidade, item.quantidade)
-            produto_estocado.save()
+    from djangosige.apps.estoque.lancamento import estornar_movimentos_estoque, movimento_ja_estornado
+    from djangosige.apps.estoque.fechamento import invalidar_fechamentos
+    if not movimento_ja_estornado(instance.pk):
+        estornar_movimentos_estoque([instance.pk])
+        invalidar_fechamentos(instance.data_movimento)
 
 
 class EntradaEstoque(MovimentoEstoque):
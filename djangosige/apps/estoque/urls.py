@@ -25,6 +25,12 @@ urlpatterns = [
     # Lista todos movimentos
     path('movimentos/', views.MovimentoEstoqueListView.as_view(),
         name='listamovimentoestoqueview'),
+    # estoque/movimentos/json/ (DataTables server-side)
+    path('movimentos/json/', views.ListaMovimentoEstoqueJsonView.as_view(),
+        name='listamovimentoestoquejson'),
+    # estoque/movimentos/produtos/json/ (autocomplete do filtro de produto)
+    path('movimentos/produtos/json/', views.ProdutosFiltroMovimentoJsonView.as_view(),
+        name='listaprodutosmovimentojson'),
 
     # EntradaEstoque
     # estoque/movimento/adicionarentrada/
@@ -2,10 +2,13 @@
 
 from django.urls import reverse_lazy
 
+from datetime import datetime
+
 from djangosige.apps.base.custom_views import CustomListView
 
 from djangosige.apps.cadastro.models import Produto
 from djangosige.apps.estoque.models import LocalEstoque
+from djangosige.apps.estoque.fechamento import saldos_em
 
 
 class ConsultaEstoqueView(CustomListView):
@@ -20,13 +23,40 @@ class ConsultaEstoqueView(CustomListView):
             controlar_estoque=True)
         context['todos_locais'] = LocalEstoque.objects.all()
         context['title_complete'] = 'CONSULTA DE ESTOQUE'
+        context['data_consulta'] = self.get_data_consulta()
         return context
 
+    def get_data_consulta(self):
+        try:
+            return datetime.strptime(self.request.GET.get('data', ''), '%d/%m/%Y').date()
+        except ValueError:
+            return None
+
+    def get_saldos_na_data(self, data, produto, local):
+        # Saldo na data: ultimo fechamento + movimentos posteriores a ele
+        saldos = saldos_em(data, produto=int(produto) if produto else None,
+                           local=int(local) if local else None)
+        locais = LocalEstoque.objects.in_bulk(set(local_id for _, local_id in saldos))
+        locais_por_produto = {}
+        for (produto_id, local_id), quantidade in sorted(saldos.items()):
+            if quantidade:
+                locais_por_produto.setdefault(produto_id, []).append((locais[local_id], quantidade))
+
+        produtos_filtrados = list(Produto.objects.filter(
+            id__in=locais_por_produto).select_related('categoria'))
+        for prod in produtos_filtrados:
+            prod.locais_na_data = locais_por_produto[prod.id]
+            prod.estoque_na_data = sum(quantidade for _, quantidade in prod.locais_na_data)
+        return produtos_filtrados
+
     def get_queryset(self):
         produto = self.request.GET.get('produto')
         local = self.request.GET.get('local')
+        data = self.get_data_consulta()
 
-        if produto:
+        if data:
+            produtos_filtrados = self.get_saldos_na_data(data, produto, local)
+        elif produto:
             produtos_filtrados = Produto.objects.filter(id=produto)
         elif local:
             produtos_filtrados = LocalEstoque.objects.get(
@@ -35,4 +65,8 @@ class ConsultaEstoqueView(CustomListView):
             produtos_filtrados = Produto.objects.filter(
                 controlar_estoque=True, estoque_atual__gt=0)
 
+        if not data:
+            # Categoria e locais de cada linha carregados de uma vez
+            produtos_filtrados = produtos_filtrados.select_related(
+                'categoria').prefetch_related('produto_estocado__local')
         return produtos_filtrados
@@ -2,67 +2,46 @@
 
 from django.urls import reverse_lazy
 from django.shortcuts import redirect
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils.html import format_html
 
-from itertools import chain
 from datetime import datetime
-from decimal import Decimal
 
-from djangosige.apps.base.custom_views import CustomDetailView, CustomCreateView, CustomListView
+from djangosige.apps.base.custom_views import CustomView, CustomDetailView, CustomCreateView, CustomListView
 
 from djangosige.apps.estoque.forms import EntradaEstoqueForm, SaidaEstoqueForm, TransferenciaEstoqueForm, ItensMovimentoFormSet
-from djangosige.apps.estoque.models import MovimentoEstoque, EntradaEstoque, SaidaEstoque, TransferenciaEstoque, ProdutoEstocado
+from djangosige.apps.estoque.models import MovimentoEstoque, EntradaEstoque, SaidaEstoque, TransferenciaEstoque, \
+    LocalEstoque
+from djangosige.apps.estoque.lancamento import lancar_movimento_estoque, excluir_movimentos_estoque
+from djangosige.apps.estoque.lista_movimentos import filtrar_movimentos, paginar_movimentos, converter_data, \
+    buscar_produtos_filtro, COLUNAS_ORDENAVEIS, TAMANHO_PAGINA_PADRAO, TAMANHO_PAGINA_MAXIMO
 
 
 class MovimentoEstoqueMixin(object):
 
-    def adicionar_novo_movimento_estoque(self, itens_mvmt_obj, pform, lista_produtos, lista_produtos_estocados):
-        prod = itens_mvmt_obj.produto
-        lista_produtos.append(prod)
-
-        # Modificar valor do estoque atual dos produtos
-        if prod.estoque_atual is not None and isinstance(self.object, EntradaEstoque):
-            prod_estocado = ProdutoEstocado.objects.get_or_create(
-                local=self.object.local_dest, produto=itens_mvmt_obj.produto)[0]
-            prod_estocado.quantidade = prod_estocado.quantidade + itens_mvmt_obj.quantidade
-            lista_produtos_estocados.append(prod_estocado)
-            prod.estoque_atual = prod.estoque_atual + itens_mvmt_obj.quantidade
-
-        elif prod.estoque_atual is not None and isinstance(self.object, SaidaEstoque):
-            prod_estocado = ProdutoEstocado.objects.get_or_create(
-                local=self.object.local_orig, produto=itens_mvmt_obj.produto)[0]
-
-            if itens_mvmt_obj.quantidade > prod_estocado.quantidade:
-                itens_mvmt_obj.quantidade = prod_estocado.quantidade
-                prod_estocado.quantidade = Decimal('0.00')
-            else:
-                prod_estocado.quantidade = prod_estocado.quantidade - itens_mvmt_obj.quantidade
-
-            lista_produtos_estocados.append(prod_estocado)
-
-            if prod.estoque_atual < itens_mvmt_obj.quantidade:
-                pform.add_error('quantidade', 'Quantidade retirada do estoque maior que o estoque atual (' +
-                                str(prod.estoque_atual).replace('.', ',') + ') do produto.')
-            else:
-                prod.estoque_atual = prod.estoque_atual - itens_mvmt_obj.quantidade
-
+    def adicionar_novo_movimento_estoque(self, itens_forms):
+        """
+        Lanca no estoque os itens (item, form) do movimento self.object.
+        Retorna False se algum item foi recusado (erro adicionado ao form).
+        """
+        if isinstance(self.object, EntradaEstoque):
+            locais = {'local_dest': self.object.local_dest_id}
+        elif isinstance(self.object, SaidaEstoque):
+            locais = {'local_orig': self.object.local_orig_id}
         elif isinstance(self.object, TransferenciaEstoque):
-            prod_estocado_orig = ProdutoEstocado.objects.get_or_create(
-                local=self.object.local_estoque_orig, produto=itens_mvmt_obj.produto)[0]
-            prod_estocado_dest = ProdutoEstocado.objects.get_or_create(
-                local=self.object.local_estoque_dest, produto=itens_mvmt_obj.produto)[0]
+            locais = {'local_orig': self.object.local_estoque_orig_id,
+                      'local_dest': self.object.local_estoque_dest_id}
+        else:
+            return True
 
-            if itens_mvmt_obj.quantidade > prod_estocado_orig.quantidade:
-                itens_mvmt_obj.quantidade = prod_estocado_orig.quantidade
-                prod_estocado_orig.quantidade = Decimal('0.00')
-            else:
-                prod_estocado_orig.quantidade = prod_estocado_orig.quantidade - \
-                    itens_mvmt_obj.quantidade
-
-            prod_estocado_dest.quantidade = prod_estocado_dest.quantidade + \
-                itens_mvmt_obj.quantidade
-
-            lista_produtos_estocados.append(prod_estocado_orig)
-            lista_produtos_estocados.append(prod_estocado_dest)
+        forms = {id(item): pform for item, pform in itens_forms}
+        erros = lancar_movimento_estoque(
+            [item for item, pform in itens_forms], limitar_ao_local=True, **locais)
+        for erro in erros:
+            forms[id(erro.item)].add_error('quantidade', 'Quantidade retirada do estoque maior que o estoque atual (' +
+                                           str(erro.disponivel).replace('.', ',') + ') do produto.')
+        return not erros
 
 
 class AdicionarMovimentoEstoqueBaseView(CustomCreateView, MovimentoEstoqueMixin):
@@ -104,29 +83,21 @@ class AdicionarMovimentoEstoqueBaseView(CustomCreateView, MovimentoEstoqueMixin)
 
         if (form.is_valid() and itens_form.is_valid()):
             self.object = form.save(commit=False)
-            lista_produtos = []
-            lista_produtos_estocados = []
             itens_form.instance = self.object
+            itens_forms = []
 
             for pform in itens_form:
                 if pform.cleaned_data != {}:
                     itens_mvmt_obj = pform.save(commit=False)
                     itens_mvmt_obj.movimento_id = self.object
+                    itens_forms.append((itens_mvmt_obj, pform))
 
-                    self.adicionar_novo_movimento_estoque(
-                        itens_mvmt_obj, pform, lista_produtos, lista_produtos_estocados)
-
-            # Verificar se movimentos de estoque invalidos existem
-            if len(pform.errors):
-                return self.form_invalid(form=form, itens_form=itens_form)
-            else:
-                self.object.save()
-                itens_form.save()
-                for prod in lista_produtos:
-                    prod.save()
-                for prod_estocado in lista_produtos_estocados:
-                    prod_estocado.save()
-                return self.form_valid(form)
+            with transaction.atomic():
+                # Verificar se movimentos de estoque invalidos existem
+                if self.adicionar_novo_movimento_estoque(itens_forms):
+                    self.object.save()
+                    itens_form.save()
+                    return self.form_valid(form)
 
         return self.form_invalid(form=form, itens_form=itens_form)
 
@@ -177,6 +148,17 @@ class MovimentoEstoqueBaseListView(CustomListView):
                         self).get_context_data(**kwargs)
         return self.view_context(context)
 
+    def post(self, request, *args, **kwargs):
+        if self.check_user_delete_permission(request, self.model or MovimentoEstoque):
+            movimento_ids = [key for key, value in request.POST.items()
+                             if value == "on" and key.isdigit()]
+            if self.model:
+                movimento_ids = self.model.objects.filter(
+                    pk__in=movimento_ids).values_list('pk', flat=True)
+            # Estorno do estoque e exclusao de todos os selecionados de uma vez
+            excluir_movimentos_estoque(movimento_ids)
+        return redirect(self.success_url)
+
 
 class MovimentoEstoqueListView(MovimentoEstoqueBaseListView):
     template_name = 'estoque/movimento/movimento_estoque_list.html'
@@ -185,29 +167,87 @@ class MovimentoEstoqueListView(MovimentoEstoqueBaseListView):
 
     def view_context(self, context):
         context['title_complete'] = 'TODAS AS MOVIMENTAÇÕES DE ESTOQUE'
+        # Linhas carregadas sob demanda por ListaMovimentoEstoqueJsonView
+        context['movimentos_url'] = reverse_lazy(
+            'estoque:listamovimentoestoquejson')
+        context['todos_locais'] = LocalEstoque.objects.all()
+        # Filtro de produto por autocomplete, sem listar o catalogo inteiro
+        context['produtos_filtro_url'] = reverse_lazy(
+            'estoque:listaprodutosmovimentojson')
         return context
 
     def get_queryset(self):
-        all_entradas = EntradaEstoque.objects.all()
-        all_saidas = SaidaEstoque.objects.all()
-        all_transferencias = TransferenciaEstoque.objects.all()
-        all_movimentos = list(
-            chain(all_saidas, all_entradas, all_transferencias))
-        return all_movimentos
+        return MovimentoEstoque.objects.none()
 
-    def post(self, request, *args, **kwargs):
-        if self.check_user_delete_permission(request, MovimentoEstoque):
-            for key, value in request.POST.items():
-                if value == "on":
-                    if EntradaEstoque.objects.filter(id=key).exists():
-                        instance = EntradaEstoque.objects.get(id=key)
-                    elif SaidaEstoque.objects.filter(id=key).exists():
-                        instance = SaidaEstoque.objects.get(id=key)
-                    elif TransferenciaEstoque.objects.filter(id=key).exists():
-                        instance = TransferenciaEstoque.objects.get(id=key)
-
-                    instance.delete()
-        return redirect(self.success_url)
+
+class ListaMovimentoEstoqueJsonView(CustomView):
+    """
+    Endpoint server-side do DataTables para MovimentoEstoqueListView.
+    Alem dos parametros do DataTables (draw, start, length, order, search)
+    aceita os filtros data_inicial, data_final, tipo, local e produto e o
+    cursor devolvido na resposta anterior, para paginar sem OFFSET.
+    """
+    permission_codename = 'view_movimentoestoque'
+
+    def get_inteiro(self, nome, padrao):
+        try:
+            return int(self.request.GET.get(nome, padrao))
+        except (TypeError, ValueError):
+            return padrao
+
+    def get(self, request, *args, **kwargs):
+        params = request.GET
+        tamanho = self.get_inteiro('length', TAMANHO_PAGINA_PADRAO)
+        if tamanho <= 0 or tamanho > TAMANHO_PAGINA_MAXIMO:
+            tamanho = TAMANHO_PAGINA_MAXIMO
+        campo = COLUNAS_ORDENAVEIS.get(
+            self.get_inteiro('order[0][column]', 0), 'id')
+        decrescente = params.get('order[0][dir]', 'desc') != 'asc'
+
+        filtros = {
+            'data_inicial': converter_data(params.get('data_inicial')),
+            'data_final': converter_data(params.get('data_final')),
+            'tipo': params.get('tipo'),
+            'local': self.get_inteiro('local', None),
+            'produto': self.get_inteiro('produto', None),
+            'busca': params.get('search[value]'),
+        }
+        movimentos = filtrar_movimentos(**filtros)
+        pagina, cursor = paginar_movimentos(
+            movimentos, campo, decrescente, params.get('cursor'),
+            max(self.get_inteiro('start', 0), 0), tamanho)
+
+        total = MovimentoEstoque.objects.count()
+        data = {
+            'draw': self.get_inteiro('draw', 0),
+            'recordsTotal': total,
+            'recordsFiltered': movimentos.count() if any(filtros.values()) else total,
+            'cursor': cursor,
+            'data': [],
+        }
+        for movimento in pagina:
+            especifico = movimento.get_movimento_especifico()
+            data['data'].append({
+                '0': movimento.id,
+                '1': movimento.format_data_movimento,
+                '2': especifico.get_tipo() if especifico is not movimento else '',
+                '3': movimento.format_quantidade_itens(),
+                '4': movimento.format_valor_total(),
+                '5': format_html(
+                    '<input type="checkbox" name="{0}" id="remover-movimento-{0}"/>'
+                    '<label class="remove-entry-label" for="remover-movimento-{0}"></label>', movimento.id),
+                'DT_RowClass': 'clickable-row',
+                'DT_RowData': {'href': str(especifico.get_edit_url()) if especifico is not movimento else ''},
+            })
+        return JsonResponse(data)
+
+
+class ProdutosFiltroMovimentoJsonView(CustomView):
+    """Sugestoes do filtro de produto de MovimentoEstoqueListView (parametro term)."""
+    permission_codename = 'view_movimentoestoque'
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(buscar_produtos_filtro(request.GET.get('term')), safe=False)
 
 
 class EntradaEstoqueListView(MovimentoEstoqueBaseListView):
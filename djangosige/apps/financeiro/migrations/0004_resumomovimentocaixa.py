@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+from datetime import date
+
+from django.db import migrations, models
+
+
+def preencher_resumos(apps, schema_editor):
+    MovimentoCaixa = apps.get_model('financeiro', 'MovimentoCaixa')
+    ResumoMovimentoCaixa = apps.get_model('financeiro', 'ResumoMovimentoCaixa')
+
+    totais = {}
+    for data_movimento, entradas, saidas in MovimentoCaixa.objects.exclude(
+            data_movimento__isnull=True).values_list('data_movimento', 'entradas', 'saidas').iterator():
+        for chave in (('M', date(data_movimento.year, data_movimento.month, 1)),
+                      ('A', date(data_movimento.year, 1, 1))):
+            total_entradas, total_saidas = totais.get(
+                chave, (Decimal('0.00'), Decimal('0.00')))
+            totais[chave] = (total_entradas + entradas, total_saidas + saidas)
+
+    ResumoMovimentoCaixa.objects.bulk_create([
+        ResumoMovimentoCaixa(periodo=periodo, data_inicio=data_inicio,
+                             entradas=entradas, saidas=saidas)
+        for (periodo, data_inicio), (entradas, saidas) in totais.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0003_auto_20170820_1808'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoMovimentoCaixa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True,
+                                        primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(choices=[
+                 ('M', 'Mensal'), ('A', 'Anual')], max_length=1)),
+                ('data_inicio', models.DateField()),
+                ('entradas', models.DecimalField(decimal_places=2,
+                                                 default=Decimal('0.00'), max_digits=13)),
+                ('saidas', models.DecimalField(decimal_places=2,
+                                               default=Decimal('0.00'), max_digits=13)),
+            ],
+            options={
+                'verbose_name': 'Resumo do Movimento de Caixa',
+                'unique_together': {('periodo', 'data_inicio')},
+            },
+        ),
+        migrations.RunPython(preencher_resumos, migrations.RunPython.noop),
+    ]
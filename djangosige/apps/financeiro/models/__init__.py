@@ -2,3 +2,4 @@
 
 from .lancamento import *
 from .plano import *
+from .fluxo_caixa import *
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q
+from decimal import Decimal
+from datetime import date, timedelta
+
+from .lancamento import MovimentoCaixa
+
+PERIODO_RESUMO_ESCOLHAS = (
+    (u'M', u'Mensal'),
+    (u'A', u'Anual'),
+)
+
+GRANULARIDADE_FLUXO_ESCOLHAS = (
+    (u'day', u'Diário'),
+    (u'week', u'Semanal'),
+    (u'month', u'Mensal'),
+    (u'quarter', u'Trimestral'),
+    (u'year', u'Anual'),
+)
+
+
+def inicio_periodo(data, periodo):
+    if periodo == 'A':
+        return date(data.year, 1, 1)
+    return date(data.year, data.month, 1)
+
+
+def fim_periodo(data, periodo):
+    if periodo == 'A':
+        return date(data.year, 12, 31)
+    if data.month == 12:
+        return date(data.year, 12, 31)
+    return date(data.year, data.month + 1, 1) - timedelta(days=1)
+
+
+def inicio_granularidade(data, granularidade):
+    if granularidade == 'week':
+        return data - timedelta(days=data.weekday())
+    elif granularidade == 'month':
+        return date(data.year, data.month, 1)
+    elif granularidade == 'quarter':
+        return date(data.year, 3 * ((data.month - 1) // 3) + 1, 1)
+    elif granularidade == 'year':
+        return date(data.year, 1, 1)
+    return data
+
+
+def fim_granularidade(data, granularidade):
+    inicio = inicio_granularidade(data, granularidade)
+    if granularidade == 'week':
+        return inicio + timedelta(days=6)
+    elif granularidade == 'month':
+        return fim_periodo(inicio, 'M')
+    elif granularidade == 'quarter':
+        return fim_periodo(date(inicio.year, inicio.month + 2, 1), 'M')
+    elif granularidade == 'year':
+        return fim_periodo(inicio, 'A')
+    return data
+
+
+class ResumoMovimentoCaixa(models.Model):
+    periodo = models.CharField(max_length=1, choices=PERIODO_RESUMO_ESCOLHAS)
+    data_inicio = models.DateField()
+    entradas = models.DecimalField(
+        max_digits=13, decimal_places=2, default=Decimal('0.00'))
+    saidas = models.DecimalField(
+        max_digits=13, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name = "Resumo do Movimento de Caixa"
+        unique_together = (('periodo', 'data_inicio'),)
+
+    @classmethod
+    def registrar_movimento(cls, data_movimento, entradas=Decimal('0.00'), saidas=Decimal('0.00')):
+        if not (entradas or saidas):
+            return
+        for periodo, _ in PERIODO_RESUMO_ESCOLHAS:
+            resumo = cls.objects.filter(
+                periodo=periodo, data_inicio=inicio_periodo(data_movimento, periodo))
+            if resumo.update(entradas=F('entradas') + entradas, saidas=F('saidas') + saidas):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(periodo=periodo, data_inicio=inicio_periodo(
+                        data_movimento, periodo), entradas=entradas, saidas=saidas)
+            except IntegrityError:
+                resumo.update(entradas=F('entradas') + entradas,
+                              saidas=F('saidas') + saidas)
+
+    @classmethod
+    def reconstruir(cls):
+        cls.objects.all().delete()
+        totais = {}
+        for m in MovimentoCaixa.objects.exclude(data_movimento__isnull=True).values_list(
+                'data_movimento', 'entradas', 'saidas').iterator():
+            for periodo, _ in PERIODO_RESUMO_ESCOLHAS:
+                chave = (periodo, inicio_periodo(m[0], periodo))
+                entradas, saidas = totais.get(
+                    chave, (Decimal('0.00'), Decimal('0.00')))
+                totais[chave] = (entradas + m[1], saidas + m[2])
+        cls.objects.bulk_create([cls(periodo=k[0], data_inicio=k[1], entradas=v[0], saidas=v[1])
+                                 for k, v in totais.items()])
+
+    def __str__(self):
+        s = u'Resumo %s %s' % (self.get_periodo_display(), self.data_inicio)
+        return s
+
+
+class PeriodoFluxoCaixa(object):
+    """Linha agregada do fluxo de caixa, com a mesma interface de MovimentoCaixa."""
+
+    def __init__(self, data_inicio, data_fim, granularidade):
+        self.data_movimento = data_inicio
+        self.data_fim = data_fim
+        self.granularidade = granularidade
+        self.saldo_inicial = Decimal('0.00')
+        self.saldo_final = Decimal('0.00')
+        self.entradas = Decimal('0.00')
+        self.saidas = Decimal('0.00')
+
+    @property
+    def format_data_movimento(self):
+        if self.granularidade == 'year':
+            return '%s' % self.data_movimento.year
+        elif self.granularidade == 'quarter':
+            return '%sº Trim/%s' % ((self.data_movimento.month - 1) // 3 + 1, self.data_movimento.year)
+        elif self.granularidade == 'month':
+            return self.data_movimento.strftime('%m/%Y')
+        return '%s a %s' % (self.data_movimento.strftime('%d/%m/%Y'), self.data_fim.strftime('%d/%m/%Y'))
+
+    @property
+    def valor_lucro_prejuizo(self):
+        return self.saldo_final - self.saldo_inicial
+
+
+def _decompor_intervalo(data_inicial, data_final, periodos):
+    # Divide [data_inicial, data_final] em anos completos, meses completos
+    # e dias avulsos nas bordas, conforme os periodos de resumo permitidos.
+    anos, meses, dias = [], [], []
+    data = data_inicial
+    while data <= data_final:
+        if 'A' in periodos and data.month == 1 and data.day == 1 and fim_periodo(data, 'A') <= data_final:
+            anos.append(data)
+            data = fim_periodo(data, 'A') + timedelta(days=1)
+        elif 'M' in periodos and data.day == 1 and fim_periodo(data, 'M') <= data_final:
+            meses.append(data)
+            data = fim_periodo(data, 'M') + timedelta(days=1)
+        else:
+            proxima = fim_periodo(data, 'M') if 'M' in periodos else data_final
+            dias.append((data, min(proxima, data_final)))
+            data = min(proxima, data_final) + timedelta(days=1)
+    return anos, meses, dias
+
+
+def fluxo_caixa_agregado(data_inicial, data_final, granularidade):
+    """
+    Retorna as linhas do fluxo de caixa entre data_inicial e data_final
+    agrupadas por granularidade, usando os resumos mensais/anuais e os
+    movimentos diarios apenas nas bordas do intervalo.
+    """
+    if granularidade in ('year',):
+        periodos = ('A', 'M')
+    elif granularidade in ('month', 'quarter'):
+        periodos = ('M',)
+    else:
+        periodos = ()
+
+    anos, meses, dias = _decompor_intervalo(data_inicial, data_final, periodos)
+
+    parcelas = []
+    if anos:
+        parcelas.extend(ResumoMovimentoCaixa.objects.filter(
+            periodo='A', data_inicio__in=anos).values_list('data_inicio', 'entradas', 'saidas'))
+    if meses:
+        parcelas.extend(ResumoMovimentoCaixa.objects.filter(
+            periodo='M', data_inicio__in=meses).values_list('data_inicio', 'entradas', 'saidas'))
+    if dias:
+        filtro_dias = Q()
+        for inicio, fim in dias:
+            filtro_dias |= Q(data_movimento__range=(inicio, fim))
+        parcelas.extend(MovimentoCaixa.objects.filter(filtro_dias).values_list(
+            'data_movimento', 'entradas', 'saidas'))
+
+    ultimo_mvmt = MovimentoCaixa.objects.filter(
+        data_movimento__lt=data_inicial).order_by('-data_movimento').values_list('saldo_final', flat=True).first()
+    saldo = ultimo_mvmt or Decimal('0.00')
+
+    linhas = {}
+    for data_parcela, entradas, saidas in parcelas:
+        inicio = max(inicio_granularidade(data_parcela, granularidade), data_inicial)
+        if inicio not in linhas:
+            linhas[inicio] = PeriodoFluxoCaixa(
+                inicio, data_final, granularidade)
+        linhas[inicio].entradas += entradas
+        linhas[inicio].saidas += saidas
+
+    resultado = [linhas[k] for k in sorted(linhas)]
+    for linha in resultado:
+        linha.data_fim = min(fim_granularidade(
+            linha.data_movimento, granularidade), data_final)
+        linha.saldo_inicial = saldo
+        saldo = saldo + linha.entradas - linha.saidas
+        linha.saldo_final = saldo
+    return resultado
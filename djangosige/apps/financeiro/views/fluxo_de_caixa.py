@@ -5,7 +5,7 @@ from django.contrib import messages
 
 from djangosige.apps.base.custom_views import CustomListView
 
-from djangosige.apps.financeiro.models import MovimentoCaixa
+from djangosige.apps.financeiro.models import MovimentoCaixa, GRANULARIDADE_FLUXO_ESCOLHAS, fluxo_caixa_agregado
 
 from datetime import datetime
 
@@ -16,6 +16,18 @@ class FluxoCaixaView(CustomListView):
     context_object_name = 'movimentos'
     permission_codename = 'acesso_fluxodecaixa'
 
+    def get_granularidade(self):
+        granularidade = self.request.GET.get('granularity', 'day')
+        if granularidade not in dict(GRANULARIDADE_FLUXO_ESCOLHAS):
+            granularidade = 'day'
+        return granularidade
+
+    def get_context_data(self, **kwargs):
+        context = super(FluxoCaixaView, self).get_context_data(**kwargs)
+        context['granularidade'] = self.get_granularidade()
+        context['granularidade_escolhas'] = GRANULARIDADE_FLUXO_ESCOLHAS
+        return context
+
     def get_queryset(self):
         try:
             data_inicial = self.request.GET.get('from')
@@ -31,11 +43,15 @@ class FluxoCaixaView(CustomListView):
                 data_final = datetime.strptime(data_final, '%d/%m/%Y')
                 data_inicial = data_final
             else:
-                data_final = data_inicial = datetime.today().strftime('%Y-%m-%d')
+                data_final = data_inicial = datetime.today()
 
         except ValueError:
-            data_final = data_inicial = datetime.today().strftime('%Y-%m-%d')
+            data_final = data_inicial = datetime.today()
             messages.error(
                 self.request, 'Formato de data incorreto, deve ser no formato DD/MM/AAAA')
 
-        return MovimentoCaixa.objects.filter(data_movimento__range=(data_inicial, data_final))
+        granularidade = self.get_granularidade()
+        if granularidade != 'day':
+            return fluxo_caixa_agregado(data_inicial.date(), data_final.date(), granularidade)
+
+        return MovimentoCaixa.objects.filter(data_movimento__range=(data_inicial.date(), data_final.date()))
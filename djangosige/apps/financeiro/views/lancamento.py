@@ -4,77 +4,54 @@ from django.urls import reverse_lazy
 from django.contrib import messages
 from django.shortcuts import redirect
 from django.http import JsonResponse
+from django.db import transaction
+from django.db.models import F
 
 from djangosige.apps.base.custom_views import CustomView, CustomCreateView, CustomListView, CustomUpdateView
 
 from djangosige.apps.financeiro.forms import ContaPagarForm, ContaReceberForm, SaidaForm, EntradaForm
-from djangosige.apps.financeiro.models import Lancamento, Saida, Entrada, MovimentoCaixa
+from djangosige.apps.financeiro.models import Lancamento, Saida, Entrada, MovimentoCaixa, ResumoMovimentoCaixa
 from djangosige.apps.vendas.models import PedidoVenda
 from djangosige.apps.compras.models import PedidoCompra
-from djangosige.apps.estoque.models import SaidaEstoque, ItensMovimento, ProdutoEstocado
+from djangosige.apps.estoque.models import SaidaEstoque, ItensMovimento
+from djangosige.apps.estoque.lancamento import lancar_movimento_estoque
 
 from itertools import chain
 from datetime import datetime
+from decimal import Decimal
 
 
 class MovimentoCaixaMixin(object):
 
-    def adicionar_novo_movimento_caixa(self, lancamento, novo_movimento):
-        if isinstance(lancamento, Entrada):
-            novo_movimento.entradas = novo_movimento.entradas + lancamento.valor_liquido
-            novo_movimento.saldo_final = novo_movimento.saldo_final + lancamento.valor_liquido
-            novo_movimento.save()
-            # Atualizar os saldos dos proximos movimentos
-            for m in MovimentoCaixa.objects.filter(data_movimento__gt=novo_movimento.data_movimento):
-                m.saldo_inicial = m.saldo_inicial + lancamento.valor_liquido
-                m.saldo_final = m.saldo_final + lancamento.valor_liquido
-                m.save()
+    def deslocar_saldos_posteriores(self, data_movimento, valor):
+        # Atualizar os saldos dos proximos movimentos com um unico UPDATE
+        if valor:
+            MovimentoCaixa.objects.filter(data_movimento__gt=data_movimento).update(
+                saldo_inicial=F('saldo_inicial') + valor,
+                saldo_final=F('saldo_final') + valor)
+
+    def lancar_movimento_caixa(self, movimento, entradas=Decimal('0.00'), saidas=Decimal('0.00')):
+        variacao = entradas - saidas
+        movimento.entradas = movimento.entradas + entradas
+        movimento.saidas = movimento.saidas + saidas
+        movimento.saldo_final = movimento.saldo_final + variacao
+        movimento.save()
+        self.deslocar_saldos_posteriores(movimento.data_movimento, variacao)
+        ResumoMovimentoCaixa.registrar_movimento(
+            movimento.data_movimento, entradas=entradas, saidas=saidas)
 
-        elif isinstance(lancamento, Saida):
-            novo_movimento.saidas = novo_movimento.saidas + lancamento.valor_liquido
-            novo_movimento.saldo_final = novo_movimento.saldo_final - lancamento.valor_liquido
-            novo_movimento.save()
-            # Atualizar os saldos dos proximos movimentos
-            for m in MovimentoCaixa.objects.filter(data_movimento__gt=novo_movimento.data_movimento):
-                m.saldo_inicial = m.saldo_inicial - lancamento.valor_liquido
-                m.saldo_final = m.saldo_final - lancamento.valor_liquido
-                m.save()
+    def adicionar_novo_movimento_caixa(self, lancamento, novo_movimento):
+        self.adicionar_valor_movimento_caixa(
+            lancamento, novo_movimento, lancamento.valor_liquido)
 
     def remover_valor_movimento_caixa(self, lancamento, movimento, valor):
-        if isinstance(lancamento, Entrada):
-            movimento.entradas = movimento.entradas - valor
-            movimento.saldo_final = movimento.saldo_final - valor
-            movimento.save()
-            for m in MovimentoCaixa.objects.filter(data_movimento__gt=movimento.data_movimento):
-                m.saldo_inicial = m.saldo_inicial - valor
-                m.saldo_final = m.saldo_final - valor
-                m.save()
-        elif isinstance(lancamento, Saida):
-            movimento.saidas = movimento.saidas - valor
-            movimento.saldo_final = movimento.saldo_final + valor
-            movimento.save()
-            for m in MovimentoCaixa.objects.filter(data_movimento__gt=movimento.data_movimento):
-                m.saldo_inicial = m.saldo_inicial + valor
-                m.saldo_final = m.saldo_final + valor
-                m.save()
+        self.adicionar_valor_movimento_caixa(lancamento, movimento, -valor)
 
     def adicionar_valor_movimento_caixa(self, lancamento, movimento, valor):
         if isinstance(lancamento, Entrada):
-            movimento.entradas = movimento.entradas + valor
-            movimento.saldo_final = movimento.saldo_final + valor
-            movimento.save()
-            for m in MovimentoCaixa.objects.filter(data_movimento__gt=movimento.data_movimento):
-                m.saldo_inicial = m.saldo_inicial + valor
-                m.saldo_final = m.saldo_final + valor
-                m.save()
+            self.lancar_movimento_caixa(movimento, entradas=valor)
         elif isinstance(lancamento, Saida):
-            movimento.saidas = movimento.saidas + valor
-            movimento.saldo_final = movimento.saldo_final - valor
-            movimento.save()
-            for m in MovimentoCaixa.objects.filter(data_movimento__gt=movimento.data_movimento):
-                m.saldo_inicial = m.saldo_inicial - valor
-                m.saldo_final = m.saldo_final - valor
-                m.save()
+            self.lancar_movimento_caixa(movimento, saidas=valor)
 
     def verificar_remocao_movimento(self, movimento):
         # Deletar Caso essa seja a unica transacao do movimento antigo
@@ -377,8 +354,13 @@ class EditarSaidaView(EditarLancamentoBaseView):
 class LancamentoListBaseView(CustomListView, MovimentoCaixaMixin):
     permission_codename = 'view_lancamento'
 
+    def get_lancamentos(self, object):
+        # Cliente/fornecedor de cada linha carregado na mesma consulta
+        pessoa = 'cliente' if object is Entrada else 'fornecedor'
+        return object.objects.select_related(pessoa)
+
     def get_queryset(self, object, status):
-        return object.objects.filter(status__in=status)
+        return self.get_lancamentos(object).filter(status__in=status)
 
     # Remover items selecionados da database
     def post(self, request, *args, **kwargs):
@@ -407,8 +389,8 @@ class LancamentoListView(LancamentoListBaseView):
         return context
 
     def get_queryset(self):
-        all_entradas = Entrada.objects.all()
-        all_saidas = Saida.objects.all()
+        all_entradas = self.get_lancamentos(Entrada)
+        all_saidas = self.get_lancamentos(Saida)
         all_lancamentos = list(chain(all_saidas, all_entradas))
         return all_lancamentos
 
@@ -462,7 +444,7 @@ class ContaPagarAtrasadasListView(LancamentoListBaseView):
         return context
 
     def get_queryset(self):
-        return Saida.objects.filter(data_vencimento__lt=datetime.now().date(), status__in=['1', '2'])
+        return self.get_lancamentos(Saida).filter(data_vencimento__lt=datetime.now().date(), status__in=['1', '2'])
 
 
 class ContaPagarHojeListView(ContaPagarAtrasadasListView):
@@ -477,7 +459,7 @@ class ContaPagarHojeListView(ContaPagarAtrasadasListView):
         return context
 
     def get_queryset(self):
-        return Saida.objects.filter(data_vencimento=datetime.now().date(), status__in=['1', '2'])
+        return self.get_lancamentos(Saida).filter(data_vencimento=datetime.now().date(), status__in=['1', '2'])
 
 
 class ContaReceberListView(LancamentoListBaseView):
@@ -510,7 +492,7 @@ class ContaReceberAtrasadasListView(LancamentoListBaseView):
         return context
 
     def get_queryset(self):
-        return Entrada.objects.filter(data_vencimento__lt=datetime.now().date(), status__in=['1', '2'])
+        return self.get_lancamentos(Entrada).filter(data_vencimento__lt=datetime.now().date(), status__in=['1', '2'])
 
 
 class ContaReceberHojeListView(ContaReceberAtrasadasListView):
@@ -525,7 +507,7 @@ class ContaReceberHojeListView(ContaReceberAtrasadasListView):
         return context
 
     def get_queryset(self):
-        return Entrada.objects.filter(data_vencimento=datetime.now().date(), status__in=['1', '2'])
+        return self.get_lancamentos(Entrada).filter(data_vencimento=datetime.now().date(), status__in=['1', '2'])
 
 
 class EntradaListView(LancamentoListBaseView):
@@ -574,7 +556,7 @@ class GerarLancamentoView(CustomView, MovimentoCaixaMixin):
                 'financeiro:editarrecebimentoview', kwargs={'pk': obj.id})
             obj.status = '0'
             obj.data_pagamento = datetime.strptime(
-                request.POST['dataPagamento'], '%d/%m/%Y').strftime('%Y-%m-%d')
+                request.POST['dataPagamento'], '%d/%m/%Y').date()
             obj.save()
             if obj.movimentar_caixa:
                 self.atualizar_movimento_caixa(obj)
@@ -584,7 +566,7 @@ class GerarLancamentoView(CustomView, MovimentoCaixaMixin):
                 'financeiro:editarpagamentoview', kwargs={'pk': obj.id})
             obj.status = '0'
             obj.data_pagamento = datetime.strptime(
-                request.POST['dataPagamento'], '%d/%m/%Y').strftime('%Y-%m-%d')
+                request.POST['dataPagamento'], '%d/%m/%Y').date()
             obj.save()
             if obj.movimentar_caixa:
                 self.atualizar_movimento_caixa(obj)
@@ -599,17 +581,19 @@ class GerarLancamentoView(CustomView, MovimentoCaixaMixin):
                 data_movimento=object.data_pagamento)
 
         if mvmt:
-            # Caso a data esteja trocada
-            if mvmt.id != object.movimento_caixa.id:
+            # Caso a data esteja trocada (ou a conta ainda nao tenha movimento)
+            if mvmt.id != object.movimento_caixa_id:
                 # Atualizar os valores sem o movimento antigo
-                self.remover_valor_movimento_caixa(
-                    object, object.movimento_caixa, object.valor_liquido)
+                if object.movimento_caixa:
+                    self.remover_valor_movimento_caixa(
+                        object, object.movimento_caixa, object.valor_liquido)
                 if created:
                     self.atualizar_saldos(mvmt)
                 else:
                     mvmt.refresh_from_db()
 
-                self.verificar_remocao_movimento(object.movimento_caixa)
+                if object.movimento_caixa:
+                    self.verificar_remocao_movimento(object.movimento_caixa)
                 self.adicionar_novo_movimento_caixa(
                     lancamento=object, novo_movimento=mvmt)
 
@@ -625,65 +609,47 @@ class FaturarPedidoVendaView(CustomView, MovimentoCaixaMixin):
         return self.success_message % dict(cleaned_data, descricao=self.object.descricao)
 
     def atualizar_estoque(self, request, pedido):
-        erros = False
-        lista_prod_estocado = []
+        # Gerar os ItensMovimento para cada produto com controle_estoque=True
         lista_itens_saida = []
-
-        # Gerar o ProdutoEstocado e ItensMovimento para cada produto com controle_estoque=True
-        # Modificar o valor de estoque_atual de cada produto
-        for item in pedido.itens_venda.all():
-            if item.produto.controlar_estoque:
-                try:
-                    prod_estocado = ProdutoEstocado.objects.get(
-                        local=pedido.local_orig, produto=item.produto)
-                    if item.quantidade > item.produto.estoque_atual:
-                        erros = True
-                        messages.warning(request, 'Aviso: A venda não pode ser faturada. O estoque atual do produto ' + str(item.produto.descricao) +
-                                         ' é de apenas ' + str(item.produto.estoque_atual))
-                    elif item.quantidade > prod_estocado.quantidade:
-                        erros = True
-                        messages.warning(request, 'Aviso: A venda não pode ser faturada. O estoque atual do produto ' + str(item.produto.descricao) +
-                                         ' no local ' + str(pedido.local_orig) + ' é de apenas ' + str(prod_estocado.quantidade))
-                    elif not erros:
-                        item_mvmt = ItensMovimento()
-                        item_mvmt.produto = item.produto
-                        item_mvmt.quantidade = item.quantidade
-                        item_mvmt.valor_unit = item.valor_unit
-                        item_mvmt.subtotal = item.vprod
-                        lista_itens_saida.append(item_mvmt)
-
-                        prod_estocado.produto.estoque_atual -= item.quantidade
-                        prod_estocado.quantidade -= item.quantidade
-                        lista_prod_estocado.append(prod_estocado)
-
-                except ProdutoEstocado.DoesNotExist:
-                    erros = True
-                    messages.warning(request, 'Aviso: A venda não pode ser faturada. O estoque atual do produto ' + str(item.produto.descricao) +
-                                     ' no local ' + str(pedido.local_orig) + ' é 0,00')
-
-        # Salvar se nao ocorreu erros
-        if not erros:
-            saida_estoque = SaidaEstoque()
-            saida_estoque.data_movimento = pedido.data_entrega
-            saida_estoque.quantidade_itens = pedido.itens_venda.count()
-            saida_estoque.observacoes = 'Saída de estoque pelo pedido de venda nº{}'.format(
-                str(pedido.id))
-            saida_estoque.tipo_movimento = u'1'
-            saida_estoque.valor_total = pedido.get_total_produtos_estoque()
-            saida_estoque.pedido_venda = pedido
-            saida_estoque.local_orig = pedido.local_orig
-
-            saida_estoque.save()
-
-            for i in lista_itens_saida:
-                i.movimento_id = saida_estoque
-                i.save()
-
-            for p in lista_prod_estocado:
-                p.produto.save()
-                p.save()
-
-        return erros
+        for item in pedido.itens_venda.select_related('produto'):
+            if item.produto and item.produto.controlar_estoque:
+                item_mvmt = ItensMovimento()
+                item_mvmt.produto = item.produto
+                item_mvmt.quantidade = item.quantidade
+                item_mvmt.valor_unit = item.valor_unit
+                item_mvmt.subtotal = item.vprod
+                lista_itens_saida.append(item_mvmt)
+
+        # Modificar o estoque dos produtos e salvar se nao ocorreu erros
+        with transaction.atomic():
+            erros = lancar_movimento_estoque(
+                lista_itens_saida, local_orig=pedido.local_orig)
+            for erro in erros:
+                if erro.local_id is None:
+                    messages.warning(request, 'Aviso: A venda não pode ser faturada. O estoque atual do produto ' + str(erro.produto.descricao) +
+                                     ' é de apenas ' + str(erro.disponivel))
+                else:
+                    messages.warning(request, 'Aviso: A venda não pode ser faturada. O estoque atual do produto ' + str(erro.produto.descricao) +
+                                     ' no local ' + str(pedido.local_orig) + ' é de apenas ' + str(erro.disponivel))
+
+            if not erros:
+                saida_estoque = SaidaEstoque()
+                saida_estoque.data_movimento = pedido.data_entrega
+                saida_estoque.quantidade_itens = pedido.itens_venda.count()
+                saida_estoque.observacoes = 'Saída de estoque pelo pedido de venda nº{}'.format(
+                    str(pedido.id))
+                saida_estoque.tipo_movimento = u'1'
+                saida_estoque.valor_total = pedido.get_total_produtos_estoque()
+                saida_estoque.pedido_venda = pedido
+                saida_estoque.local_orig = pedido.local_orig
+
+                saida_estoque.save()
+
+                for i in lista_itens_saida:
+                    i.movimento_id = saida_estoque
+                ItensMovimento.objects.bulk_create(lista_itens_saida)
+
+        return bool(erros)
 
     def get(self, request, *args, **kwargs):
         pedido_id = kwargs.get('pk', None)
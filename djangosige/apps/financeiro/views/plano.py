@@ -19,7 +19,7 @@ class PlanoContasView(CustomTemplateView):
         grupo_entrada = []
         grupo_saida = []
 
-        for grupo in PlanoContasGrupo.objects.all():
+        for grupo in PlanoContasGrupo.objects.prefetch_related('subgrupos'):
             if grupo.tipo_grupo == '0' and '.' not in grupo.codigo:
                 grupo_entrada.append(grupo)
             elif grupo.tipo_grupo == '1' and '.' not in grupo.codigo:
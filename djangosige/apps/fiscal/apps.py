@@ -7,3 +7,9 @@ class FiscalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'djangosige.apps.fiscal'  # Nome completo obrigatório
     verbose_name = "Fiscal"  # Opcional
+
+    def ready(self):
+        from djangosige.apps.fiscal.perfil_tributario import conectar_sinais_perfil_tributario
+        from djangosige.apps.fiscal.numeracao import conectar_sinais_numeracao
+        conectar_sinais_perfil_tributario()
+        conectar_sinais_numeracao()
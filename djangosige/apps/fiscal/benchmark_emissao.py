@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from lxml import etree
+
+from .emissao_lote import TransmissorLoteNFe, NAMESPACE_NFE, TAMANHO_MAXIMO_LOTE, CSTAT_AUTORIZADA
+from .simulador_sefaz import servidor_simulador_sefaz
+
+NS = '{%s}' % NAMESPACE_NFE
+
+
+class NotaSintetica(object):
+    """NF-e gerada apenas para o benchmark, sem acesso ao banco."""
+
+    def __init__(self, numero, serie='1', itens=10, cnpj='12345678000190'):
+        self.numero = numero
+        self.serie = serie
+        self.itens = itens
+        self.chave = '3520%s%s55%s%s1%s0' % (
+            '01', cnpj, str(serie).zfill(3), str(numero).zfill(9), str(numero).zfill(8))
+
+    def xml(self):
+        nfe = etree.Element(NS + 'NFe', nsmap={None: NAMESPACE_NFE})
+        inf_nfe = etree.SubElement(
+            nfe, NS + 'infNFe', Id='NFe' + self.chave, versao='4.00')
+        ide = etree.SubElement(inf_nfe, NS + 'ide')
+        etree.SubElement(ide, NS + 'serie').text = str(self.serie)
+        etree.SubElement(ide, NS + 'nNF').text = str(self.numero)
+        for i in range(1, self.itens + 1):
+            det = etree.SubElement(inf_nfe, NS + 'det', nItem=str(i))
+            prod = etree.SubElement(det, NS + 'prod')
+            etree.SubElement(prod, NS + 'cProd').text = str(i)
+            etree.SubElement(prod, NS + 'xProd').text = u'PRODUTO %s' % i
+            etree.SubElement(prod, NS + 'qCom').text = '1.0000'
+            etree.SubElement(prod, NS + 'vProd').text = '10.00'
+        total = etree.SubElement(inf_nfe, NS + 'total')
+        icms_tot = etree.SubElement(total, NS + 'ICMSTot')
+        etree.SubElement(icms_tot, NS + 'vNF').text = '%.2f' % (10 * self.itens)
+        return nfe
+
+
+class TransmissorBenchmark(TransmissorLoteNFe):
+
+    def xml_nota(self, nota):
+        return nota.xml()
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100.0 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def emitir_lote(transmissor, id_lote, notas, config=None):
+    """
+    Envia um lote e consulta o recibo ate o fim do processamento.
+    Retorna (segundos, quantidade de notas autorizadas).
+    """
+    config = config or {}
+    inicio = time.perf_counter()
+    envio = transmissor.enviar_lote(config, id_lote, notas)
+    if not envio.sucesso:
+        return time.perf_counter() - inicio, 0
+    retorno = transmissor.consultar_recibo(config, envio.recibo)
+    while retorno.em_processamento:
+        time.sleep(0.01)
+        retorno = transmissor.consultar_recibo(config, envio.recibo)
+    autorizadas = len([p for p in retorno.protocolos if p['cStat'] in CSTAT_AUTORIZADA])
+    return time.perf_counter() - inicio, autorizadas
+
+
+def executar_benchmark_emissao(notas=500, tamanho_lote=TAMANHO_MAXIMO_LOTE, workers=4, itens_por_nota=10,
+                               url_sefaz=None, **config_simulador):
+    """
+    Mede o pipeline de emissao em lote contra o simulador local da SEFAZ
+    (ou url_sefaz, se informado). A memoria e medida em uma passagem
+    separada, com tracemalloc, para nao distorcer a vazao.
+    """
+    lotes = []
+    for inicio in range(0, notas, tamanho_lote):
+        lotes.append([NotaSintetica(numero, itens=itens_por_nota)
+                      for numero in range(inicio + 1, min(inicio + tamanho_lote, notas) + 1)])
+
+    def executar(url):
+        transmissor = TransmissorBenchmark(url_sefaz=url)
+
+        tracemalloc.start()
+        emitir_lote(transmissor, 0, lotes[0])
+        memoria_pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            resultados = list(executor.map(
+                lambda args: emitir_lote(transmissor, *args), enumerate(lotes, 1)))
+        duracao = time.perf_counter() - inicio
+
+        latencias = [segundos for segundos, _ in resultados]
+        return {
+            'notas': notas,
+            'lotes': len(lotes),
+            'autorizadas': sum(autorizadas for _, autorizadas in resultados),
+            'duracao': duracao,
+            'notas_por_segundo': notas / duracao if duracao else 0.0,
+            'latencia_p50': percentil(latencias, 50),
+            'latencia_p95': percentil(latencias, 95),
+            'memoria_por_nota_kb': memoria_pico / 1024.0 / len(lotes[0]),
+        }
+
+    if url_sefaz:
+        return executar(url_sefaz)
+    with servidor_simulador_sefaz(**config_simulador) as (url, simulador):
+        return executar(url)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from djangosige.apps.cadastro.models import COD_UF
+
+logger = logging.getLogger(__name__)
+
+try:
+    from erpbrasil.assinatura.certificado import Certificado as CertificadoERPBrasil
+except ImportError:
+    CertificadoERPBrasil = None
+
+try:
+    from erpbrasil.transmissao import TransmissaoSOAP
+    from requests import Session
+except ImportError:
+    TransmissaoSOAP = None
+    Session = None
+
+CODIGO_UF_POR_SIGLA = {sigla: codigo for codigo, sigla in COD_UF}
+
+TAMANHO_MAXIMO_POOL_NFE = 4
+
+
+class CacheCertificadoA1(object):
+    """
+    Mantem os certificados A1 (.pfx) ja decifrados em memoria, indexados por
+    caminho do arquivo + mtime + hash da senha. Trocar o arquivo ou a senha
+    gera uma nova chave; certificados vencidos sao descartados ao serem lidos.
+    """
+
+    def __init__(self):
+        self._certificados = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def gerar_chave(caminho, senha):
+        caminho = os.path.abspath(caminho)
+        senha_hash = hashlib.sha256(
+            (senha or '').encode('utf-8')).hexdigest()
+        return (caminho, os.stat(caminho).st_mtime_ns, senha_hash)
+
+    def obter(self, caminho, senha):
+        return self.obter_com_chave(caminho, senha)[1]
+
+    def obter_com_chave(self, caminho, senha):
+        if CertificadoERPBrasil is None:
+            raise ValueError(
+                u'erpbrasil.assinatura não disponível para ler o certificado A1.')
+
+        chave = self.gerar_chave(caminho, senha)
+        with self._lock:
+            certificado = self._certificados.get(chave)
+        if certificado is not None:
+            if not certificado.expirado:
+                return chave, certificado
+            logger.warning(
+                u"Certificado A1 %s expirado em %s.", caminho, certificado.fim_validade)
+
+        # Levanta CertificadoExpirado/CertificadoSenhaInvalida da erpbrasil
+        certificado = CertificadoERPBrasil(chave[0], senha)
+        with self._lock:
+            # Remover versoes anteriores do mesmo arquivo
+            for antiga in [k for k in self._certificados if k[0] == chave[0]]:
+                del self._certificados[antiga]
+            self._certificados[chave] = certificado
+        return chave, certificado
+
+    def limpar(self):
+        with self._lock:
+            self._certificados.clear()
+
+
+class PoolServicoNFe(object):
+    """
+    Pool de servicos NFe da erpbrasil.edoc ja configurados, por
+    (UF, ambiente, CNPJ, certificado). Cada servico tem a sua propria
+    requests.Session, reaproveitando as conexoes TLS com a SEFAZ.
+    """
+
+    def __init__(self, cache_certificados, tamanho_maximo=TAMANHO_MAXIMO_POOL_NFE):
+        self.cache_certificados = cache_certificados
+        self.tamanho_maximo = tamanho_maximo
+        self._livres = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def criar_servico(self, classe_servico, certificado, uf, ambiente, versao):
+        if TransmissaoSOAP is None:
+            raise ValueError(u'erpbrasil.transmissao não disponível.')
+        transmissao = TransmissaoSOAP(certificado, session=Session())
+        return classe_servico(transmissao, uf, versao=versao, ambiente=ambiente)
+
+    @contextmanager
+    def servico(self, classe_servico, caminho_certificado, senha_certificado, uf_sigla,
+                ambiente=2, cnpj=None, versao='4.00'):
+        uf = CODIGO_UF_POR_SIGLA.get(str(uf_sigla or '').upper())
+        if not uf:
+            raise ValueError(u'UF do emitente inválida: %s' % uf_sigla)
+
+        chave_certificado, certificado = self.cache_certificados.obter_com_chave(
+            caminho_certificado, senha_certificado)
+        chave = (uf, str(ambiente), cnpj or '', versao, chave_certificado)
+
+        with self._lock:
+            livres = self._livres[chave]
+            servico = livres.pop() if livres else None
+        if servico is None:
+            servico = self.criar_servico(
+                classe_servico, certificado, uf, ambiente, versao)
+
+        try:
+            yield servico
+        except Exception:
+            # Servico possivelmente com conexao quebrada, nao devolver ao pool
+            raise
+        else:
+            with self._lock:
+                livres = self._livres[chave]
+                if len(livres) < self.tamanho_maximo:
+                    livres.append(servico)
+
+    def limpar(self):
+        with self._lock:
+            self._livres.clear()
+
+
+cache_certificados_a1 = CacheCertificadoA1()
+pool_servicos_nfe = PoolServicoNFe(cache_certificados_a1)
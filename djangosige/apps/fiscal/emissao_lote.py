@@ -0,0 +1,594 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from lxml import etree
+
+from .certificado import cache_certificados_a1, CODIGO_UF_POR_SIGLA
+from .models import NotaFiscal, LoteNFe, FilaEmissaoNFe
+from .numeracao import numerar_notas
+
+logger = logging.getLogger(__name__)
+
+try:
+    from erpbrasil.assinatura.assinatura import Assinatura
+    from erpbrasil.assinatura.certificado import ArquivoCertificado
+    from erpbrasil.edoc.nfe import localizar_url, WS_NFE_AUTORIZACAO, WS_NFE_RET_AUTORIZACAO, \
+        WS_NFE_INUTILIZACAO, WS_NFE_CONSULTA
+except ImportError:
+    Assinatura = None
+    ArquivoCertificado = None
+    localizar_url = None
+    WS_NFE_AUTORIZACAO = 'NfeAutorizacao'
+    WS_NFE_RET_AUTORIZACAO = 'NfeRetAutorizacao'
+    WS_NFE_INUTILIZACAO = 'NfeInutilizacao'
+    WS_NFE_CONSULTA = 'NfeConsultaProtocolo'
+
+try:
+    from requests import Session
+except ImportError:
+    Session = None
+
+try:
+    from .compat import XML_SERIALIZER_Nfelib_local as XML_SERIALIZER
+except ImportError:
+    XML_SERIALIZER = None
+
+# Limite de NF-e por lote no envio assincrono (Manual de Orientacao do Contribuinte)
+TAMANHO_MAXIMO_LOTE = 50
+
+NAMESPACE_NFE = 'http://www.portalfiscal.inf.br/nfe'
+NAMESPACE_SOAP = 'http://www.w3.org/2003/05/soap-envelope'
+NAMESPACE_WSDL = {
+    WS_NFE_AUTORIZACAO: 'http://www.portalfiscal.inf.br/nfe/wsdl/NFeAutorizacao4',
+    WS_NFE_RET_AUTORIZACAO: 'http://www.portalfiscal.inf.br/nfe/wsdl/NFeRetAutorizacao4',
+    WS_NFE_INUTILIZACAO: 'http://www.portalfiscal.inf.br/nfe/wsdl/NFeInutilizacao4',
+    WS_NFE_CONSULTA: 'http://www.portalfiscal.inf.br/nfe/wsdl/NFeConsultaProtocolo4',
+}
+
+CSTAT_LOTE_RECEBIDO = '103'
+CSTAT_LOTE_EM_PROCESSAMENTO = '105'
+CSTAT_AUTORIZADA = ('100', '150')
+CSTAT_DENEGADA = ('110', '301', '302')
+CSTAT_INUTILIZADA = '102'
+CSTAT_NAO_CONSTA = '217'
+
+# Lote cujo envio nao foi confirmado: segundos ate a primeira consulta das
+# NF-e pela chave (a SEFAZ pode ainda estar processando o lote) e numero de
+# consultas "nao consta" ate a nota voltar para a fila
+INTERVALO_RECONCILIACAO = 120
+TENTATIVAS_RECONCILIACAO = 3
+# Lote montado ha mais que isto sem resultado do envio: processo interrompido
+LIMITE_LOTE_MONTADO = 600
+
+
+class RetornoEnvioLote(object):
+
+    def __init__(self, sucesso, recibo=None, tempo_medio=0, motivo=''):
+        self.sucesso = sucesso
+        self.recibo = recibo
+        self.tempo_medio = tempo_medio
+        self.motivo = motivo
+
+
+class RetornoConsultaLote(object):
+    """
+    protocolos: lista de dicts com chave, cStat, motivo, protocolo e xml
+    (protNFe) de cada NF-e do lote.
+    """
+
+    def __init__(self, em_processamento=False, protocolos=None, motivo=''):
+        self.em_processamento = em_processamento
+        self.protocolos = protocolos or []
+        self.motivo = motivo
+
+
+def ler_protocolo(prot_nfe):
+    inf_prot = prot_nfe.find('{%s}infProt' % NAMESPACE_NFE)
+    return {
+        'chave': inf_prot.findtext('{%s}chNFe' % NAMESPACE_NFE),
+        'cStat': inf_prot.findtext('{%s}cStat' % NAMESPACE_NFE),
+        'motivo': inf_prot.findtext('{%s}xMotivo' % NAMESPACE_NFE),
+        'protocolo': inf_prot.findtext('{%s}nProt' % NAMESPACE_NFE),
+        'xml': etree.tostring(prot_nfe, encoding='unicode'),
+    }
+
+
+def montar_nfe_proc(xml_nfe, xml_prot_nfe, versao='4.00'):
+    """nfeProc (NFe assinada + protNFe): o XML de distribuicao da NF-e."""
+    nfe_proc = etree.Element('{%s}nfeProc' % NAMESPACE_NFE, nsmap={None: NAMESPACE_NFE}, versao=versao)
+    nfe_proc.append(etree.fromstring(xml_nfe.encode('utf-8')))
+    nfe_proc.append(etree.fromstring(xml_prot_nfe.encode('utf-8')))
+    return etree.tostring(nfe_proc, encoding='unicode')
+
+
+class RetornoInutilizacao(object):
+
+    def __init__(self, sucesso, protocolo=None, motivo=''):
+        self.sucesso = sucesso
+        self.protocolo = protocolo
+        self.motivo = motivo
+
+
+class TransmissorLoteNFe(object):
+    """
+    Envia lotes de NF-e (NFeAutorizacao4, indSinc=0), consulta os recibos
+    (NFeRetAutorizacao4) e inutiliza faixas de numeracao (NFeInutilizacao4)
+    com envelopes SOAP 1.2. url_sefaz permite apontar os servicos para um
+    endpoint local (ex.: simulador da SEFAZ).
+    """
+
+    def __init__(self, url_sefaz=None, timeout=60):
+        self.url_sefaz = url_sefaz
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = Session()
+        return self._local.session
+
+    def get_url(self, servico, config, modelo='55'):
+        if self.url_sefaz:
+            return '%s/%s' % (self.url_sefaz.rstrip('/'), servico)
+        uf = CODIGO_UF_POR_SIGLA.get(
+            str(config.get('uf_sigla_emitente') or '').upper())
+        url = localizar_url(servico, str(uf), modelo,
+                            int(config.get('ambiente_sefaz', 2)))
+        return url.split('?')[0]
+
+    def get_certificado(self, config):
+        if not config.get('caminho_certificado_a1'):
+            return None
+        return cache_certificados_a1.obter(config['caminho_certificado_a1'], config.get('senha_certificado_a1'))
+
+    def montar_envelope(self, servico, raiz):
+        envelope = etree.Element('{%s}Envelope' % NAMESPACE_SOAP,
+                                 nsmap={'soap12': NAMESPACE_SOAP})
+        body = etree.SubElement(envelope, '{%s}Body' % NAMESPACE_SOAP)
+        dados = etree.SubElement(body, '{%s}nfeDadosMsg' % NAMESPACE_WSDL[servico],
+                                 nsmap={None: NAMESPACE_WSDL[servico]})
+        dados.append(raiz)
+        return etree.tostring(envelope, encoding='utf-8', xml_declaration=True)
+
+    def post(self, servico, config, raiz, nome_retorno, modelo='55'):
+        envelope = self.montar_envelope(servico, raiz)
+        url = self.get_url(servico, config, modelo)
+        headers = {'Content-Type': 'application/soap+xml; charset=utf-8'}
+        certificado = self.get_certificado(config) if url.startswith('https') else None
+        if certificado is not None:
+            with ArquivoCertificado(certificado, 'w') as (key, cert):
+                resposta = self.session.post(url, data=envelope, headers=headers, cert=(cert, key),
+                                             verify=False, timeout=self.timeout)
+        else:
+            resposta = self.session.post(
+                url, data=envelope, headers=headers, timeout=self.timeout)
+        resposta.raise_for_status()
+        retorno = etree.fromstring(resposta.content).find(
+            './/{%s}%s' % (NAMESPACE_NFE, nome_retorno))
+        if retorno is None:
+            raise ValueError(
+                u'Resposta da SEFAZ sem o elemento %s.' % nome_retorno)
+        return retorno
+
+    def xml_nota(self, nota):
+        return etree.fromstring(XML_SERIALIZER.render(nota.to_nfelib()).encode('utf-8'))
+
+    def xml_nota_assinado(self, nota, certificado):
+        xml_nota = self.xml_nota(nota)
+        inf_nfe = xml_nota.find('{%s}infNFe' % NAMESPACE_NFE)
+        if inf_nfe is None or not inf_nfe.get('Id'):
+            raise ValueError(
+                u'NF-e %s/%s sem chave de acesso (infNFe/@Id).' % (nota.serie, nota.numero))
+        if certificado is None:
+            return xml_nota
+        return etree.fromstring(Assinatura(certificado).assina_xml2(xml_nota, inf_nfe.get('Id')).encode('utf-8'))
+
+    def assinar_notas(self, config, notas):
+        certificado = self.get_certificado(config)
+        return [self.xml_nota_assinado(nota, certificado) for nota in notas]
+
+    def enviar_lote(self, config, id_lote, notas, xmls=None):
+        """xmls: NFe ja assinadas (assinar_notas), na ordem de notas."""
+        if xmls is None:
+            xmls = self.assinar_notas(config, notas)
+        envio = etree.Element('{%s}enviNFe' % NAMESPACE_NFE, nsmap={None: NAMESPACE_NFE},
+                              versao=config.get('versao_leiaute') or '4.00')
+        etree.SubElement(envio, '{%s}idLote' % NAMESPACE_NFE).text = str(id_lote)
+        etree.SubElement(envio, '{%s}indSinc' % NAMESPACE_NFE).text = '0'
+        for xml in xmls:
+            envio.append(xml)
+
+        retorno = self.post(WS_NFE_AUTORIZACAO, config, envio, 'retEnviNFe')
+        cstat = retorno.findtext('{%s}cStat' % NAMESPACE_NFE)
+        motivo = retorno.findtext('{%s}xMotivo' % NAMESPACE_NFE)
+        if cstat != CSTAT_LOTE_RECEBIDO:
+            return RetornoEnvioLote(False, motivo=u'%s - %s' % (cstat, motivo))
+        return RetornoEnvioLote(True, recibo=retorno.findtext('{ns}infRec/{ns}nRec'.format(ns='{%s}' % NAMESPACE_NFE)),
+                                tempo_medio=int(retorno.findtext('{ns}infRec/{ns}tMed'.format(
+                                    ns='{%s}' % NAMESPACE_NFE)) or 0),
+                                motivo=motivo)
+
+    def consultar_recibo(self, config, recibo):
+        consulta = etree.Element('{%s}consReciNFe' % NAMESPACE_NFE, nsmap={None: NAMESPACE_NFE},
+                                 versao=config.get('versao_leiaute') or '4.00')
+        etree.SubElement(consulta, '{%s}tpAmb' % NAMESPACE_NFE).text = str(
+            config.get('ambiente_sefaz', 2))
+        etree.SubElement(consulta, '{%s}nRec' % NAMESPACE_NFE).text = recibo
+
+        retorno = self.post(WS_NFE_RET_AUTORIZACAO, config,
+                            consulta, 'retConsReciNFe')
+        cstat = retorno.findtext('{%s}cStat' % NAMESPACE_NFE)
+        motivo = retorno.findtext('{%s}xMotivo' % NAMESPACE_NFE)
+        if cstat == CSTAT_LOTE_EM_PROCESSAMENTO:
+            return RetornoConsultaLote(em_processamento=True, motivo=motivo)
+
+        protocolos = [ler_protocolo(prot_nfe) for prot_nfe in retorno.findall('{%s}protNFe' % NAMESPACE_NFE)]
+        return RetornoConsultaLote(protocolos=protocolos, motivo=u'%s - %s' % (cstat, motivo))
+
+    def consultar_protocolo(self, config, chave):
+        """
+        Protocolo da NF-e pela chave (NFeConsultaProtocolo4), no formato de
+        consultar_recibo, ou None se a NF-e nao consta na SEFAZ.
+        """
+        consulta = etree.Element('{%s}consSitNFe' % NAMESPACE_NFE, nsmap={None: NAMESPACE_NFE},
+                                 versao=config.get('versao_leiaute') or '4.00')
+        etree.SubElement(consulta, '{%s}tpAmb' % NAMESPACE_NFE).text = str(
+            config.get('ambiente_sefaz', 2))
+        etree.SubElement(consulta, '{%s}xServ' % NAMESPACE_NFE).text = 'CONSULTAR'
+        etree.SubElement(consulta, '{%s}chNFe' % NAMESPACE_NFE).text = chave
+
+        retorno = self.post(WS_NFE_CONSULTA, config, consulta, 'retConsSitNFe')
+        cstat = retorno.findtext('{%s}cStat' % NAMESPACE_NFE)
+        if cstat == CSTAT_NAO_CONSTA:
+            return None
+        prot_nfe = retorno.find('{%s}protNFe' % NAMESPACE_NFE)
+        if prot_nfe is None:
+            raise ValueError(u'%s - %s' % (cstat, retorno.findtext('{%s}xMotivo' % NAMESPACE_NFE)))
+        return ler_protocolo(prot_nfe)
+
+    def inutilizar_faixa(self, config, ano, modelo, serie, numero_inicial, numero_final, justificativa):
+        ns = '{%s}' % NAMESPACE_NFE
+        uf = CODIGO_UF_POR_SIGLA.get(
+            str(config.get('uf_sigla_emitente') or '').upper(), '')
+        cnpj = config.get('cnpj_empresa_emitente') or ''
+        id_inut = 'ID%s%s%s%s%s%s%s' % (uf, str(ano)[-2:], cnpj, modelo, str(serie).zfill(3),
+                                        str(numero_inicial).zfill(9), str(numero_final).zfill(9))
+
+        inutilizacao = etree.Element(ns + 'inutNFe', nsmap={None: NAMESPACE_NFE},
+                                     versao=config.get('versao_leiaute') or '4.00')
+        inf_inut = etree.SubElement(inutilizacao, ns + 'infInut', Id=id_inut)
+        for tag, valor in (('tpAmb', config.get('ambiente_sefaz', 2)), ('xServ', 'INUTILIZAR'),
+                           ('cUF', uf), ('ano', str(ano)[-2:]), ('CNPJ', cnpj), ('mod', modelo),
+                           ('serie', int(serie)), ('nNFIni', numero_inicial), ('nNFFin', numero_final),
+                           ('xJust', justificativa)):
+            etree.SubElement(inf_inut, ns + tag).text = str(valor)
+
+        certificado = self.get_certificado(config)
+        if certificado is not None:
+            inutilizacao = etree.fromstring(
+                Assinatura(certificado).assina_xml2(inutilizacao, id_inut).encode('utf-8'))
+
+        retorno = self.post(WS_NFE_INUTILIZACAO, config, inutilizacao, 'retInutNFe', modelo)
+        inf_ret = retorno.find(ns + 'infInut')
+        cstat = inf_ret.findtext(ns + 'cStat')
+        motivo = u'%s - %s' % (cstat, inf_ret.findtext(ns + 'xMotivo'))
+        if cstat != CSTAT_INUTILIZADA:
+            return RetornoInutilizacao(False, motivo=motivo)
+        return RetornoInutilizacao(True, protocolo=inf_ret.findtext(ns + 'nProt'), motivo=motivo)
+
+
+def enfileirar_notas(notas):
+    """
+    Inclui as notas na fila de emissao, numerando as que ainda nao tem
+    numero. Notas ja rejeitadas voltam a ficar pendentes; notas ja em lote
+    ou autorizadas nao sao alteradas.
+    """
+    ids = [nota.pk for nota in notas]
+    numerar_notas(list(NotaFiscal.objects.filter(pk__in=ids, numero__isnull=True)))
+    FilaEmissaoNFe.objects.bulk_create(
+        [FilaEmissaoNFe(nota_id=pk) for pk in ids], ignore_conflicts=True)
+    FilaEmissaoNFe.objects.filter(nota_id__in=ids, status=u'R').update(
+        status=u'P', lote=None, mensagem=None)
+
+
+def reservar_lote(tamanho_lote=TAMANHO_MAXIMO_LOTE):
+    """
+    Separa ate tamanho_lote notas pendentes do mesmo emitente em um novo
+    LoteNFe. Linhas ja reservadas por outro worker sao ignoradas.
+    """
+    with transaction.atomic():
+        pendentes = FilaEmissaoNFe.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+            status=u'P').order_by('pk')
+        primeiro = pendentes.select_related('nota').first()
+        if primeiro is None:
+            return None
+
+        emitente_id = primeiro.nota.emitente_id
+        if emitente_id is None:
+            pendentes = pendentes.filter(nota__emitente__isnull=True)
+        else:
+            pendentes = pendentes.filter(nota__emitente_id=emitente_id)
+        ids = list(pendentes.values_list('pk', flat=True)[:tamanho_lote])
+
+        lote = LoteNFe.objects.create(emitente_id=emitente_id)
+        FilaEmissaoNFe.objects.filter(pk__in=ids).update(
+            lote=lote, status=u'L', tentativas=F('tentativas') + 1)
+    return lote
+
+
+def _gravar_itens(lote, itens):
+    with transaction.atomic():
+        FilaEmissaoNFe.objects.bulk_update(
+            itens, ['status', 'lote', 'mensagem', 'data_processamento'])
+        NotaFiscal.objects.bulk_update(
+            [item.nota for item in itens], ['status', 'chave', 'protocolo', 'xml_gerado', 'motivo_erro'])
+        lote.save()
+
+
+def _rejeitar_itens(lote, itens, motivo):
+    agora = timezone.now()
+    for item in itens:
+        item.status = u'R'
+        item.mensagem = motivo
+        item.data_processamento = agora
+        item.nota.status = u'R'
+        item.nota.motivo_erro = motivo
+    _gravar_itens(lote, itens)
+
+
+def _aguardar_reconciliacao(lote, motivo):
+    """Nao se sabe se a SEFAZ recebeu o lote: as notas ficam em lote ate a consulta pela chave."""
+    lote.status = u'4'
+    lote.motivo = motivo
+    lote.tentativas_consulta = 0
+    lote.proxima_consulta = timezone.now() + timedelta(seconds=INTERVALO_RECONCILIACAO)
+    lote.save()
+    return lote
+
+
+def _registrar_xml_assinado(itens, xmls):
+    """
+    Grava, antes da transmissao, a chave (usada na reconciliacao) e a NFe
+    assinada de cada nota (que compoe o nfeProc com o protocolo).
+    """
+    for item, xml in zip(itens, xmls):
+        item.nota.chave = xml.find('{%s}infNFe' % NAMESPACE_NFE).get('Id')[3:]
+        item.nota.xml_gerado = etree.tostring(xml, encoding='unicode')
+    NotaFiscal.objects.bulk_update([item.nota for item in itens], ['chave', 'xml_gerado'])
+
+
+def enviar_lote(lote, transmissor):
+    itens = list(lote.itens_fila.select_related('nota', 'nota__emitente'))
+    if not itens:
+        lote.status = u'2'
+        lote.save()
+        return lote
+
+    notas = [item.nota for item in itens]
+    try:
+        config = notas[0].get_configuracao_servico()
+        xmls = transmissor.assinar_notas(config, notas)
+    except Exception as e:
+        # Nada foi transmitido
+        logger.error(u"Erro ao montar lote %s: %s", lote.pk, e, exc_info=True)
+        lote.status = u'3'
+        lote.motivo = u'Erro de sistema durante o envio: %s' % e
+        _rejeitar_itens(lote, itens, lote.motivo)
+        return lote
+
+    _registrar_xml_assinado(itens, xmls)
+    try:
+        retorno = transmissor.enviar_lote(config, lote.pk, notas, xmls)
+    except Exception as e:
+        # Timeout ou falha de transporte: a SEFAZ pode ter recebido o lote
+        logger.error(u"Erro ao enviar lote %s: %s", lote.pk, e, exc_info=True)
+        return _aguardar_reconciliacao(lote, u'Envio não confirmado: %s' % e)
+
+    lote.motivo = retorno.motivo
+    if not retorno.sucesso:
+        lote.status = u'3'
+        _rejeitar_itens(lote, itens, retorno.motivo)
+        return lote
+
+    agora = timezone.now()
+    lote.status = u'1'
+    lote.recibo = retorno.recibo
+    lote.tempo_medio = retorno.tempo_medio
+    lote.data_envio = agora
+    lote.proxima_consulta = agora + timedelta(seconds=retorno.tempo_medio)
+    lote.save()
+    return lote
+
+
+def _aplicar_protocolo(item, protocolo, agora):
+    """Resultado de uma NF-e; autorizadas e denegadas guardam o nfeProc."""
+    nota = item.nota
+    motivo = u'%s - %s' % (protocolo['cStat'], protocolo['motivo'])
+    item.mensagem = nota.motivo_erro = motivo
+    nota.chave = protocolo['chave']
+    if protocolo['cStat'] in CSTAT_AUTORIZADA + CSTAT_DENEGADA:
+        item.status = nota.status = u'A' if protocolo['cStat'] in CSTAT_AUTORIZADA else u'D'
+        nota.protocolo = protocolo['protocolo']
+        if nota.xml_gerado:
+            nota.xml_gerado = montar_nfe_proc(nota.xml_gerado, protocolo['xml'])
+        else:
+            logger.warning(u"NF-e %s sem o XML assinado: nfeProc nao montado.", nota.pk)
+    else:
+        item.status = nota.status = u'R'
+    item.data_processamento = agora
+
+
+def aplicar_protocolos(lote, itens, protocolos):
+    """
+    Grava o resultado de cada NF-e do lote com dois bulk_update (fila e
+    notas), casando o protocolo pela serie/numero contidos na chave.
+    """
+    por_numero = {}
+    for protocolo in protocolos:
+        chave = protocolo.get('chave') or ''
+        por_numero[(int(chave[22:25] or 0), int(chave[25:34] or 0))] = protocolo
+
+    agora = timezone.now()
+    for item in itens:
+        nota = item.nota
+        protocolo = por_numero.get((int(nota.serie or 0), int(nota.numero or 0)))
+        if protocolo is None:
+            item.status = nota.status = u'R'
+            item.mensagem = nota.motivo_erro = u'NF-e não retornada no processamento do lote %s.' % lote.recibo
+            item.data_processamento = agora
+        else:
+            _aplicar_protocolo(item, protocolo, agora)
+
+    lote.status = u'2'
+    lote.proxima_consulta = None
+    _gravar_itens(lote, itens)
+
+
+def consultar_lote(lote, transmissor):
+    itens = list(lote.itens_fila.select_related('nota', 'nota__emitente'))
+    try:
+        config = itens[0].nota.get_configuracao_servico() if itens else {}
+        retorno = transmissor.consultar_recibo(config, lote.recibo)
+    except Exception as e:
+        # Nova tentativa na proxima passagem
+        logger.error(u"Erro ao consultar recibo do lote %s: %s", lote.pk, e, exc_info=True)
+        retorno = RetornoConsultaLote(em_processamento=True, motivo=str(e))
+
+    if retorno.em_processamento:
+        lote.tentativas_consulta += 1
+        lote.motivo = retorno.motivo
+        lote.proxima_consulta = timezone.now() + timedelta(
+            seconds=max(lote.tempo_medio, 1) * lote.tentativas_consulta)
+        lote.save()
+        return lote
+
+    if itens and not retorno.protocolos:
+        # Recibo sem protocolos (ex.: 106 - lote nao localizado): a situacao
+        # das notas e conferida pela chave
+        return _aguardar_reconciliacao(lote, retorno.motivo)
+
+    lote.motivo = retorno.motivo
+    aplicar_protocolos(lote, itens, retorno.protocolos)
+    return lote
+
+
+def reconciliar_lote(lote, transmissor):
+    """
+    Lote sem confirmacao do envio: a situacao de cada NF-e e consultada
+    pela chave. Notas sem chave nao chegaram a ser transmitidas e voltam
+    para a fila; as que nao constam na SEFAZ voltam apos
+    TENTATIVAS_RECONCILIACAO consultas. Falhas na consulta ficam para a
+    proxima passagem.
+    """
+    itens = list(lote.itens_fila.filter(status=u'L').select_related('nota', 'nota__emitente'))
+    lote.tentativas_consulta += 1
+    agora = timezone.now()
+    resolvidos = []
+    pendentes = False
+    config = None
+    for item in itens:
+        protocolo = None
+        if item.nota.chave:
+            try:
+                if config is None:
+                    config = item.nota.get_configuracao_servico()
+                protocolo = transmissor.consultar_protocolo(config, item.nota.chave)
+            except Exception as e:
+                logger.error(u"Erro ao consultar NF-e %s do lote %s: %s", item.nota.chave, lote.pk, e,
+                             exc_info=True)
+                pendentes = True
+                continue
+            if protocolo is None and lote.tentativas_consulta < TENTATIVAS_RECONCILIACAO:
+                pendentes = True
+                continue
+
+        if protocolo is None:
+            item.status = u'P'
+            item.lote = None
+            item.mensagem = u'NF-e não recebida pela SEFAZ no lote %s; enviada novamente.' % lote.pk
+            item.data_processamento = agora
+        else:
+            _aplicar_protocolo(item, protocolo, agora)
+        resolvidos.append(item)
+
+    if pendentes:
+        lote.proxima_consulta = agora + timedelta(seconds=INTERVALO_RECONCILIACAO * lote.tentativas_consulta)
+    else:
+        lote.status = u'2'
+        lote.proxima_consulta = None
+    _gravar_itens(lote, resolvidos)
+    return lote
+
+
+def recuperar_fila():
+    """
+    Retoma o que um processo interrompido deixou para tras: lotes montados
+    ha mais de LIMITE_LOTE_MONTADO segundos sem resultado do envio, e itens
+    "em lote" sem lote em andamento, passam a ser reconciliados pela chave.
+    Retorna o numero de lotes retomados.
+    """
+    agora = timezone.now()
+    motivo = u'Envio interrompido: situação conferida na SEFAZ.'
+    retomados = LoteNFe.objects.filter(
+        status=u'0', data_criacao__lt=agora - timedelta(seconds=LIMITE_LOTE_MONTADO)).update(
+        status=u'4', motivo=motivo, tentativas_consulta=0, proxima_consulta=agora)
+
+    orfaos = {}
+    for item_id, emitente_id in FilaEmissaoNFe.objects.filter(status=u'L').filter(
+            Q(lote__isnull=True) | Q(lote__status__in=(u'2', u'3'))).values_list('pk', 'nota__emitente_id'):
+        orfaos.setdefault(emitente_id, []).append(item_id)
+    for emitente_id, ids in orfaos.items():
+        lote = LoteNFe.objects.create(emitente_id=emitente_id, status=u'4', motivo=motivo, proxima_consulta=agora)
+        FilaEmissaoNFe.objects.filter(pk__in=ids).update(lote=lote)
+    return retomados + len(orfaos)
+
+
+def _executar(funcao, lote, transmissor):
+    try:
+        return funcao(lote, transmissor)
+    finally:
+        # Cada thread do pool usa sua propria conexao com o banco
+        connection.close()
+
+
+def processar_fila(transmissor=None, workers=4, tamanho_lote=TAMANHO_MAXIMO_LOTE):
+    """
+    Uma passagem pela fila: retoma lotes interrompidos, monta e envia os
+    lotes pendentes e consulta os recibos cujo tempo medio ja expirou (e as
+    chaves dos lotes sem confirmacao do envio). Com workers > 1 os lotes sao
+    transmitidos em paralelo.
+    Retorna (lotes enviados, lotes consultados).
+    """
+    transmissor = transmissor or TransmissorLoteNFe()
+    recuperar_fila()
+    lotes = []
+    lote = reservar_lote(tamanho_lote)
+    while lote is not None:
+        lotes.append(lote)
+        lote = reservar_lote(tamanho_lote)
+
+    consultas = [(reconciliar_lote if lote.status == u'4' else consultar_lote, lote)
+                 for lote in LoteNFe.objects.filter(
+                     status__in=(u'1', u'4'), proxima_consulta__lte=timezone.now()).exclude(
+                     pk__in=[reservado.pk for reservado in lotes])]
+
+    if workers <= 1:
+        for lote in lotes:
+            enviar_lote(lote, transmissor)
+        for funcao, lote in consultas:
+            funcao(lote, transmissor)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            tarefas = [executor.submit(_executar, enviar_lote, lote, transmissor) for lote in lotes]
+            tarefas += [executor.submit(_executar, funcao, lote, transmissor) for funcao, lote in consultas]
+            for tarefa in tarefas:
+                tarefa.result()
+    return len(lotes), len(consultas)
@@ -120,8 +120,8 @@ class ConsultarCadastroForm(forms.Form):
     )
     documento_consulta = forms.CharField(
         label=_('CNPJ, CPF ou IE do Contribuinte'),
-        max_length=14, 
-        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Apenas números'})
+        max_length=18, 
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'CNPJ, CPF ou IE'})
     )
 
 class InutilizarNotasForm(forms.Form):
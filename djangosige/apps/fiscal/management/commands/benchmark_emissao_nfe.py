@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from djangosige.apps.fiscal.benchmark_emissao import executar_benchmark_emissao
+from djangosige.apps.fiscal.emissao_lote import TAMANHO_MAXIMO_LOTE
+
+
+class Command(BaseCommand):
+    help = u'Mede a vazão da emissão de NF-e em lote contra o simulador local da SEFAZ.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--notas', type=int, default=500)
+        parser.add_argument('--tamanho-lote', type=int,
+                            default=TAMANHO_MAXIMO_LOTE)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--itens', type=int, default=10,
+                            help=u'Itens por NF-e sintética.')
+        parser.add_argument('--latencia-min', type=float, default=0)
+        parser.add_argument('--latencia-max', type=float, default=0)
+        parser.add_argument('--taxa-rejeicao', type=float, default=0)
+        parser.add_argument('--url-sefaz', default=None,
+                            help=u'Usar um simulador já em execução em vez de subir um local.')
+
+    def handle(self, *args, **options):
+        resultado = executar_benchmark_emissao(
+            notas=options['notas'], tamanho_lote=options['tamanho_lote'],
+            workers=options['workers'], itens_por_nota=options['itens'],
+            url_sefaz=options['url_sefaz'],
+            latencia=(options['latencia_min'], max(
+                options['latencia_min'], options['latencia_max'])),
+            taxa_rejeicao=options['taxa_rejeicao'], tempo_medio=0)
+
+        self.stdout.write(u'NF-e emitidas: %(notas)s em %(lotes)s lotes (%(autorizadas)s autorizadas)' % resultado)
+        self.stdout.write(u'Duração: %(duracao).3fs' % resultado)
+        self.stdout.write(u'NF-e/segundo: %(notas_por_segundo).1f' % resultado)
+        self.stdout.write(u'Latência por lote p50: %.1fms, p95: %.1fms' % (
+            resultado['latencia_p50'] * 1000, resultado['latencia_p95'] * 1000))
+        self.stdout.write(u'Memória por NF-e: %(memoria_por_nota_kb).1f KB' % resultado)
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosige.apps.fiscal.emissao_lote import TransmissorLoteNFe
+from djangosige.apps.fiscal.numeracao import inutilizar_faixas_pendentes, JUSTIFICATIVA_INUTILIZACAO_PADRAO
+
+
+class Command(BaseCommand):
+    help = u'Inutiliza na SEFAZ as faixas de numeração de NF-e liberadas ou puladas (pendentes).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--justificativa', default=JUSTIFICATIVA_INUTILIZACAO_PADRAO,
+                            help=u'Justificativa enviada à SEFAZ (mínimo 15 caracteres).')
+        parser.add_argument('--url-sefaz', default=None,
+                            help=u'Endpoint SOAP alternativo (ex.: simulador local da SEFAZ).')
+
+    def handle(self, *args, **options):
+        if len(options['justificativa']) < 15:
+            raise CommandError(u'A justificativa deve ter no mínimo 15 caracteres.')
+        enviados = inutilizar_faixas_pendentes(
+            TransmissorLoteNFe(url_sefaz=options['url_sefaz']), options['justificativa'])
+        self.stdout.write(u'Pedidos de inutilização enviados: %s' % enviados)
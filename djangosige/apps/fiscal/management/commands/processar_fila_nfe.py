@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from djangosige.apps.fiscal.emissao_lote import processar_fila, enfileirar_notas, TransmissorLoteNFe, TAMANHO_MAXIMO_LOTE
+from djangosige.apps.fiscal.models import NotaFiscal
+
+
+class Command(BaseCommand):
+    help = u'Processa a fila de emissão de NF-e: monta e envia os lotes e consulta os recibos pendentes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help=u'Quantidade de lotes transmitidos em paralelo.')
+        parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_MAXIMO_LOTE,
+                            help=u'Quantidade máxima de NF-e por lote (máx. 50).')
+        parser.add_argument('--intervalo', type=float, default=5,
+                            help=u'Segundos entre as passagens no modo contínuo.')
+        parser.add_argument('--continuo', action='store_true',
+                            help=u'Continua processando a fila até ser interrompido.')
+        parser.add_argument('--enfileirar-validadas', action='store_true',
+                            help=u'Inclui na fila todas as NF-e com status "Validada".')
+        parser.add_argument('--url-sefaz', default=None,
+                            help=u'Endpoint SOAP alternativo (ex.: simulador local da SEFAZ).')
+
+    def handle(self, *args, **options):
+        tamanho_lote = max(1, min(options['tamanho_lote'], TAMANHO_MAXIMO_LOTE))
+        transmissor = TransmissorLoteNFe(url_sefaz=options['url_sefaz'])
+
+        if options['enfileirar_validadas']:
+            notas = list(NotaFiscal.objects.filter(status=u'V').only('pk'))
+            enfileirar_notas(notas)
+            self.stdout.write(u'%s NF-e incluídas na fila.' % len(notas))
+
+        while True:
+            enviados, consultados = processar_fila(
+                transmissor, workers=options['workers'], tamanho_lote=tamanho_lote)
+            if enviados or consultados:
+                self.stdout.write(u'Lotes enviados: %s, recibos consultados: %s' % (
+                    enviados, consultados))
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from django.core.management.base import BaseCommand
+
+from djangosige.apps.fiscal.simulador_sefaz import SimuladorSEFAZ, criar_servidor_simulador
+
+
+class Command(BaseCommand):
+    help = u'Sobe um simulador local dos web services NF-e 4.00 da SEFAZ (autorização, recibo, consulta, inutilização e eventos).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endereco', default='127.0.0.1')
+        parser.add_argument('--porta', type=int, default=8099)
+        parser.add_argument('--latencia-min', type=float, default=0,
+                            help=u'Latência mínima por requisição, em segundos.')
+        parser.add_argument('--latencia-max', type=float, default=0,
+                            help=u'Latência máxima por requisição, em segundos.')
+        parser.add_argument('--taxa-rejeicao', type=float, default=0,
+                            help=u'Fração (0 a 1) das NF-e rejeitadas.')
+        parser.add_argument('--cstat-rejeicao', default='539',
+                            help=u'cStat retornado para as NF-e rejeitadas.')
+        parser.add_argument('--tempo-medio', type=int, default=1,
+                            help=u'tMed informado no recibo do lote.')
+        parser.add_argument('--tempo-processamento', type=float, default=0,
+                            help=u'Segundos em que o lote fica "em processamento" (cStat 105).')
+        parser.add_argument('--semente', type=int, default=None)
+
+    def handle(self, *args, **options):
+        simulador = SimuladorSEFAZ(
+            latencia=(options['latencia_min'], max(
+                options['latencia_min'], options['latencia_max'])),
+            taxa_rejeicao=options['taxa_rejeicao'],
+            cstat_rejeicao=options['cstat_rejeicao'],
+            tempo_medio=options['tempo_medio'],
+            tempo_processamento=options['tempo_processamento'],
+            semente=options['semente'])
+        servidor = criar_servidor_simulador(
+            simulador, options['endereco'], options['porta'])
+        self.stdout.write(u'Simulador SEFAZ em http://%s:%s/ (use --url-sefaz no processar_fila_nfe)' %
+                          servidor.server_address[:2])
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0004_pessoa_documento_digitos'),
+        ('fiscal', '0003_auto_20170915_0904'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoteNFe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True,
+                                           primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('0', 'Montado'), ('1', 'Enviado (aguardando retorno)'), (
+                    '2', 'Processado'), ('3', 'Erro no envio')], default='0', max_length=1)),
+                ('recibo', models.CharField(blank=True, max_length=15, null=True)),
+                ('tempo_medio', models.PositiveIntegerField(default=0)),
+                ('tentativas_consulta', models.PositiveIntegerField(default=0)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('data_envio', models.DateTimeField(blank=True, null=True)),
+                ('proxima_consulta', models.DateTimeField(
+                    blank=True, db_index=True, null=True)),
+                ('motivo', models.TextField(blank=True, null=True)),
+                ('emitente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL,
+                                               related_name='lotes_nfe', to='cadastro.Empresa')),
+            ],
+            options={
+                'verbose_name': 'Lote de NF-e',
+            },
+        ),
+        migrations.CreateModel(
+            name='FilaEmissaoNFe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True,
+                                           primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('P', 'Pendente'), ('L', 'Em lote'), ('A', 'Autorizada'), (
+                    'D', 'Denegada'), ('R', 'Rejeitada')], db_index=True, default='P', max_length=1)),
+                ('tentativas', models.PositiveIntegerField(default=0)),
+                ('data_inclusao', models.DateTimeField(auto_now_add=True)),
+                ('data_processamento', models.DateTimeField(blank=True, null=True)),
+                ('mensagem', models.TextField(blank=True, null=True)),
+                ('lote', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL,
+                                           related_name='itens_fila', to='fiscal.LoteNFe')),
+                ('nota', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE,
+                                              related_name='fila_emissao', to='fiscal.NotaFiscal')),
+            ],
+            options={
+                'verbose_name': 'Fila de Emissão de NF-e',
+                'ordering': ('pk',),
+            },
+        ),
+    ]
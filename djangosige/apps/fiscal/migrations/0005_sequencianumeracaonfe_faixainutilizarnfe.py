@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cadastro', '0004_pessoa_documento_digitos'),
+        ('fiscal', '0004_lotenfe_filaemissaonfe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenciaNumeracaoNFe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True,
+                                           primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('55', 'NF-e (55)'), ('65', 'NFC-e (65)')],
+                                            default='55', max_length=2)),
+                ('serie', models.CharField(max_length=3)),
+                ('proximo_numero', models.PositiveIntegerField(default=1)),
+                ('emitente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                               related_name='sequencias_nfe', to='cadastro.Empresa')),
+            ],
+            options={
+                'verbose_name': 'Sequência de Numeração de NF-e',
+                'unique_together': {('emitente', 'modelo', 'serie')},
+            },
+        ),
+        migrations.CreateModel(
+            name='FaixaInutilizarNFe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True,
+                                           primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('55', 'NF-e (55)'), ('65', 'NFC-e (65)')],
+                                            default='55', max_length=2)),
+                ('serie', models.CharField(max_length=3)),
+                ('numero_inicial', models.PositiveIntegerField()),
+                ('numero_final', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('P', 'Pendente'), ('I', 'Inutilizada'), (
+                    'E', 'Erro na inutilização')], db_index=True, default='P', max_length=1)),
+                ('motivo', models.CharField(blank=True, max_length=255, null=True)),
+                ('protocolo', models.CharField(blank=True, max_length=15, null=True)),
+                ('mensagem', models.TextField(blank=True, null=True)),
+                ('data_inclusao', models.DateTimeField(auto_now_add=True)),
+                ('data_inutilizacao', models.DateTimeField(blank=True, null=True)),
+                ('emitente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                               related_name='faixas_inutilizar_nfe', to='cadastro.Empresa')),
+            ],
+            options={
+                'verbose_name': 'Faixa de Numeração a Inutilizar',
+                'ordering': ('emitente', 'modelo', 'serie', 'numero_inicial'),
+            },
+        ),
+    ]
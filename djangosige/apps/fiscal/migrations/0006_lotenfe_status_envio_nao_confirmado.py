@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiscal', '0005_sequencianumeracaonfe_faixainutilizarnfe'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lotenfe',
+            name='status',
+            field=models.CharField(choices=[('0', 'Montado'), ('1', 'Enviado (aguardando retorno)'), (
+                '2', 'Processado'), ('3', 'Erro no envio'), ('4', 'Envio não confirmado')], default='0', max_length=1),
+        ),
+    ]
@@ -5,6 +5,8 @@ from .natureza_operacao import NaturezaOperacao
 from .nota_fiscal import NotaFiscal
 from .item_nota_fiscal import ItemNotaFiscal
 from .grupo_fiscal import GrupoFiscal
+from .fila_emissao import LoteNFe, FilaEmissaoNFe
+from .numeracao import SequenciaNumeracaoNFe, FaixaInutilizarNFe
 
 # Importando os modelos de tributos com os nomes corretos (prefixo "Tributo")
 # Certifique-se de que o arquivo 'tributos.py' (ou arquivos individuais se você os separou)
@@ -23,6 +25,10 @@ __all__ = [
     'NotaFiscal',
     'ItemNotaFiscal',
     'GrupoFiscal',
+    'LoteNFe',
+    'FilaEmissaoNFe',
+    'SequenciaNumeracaoNFe',
+    'FaixaInutilizarNFe',
     'TributoICMS', 
     'TributoICMSUFDest', 
     'TributoICMSSN', 
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+from django.db import models
+
+STATUS_LOTE_ESCOLHAS = (
+    (u'0', u'Montado'),
+    (u'1', u'Enviado (aguardando retorno)'),
+    (u'2', u'Processado'),
+    (u'3', u'Erro no envio'),
+    (u'4', u'Envio não confirmado'),
+)
+
+STATUS_FILA_ESCOLHAS = (
+    (u'P', u'Pendente'),
+    (u'L', u'Em lote'),
+    (u'A', u'Autorizada'),
+    (u'D', u'Denegada'),
+    (u'R', u'Rejeitada'),
+)
+
+
+class LoteNFe(models.Model):
+    emitente = models.ForeignKey(
+        'cadastro.Empresa', related_name='lotes_nfe', on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(
+        max_length=1, choices=STATUS_LOTE_ESCOLHAS, default=u'0')
+    recibo = models.CharField(max_length=15, null=True, blank=True)
+    tempo_medio = models.PositiveIntegerField(default=0)
+    tentativas_consulta = models.PositiveIntegerField(default=0)
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    data_envio = models.DateTimeField(null=True, blank=True)
+    proxima_consulta = models.DateTimeField(
+        null=True, blank=True, db_index=True)
+    motivo = models.TextField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Lote de NF-e"
+
+    def __str__(self):
+        s = u'Lote %s (%s)' % (self.pk, self.get_status_display())
+        return s
+
+
+class FilaEmissaoNFe(models.Model):
+    nota = models.OneToOneField(
+        'fiscal.NotaFiscal', related_name='fila_emissao', on_delete=models.CASCADE)
+    lote = models.ForeignKey(LoteNFe, related_name='itens_fila',
+                             on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(
+        max_length=1, choices=STATUS_FILA_ESCOLHAS, default=u'P', db_index=True)
+    tentativas = models.PositiveIntegerField(default=0)
+    data_inclusao = models.DateTimeField(auto_now_add=True)
+    data_processamento = models.DateTimeField(null=True, blank=True)
+    mensagem = models.TextField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Fila de Emissão de NF-e"
+        ordering = ('pk',)
+
+    def __str__(self):
+        s = u'Fila NF-e %s (%s)' % (self.nota_id, self.get_status_display())
+        return s
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from decimal import Decimal
@@ -48,6 +48,35 @@ except ImportError as e:
     raise ImportError(f"Não foi possível importar os bindings da nfelib de fiscal.compat. Verifique o arquivo compat.py e a instalação da nfelib. Erro original: {e}")
 
 
+# Campo de total da NotaFiscal -> coluna somada dos itens (ICMSTot)
+TOTAIS_ITENS_NOTA = (
+    ('valor_total_produtos', 'valor_total'),
+    ('valor_bc_icms', 'icms__valor_bc'),
+    ('valor_icms', 'icms__valor_icms'),
+    ('valor_icms_desonerado', 'icms__valor_icms_desonerado'),
+    ('valor_fcp', 'icms__valor_fcp'),
+    ('valor_bc_st', 'icms__valor_bc_st'),
+    ('valor_st', 'icms__valor_st'),
+    ('valor_fcp_st', 'icms__valor_fcp_st'),
+    ('valor_fcp_st_retido', 'icms__valor_fcp_st_retido'),
+    ('valor_ipi', 'ipi__valor_ipi'),
+    ('valor_ipi_devolvido', 'ipi__valor_ipi_devolvido'),
+    ('valor_pis', 'pis__valor_pis'),
+    ('valor_cofins', 'cofins__valor_cofins'),
+)
+
+
+def configuracao_servico_emitente(emitente):
+    return {
+        'caminho_certificado_a1': settings.NFE_CONFIG['CERTIFICADO']['arquivo'], 
+        'senha_certificado_a1': settings.NFE_CONFIG['CERTIFICADO']['senha'],     
+        'ambiente_sefaz': settings.NFE_CONFIG['AMBIENTE_NFE'],                 
+        'cnpj_empresa_emitente': emitente.cnpj_apenas_numeros,        
+        'uf_sigla_emitente': emitente.endereco.get('uf_sigla') if emitente.endereco else None, 
+        'versao_leiaute': settings.NFE_CONFIG['VERSAO_LEIAUTE_NFE'], 
+    }
+
+
 def arquivo_proc_path(instance, filename):
     return f'fiscal/arquivos_processados_obsoletos/{filename}'
 
@@ -143,14 +172,7 @@ class NotaFiscal(models.Model):
     def get_configuracao_servico(self):
         if not self.emitente:
             raise ValueError("Emitente não definido para a Nota Fiscal. Impossível obter configuração do serviço.")
-        return {
-            'caminho_certificado_a1': settings.NFE_CONFIG['CERTIFICADO']['arquivo'], 
-            'senha_certificado_a1': settings.NFE_CONFIG['CERTIFICADO']['senha'],     
-            'ambiente_sefaz': settings.NFE_CONFIG['AMBIENTE_NFE'],                 
-            'cnpj_empresa_emitente': self.emitente.cnpj_apenas_numeros,        
-            'uf_sigla_emitente': self.emitente.endereco.get('uf_sigla') if self.emitente.endereco else None, 
-            'versao_leiaute': settings.NFE_CONFIG['VERSAO_LEIAUTE_NFE'], 
-        }
+        return configuracao_servico_emitente(self.emitente)
 
     def _determinar_destino(self):
         id_dest = '1' 
@@ -176,29 +198,25 @@ class NotaFiscal(models.Model):
         ind_pres = map_presenca.get(modalidade, '9')
         return id_dest, ind_final, ind_pres
 
-    def calcular_totais(self):
-        from django.db.models import Sum
-        itens_qs = self.itens.all()
-        
-        if not itens_qs.exists():
-            for field_name in [f.name for f in self._meta.get_fields() if isinstance(f, models.DecimalField) and 'valor_' in f.name]:
-                setattr(self, field_name, Decimal('0.00'))
+    def calcular_totais(self, salvar=True):
+        """
+        Recalcula os totais (ICMSTot) a partir dos itens e dos seus tributos
+        em uma unica consulta, somando cada coluna com Decimal exato. Com
+        salvar=True, grava apenas os campos de totais.
+        """
+        campos = [campo for campo, _ in TOTAIS_ITENS_NOTA]
+        if self.pk:
+            linhas = self.itens.values_list(*[lookup for _, lookup in TOTAIS_ITENS_NOTA])
         else:
-            self.valor_total_produtos = itens_qs.aggregate(total=Sum('valor_total'))['total'] or Decimal('0.00')
-            self.valor_bc_icms = sum(getattr(item.icms, 'valor_bc', Decimal('0.00')) for item in itens_qs if hasattr(item, 'icms') and item.icms)
-            self.valor_icms = sum(getattr(item.icms, 'valor_icms', Decimal('0.00')) for item in itens_qs if hasattr(item, 'icms') and item.icms)
-            self.valor_icms_desonerado = sum(getattr(item.icms, 'valor_icms_desonerado', Decimal('0.00')) for item in itens_qs if hasattr(item, 'icms') and item.icms)
-            self.valor_fcp = sum(getattr(item.icms, 'valor_fcp', Decimal('0.00')) for item in itens_qs if hasattr(item, 'icms') and item.icms)
-            self.valor_bc_st = sum(getattr(item.icms, 'valor_bc_st', Decimal('0.00')) for item in itens_qs if hasattr(item, 'icms') and item.icms)
-            self.valor_st = sum(getattr(item.icms, 'valor_st', Decimal('0.00')) for item in itens_qs if hasattr(item, 'icms') and item.icms)
-            self.valor_fcp_st = sum(getattr(item.icms, 'valor_fcp_st', Decimal('0.00')) for item in itens_qs if hasattr(item, 'icms') and item.icms)
-            self.valor_fcp_st_retido = sum(getattr(item.icms, 'valor_fcp_st_retido', Decimal('0.00')) for item in itens_qs if hasattr(item, 'icms') and item.icms)
-            self.valor_imposto_importacao = sum(getattr(item, 'imposto_importacao_valor_ii', Decimal('0.00')) for item in itens_qs)
-            self.valor_ipi = sum(getattr(item.ipi, 'valor_ipi', Decimal('0.00')) for item in itens_qs if hasattr(item, 'ipi') and item.ipi)
-            self.valor_ipi_devolvido = sum(getattr(item.ipi, 'valor_ipi_devolvido', Decimal('0.00')) for item in itens_qs if hasattr(item, 'ipi') and item.ipi)
-            self.valor_pis = sum(getattr(item.pis, 'valor_pis', Decimal('0.00')) for item in itens_qs if hasattr(item, 'pis') and item.pis)
-            self.valor_cofins = sum(getattr(item.cofins, 'valor_cofins', Decimal('0.00')) for item in itens_qs if hasattr(item, 'cofins') and item.cofins)
-        
+            linhas = []
+
+        totais = [Decimal('0.00')] * len(campos)
+        for linha in linhas:
+            totais = [total + valor if valor is not None else total
+                      for total, valor in zip(totais, linha)]
+        for campo, total in zip(campos, totais):
+            setattr(self, campo, total)
+
         self.valor_total_nota = (
             self.valor_total_produtos - 
             (self.valor_desconto or Decimal('0.00')) + 
@@ -213,6 +231,9 @@ class NotaFiscal(models.Model):
             (self.valor_fcp_st or Decimal('0.00'))
         )
 
+        if salvar and self.pk:
+            self.save(update_fields=campos + ['valor_total_nota'])
+
     def clean(self):
         super().clean()
         if self.status not in ['E', 'R']:
@@ -240,6 +261,23 @@ class NotaFiscal(models.Model):
                 raise ValidationError({'numero': f'Já existe uma Nota Fiscal com este número ({self.numero}), série ({self.serie}) para o emitente selecionado.'})
 
     def save(self, *args, **kwargs):
+        if self.pk is None and self.emitente_id and self.serie:
+            from ..numeracao import proximo_numero, registrar_numero_informado
+            numerar = self.numero is None
+            try:
+                # Reserva do numero e INSERT na mesma transacao: se a gravacao
+                # falhar, o numero volta para a sequencia e nao se perde
+                with transaction.atomic():
+                    if numerar:
+                        self.numero = proximo_numero(self.emitente_id, self.serie)
+                    else:
+                        registrar_numero_informado(self.emitente_id, self.serie, self.numero)
+                    super().save(*args, **kwargs)
+            except Exception:
+                if numerar:
+                    self.numero = None
+                raise
+            return
         super().save(*args, **kwargs)
 
     def _get_icms_nfelib(self, icms_model_instance, item_bc_icms=Decimal('0.00'), item_valor_icms=Decimal('0.00'), item_valor_fcp=Decimal('0.00'), item_bc_icms_st=Decimal('0.00'), item_valor_icms_st=Decimal('0.00'), item_valor_fcp_st=Decimal('0.00')):
@@ -548,7 +586,9 @@ class NotaFiscal(models.Model):
         inf_nfe.dest = dest
 
         inf_nfe.det = []
-        for index, item_model in enumerate(self.itens.all().order_by('ordem'), start=1): 
+        itens = self.itens.select_related(
+            'produto', 'icms__grupo_fiscal', 'ipi', 'pis', 'cofins').order_by('ordem')
+        for index, item_model in enumerate(itens, start=1): 
             det_nfelib_item = Tnfe.InfNFe.Det() 
             det_nfelib_item.nItem = str(index)
             
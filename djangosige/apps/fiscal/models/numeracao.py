@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from django.db import models
+
+MOD_DOCUMENTO_ESCOLHAS = (
+    (u'55', u'NF-e (55)'),
+    (u'65', u'NFC-e (65)'),
+)
+
+STATUS_FAIXA_INUTILIZAR_ESCOLHAS = (
+    (u'P', u'Pendente'),
+    (u'I', u'Inutilizada'),
+    (u'E', u'Erro na inutilização'),
+)
+
+
+class SequenciaNumeracaoNFe(models.Model):
+    emitente = models.ForeignKey(
+        'cadastro.Empresa', related_name='sequencias_nfe', on_delete=models.CASCADE)
+    modelo = models.CharField(
+        max_length=2, choices=MOD_DOCUMENTO_ESCOLHAS, default=u'55')
+    serie = models.CharField(max_length=3)
+    proximo_numero = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Sequência de Numeração de NF-e"
+        unique_together = (('emitente', 'modelo', 'serie'),)
+
+    def __str__(self):
+        s = u'Modelo %s / Série %s: próximo %s' % (
+            self.modelo, self.serie, self.proximo_numero)
+        return s
+
+
+class FaixaInutilizarNFe(models.Model):
+    emitente = models.ForeignKey(
+        'cadastro.Empresa', related_name='faixas_inutilizar_nfe', on_delete=models.CASCADE)
+    modelo = models.CharField(
+        max_length=2, choices=MOD_DOCUMENTO_ESCOLHAS, default=u'55')
+    serie = models.CharField(max_length=3)
+    numero_inicial = models.PositiveIntegerField()
+    numero_final = models.PositiveIntegerField()
+    status = models.CharField(
+        max_length=1, choices=STATUS_FAIXA_INUTILIZAR_ESCOLHAS, default=u'P', db_index=True)
+    motivo = models.CharField(max_length=255, null=True, blank=True)
+    protocolo = models.CharField(max_length=15, null=True, blank=True)
+    mensagem = models.TextField(null=True, blank=True)
+    data_inclusao = models.DateTimeField(auto_now_add=True)
+    data_inutilizacao = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Faixa de Numeração a Inutilizar"
+        ordering = ('emitente', 'modelo', 'serie', 'numero_inicial')
+
+    def __str__(self):
+        s = u'Série %s: %s a %s (%s)' % (
+            self.serie, self.numero_inicial, self.numero_final, self.get_status_display())
+        return s
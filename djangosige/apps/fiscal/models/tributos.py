@@ -305,6 +305,7 @@ class TributoIPI(models.Model):
     incluir_bc_icmsst = models.BooleanField(_('IPI na BC ICMS ST?'), default=False)
     valor_bc = models.DecimalField(_('Valor Base de Cálculo IPI (Item)'), max_digits=15, decimal_places=2, default=Decimal('0.00'))
     valor_ipi = models.DecimalField(_('Valor IPI (Item)'), max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    valor_ipi_devolvido = models.DecimalField(_('Valor IPI Devolvido (Item)'), max_digits=15, decimal_places=2, default=Decimal('0.00'))
 
     class Meta:
         verbose_name = _("Tributo IPI (Item)")
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from .models import NotaFiscal, SequenciaNumeracaoNFe, FaixaInutilizarNFe
+from .models.nota_fiscal import configuracao_servico_emitente
+
+logger = logging.getLogger(__name__)
+
+NUMERO_MAXIMO_NFE = 999999999
+
+# Status em que o numero ja foi usado perante a SEFAZ e nao pode ser inutilizado
+STATUS_NUMERO_UTILIZADO = (u'A', u'C', u'D')
+
+JUSTIFICATIVA_INUTILIZACAO_PADRAO = u'Numeracao nao utilizada pelo sistema emissor'
+
+
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
+
+
+def _bloquear_sequencia(emitente_id, serie, modelo):
+    """
+    Retorna a sequencia (emitente, modelo, serie) bloqueada ate o fim da
+    transacao atual. Na primeira utilizacao a sequencia de NF-e continua a
+    partir do maior numero ja gravado nas notas do emitente/serie.
+    """
+    filtro = {'emitente_id': emitente_id, 'modelo': modelo, 'serie': serie}
+    sequencia = SequenciaNumeracaoNFe.objects.select_for_update().filter(**filtro).first()
+    if sequencia is not None:
+        return sequencia
+
+    ultimo = None
+    if modelo == u'55':
+        # NotaFiscal ainda nao guarda o modelo: todas sao NF-e (55)
+        ultimo = NotaFiscal.objects.filter(
+            emitente_id=emitente_id, serie=serie).aggregate(ultimo=Max('numero'))['ultimo']
+    try:
+        with transaction.atomic():
+            return SequenciaNumeracaoNFe.objects.create(
+                proximo_numero=(ultimo or 0) + 1, **filtro)
+    except IntegrityError:
+        # Criada por outro processo ao mesmo tempo
+        return SequenciaNumeracaoNFe.objects.select_for_update().get(**filtro)
+
+
+def reservar_numeros(emitente, serie, quantidade=1, modelo=u'55'):
+    """
+    Reserva um bloco de quantidade numeros consecutivos e retorna o range.
+    Apenas a linha da sequencia fica bloqueada, pelo tempo de um UPDATE.
+    """
+    with transaction.atomic():
+        sequencia = _bloquear_sequencia(_pk(emitente), serie, modelo)
+        inicio = sequencia.proximo_numero
+        fim = inicio + quantidade - 1
+        if fim > NUMERO_MAXIMO_NFE:
+            raise ValueError(u'Numeração da série %s esgotada (máximo %s).' % (
+                serie, NUMERO_MAXIMO_NFE))
+        sequencia.proximo_numero = fim + 1
+        sequencia.save(update_fields=['proximo_numero'])
+    return range(inicio, fim + 1)
+
+
+def proximo_numero(emitente, serie, modelo=u'55'):
+    return reservar_numeros(emitente, serie, 1, modelo)[0]
+
+
+def numerar_notas(notas, modelo=u'55'):
+    """
+    Atribui numeros as notas ainda sem numero, reservando um bloco por
+    emitente/serie, e grava tudo com um bulk_update na mesma transacao.
+    """
+    grupos = defaultdict(list)
+    for nota in notas:
+        if nota.numero is None and nota.emitente_id and nota.serie:
+            grupos[(nota.emitente_id, nota.serie)].append(nota)
+
+    numeradas = []
+    try:
+        # Reservas e bulk_update na mesma transacao: se a gravacao falhar,
+        # os numeros voltam para as sequencias
+        with transaction.atomic():
+            for (emitente_id, serie), notas_grupo in grupos.items():
+                numeros = reservar_numeros(emitente_id, serie, len(notas_grupo), modelo)
+                for nota, numero in zip(notas_grupo, numeros):
+                    nota.numero = numero
+                    numeradas.append(nota)
+            NotaFiscal.objects.bulk_update(numeradas, ['numero'])
+    except Exception:
+        for nota in numeradas:
+            nota.numero = None
+        raise
+    return numeradas
+
+
+def agrupar_faixas(numeros):
+    """[1, 2, 3, 7, 8] -> [(1, 3), (7, 8)]"""
+    faixas = []
+    for numero in sorted(set(numeros)):
+        if faixas and numero == faixas[-1][1] + 1:
+            faixas[-1] = (faixas[-1][0], numero)
+        else:
+            faixas.append((numero, numero))
+    return faixas
+
+
+def liberar_numeros(emitente, serie, numeros, modelo=u'55', motivo=None):
+    """Registra numeros reservados que nao serao usados, para inutilizacao."""
+    FaixaInutilizarNFe.objects.bulk_create([
+        FaixaInutilizarNFe(emitente_id=_pk(emitente), modelo=modelo, serie=serie,
+                           numero_inicial=inicial, numero_final=final, motivo=motivo)
+        for inicial, final in agrupar_faixas(numeros)])
+
+
+def registrar_numero_informado(emitente, serie, numero, modelo=u'55'):
+    """
+    Numero digitado manualmente: avanca a sequencia e registra a faixa
+    pulada (se houver) para inutilizacao.
+    """
+    with transaction.atomic():
+        sequencia = _bloquear_sequencia(_pk(emitente), serie, modelo)
+        if numero < sequencia.proximo_numero:
+            return
+        if numero > sequencia.proximo_numero:
+            FaixaInutilizarNFe.objects.create(
+                emitente_id=_pk(emitente), modelo=modelo, serie=serie,
+                numero_inicial=sequencia.proximo_numero, numero_final=numero - 1,
+                motivo=u'Numeração pulada')
+        sequencia.proximo_numero = numero + 1
+        sequencia.save(update_fields=['proximo_numero'])
+
+
+def liberar_numero_nota_excluida(sender, instance, **kwargs):
+    if instance.numero and instance.emitente_id and instance.serie and \
+            instance.status not in STATUS_NUMERO_UTILIZADO:
+        liberar_numeros(instance.emitente_id, instance.serie, [instance.numero],
+                        motivo=u'Nota fiscal excluída')
+
+
+def conectar_sinais_numeracao():
+    post_delete.connect(liberar_numero_nota_excluida, sender=NotaFiscal,
+                        dispatch_uid='numeracao_post_delete_notafiscal')
+
+
+def inutilizar_faixas_pendentes(transmissor, justificativa=JUSTIFICATIVA_INUTILIZACAO_PADRAO):
+    """
+    Junta as faixas pendentes contiguas de cada emitente/modelo/serie e
+    envia um pedido de inutilizacao por faixa resultante. Retorna a
+    quantidade de pedidos enviados.
+    """
+    pendentes = defaultdict(list)
+    for faixa in FaixaInutilizarNFe.objects.filter(status=u'P').select_related('emitente'):
+        pendentes[(faixa.emitente_id, faixa.modelo, faixa.serie)].append(faixa)
+
+    ano = timezone.now().year
+    enviados = 0
+    for faixas in pendentes.values():
+        faixas.sort(key=lambda f: f.numero_inicial)
+        blocos = []
+        for faixa in faixas:
+            if blocos and faixa.numero_inicial <= blocos[-1][1] + 1:
+                blocos[-1][1] = max(blocos[-1][1], faixa.numero_final)
+                blocos[-1][2].append(faixa)
+            else:
+                blocos.append([faixa.numero_inicial, faixa.numero_final, [faixa]])
+
+        for inicial, final, faixas_bloco in blocos:
+            try:
+                config = configuracao_servico_emitente(faixas_bloco[0].emitente)
+                retorno = transmissor.inutilizar_faixa(
+                    config, ano, faixas_bloco[0].modelo, faixas_bloco[0].serie, inicial, final, justificativa)
+            except Exception as e:
+                logger.error(u"Erro ao inutilizar a faixa %s-%s: %s", inicial, final, e, exc_info=True)
+                retorno = None
+            enviados += 1
+
+            agora = timezone.now()
+            for faixa in faixas_bloco:
+                if retorno is not None and retorno.sucesso:
+                    faixa.status = u'I'
+                    faixa.protocolo = retorno.protocolo
+                    faixa.data_inutilizacao = agora
+                else:
+                    faixa.status = u'E'
+                faixa.mensagem = retorno.motivo if retorno is not None else u'Erro de sistema durante o envio.'
+            FaixaInutilizarNFe.objects.bulk_update(
+                faixas_bloco, ['status', 'protocolo', 'data_inutilizacao', 'mensagem'])
+    return enviados
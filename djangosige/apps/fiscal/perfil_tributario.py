@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+
+from .models import GrupoFiscal, TributoICMS, TributoICMSSN, TributoICMSUFDest, \
+    TributoIPI, TributoPIS, TributoCOFINS
+
+# Atributo do PerfilTributario -> modelo com a configuracao padrao do grupo
+TRIBUTOS_PERFIL = (
+    ('icms', TributoICMS),
+    ('icms_sn', TributoICMSSN),
+    ('icms_uf_dest', TributoICMSUFDest),
+    ('ipi', TributoIPI),
+    ('pis', TributoPIS),
+    ('cofins', TributoCOFINS),
+)
+
+PERFIL_TRIBUTARIO_VERSAO_KEY = 'perfil_tributario_versao'
+PERFIL_TRIBUTARIO_CACHE_TIMEOUT = 60 * 5
+
+
+class PerfilTributario(object):
+    """
+    Configuracoes padrao (linhas sem item_nota_fiscal) de um GrupoFiscal.
+    Tributos nao cadastrados para o grupo ficam como None.
+    """
+
+    def __init__(self, grupo_fiscal_id=None, **tributos):
+        self.grupo_fiscal_id = grupo_fiscal_id
+        for nome, _ in TRIBUTOS_PERFIL:
+            setattr(self, nome, tributos.get(nome))
+
+
+PERFIL_VAZIO = PerfilTributario()
+
+
+def get_versao_perfis():
+    versao = cache.get(PERFIL_TRIBUTARIO_VERSAO_KEY)
+    if versao is None:
+        cache.add(PERFIL_TRIBUTARIO_VERSAO_KEY, int(time.time() * 1000), None)
+        versao = cache.get(PERFIL_TRIBUTARIO_VERSAO_KEY)
+    return versao
+
+
+def _incrementar_versao_perfis():
+    try:
+        cache.incr(PERFIL_TRIBUTARIO_VERSAO_KEY)
+    except ValueError:
+        cache.delete(PERFIL_TRIBUTARIO_VERSAO_KEY)
+
+
+class CachePerfilTributario(object):
+    """
+    Memoriza, por processo, o PerfilTributario de cada GrupoFiscal. Os
+    perfis ausentes sao carregados juntos (uma consulta por tabela de
+    tributo para todos os grupos pedidos). Os sinais de save/delete dos
+    tributos e do grupo trocam a versao guardada no cache do Django, que
+    descarta os perfis de todos os processos; cada perfil tambem expira
+    apos PERFIL_TRIBUTARIO_CACHE_TIMEOUT segundos.
+    """
+
+    def __init__(self):
+        self._perfis = {}
+        self._versao = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def carregar(grupos_ids):
+        tributos = {grupo_id: {} for grupo_id in grupos_ids}
+        for nome, modelo in TRIBUTOS_PERFIL:
+            configs = modelo.objects.filter(
+                grupo_fiscal_id__in=grupos_ids,
+                item_nota_fiscal__isnull=True).order_by('-pk')
+            # Mesma escolha de .filter(grupo_fiscal=...).first(): menor pk
+            for config in configs:
+                tributos[config.grupo_fiscal_id][nome] = config
+        return {grupo_id: PerfilTributario(grupo_id, **valores)
+                for grupo_id, valores in tributos.items()}
+
+    def obter(self, grupo_fiscal):
+        grupo_id = getattr(grupo_fiscal, 'pk', grupo_fiscal)
+        if grupo_id is None:
+            return PERFIL_VAZIO
+        return self.obter_varios([grupo_id])[grupo_id]
+
+    def obter_varios(self, grupos_ids):
+        grupos_ids = set(grupos_ids) - {None}
+        versao = get_versao_perfis()
+        validade = time.monotonic() - getattr(
+            settings, 'PERFIL_TRIBUTARIO_CACHE_TIMEOUT', PERFIL_TRIBUTARIO_CACHE_TIMEOUT)
+        with self._lock:
+            if versao != self._versao:
+                self._perfis.clear()
+                self._versao = versao
+            perfis = {grupo_id: self._perfis[grupo_id][0] for grupo_id in grupos_ids
+                      if grupo_id in self._perfis and self._perfis[grupo_id][1] > validade}
+        faltantes = grupos_ids - set(perfis)
+        if faltantes:
+            carregados = self.carregar(faltantes)
+            carregado_em = time.monotonic()
+            with self._lock:
+                if self._versao == versao:
+                    self._perfis.update((grupo_id, (perfil, carregado_em))
+                                        for grupo_id, perfil in carregados.items())
+            perfis.update(carregados)
+        return perfis
+
+    def invalidar(self, grupo_fiscal_id):
+        with self._lock:
+            self._perfis.pop(grupo_fiscal_id, None)
+        _incrementar_versao_perfis()
+
+    def limpar(self):
+        with self._lock:
+            self._perfis.clear()
+        _incrementar_versao_perfis()
+
+
+cache_perfis_tributarios = CachePerfilTributario()
+
+
+def get_perfil_tributario(grupo_fiscal):
+    """Recebe um GrupoFiscal (ou o seu pk) e retorna o PerfilTributario."""
+    return cache_perfis_tributarios.obter(grupo_fiscal)
+
+
+def invalidar_perfil_tributario(sender, instance, **kwargs):
+    if sender is GrupoFiscal:
+        cache_perfis_tributarios.invalidar(instance.pk)
+    elif instance.item_nota_fiscal_id is None:
+        # A configuracao pode ter trocado de grupo, entao o grupo anterior
+        # tambem fica desatualizado.
+        cache_perfis_tributarios.limpar()
+
+
+def conectar_sinais_perfil_tributario():
+    for modelo in [GrupoFiscal] + [modelo for _, modelo in TRIBUTOS_PERFIL]:
+        post_save.connect(invalidar_perfil_tributario, sender=modelo,
+                          dispatch_uid='perfil_tributario_post_save_%s' % modelo.__name__)
+        post_delete.connect(invalidar_perfil_tributario, sender=modelo,
+                            dispatch_uid='perfil_tributario_post_delete_%s' % modelo.__name__)
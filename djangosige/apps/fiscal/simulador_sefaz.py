@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lxml import etree
+
+from .emissao_lote import NAMESPACE_NFE, NAMESPACE_SOAP
+
+NS = '{%s}' % NAMESPACE_NFE
+
+SERVICOS_SIMULADOR = {
+    'NfeAutorizacao': 'http://www.portalfiscal.inf.br/nfe/wsdl/NFeAutorizacao4',
+    'NfeRetAutorizacao': 'http://www.portalfiscal.inf.br/nfe/wsdl/NFeRetAutorizacao4',
+    'NfeConsultaProtocolo': 'http://www.portalfiscal.inf.br/nfe/wsdl/NFeConsultaProtocolo4',
+    'NfeInutilizacao': 'http://www.portalfiscal.inf.br/nfe/wsdl/NFeInutilizacao4',
+    'RecepcaoEvento': 'http://www.portalfiscal.inf.br/nfe/wsdl/NFeRecepcaoEvento4',
+}
+
+MOTIVOS_CSTAT = {
+    '100': u'Autorizado o uso da NF-e',
+    '101': u'Cancelamento de NF-e homologado',
+    '102': u'Inutilização de número homologado',
+    '103': u'Lote recebido com sucesso',
+    '104': u'Lote processado',
+    '105': u'Lote em processamento',
+    '106': u'Lote não localizado',
+    '110': u'Uso Denegado',
+    '128': u'Lote de Evento Processado',
+    '135': u'Evento registrado e vinculado a NF-e',
+    '217': u'Rejeição: NF-e não consta na base de dados da SEFAZ',
+    '539': u'Rejeição: Duplicidade de NF-e, com diferença na Chave de Acesso',
+}
+
+TP_EVENTO_CANCELAMENTO = '110111'
+
+
+class SimuladorSEFAZ(object):
+    """
+    Estado e regras do simulador local dos web services NF-e 4.00.
+
+    latencia: (minimo, maximo) em segundos aplicado a cada requisicao.
+    taxa_rejeicao: fracao das NF-e que recebem cstat_rejeicao.
+    tempo_processamento: segundos ate o lote sair de 105 (em processamento).
+    """
+
+    def __init__(self, latencia=(0, 0), taxa_rejeicao=0.0, cstat_rejeicao='539',
+                 tempo_medio=1, tempo_processamento=0, semente=None):
+        self.latencia = latencia
+        self.taxa_rejeicao = taxa_rejeicao
+        self.cstat_rejeicao = cstat_rejeicao
+        self.tempo_medio = tempo_medio
+        self.tempo_processamento = tempo_processamento
+        self.random = random.Random(semente)
+        self.lotes = {}
+        self.notas = {}
+        self._sequencia = 0
+        self._lock = threading.Lock()
+
+    def proximo_numero(self):
+        with self._lock:
+            self._sequencia += 1
+            return str(self._sequencia).zfill(15)
+
+    def aguardar_latencia(self):
+        minimo, maximo = self.latencia
+        if maximo:
+            time.sleep(self.random.uniform(minimo, maximo))
+
+    def processar(self, servico, dados):
+        self.aguardar_latencia()
+        metodo = {
+            'NfeAutorizacao': self.autorizacao,
+            'NfeRetAutorizacao': self.ret_autorizacao,
+            'NfeConsultaProtocolo': self.consulta_protocolo,
+            'NfeInutilizacao': self.inutilizacao,
+            'RecepcaoEvento': self.recepcao_evento,
+        }[servico]
+        return metodo(dados)
+
+    @staticmethod
+    def elemento(tag, pai=None, texto=None, **atributos):
+        if pai is None:
+            el = etree.Element(NS + tag, nsmap={None: NAMESPACE_NFE}, **atributos)
+        else:
+            el = etree.SubElement(pai, NS + tag, **atributos)
+        if texto is not None:
+            el.text = str(texto)
+        return el
+
+    def cabecalho(self, raiz, cstat, motivo=None):
+        self.elemento('tpAmb', raiz, '2')
+        self.elemento('verAplic', raiz, 'SIMULADOR')
+        self.elemento('cStat', raiz, cstat)
+        self.elemento('xMotivo', raiz, motivo or MOTIVOS_CSTAT.get(cstat, ''))
+        self.elemento('cUF', raiz, '35')
+        self.elemento('dhRecbto', raiz, datetime.now().isoformat(timespec='seconds'))
+
+    def prot_nfe(self, pai, chave):
+        cstat, protocolo = self.notas[chave]
+        prot = self.elemento('protNFe', pai, versao='4.00')
+        inf_prot = self.elemento('infProt', prot)
+        self.elemento('tpAmb', inf_prot, '2')
+        self.elemento('verAplic', inf_prot, 'SIMULADOR')
+        self.elemento('chNFe', inf_prot, chave)
+        self.elemento('dhRecbto', inf_prot, datetime.now().isoformat(timespec='seconds'))
+        if protocolo:
+            self.elemento('nProt', inf_prot, protocolo)
+        self.elemento('cStat', inf_prot, cstat)
+        self.elemento('xMotivo', inf_prot, MOTIVOS_CSTAT.get(cstat, ''))
+        return prot
+
+    def decidir_cstat(self):
+        if self.taxa_rejeicao and self.random.random() < self.taxa_rejeicao:
+            return self.cstat_rejeicao
+        return '100'
+
+    def autorizacao(self, envio):
+        chaves = []
+        for inf_nfe in envio.iter(NS + 'infNFe'):
+            chave = (inf_nfe.get('Id') or '')[3:]
+            cstat = self.decidir_cstat()
+            protocolo = self.proximo_numero() if cstat in ('100', '110') else None
+            with self._lock:
+                self.notas[chave] = (cstat, protocolo)
+            chaves.append(chave)
+
+        retorno = self.elemento('retEnviNFe', versao='4.00')
+        if envio.findtext(NS + 'indSinc') == '1':
+            self.cabecalho(retorno, '104')
+            for chave in chaves:
+                self.prot_nfe(retorno, chave)
+            return retorno
+
+        recibo = self.proximo_numero()
+        with self._lock:
+            self.lotes[recibo] = (time.time(), chaves)
+        self.cabecalho(retorno, '103')
+        inf_rec = self.elemento('infRec', retorno)
+        self.elemento('nRec', inf_rec, recibo)
+        self.elemento('tMed', inf_rec, self.tempo_medio)
+        return retorno
+
+    def ret_autorizacao(self, consulta):
+        recibo = consulta.findtext(NS + 'nRec')
+        retorno = self.elemento('retConsReciNFe', versao='4.00')
+        lote = self.lotes.get(recibo)
+        if lote is None:
+            self.cabecalho(retorno, '106')
+            return retorno
+        recebido_em, chaves = lote
+        if time.time() - recebido_em < self.tempo_processamento:
+            self.cabecalho(retorno, '105')
+            return retorno
+        self.cabecalho(retorno, '104')
+        self.elemento('nRec', retorno, recibo)
+        for chave in chaves:
+            self.prot_nfe(retorno, chave)
+        return retorno
+
+    def consulta_protocolo(self, consulta):
+        chave = consulta.findtext(NS + 'chNFe')
+        retorno = self.elemento('retConsSitNFe', versao='4.00')
+        if chave not in self.notas:
+            self.cabecalho(retorno, '217')
+            return retorno
+        self.cabecalho(retorno, self.notas[chave][0])
+        self.elemento('chNFe', retorno, chave)
+        self.prot_nfe(retorno, chave)
+        return retorno
+
+    def inutilizacao(self, inutilizacao):
+        retorno = self.elemento('retInutNFe', versao='4.00')
+        inf_inut = self.elemento('infInut', retorno)
+        self.cabecalho(inf_inut, '102')
+        for tag in ('ano', 'CNPJ', 'mod', 'serie', 'nNFIni', 'nNFFin'):
+            valor = inutilizacao.findtext('.//' + NS + tag)
+            if valor is not None:
+                self.elemento(tag, inf_inut, valor)
+        self.elemento('nProt', inf_inut, self.proximo_numero())
+        return retorno
+
+    def recepcao_evento(self, envio):
+        retorno = self.elemento('retEnvEvento', versao='1.00')
+        self.elemento('idLote', retorno, envio.findtext(NS + 'idLote'))
+        self.cabecalho(retorno, '128')
+        for inf_evento in envio.iter(NS + 'infEvento'):
+            chave = inf_evento.findtext(NS + 'chNFe')
+            tp_evento = inf_evento.findtext(NS + 'tpEvento')
+            if chave not in self.notas:
+                cstat = '217'
+            else:
+                cstat = '135'
+                if tp_evento == TP_EVENTO_CANCELAMENTO:
+                    with self._lock:
+                        self.notas[chave] = ('101', self.notas[chave][1])
+            ret_evento = self.elemento('retEvento', retorno, versao='1.00')
+            inf = self.elemento('infEvento', ret_evento)
+            self.elemento('tpAmb', inf, '2')
+            self.elemento('cStat', inf, cstat)
+            self.elemento('xMotivo', inf, MOTIVOS_CSTAT.get(cstat, ''))
+            self.elemento('chNFe', inf, chave)
+            self.elemento('tpEvento', inf, tp_evento)
+            if cstat == '135':
+                self.elemento('nProt', inf, self.proximo_numero())
+        return retorno
+
+
+def montar_resposta_soap(servico, retorno):
+    envelope = etree.Element('{%s}Envelope' % NAMESPACE_SOAP,
+                             nsmap={'soap12': NAMESPACE_SOAP})
+    body = etree.SubElement(envelope, '{%s}Body' % NAMESPACE_SOAP)
+    resultado = etree.SubElement(body, '{%s}nfeResultMsg' % SERVICOS_SIMULADOR[servico],
+                                 nsmap={None: SERVICOS_SIMULADOR[servico]})
+    resultado.append(retorno)
+    return etree.tostring(envelope, encoding='utf-8', xml_declaration=True)
+
+
+class SimuladorSEFAZHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        servico = self.path.strip('/').split('/')[-1].split('?')[0]
+        if servico not in SERVICOS_SIMULADOR:
+            self.send_error(404, u'Serviço não simulado: %s' % servico)
+            return
+        try:
+            envelope = etree.fromstring(self.rfile.read(
+                int(self.headers.get('Content-Length', 0))))
+            dados = envelope.find('.//{%s}nfeDadosMsg' % SERVICOS_SIMULADOR[servico])[0]
+            conteudo = montar_resposta_soap(
+                servico, self.server.simulador.processar(servico, dados))
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/soap+xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(conteudo)))
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def criar_servidor_simulador(simulador, endereco='127.0.0.1', porta=0):
+    servidor = ThreadingHTTPServer((endereco, porta), SimuladorSEFAZHandler)
+    servidor.daemon_threads = True
+    servidor.simulador = simulador
+    return servidor
+
+
+@contextmanager
+def servidor_simulador_sefaz(**config):
+    """
+    Sobe o simulador em uma thread e retorna (url, simulador), para uso em
+    testes e benchmarks: TransmissorLoteNFe(url_sefaz=url).
+    """
+    simulador = SimuladorSEFAZ(**config)
+    servidor = criar_servidor_simulador(simulador)
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://%s:%s' % servidor.server_address[:2], simulador
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
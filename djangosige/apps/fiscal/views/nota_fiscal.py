@@ -13,7 +13,6 @@ from datetime import datetime
 from django import forms 
 
 import logging # Adicionar importação de logging
-logger = logging.getLogger(__name__) # Definir o logger para este módulo
 
 from djangosige.apps.base.custom_views import (
     CustomView, 
@@ -24,12 +23,15 @@ from djangosige.apps.base.custom_views import (
     CustomDetailView 
 )
 
-from djangosige.apps.fiscal.models import NotaFiscal
+from djangosige.apps.fiscal.models import NotaFiscal, FilaEmissaoNFe
 from djangosige.apps.cadastro.models import MinhaEmpresa, Empresa 
 from djangosige.apps.fiscal.services import EmissorNFeService 
+from djangosige.apps.fiscal.emissao_lote import enfileirar_notas, recuperar_fila
 
 from djangosige.apps.fiscal.forms import ConsultarCadastroForm, InutilizarNotasForm, ConsultarNotaForm, ManifestacaoDestinatarioForm
 
+logger = logging.getLogger(__name__) # Definir o logger para este módulo
+
 
 class NotaFiscalDetailView(CustomDetailView): 
     model = NotaFiscal
@@ -60,16 +62,21 @@ class NotaFiscalEmitirView(CustomView):
             return redirect('fiscal:nota_fiscal_detail', pk=nota.pk)
         
         if hasattr(nota, 'calcular_totais'):
-            nota.calcular_totais() 
-            nota.save() 
-
-        config_servico_dict = nota.get_configuracao_servico() if hasattr(nota, 'get_configuracao_servico') else {}
-        resultado = EmissorNFeService.emitir(nota) 
+            nota.calcular_totais()
+
+        if FilaEmissaoNFe.objects.filter(nota=nota, status__in=['P', 'L']).exists():
+            # Um lote interrompido nao e reenviado: passa a ser conferido na SEFAZ pela chave
+            recuperar_fila()
+            item_fila = FilaEmissaoNFe.objects.select_related('lote').get(nota=nota)
+            if item_fila.status == 'L' and item_fila.lote and item_fila.lote.status == '4':
+                messages.warning(request, f"O envio do lote {item_fila.lote.pk} da NF-e {nota.serie}/{nota.numero} não foi confirmado. A situação da nota será conferida na SEFAZ pelo processamento da fila antes de qualquer reenvio.")
+            else:
+                messages.warning(request, f"A NF-e {nota.serie}/{nota.numero} já está na fila de emissão.")
+            return redirect('fiscal:nota_fiscal_detail', pk=nota.pk)
 
-        if resultado.get('sucesso'):
-            messages.success(request, f"NF-e {nota.serie}/{nota.numero} enviada para autorização com sucesso! Protocolo: {resultado.get('protocolo')}")
-        else:
-            messages.error(request, f"Erro ao emitir NF-e {nota.serie}/{nota.numero}: {resultado.get('erro')}")
+        # A transmissao para a SEFAZ e feita pelo comando processar_fila_nfe
+        enfileirar_notas([nota])
+        messages.success(request, f"NF-e {nota.serie}/{nota.numero} incluída na fila de emissão. O resultado da autorização será atualizado na nota.")
 
         return redirect('fiscal:nota_fiscal_detail', pk=nota.pk)
 
@@ -3,6 +3,8 @@
 from djangosige.apps.fiscal.models import NotaFiscalSaida, NotaFiscalEntrada, ConfiguracaoNotaFiscal, AutXML, \
     ErrosValidacaoNotaFiscal, RespostaSefazNotaFiscal, NaturezaOperacao, GrupoFiscal, \
     ICMS, ICMSUFDest, ICMSSN, IPI, PIS, COFINS
+from djangosige.apps.fiscal.certificado import cache_certificados_a1
+from djangosige.apps.fiscal.perfil_tributario import get_perfil_tributario, cache_perfis_tributarios
 from djangosige.configs.settings import MEDIA_ROOT
 from djangosige.apps.cadastro.models import COD_UF, PessoaJuridica, PessoaFisica, Fornecedor, Cliente, Empresa, Transportadora, Endereco, Telefone, Produto, Unidade
 from djangosige.apps.compras.models import PedidoCompra, ItensCompra
@@ -129,7 +131,12 @@ class ProcessadorNotaFiscal(object):
 
         # Detalhamento dos produtos e servicos
         if nota_obj.venda:
-            for index, item in enumerate(nota_obj.venda.itens_venda.all(), 1):
+            itens = list(nota_obj.venda.itens_venda.select_related(
+                'produto__grupo_fiscal'))
+            # Carrega de uma vez os perfis tributarios que ainda nao estao em cache
+            cache_perfis_tributarios.obter_varios(
+                [item.produto.grupo_fiscal_id for item in itens])
+            for index, item in enumerate(itens, 1):
                 det = Det_310()
                 det.nItem.valor = index
                 det.infAdProd.valor = item.inf_ad_prod
@@ -159,12 +166,14 @@ class ProcessadorNotaFiscal(object):
 
                 # Impostos
                 if item.produto.grupo_fiscal:
+                    perfil = get_perfil_tributario(
+                        item.produto.grupo_fiscal_id)
                     # Simples Nacional
                     if item.produto.grupo_fiscal.regime_trib == '1':
                         det.imposto.ICMS.regime_tributario = 1
                         # ICMS
-                        if item.produto.grupo_fiscal.icms_sn_padrao:
-                            icms_sn_obj = item.produto.grupo_fiscal.icms_sn_padrao.get()
+                        if perfil.icms_sn:
+                            icms_sn_obj = perfil.icms_sn
 
                             det.imposto.ICMS.orig.valor = item.produto.origem
                             det.imposto.ICMS.CSOSN.valor = icms_sn_obj.csosn
@@ -188,8 +197,8 @@ class ProcessadorNotaFiscal(object):
                     elif item.produto.grupo_fiscal.regime_trib == '0':
                         det.imposto.ICMS.regime_tributario = False
                         # ICMS
-                        if item.produto.grupo_fiscal.icms_padrao:
-                            icms_obj = item.produto.grupo_fiscal.icms_padrao.get()
+                        if perfil.icms:
+                            icms_obj = perfil.icms
 
                             det.imposto.ICMS.orig.valor = item.produto.origem
                             det.imposto.ICMS.CST.valor = icms_obj.cst.replace(
@@ -218,8 +227,8 @@ class ProcessadorNotaFiscal(object):
 
                     # ICMSUFDest (vendas interestaduais para consumidor final
                     # nao contribuinte)
-                    icms_dest = item.produto.grupo_fiscal.icms_dest_padrao.get()
-                    if icms_dest.p_fcp_dest or icms_dest.p_icms_dest or icms_dest.p_icms_inter or icms_dest.p_icms_inter_part:
+                    icms_dest = perfil.icms_uf_dest
+                    if icms_dest and (icms_dest.p_fcp_dest or icms_dest.p_icms_dest or icms_dest.p_icms_inter or icms_dest.p_icms_inter_part):
                         det.imposto.ICMSUFDest.vBCUFDest.valor = item.vbc_uf_dest
                         det.imposto.ICMSUFDest.pFCPUFDest.valor = icms_dest.p_fcp_dest
                         det.imposto.ICMSUFDest.pICMSUFDest.valor = icms_dest.p_icms_dest
@@ -230,8 +239,8 @@ class ProcessadorNotaFiscal(object):
                         det.imposto.ICMSUFDest.vICMSUFRemet.valor = item.vicmsufremet
 
                     # IPI
-                    ipi_obj = item.produto.grupo_fiscal.ipi_padrao.get()
-                    if ipi_obj.cst:
+                    ipi_obj = perfil.ipi
+                    if ipi_obj and ipi_obj.cst:
                         det.imposto.IPI.CST.valor = ipi_obj.cst
                         det.imposto.IPI.clEnq.valor = ipi_obj.cl_enq
                         det.imposto.IPI.CNPJProd.valor = ipi_obj.get_cnpj_prod_apenas_digitos()
@@ -249,8 +258,8 @@ class ProcessadorNotaFiscal(object):
                         det.imposto.IPI.CST.valor = '99'
 
                     # PIS
-                    pis_obj = item.produto.grupo_fiscal.pis_padrao.get()
-                    if pis_obj.cst:
+                    pis_obj = perfil.pis
+                    if pis_obj and pis_obj.cst:
                         det.imposto.PIS.CST.valor = pis_obj.cst
 
                         if pis_obj.valiq_pis:
@@ -266,8 +275,8 @@ class ProcessadorNotaFiscal(object):
                         det.imposto.PIS.CST.valor = '99'
 
                     # COFINS
-                    cofins_obj = item.produto.grupo_fiscal.cofins_padrao.get()
-                    if cofins_obj.cst:
+                    cofins_obj = perfil.cofins
+                    if cofins_obj and cofins_obj.cst:
                         det.imposto.COFINS.CST.valor = cofins_obj.cst
 
                         if cofins_obj.valiq_cofins:
@@ -405,11 +414,11 @@ class ProcessadorNotaFiscal(object):
         clientes = []
 
         if nfe.infNFe.dest.CNPJ.valor:
-            clientes = [c for c in Cliente.objects.filter(
-                tipo_pessoa='PJ') if c.cpf_cnpj_apenas_digitos == nfe.infNFe.dest.CNPJ.valor]
+            clientes = list(Cliente.objects.by_documento(
+                nfe.infNFe.dest.CNPJ.valor, tipo_pessoa='PJ'))
         elif nfe.infNFe.dest.CPF.valor:
-            clientes = [c for c in Cliente.objects.filter(
-                tipo_pessoa='PF') if c.cpf_cnpj_apenas_digitos == nfe.infNFe.dest.CPF.valor]
+            clientes = list(Cliente.objects.by_documento(
+                nfe.infNFe.dest.CPF.valor, tipo_pessoa='PF'))
 
         if len(clientes):
             nota_saida.dest_saida = clientes[0]
@@ -470,11 +479,11 @@ class ProcessadorNotaFiscal(object):
         empresas = []
 
         if nfe.infNFe.emit.CNPJ.valor:
-            empresas = [e for e in Empresa.objects.filter(
-                tipo_pessoa='PJ') if e.cpf_cnpj_apenas_digitos == nfe.infNFe.emit.CNPJ.valor]
+            empresas = list(Empresa.objects.by_documento(
+                nfe.infNFe.emit.CNPJ.valor, tipo_pessoa='PJ'))
         elif nfe.infNFe.emit.CPF.valor:
-            empresas = [e for e in Empresa.objects.filter(
-                tipo_pessoa='PF') if e.cpf_cnpj_apenas_digitos == nfe.infNFe.emit.CPF.valor]
+            empresas = list(Empresa.objects.by_documento(
+                nfe.infNFe.emit.CPF.valor, tipo_pessoa='PF'))
 
         if len(empresas):
             nota_saida.emit_saida = empresas[0]
@@ -532,11 +541,11 @@ class ProcessadorNotaFiscal(object):
         if nfe.infNFe.transp.transporta.CNPJ.valor or nfe.infNFe.transp.transporta.CPF.valor:
             transportadoras = []
             if nfe.infNFe.transp.transporta.CNPJ.valor:
-                transportadoras = [t for t in Transportadora.objects.filter(
-                    tipo_pessoa='PJ') if t.cpf_cnpj_apenas_digitos == nfe.infNFe.transp.transporta.CNPJ.valor]
+                transportadoras = list(Transportadora.objects.by_documento(
+                    nfe.infNFe.transp.transporta.CNPJ.valor, tipo_pessoa='PJ'))
             elif nfe.infNFe.transp.transporta.CPF.valor:
-                transportadoras = [t for t in Transportadora.objects.filter(
-                    tipo_pessoa='PF') if t.cpf_cnpj_apenas_digitos == nfe.infNFe.transp.transporta.CPF.valor]
+                transportadoras = list(Transportadora.objects.by_documento(
+                    nfe.infNFe.transp.transporta.CPF.valor, tipo_pessoa='PF'))
 
             if len(transportadoras):
                 venda.transportadora = transportadoras[0]
@@ -831,11 +840,11 @@ class ProcessadorNotaFiscal(object):
         fornecedores = []
 
         if nfe.infNFe.emit.CNPJ.valor:
-            fornecedores = [f for f in Fornecedor.objects.filter(
-                tipo_pessoa='PJ') if f.cpf_cnpj_apenas_digitos == nfe.infNFe.emit.CNPJ.valor]
+            fornecedores = list(Fornecedor.objects.by_documento(
+                nfe.infNFe.emit.CNPJ.valor, tipo_pessoa='PJ'))
         elif nfe.infNFe.emit.CPF.valor:
-            fornecedores = [f for f in Fornecedor.objects.filter(
-                tipo_pessoa='PF') if f.cpf_cnpj_apenas_digitos == nfe.infNFe.emit.CPF.valor]
+            fornecedores = list(Fornecedor.objects.by_documento(
+                nfe.infNFe.emit.CPF.valor, tipo_pessoa='PF'))
 
         if len(fornecedores):
             nota_entrada.emit_entrada = fornecedores[0]
@@ -893,8 +902,8 @@ class ProcessadorNotaFiscal(object):
         empresas = []
 
         if nfe.infNFe.dest.CNPJ.valor:
-            empresas = [e for e in Empresa.objects.filter(
-                tipo_pessoa='PJ') if e.cpf_cnpj_apenas_digitos == nfe.infNFe.dest.CNPJ.valor]
+            empresas = list(Empresa.objects.by_documento(
+                nfe.infNFe.dest.CNPJ.valor, tipo_pessoa='PJ'))
             if len(empresas):
                 nota_entrada.dest_entrada = fornecedores[0]
             else:
@@ -1117,6 +1126,13 @@ class ProcessadorNotaFiscal(object):
         nota_entrada.compra = compra
         nota_entrada.save()
 
+    def carregar_certificado_a1(self):
+        # Certificado decifrado uma unica vez por processo (ver fiscal.certificado)
+        certificado = cache_certificados_a1.obter(
+            self.conf_nfe.get_certificado_a1(), self.conf_nfe.senha_certificado)
+        cert, key = certificado.cert_chave()
+        return {'cert': cert, 'key': key}
+
     def verificar_configuracao(self):
         try:
             self.conf_nfe = ConfiguracaoNotaFiscal.objects.all()[:1].get()
@@ -1127,10 +1143,7 @@ class ProcessadorNotaFiscal(object):
             return self.salvar_mensagem(message=u'Certificado A1 não encontrado.', erro=True)
 
         try:
-            with open(self.conf_nfe.get_certificado_a1(), 'rb') as f:
-                arquivo = f.read()
-            self.info_certificado = self.nova_nfe.extrair_certificado_a1(
-                arquivo, self.conf_nfe.senha_certificado)
+            self.info_certificado = self.carregar_certificado_a1()
         except:
             return self.salvar_mensagem(message=u'Erro ao tentar ler o certificado, verifique se sua senha está correta.', erro=True)
 
@@ -1152,10 +1165,7 @@ class ProcessadorNotaFiscal(object):
             return self.salvar_mensagem(message=e.descricao, erro=True)
 
         try:
-            with open(self.conf_nfe.get_certificado_a1(), 'rb') as f:
-                arquivo = f.read()
-            self.info_certificado = self.nova_nfe.extrair_certificado_a1(
-                arquivo, self.conf_nfe.senha_certificado)
+            self.info_certificado = self.carregar_certificado_a1()
         except:
             e = ErrosValidacaoNotaFiscal(nfe=nota_obj)
             e.tipo = u'0'
@@ -6,3 +6,7 @@ from django.apps import AppConfig
 class LoginConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'djangosige.apps.login'  # Nome completo do módulo
+
+    def ready(self):
+        from djangosige.apps.login.context_user import conectar_sinais_contexto_usuario
+        conectar_sinais_contexto_usuario()
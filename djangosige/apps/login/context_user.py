@@ -1,27 +1,89 @@
 # -*- coding: utf-8 -*-
 
+from django.conf import settings
+from django.core.cache import cache
+
 from .models import Usuario
+from djangosige.apps.base.permissoes import cache_compartilhado
 from djangosige.apps.cadastro.models import MinhaEmpresa
 
-# Manter foto do perfil na sidebar
+CONTEXTO_USUARIO_CACHE_KEY = 'contexto_usuario_%s'
+CONTEXTO_USUARIO_CACHE_TIMEOUT = 60 * 60 * 24
 
 
-def foto_usuario(request):
+def calcular_contexto_usuario(user):
     context_dict = {}
     # Foto do usuario
-    try:
-        user_foto = Usuario.objects.get(user=request.user).user_foto
-        context_dict['user_foto_sidebar'] = user_foto
-    except:
-        pass
+    perfil = Usuario.objects.filter(user=user).first()
+    if perfil is not None:
+        context_dict['user_foto_sidebar'] = perfil.user_foto
 
     # Empresa do usuario
-    try:
-        user_empresa = MinhaEmpresa.objects.get(
-            m_usuario=Usuario.objects.get(user=request.user)).m_empresa
-        if user_empresa:
-            context_dict['user_empresa'] = user_empresa
-    except:
-        pass
+    minha_empresa = MinhaEmpresa.objects.select_related('m_empresa').filter(
+        m_usuario__user=user, m_empresa__isnull=False).first()
+    if minha_empresa is not None:
+        context_dict['user_empresa'] = minha_empresa.m_empresa
+
+    return context_dict
+
 
+def get_contexto_usuario(user):
+    # Sem um cache compartilhado a invalidacao feita em um processo nao
+    # chegaria aos outros: o contexto e sempre lido do banco
+    if not cache_compartilhado():
+        return calcular_contexto_usuario(user)
+    chave = CONTEXTO_USUARIO_CACHE_KEY % user.pk
+    context_dict = cache.get(chave)
+    if context_dict is None:
+        context_dict = calcular_contexto_usuario(user)
+        cache.set(chave, context_dict, getattr(
+            settings, 'CONTEXTO_USUARIO_CACHE_TIMEOUT', CONTEXTO_USUARIO_CACHE_TIMEOUT))
     return context_dict
+
+
+def invalidar_contexto_usuario(user_id):
+    cache.delete(CONTEXTO_USUARIO_CACHE_KEY % user_id)
+
+
+# Manter foto do perfil na sidebar
+
+
+def foto_usuario(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return get_contexto_usuario(user)
+
+
+def invalidar_contexto_perfil(sender, instance, **kwargs):
+    invalidar_contexto_usuario(instance.user_id)
+
+
+def invalidar_contexto_minha_empresa(sender, instance, **kwargs):
+    user_id = Usuario.objects.filter(pk=instance.m_usuario_id).values_list(
+        'user_id', flat=True).first()
+    if user_id is not None:
+        invalidar_contexto_usuario(user_id)
+
+
+def invalidar_contexto_empresa(sender, instance, **kwargs):
+    # Nome da empresa exibido na sidebar de todos os usuarios vinculados
+    for user_id in MinhaEmpresa.objects.filter(m_empresa=instance).values_list(
+            'm_usuario__user_id', flat=True):
+        invalidar_contexto_usuario(user_id)
+
+
+def conectar_sinais_contexto_usuario():
+    from django.db.models.signals import post_save, post_delete, pre_delete
+    from djangosige.apps.cadastro.models import Empresa
+
+    for sinal, nome in ((post_save, 'post_save'), (post_delete, 'post_delete')):
+        sinal.connect(invalidar_contexto_perfil, sender=Usuario,
+                      dispatch_uid='contexto_usuario_%s_usuario' % nome)
+        sinal.connect(invalidar_contexto_minha_empresa, sender=MinhaEmpresa,
+                      dispatch_uid='contexto_usuario_%s_minhaempresa' % nome)
+    post_save.connect(invalidar_contexto_empresa, sender=Empresa,
+                      dispatch_uid='contexto_usuario_post_save_empresa')
+    # Antes da exclusao, enquanto os vinculos com MinhaEmpresa ainda existem
+    pre_delete.connect(invalidar_contexto_empresa, sender=Empresa,
+                       dispatch_uid='contexto_usuario_pre_delete_empresa')
@@ -7,3 +7,7 @@ class VendasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'djangosige.apps.vendas'  # Nome completo do módulo
     verbose_name = "Vendas"  # Opcional
+
+    def ready(self):
+        from djangosige.apps.vendas.totais import conectar_sinais_totais_venda
+        conectar_sinais_totais_venda()
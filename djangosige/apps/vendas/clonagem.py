@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+from djangosige.apps.base.clonagem import clonar_documento
+
+from .models import Venda, ItensVenda, Pagamento
+
+RELACIONADOS_VENDA = ((ItensVenda, 'venda_id'), (Pagamento, 'venda_id'))
+
+
+def clonar_venda(origem, modelo=None, **valores):
+    """Copia o orcamento/pedido origem (com itens e parcelas) para um novo modelo (o mesmo por padrao)."""
+    return clonar_documento(origem, modelo or type(origem), Venda, RELACIONADOS_VENDA, **valores)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+from django.db.models import Prefetch
+
+from djangosige.apps.fiscal.perfil_tributario import cache_perfis_tributarios
+
+from .models import PedidoVenda, ItensVenda, Pagamento
+
+
+def carregar_pedido_venda(pk):
+    """
+    PedidoVenda com a condicao de pagamento, os itens (produto, unidade e
+    CFOP) e as parcelas em tres consultas, e o perfil tributario dos
+    grupos fiscais dos produtos carregado de uma vez.
+    """
+    venda = PedidoVenda.objects.select_related('cond_pagamento').prefetch_related(
+        Prefetch('itens_venda', queryset=ItensVenda.objects.select_related(
+            'produto__unidade', 'produto__cfop_padrao').order_by('pk')),
+        Prefetch('parcela_pagamento', queryset=Pagamento.objects.order_by('pk'))).get(pk=pk)
+    cache_perfis_tributarios.obter_varios(
+        item.produto.grupo_fiscal_id for item in venda.itens_venda.all() if item.produto_id)
+    return venda
+
+
+def serializar_pedido_venda(venda):
+    """Lista usada pelo JS das notas fiscais e movimentos de estoque (InfoVenda)."""
+    itens_venda = venda.itens_venda.all()
+    data = []
+
+    pedido_fields_dict = {
+        'dest': venda.cliente_id,
+        'local': venda.local_orig_id or '',
+        'status': venda.get_status_display(),
+        'desconto': venda.format_desconto(),
+        'frete': venda.format_frete(),
+        'despesas': venda.format_despesas(),
+        'seguro': venda.format_seguro(),
+        'impostos': venda.format_impostos(),
+        'valor_total': venda.format_valor_total(),
+        'total_sem_desconto': venda.format_total_sem_desconto(),
+        'ind_final': venda.ind_final,
+        'forma_pag': venda.get_forma_pagamento(),
+        'n_itens': str(len(itens_venda)),
+        'valor_total_produtos': venda.format_total_produtos(),
+        'n_parcelas': venda.cond_pagamento.n_parcelas if venda.cond_pagamento else 1,
+    }
+    data.append({'model': 'vendas.pedidovenda', 'pk': venda.id, 'fields': pedido_fields_dict})
+
+    for item in itens_venda:
+        itens_fields_dict = {
+            'produto_id': item.produto.id,
+            'controlar_estoque': item.produto.controlar_estoque,
+            'produto': item.produto.descricao,
+            'quantidade': item.format_quantidade(),
+            'valor_unit': item.format_valor_unit(),
+            'desconto': item.format_desconto(),
+            'impostos': item.format_total_impostos(),
+            'total': item.format_total_com_imposto(),
+            'vprod': item.format_vprod(),
+        }
+        itens_hidden_fields_dict = {
+            'codigo': item.produto.codigo,
+            'unidade': item.produto.get_sigla_unidade(),
+            'cfop': item.produto.get_cfop_padrao(),
+            'ncm': item.produto.ncm,
+            'frete': item.format_valor_attr('valor_rateio_frete'),
+            'despesas': item.format_valor_attr('valor_rateio_despesas'),
+            'seguro': item.format_valor_attr('valor_rateio_seguro'),
+            'subtotal': item.format_valor_attr('subtotal'),
+            'vicms': item.format_valor_attr('vicms'),
+            'vipi': item.format_valor_attr('vipi'),
+            'vicms_st': item.format_valor_attr('vicms_st'),
+            'vfcp': item.format_valor_attr('vfcp'),
+            'vicmsufdest': item.format_valor_attr('vicmsufdest'),
+            'vicmsufremet': item.format_valor_attr('vicmsufremet'),
+            'aliq_pis': item.get_aliquota_pis(),
+            'aliq_cofins': item.get_aliquota_cofins(),
+            'mot_des_icms': item.get_mot_deson_icms(),
+        }
+        itens_editable_fields_dict = {
+            'editable_field_vq_bcpis': item.format_valor_attr('vq_bcpis'),
+            'editable_field_vq_bccofins': item.format_valor_attr('vq_bccofins'),
+            'editable_field_vpis': item.format_valor_attr('vpis'),
+            'editable_field_vcofins': item.format_valor_attr('vcofins'),
+            'editable_field_vicms_deson': item.format_valor_attr('vicms_deson'),
+            'editable_field_inf_ad_prod': item.inf_ad_prod,
+        }
+        data.append({'model': 'vendas.itensvenda', 'pk': item.id, 'fields': itens_fields_dict,
+                     'hidden_fields': itens_hidden_fields_dict,
+                     'editable_fields': itens_editable_fields_dict})
+
+    for pagamento in venda.parcela_pagamento.all():
+        data.append({'model': 'vendas.pagamento', 'pk': pagamento.id, 'fields': {
+            'id': pagamento.id,
+            'vencimento': pagamento.format_vencimento,
+            'valor_parcela': pagamento.format_valor_parcela,
+        }})
+
+    return data
+
+
+def info_pedido_venda(pk):
+    return serializar_pedido_venda(carregar_pedido_venda(pk))
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+from djangosige.apps.base.totais_pedidos import recalcular_totais_documentos
+
+IMPOSTOS_ITEM_VENDA = ('vicms', 'vicms_st', 'vipi', 'vfcp', 'vicmsufdest', 'vicmsufremet')
+
+
+# Colunas existentes nesta migration (total_itens veio depois)
+CAMPOS_TOTAIS = ('total_produtos', 'total_impostos', 'total_produtos_estoque', 'quantidade_itens')
+
+
+def preencher_totais(apps, schema_editor):
+    recalcular_totais_documentos(apps.get_model('vendas', 'Venda'), apps.get_model('vendas', 'ItensVenda'),
+                                 'venda_id', IMPOSTOS_ITEM_VENDA, campos=CAMPOS_TOTAIS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venda',
+            name='total_produtos',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=13),
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='total_impostos',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=13),
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='total_produtos_estoque',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=13),
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='quantidade_itens',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(preencher_totais, migrations.RunPython.noop),
+    ]
@@ -7,7 +7,7 @@ from django.urls import reverse_lazy
 
 from decimal import Decimal
 
-from djangosige.apps.fiscal.models import TributoPIS, TributoCOFINS
+from djangosige.apps.fiscal.perfil_tributario import get_perfil_tributario
 from djangosige.apps.estoque.models import DEFAULT_LOCAL_ID
 
 import locale
@@ -149,8 +149,8 @@ class ItensVenda(models.Model):
         try:
             # Garante que temos valor decimal
             sub = self.subtotal if self.subtotal is not None else Decimal('0.00')
-            if sub > 0 and self.produto and self.produto.grupo_fiscal and self.produto.grupo_fiscal.icms_sn_padrao:
-                icms_obj = self.produto.grupo_fiscal.icms_sn_padrao.get()
+            icms_obj = self.get_perfil_tributario().icms_sn
+            if sub > 0 and icms_obj:
                 if icms_obj.p_cred_sn is not None:
                     p_cred = Decimal(icms_obj.p_cred_sn)
                     return (sub * p_cred / Decimal('100')).quantize(Decimal('0.01'))
@@ -238,14 +238,20 @@ class ItensVenda(models.Model):
     # --- FIM SUBSTITUIÇÃO locale.format ---
 
 
+    def get_perfil_tributario(self):
+        # Tributos padrão do grupo fiscal do produto, sem consulta por item
+        if self.produto_id is None:
+            return get_perfil_tributario(None)
+        return get_perfil_tributario(self.produto.grupo_fiscal_id)
+
     def get_total_sem_desconto(self):
         # Calcula Qtd * Vl Unitário
         return self.vprod
 
     def get_mot_deson_icms(self):
         try:
-            if self.produto and self.produto.grupo_fiscal and self.produto.grupo_fiscal.icms_padrao:
-                icms_obj = self.produto.grupo_fiscal.icms_padrao.get()
+            icms_obj = self.get_perfil_tributario().icms
+            if icms_obj:
                 if icms_obj.mot_des_icms:
                     return icms_obj.get_mot_des_icms_display()
         except Exception:
@@ -300,18 +306,12 @@ class ItensVenda(models.Model):
 
     def get_aliquota_pis(self, format=True):
         valor = None
-        try:
-            if self.produto and self.produto.grupo_fiscal:
-                 pis_padrao = PIS.objects.get(
-                     grupo_fiscal=self.produto.grupo_fiscal)
-
-                 if pis_padrao.valiq_pis is not None:
-                     valor = Decimal(pis_padrao.valiq_pis)
-                 elif pis_padrao.p_pis is not None:
-                     valor = Decimal(pis_padrao.p_pis)
-
-        except PIS.DoesNotExist:
-            pass # Continua para retornar None ou valor formatado de None
+        pis_padrao = self.get_perfil_tributario().pis
+        if pis_padrao:
+            if pis_padrao.valiq_pis is not None:
+                valor = Decimal(pis_padrao.valiq_pis)
+            elif pis_padrao.p_pis is not None:
+                valor = Decimal(pis_padrao.p_pis)
 
         if valor is not None:
             if format and locale:
@@ -326,18 +326,12 @@ class ItensVenda(models.Model):
 
     def get_aliquota_cofins(self, format=True):
         valor = None
-        try:
-            if self.produto and self.produto.grupo_fiscal:
-                 cofins_padrao = COFINS.objects.get(
-                     grupo_fiscal=self.produto.grupo_fiscal)
-
-                 if cofins_padrao.valiq_cofins is not None:
-                      valor = Decimal(cofins_padrao.valiq_cofins)
-                 elif cofins_padrao.p_cofins is not None:
-                      valor = Decimal(cofins_padrao.p_cofins)
-
-        except COFINS.DoesNotExist:
-            pass # Continua para retornar None ou valor formatado de None
+        cofins_padrao = self.get_perfil_tributario().cofins
+        if cofins_padrao:
+            if cofins_padrao.valiq_cofins is not None:
+                valor = Decimal(cofins_padrao.valiq_cofins)
+            elif cofins_padrao.p_cofins is not None:
+                valor = Decimal(cofins_padrao.p_cofins)
 
         if valor is not None:
             if format and locale:
@@ -359,10 +353,11 @@ class ItensVenda(models.Model):
         despesas_rateio = self.valor_rateio_despesas if self.valor_rateio_despesas is not None else Decimal('0.00')
         vbc += despesas_rateio
 
-        if self.produto and self.produto.grupo_fiscal:
+        perfil = self.get_perfil_tributario()
+        if perfil.pis and perfil.cofins:
             try:
-                pis_padrao = PIS.objects.get(grupo_fiscal=self.produto.grupo_fiscal)
-                cofins_padrao = COFINS.objects.get(grupo_fiscal=self.produto.grupo_fiscal)
+                pis_padrao = perfil.pis
+                cofins_padrao = perfil.cofins
 
                 # Calculo Vl. PIS
                 if pis_padrao.valiq_pis is not None:
@@ -388,18 +383,13 @@ class ItensVenda(models.Model):
                      self.vcofins = Decimal('0.00')
 
 
-            except (PIS.DoesNotExist, COFINS.DoesNotExist):
-                self.vq_bcpis = Decimal('0.00')
-                self.vpis = Decimal('0.00')
-                self.vq_bccofins = Decimal('0.00')
-                self.vcofins = Decimal('0.00')
             except Exception: # Outros erros
                  self.vq_bcpis = Decimal('0.00')
                  self.vpis = Decimal('0.00')
                  self.vq_bccofins = Decimal('0.00')
                  self.vcofins = Decimal('0.00')
         else:
-            # Se não há grupo fiscal, zera PIS/COFINS
+            # Se não há grupo fiscal (ou PIS/COFINS padrão), zera PIS/COFINS
             self.vq_bcpis = Decimal('0.00')
             self.vpis = Decimal('0.00')
             self.vq_bccofins = Decimal('0.00')
@@ -444,6 +434,12 @@ class Venda(models.Model):
     cond_pagamento = models.ForeignKey(
         'vendas.CondicaoPagamento', related_name="venda_pagamento", on_delete=models.SET_NULL, null=True, blank=True)
     observacoes = models.CharField(max_length=1055, null=True, blank=True)
+    # Totais dos itens, mantidos por vendas.totais a cada alteracao de item
+    total_produtos = models.DecimalField(max_digits=13, decimal_places=2, default=Decimal('0.00'))
+    total_impostos = models.DecimalField(max_digits=13, decimal_places=2, default=Decimal('0.00'))
+    total_produtos_estoque = models.DecimalField(max_digits=13, decimal_places=2, default=Decimal('0.00'))
+    total_itens = models.DecimalField(max_digits=13, decimal_places=2, default=Decimal('0.00'))
+    quantidade_itens = models.IntegerField(default=0)
 
     def get_total_sem_imposto(self):
         # Garante que temos valores decimais
@@ -452,27 +448,16 @@ class Venda(models.Model):
         return (total - imp).quantize(Decimal('0.01'))
 
     def get_total_produtos(self):
-        # Soma o vprod de cada item
-        return sum(item.vprod for item in self.itens_venda.all() if item.vprod is not None)
+        # Soma do vprod dos itens (coluna mantida por vendas.totais)
+        return self.total_produtos
 
-    # --- INÍCIO MÉTODO ADICIONADO ---
     def get_total_impostos(self):
         """Soma o valor total de impostos de todos os itens da venda."""
-        total_impostos_itens = sum(item.get_total_impostos() for item in self.itens_venda.all())
-        # Se o campo 'impostos' na Venda for usado para algo adicional (ex: imposto global), some aqui.
-        # Caso contrário, apenas retorne a soma dos itens.
-        # imposto_venda = self.impostos if self.impostos is not None else Decimal('0.00')
-        # return (total_impostos_itens + imposto_venda).quantize(Decimal('0.01'))
-        return Decimal(total_impostos_itens).quantize(Decimal('0.01')) # Converte para Decimal antes
-    # --- FIM MÉTODO ADICIONADO ---
+        return self.total_impostos
 
     def get_total_produtos_estoque(self):
-        itens = self.itens_venda.all()
-        tot = Decimal('0.00')
-        for it in itens:
-            if it.produto and it.produto.controlar_estoque:
-                tot += it.vprod # Usa a property vprod
-        return tot.quantize(Decimal('0.01'))
+        # Soma do vprod dos itens com controle de estoque
+        return self.total_produtos_estoque
 
     # --- INÍCIO SUBSTITUIÇÃO locale.format ---
     def format_total_produtos(self):
@@ -496,7 +481,7 @@ class Venda(models.Model):
                 valor_desconto = desconto_field
             elif self.tipo_desconto == '1': # Percentual
                  # Base para percentual: soma dos subtotais dos itens (após desconto de item)
-                 base_desconto = sum(item.get_total() for item in self.itens_venda.all())
+                 base_desconto = self.total_itens
                  valor_desconto = base_desconto * (desconto_field / Decimal('100'))
             else:
                  valor_desconto = Decimal('0.00')
@@ -533,8 +518,8 @@ class Venda(models.Model):
         return str(total_sem_imp)
 
     def format_desconto(self):
-        # Usa a própria função get_valor_desconto_total com format=False e formata aqui
-        desconto_calculado = self.get_valor_desconto_total(format=False)
+        # get_valor_desconto_total retorna Decimal; a formatacao e feita aqui
+        desconto_calculado = self.get_valor_desconto_total()
         if locale:
             return locale.format_string(u'%.2f', desconto_calculado, grouping=True)
         return str(desconto_calculado)
@@ -554,7 +539,7 @@ class Venda(models.Model):
     def format_total_sem_desconto(self):
          # Base para desconto percentual é a soma dos totais dos itens
          base = sum(item.get_total() for item in self.itens_venda.all())
-         desconto_total = self.get_valor_desconto_total(format=False)
+         desconto_total = self.get_valor_desconto_total()
          total_sem_desconto_geral = base - desconto_total # Isso pode não ser o que o método originalmente queria dizer
                                                           # Se for simplesmente valor_total - desconto, use a linha abaixo
          # total_sem_desconto = (self.valor_total if self.valor_total is not None else Decimal('0.00')) - desconto_total
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+from functools import partial
+
+from django.db.models import Prefetch
+
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm, inch
+from reportlab.platypus import Paragraph, Table, TableStyle, Spacer
+
+from djangosige.apps.base.relatorios_pdf import get_estilos, imagem_logo, chave_conteudo, construir_pdf, \
+    agendar_relatorio, agendar_lote
+
+from .models import OrcamentoVenda, PedidoVenda, ItensVenda
+
+
+def _configurar_estilos(styles):
+    styles.add(ParagraphStyle(name='TituloVenda', parent=styles['Title'], fontSize=14,
+                              alignment=1, spaceAfter=12))
+
+
+def carregar_vendas(queryset):
+    """Vendas com cliente (CPF/CNPJ, endereco, telefone, email), condicao de pagamento e itens."""
+    return queryset.select_related(
+        'cliente__endereco_padrao', 'cliente__telefone_padrao', 'cliente__email_padrao',
+        'cliente__pessoa_fis_info', 'cliente__pessoa_jur_info',
+        'cond_pagamento').prefetch_related(
+        Prefetch('itens_venda', queryset=ItensVenda.objects.select_related('produto').order_by('pk')))
+
+
+def _data(data):
+    return data.strftime("%d/%m/%Y") if data else "Não informada"
+
+
+def dados_pdf_venda(venda, titulo, empresa):
+    """
+    Tudo o que aparece no PDF, ja formatado: a renderizacao roda no pool
+    sem acessar o banco, e o hash destes dados e a chave do cache.
+    """
+    documento = [["Número:", str(venda.id)], ["Data de Emissão:", _data(venda.data_emissao)]]
+    if isinstance(venda, OrcamentoVenda):
+        documento.append(["Data de Validade:", _data(venda.data_vencimento)])
+    elif isinstance(venda, PedidoVenda):
+        documento.append(["Data de Entrega:", _data(venda.data_entrega)])
+
+    cliente = venda.cliente
+    dados_cliente = [
+        ["Nome/Razão Social:", cliente.nome_razao_social],
+        ["CPF/CNPJ:", cliente.format_cpf_cnpj()],
+    ]
+    if cliente.endereco_padrao:
+        dados_cliente.append(["Endereço:", cliente.endereco_padrao.format_endereco_completo])
+    if cliente.telefone_padrao:
+        dados_cliente.append(["Telefone:", cliente.telefone_padrao.telefone])
+    if cliente.email_padrao:
+        dados_cliente.append(["E-mail:", cliente.email_padrao.email])
+
+    return {
+        'titulo': titulo,
+        'empresa': empresa,
+        'documento': documento,
+        'cliente': dados_cliente,
+        'itens': [[item.produto.descricao, str(item.quantidade), "R$ %.2f" % item.valor_unit,
+                   "R$ %.2f" % item.get_total()] for item in venda.itens_venda.all()],
+        'totais': [
+            ["Subtotal:", "R$ %.2f" % venda.get_total_sem_imposto()],
+            ["Impostos:", "R$ %.2f" % venda.get_total_impostos()],
+            ["Total:", "R$ %.2f" % venda.valor_total],
+        ],
+        'cond_pagamento': venda.cond_pagamento.descricao if venda.cond_pagamento else None,
+        'observacoes': venda.observacoes or "Nenhuma observação.",
+        'vendedor': venda.vendedor,
+    }
+
+
+def _tabela_dados(linhas):
+    tabela = Table(linhas, colWidths=[80 * mm, 100 * mm])
+    tabela.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+    return tabela
+
+
+def story_pdf_venda(dados):
+    styles = get_estilos('venda', _configurar_estilos)
+    style_normal = styles['Normal']
+    style_heading = styles['Heading4']
+    empresa = dados['empresa']
+    elements = []
+
+    # Logo da empresa
+    if empresa and empresa['logo']:
+        logo = imagem_logo(empresa['logo'], 2 * inch, 1 * inch)
+        if logo is not None:
+            elements.append(logo)
+            elements.append(Spacer(1, 12))
+
+    # Título do documento
+    elements.append(Paragraph(dados['titulo'], styles['TituloVenda']))
+    elements.append(Spacer(1, 12))
+
+    # Dados da Empresa
+    if empresa:
+        elements.append(Paragraph("<b>%s</b>" % empresa['nome'], style_heading))
+        if empresa['endereco']:
+            elements.append(Paragraph(empresa['endereco'], style_normal))
+        if empresa['telefone']:
+            elements.append(Paragraph("Telefone: %s" % empresa['telefone'], style_normal))
+        elements.append(Spacer(1, 12))
+
+    # Dados da Venda
+    elements.append(Paragraph("<b>DADOS DA VENDA</b>", style_heading))
+    elements.append(_tabela_dados(dados['documento']))
+    elements.append(Spacer(1, 12))
+
+    # Dados do Cliente
+    elements.append(Paragraph("<b>DADOS DO CLIENTE</b>", style_heading))
+    elements.append(_tabela_dados(dados['cliente']))
+    elements.append(Spacer(1, 12))
+
+    # Itens da Venda
+    elements.append(Paragraph("<b>ITENS DA VENDA</b>", style_heading))
+    itens_table = Table([["Produto", "Quantidade", "Valor Unit.", "Total"]] + dados['itens'],
+                        colWidths=[100 * mm, 30 * mm, 30 * mm, 30 * mm])
+    itens_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#CCCCCC")),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+    ]))
+    elements.append(itens_table)
+    elements.append(Spacer(1, 12))
+
+    # Totais
+    elements.append(Paragraph("<b>TOTAIS</b>", style_heading))
+    totais_table = Table(dados['totais'], colWidths=[130 * mm, 50 * mm])
+    totais_table.setStyle(TableStyle([
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ]))
+    elements.append(totais_table)
+    elements.append(Spacer(1, 12))
+
+    # Condições de Pagamento
+    if dados['cond_pagamento']:
+        elements.append(Paragraph("<b>CONDIÇÕES DE PAGAMENTO</b>", style_heading))
+        elements.append(Paragraph(dados['cond_pagamento'], style_normal))
+        elements.append(Spacer(1, 12))
+
+    # Observações
+    elements.append(Paragraph("<b>OBSERVAÇÕES</b>", style_heading))
+    elements.append(Paragraph(dados['observacoes'], style_normal))
+    elements.append(Spacer(1, 12))
+
+    # Vendedor
+    elements.append(Paragraph("<b>Vendedor:</b> %s" % dados['vendedor'], style_normal))
+    return elements
+
+
+def renderizar_pdf_venda(dados):
+    return construir_pdf(dados['titulo'], story_pdf_venda(dados), 20 * mm)
+
+
+def relatorio_pdf_venda(venda, titulo, empresa):
+    """(nome do arquivo, renderizar) do PDF da venda; o nome leva o hash do conteudo."""
+    dados = dados_pdf_venda(venda, titulo, empresa)
+    nome_arquivo = 'venda_%s_%s.pdf' % (venda.pk, chave_conteudo(dados))
+    return nome_arquivo, partial(renderizar_pdf_venda, dados)
+
+
+def agendar_pdf_venda(venda, titulo, empresa):
+    nome_arquivo, renderizar = relatorio_pdf_venda(venda, titulo, empresa)
+    return nome_arquivo, agendar_relatorio(nome_arquivo, renderizar)
+
+
+def agendar_pdf_pedidos_venda(data, empresa):
+    """
+    PDF unico com os pedidos de venda emitidos em data. Retorna
+    (nome do arquivo, Future), ou (None, None) se nao ha pedidos.
+    """
+    relatorios = [relatorio_pdf_venda(pedido, u'Pedido de venda nº %s' % pedido.pk, empresa)
+                  for pedido in carregar_vendas(PedidoVenda.objects.filter(data_emissao=data).order_by('pk'))]
+    if not relatorios:
+        return None, None
+    nome_arquivo = 'pedidos_venda_%s_%s.pdf' % (data.isoformat(), chave_conteudo([nome for nome, _ in relatorios]))
+    return nome_arquivo, agendar_lote(nome_arquivo, relatorios)
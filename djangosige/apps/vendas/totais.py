@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+from djangosige.apps.base.totais_pedidos import atualizar_totais_documento, recalcular_totais_documentos, \
+    conectar_sinais_totais, TAMANHO_LOTE_TOTAIS
+
+from .models import Venda, ItensVenda
+
+IMPOSTOS_ITEM_VENDA = ('vicms', 'vicms_st', 'vipi', 'vfcp', 'vicmsufdest', 'vicmsufremet')
+
+
+def atualizar_totais_venda(venda_id):
+    atualizar_totais_documento(Venda, ItensVenda, 'venda_id', IMPOSTOS_ITEM_VENDA, venda_id)
+
+
+def recalcular_totais_vendas(venda_ids=None, tamanho_lote=TAMANHO_LOTE_TOTAIS):
+    return recalcular_totais_documentos(Venda, ItensVenda, 'venda_id', IMPOSTOS_ITEM_VENDA,
+                                        venda_ids, tamanho_lote)
+
+
+def conectar_sinais_totais_venda():
+    conectar_sinais_totais(Venda, ItensVenda, 'venda_id', atualizar_totais_venda, 'totais_venda')
@@ -61,6 +61,9 @@ urlpatterns = [
     # Gerar pdf pedido
     path('gerarpdfpedidovenda/<int:pk>/',
         views.GerarPDFPedidoVenda.as_view(), name='gerarpdfpedidovenda'),
+    # Gerar pdf unico dos pedidos do dia (?data=dd/mm/aaaa)
+    path('gerarpdfpedidosvendadia/',
+        views.GerarPDFPedidosVendaDia.as_view(), name='gerarpdfpedidosvendadia'),
     # Gerar pedido a partir de um orçamento
     path('gerarpedidovenda/<int:pk>/',
         views.GerarPedidoVendaView.as_view(), name='gerarpedidovenda'),
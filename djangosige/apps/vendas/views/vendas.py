@@ -2,28 +2,18 @@
 
 from django.urls import reverse_lazy
 from django.shortcuts import redirect, get_object_or_404
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.db import transaction
 
 from djangosige.apps.base.custom_views import CustomView, CustomCreateView, CustomListView, CustomUpdateView
+from djangosige.apps.base.relatorios_pdf import dados_empresa_relatorio, data_relatorio, resposta_relatorio_pdf
 
 from djangosige.apps.vendas.forms import OrcamentoVendaForm, PedidoVendaForm, ItensVendaFormSet, PagamentoFormSet
 from djangosige.apps.vendas.models import OrcamentoVenda, PedidoVenda, ItensVenda, Pagamento
-from djangosige.apps.cadastro.models import MinhaEmpresa
-from djangosige.apps.login.models import Usuario
-from djangosige.configs.settings import MEDIA_ROOT
-
+from djangosige.apps.vendas.clonagem import clonar_venda
+from djangosige.apps.vendas.relatorio_pdf import carregar_vendas, agendar_pdf_venda, agendar_pdf_pedidos_venda
 
 from datetime import datetime
-from io import BytesIO
-
-# from .report_vendas import VendaReport
-
-# ReportLab imports
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import mm, inch
 
 
 class AdicionarVendaView(CustomCreateView):
@@ -140,6 +130,9 @@ class VendaListView(CustomListView):
         context = super(VendaListView, self).get_context_data(**kwargs)
         return self.view_context(context)
 
+    def get_queryset(self):
+        return super(VendaListView, self).get_queryset().select_related('cliente')
+
 
 class OrcamentoVendaListView(VendaListView):
     template_name = 'vendas/orcamento_venda/orcamento_venda_list.html'
@@ -163,7 +156,8 @@ class OrcamentoVendaVencidosListView(OrcamentoVendaListView):
         return context
 
     def get_queryset(self):
-        return OrcamentoVenda.objects.filter(data_vencimento__lte=datetime.now().date(), status='0')
+        return super(OrcamentoVendaVencidosListView, self).get_queryset().filter(
+            data_vencimento__lte=datetime.now().date(), status='0')
 
 
 class OrcamentoVendaVencimentoHojeListView(OrcamentoVendaListView):
@@ -176,7 +170,8 @@ class OrcamentoVendaVencimentoHojeListView(OrcamentoVendaListView):
         return context
 
     def get_queryset(self):
-        return OrcamentoVenda.objects.filter(data_vencimento=datetime.now().date(), status='0')
+        return super(OrcamentoVendaVencimentoHojeListView, self).get_queryset().filter(
+            data_vencimento=datetime.now().date(), status='0')
 
 
 class PedidoVendaListView(VendaListView):
@@ -201,7 +196,8 @@ class PedidoVendaAtrasadosListView(PedidoVendaListView):
         return context
 
     def get_queryset(self):
-        return PedidoVenda.objects.filter(data_entrega__lte=datetime.now().date(), status='0')
+        return super(PedidoVendaAtrasadosListView, self).get_queryset().filter(
+            data_entrega__lte=datetime.now().date(), status='0')
 
 
 class PedidoVendaEntregaHojeListView(PedidoVendaListView):
@@ -214,7 +210,8 @@ class PedidoVendaEntregaHojeListView(PedidoVendaListView):
         return context
 
     def get_queryset(self):
-        return PedidoVenda.objects.filter(data_entrega=datetime.now().date(), status='0')
+        return super(PedidoVendaEntregaHojeListView, self).get_queryset().filter(
+            data_entrega=datetime.now().date(), status='0')
 
 
 class EditarVendaView(CustomUpdateView):
@@ -347,33 +344,11 @@ class GerarPedidoVendaView(CustomView):
     def get(self, request, *args, **kwargs):
         orcamento_id = kwargs.get('pk', None)
         orcamento = OrcamentoVenda.objects.get(id=orcamento_id)
-        itens_venda = orcamento.itens_venda.all()
-        pagamentos = orcamento.parcela_pagamento.all()
-        novo_pedido = PedidoVenda()
-
-        for field in orcamento._meta.fields:
-            setattr(novo_pedido, field.name, getattr(orcamento, field.name))
-
-        novo_pedido.venda_ptr = None
-        novo_pedido.pk = None
-        novo_pedido.id = None
-        novo_pedido.status = '0'
-        orcamento.status = '1'  # Baixado
-        orcamento.save()
-        novo_pedido.orcamento = orcamento
-        novo_pedido.save()
-
-        for item in itens_venda:
-            item.pk = None
-            item.id = None
-            item.save()
-            novo_pedido.itens_venda.add(item)
-
-        for pagamento in pagamentos:
-            pagamento.pk = None
-            pagamento.id = None
-            pagamento.save()
-            novo_pedido.parcela_pagamento.add(pagamento)
+
+        with transaction.atomic():
+            novo_pedido = clonar_venda(orcamento, PedidoVenda, status='0', orcamento=orcamento)
+            orcamento.status = '1'  # Baixado
+            orcamento.save()
 
         return redirect(reverse_lazy('vendas:editarpedidovendaview', kwargs={'pk': novo_pedido.id}))
 
@@ -403,27 +378,8 @@ class CancelarPedidoVendaView(CustomView):
 class GerarCopiaVendaView(CustomView):
 
     def get(self, request, instance, redirect_url, *args, **kwargs):
-        itens_venda = instance.itens_venda.all()
-        pagamentos = instance.parcela_pagamento.all()
-
-        instance.pk = None
-        instance.id = None
-        instance.status = '0'
-        instance.save()
-
-        for item in itens_venda:
-            item.pk = None
-            item.id = None
-            item.save()
-            instance.itens_venda.add(item)
-
-        for pagamento in pagamentos:
-            pagamento.pk = None
-            pagamento.id = None
-            pagamento.save()
-            instance.parcela_pagamento.add(pagamento)
-
-        return redirect(reverse_lazy(redirect_url, kwargs={'pk': instance.id}))
+        nova_copia = clonar_venda(instance, status='0')
+        return redirect(reverse_lazy(redirect_url, kwargs={'pk': nova_copia.id}))
 
 
 class GerarCopiaOrcamentoVendaView(GerarCopiaVendaView):
@@ -447,192 +403,9 @@ class GerarCopiaPedidoVendaView(GerarCopiaVendaView):
 
 
 class GerarPDFVenda(CustomView):
-    def gerar_pdf(self, title, venda, user_id):
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=A4,
-            leftMargin=20 * mm,
-            rightMargin=20 * mm,
-            topMargin=20 * mm,
-            bottomMargin=20 * mm,
-            title=title
-        )
-        
-        styles = getSampleStyleSheet()
-        elements = []
-
-        # Estilo personalizado
-        style_title = ParagraphStyle(
-            name='Title',
-            parent=styles['Title'],
-            fontSize=14,
-            alignment=1,
-            spaceAfter=12,
-        )
-        style_normal = styles['Normal']
-        style_heading = styles['Heading4']
-
-        # Logo da empresa
-        try:
-            usuario = Usuario.objects.get(pk=user_id)
-            m_empresa = MinhaEmpresa.objects.get(m_usuario=usuario)
-            empresa = m_empresa.m_empresa
-            
-            if empresa.logo_file and empresa.logo_file != 'imagens/logo.png':
-                logo_path = f"{MEDIA_ROOT}{empresa.logo_file}"
-                logo = Image(logo_path, width=2*inch, height=1*inch)
-                elements.append(logo)
-                elements.append(Spacer(1, 12))
-        except Exception as e:
-            print(f"Erro ao carregar logo: {e}")
-
-        # Título do documento
-        elements.append(Paragraph(title, style_title))
-        elements.append(Spacer(1, 12))
-
-        # Dados da Empresa
-        try:
-            elements.append(Paragraph(f"<b>{empresa.nome_razao_social}</b>", style_heading))
-            
-            if empresa.endereco_padrao:
-                endereco = empresa.endereco_padrao.format_endereco_completo
-                elements.append(Paragraph(endereco, style_normal))
-            
-            if empresa.telefone_padrao:
-                telefone = empresa.telefone_padrao.telefone
-                elements.append(Paragraph(f"Telefone: {telefone}", style_normal))
-            
-            elements.append(Spacer(1, 12))
-        except Exception as e:
-            print(f"Erro ao carregar dados da empresa: {e}")
-
-        # Dados da Venda
-        elements.append(Paragraph("<b>DADOS DA VENDA</b>", style_heading))
-        
-        # Tratamento para datas nulas
-        data_emissao = venda.data_emissao.strftime("%d/%m/%Y") if venda.data_emissao else "Não informada"
-        
-        # Verifica o tipo de venda antes de acessar campos específicos
-        if isinstance(venda, OrcamentoVenda):
-            data_vencimento = venda.data_vencimento.strftime("%d/%m/%Y") if venda.data_vencimento else "Não informada"
-        elif isinstance(venda, PedidoVenda):
-            data_entrega = venda.data_entrega.strftime("%d/%m/%Y") if venda.data_entrega else "Não informada"
-        else:
-            data_vencimento = ""
-            data_entrega = ""
-        
-        venda_data = [
-            ["Número:", str(venda.id)],
-            ["Data de Emissão:", data_emissao],
-        ]
-        
-        if isinstance(venda, OrcamentoVenda):
-            venda_data.append(["Data de Validade:", data_vencimento])
-        elif isinstance(venda, PedidoVenda):
-            venda_data.append(["Data de Entrega:", data_entrega])
-        
-        venda_table = Table(venda_data, colWidths=[80 * mm, 100 * mm])
-        venda_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
-        elements.append(venda_table)
-        elements.append(Spacer(1, 12))
-
-        # Dados do Cliente
-        elements.append(Paragraph("<b>DADOS DO CLIENTE</b>", style_heading))
-        
-        cliente = venda.cliente
-        cliente_data = [
-            ["Nome/Razão Social:", cliente.nome_razao_social],
-            ["CPF/CNPJ:", cliente.format_cpf_cnpj()],
-        ]
-        
-        if cliente.endereco_padrao:
-            cliente_data.append(["Endereço:", cliente.endereco_padrao.format_endereco_completo])
-        if cliente.telefone_padrao:
-            cliente_data.append(["Telefone:", cliente.telefone_padrao.telefone])
-        if cliente.email_padrao:
-            cliente_data.append(["E-mail:", cliente.email_padrao.email])
-        
-        cliente_table = Table(cliente_data, colWidths=[80 * mm, 100 * mm])
-        cliente_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
-        elements.append(cliente_table)
-        elements.append(Spacer(1, 12))
-
-        # Itens da Venda
-        elements.append(Paragraph("<b>ITENS DA VENDA</b>", style_heading))
-        
-        itens = venda.itens_venda.all()
-        itens_data = [["Produto", "Quantidade", "Valor Unit.", "Total"]]
-        
-        for item in itens:
-            itens_data.append([
-                item.produto.descricao,
-                str(item.quantidade),
-                f"R$ {item.valor_unit:.2f}",
-                f"R$ {item.get_total():.2f}",
-            ])
-        
-        itens_table = Table(itens_data, colWidths=[100 * mm, 30 * mm, 30 * mm, 30 * mm])
-        itens_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#CCCCCC")),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
-        ]))
-        elements.append(itens_table)
-        elements.append(Spacer(1, 12))
-
-        # Totais
-        elements.append(Paragraph("<b>TOTAIS</b>", style_heading))
-        
-        totais_data = [
-            ["Subtotal:", f"R$ {venda.get_total_sem_imposto():.2f}"],
-            ["Impostos:", f"R$ {venda.get_total_impostos():.2f}"],
-            ["Total:", f"R$ {venda.valor_total:.2f}"],
-        ]
-        
-        totais_table = Table(totais_data, colWidths=[130 * mm, 50 * mm])
-        totais_table.setStyle(TableStyle([
-            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ]))
-        elements.append(totais_table)
-        elements.append(Spacer(1, 12))
-
-        # Condições de Pagamento
-        if venda.cond_pagamento:
-            elements.append(Paragraph("<b>CONDIÇÕES DE PAGAMENTO</b>", style_heading))
-            elements.append(Paragraph(venda.cond_pagamento.descricao, style_normal))
-            elements.append(Spacer(1, 12))
-
-        # Observações
-        elements.append(Paragraph("<b>OBSERVAÇÕES</b>", style_heading))
-        elements.append(Paragraph(venda.observacoes or "Nenhuma observação.", style_normal))
-        elements.append(Spacer(1, 12))
-
-        # Vendedor
-        elements.append(Paragraph(f"<b>Vendedor:</b> {venda.vendedor}", style_normal))
-
-        # Gera o PDF
-        doc.build(elements)
-        pdf = buffer.getvalue()
-        buffer.close()
-
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="{title}.pdf"'
-        response.write(pdf)
-        return response
+    def gerar_pdf(self, request, title, venda):
+        nome_arquivo, futuro = agendar_pdf_venda(venda, title, dados_empresa_relatorio(request.user))
+        return resposta_relatorio_pdf(title, nome_arquivo, futuro)
 
 
 class GerarPDFOrcamentoVenda(GerarPDFVenda):
@@ -643,9 +416,9 @@ class GerarPDFOrcamentoVenda(GerarPDFVenda):
         if not venda_id:
             return HttpResponse('Objeto não encontrado.')
 
-        obj = get_object_or_404(OrcamentoVenda, pk=venda_id)  # Agora a função está disponível
+        obj = get_object_or_404(carregar_vendas(OrcamentoVenda.objects), pk=venda_id)
         title = f'Orçamento de venda nº {venda_id}'
-        return self.gerar_pdf(title, obj, request.user.id)
+        return self.gerar_pdf(request, title, obj)
 
 
 class GerarPDFPedidoVenda(GerarPDFVenda):
@@ -656,7 +429,20 @@ class GerarPDFPedidoVenda(GerarPDFVenda):
         if not venda_id:
             return HttpResponse('Objeto não encontrado.')
 
-        obj = get_object_or_404(PedidoVenda, pk=venda_id)  # Agora a função está disponível
+        obj = get_object_or_404(carregar_vendas(PedidoVenda.objects), pk=venda_id)
         title = f'Pedido de venda nº {venda_id}'
-        return self.gerar_pdf(title, obj, request.user.id)
-        
\ No newline at end of file
+        return self.gerar_pdf(request, title, obj)
+
+
+class GerarPDFPedidosVendaDia(CustomView):
+    permission_codename = 'change_pedidovenda'
+
+    def get(self, request, *args, **kwargs):
+        data = data_relatorio(request.GET.get('data'))
+        if data is None:
+            return HttpResponseBadRequest('Data inválida.')
+
+        nome_arquivo, futuro = agendar_pdf_pedidos_venda(data, dados_empresa_relatorio(request.user))
+        if nome_arquivo is None:
+            return HttpResponse(f'Nenhum pedido de venda emitido em {data:%d/%m/%Y}.')
+        return resposta_relatorio_pdf(f'Pedidos de venda de {data:%d-%m-%Y}', nome_arquivo, futuro)
@@ -91,6 +91,12 @@ MIDDLEWARE = [
     'djangosige.middleware.LoginRequiredMiddleware',
 ]
 
+# Monitor de consultas e tempos por view (ver base/desempenho.py)
+MONITOR_DESEMPENHO = config('MONITOR_DESEMPENHO', default='False') == 'True'
+MONITOR_DESEMPENHO_DIR = config('MONITOR_DESEMPENHO_DIR', default=os.path.join(PROJECT_ROOT, 'desempenho'))
+if MONITOR_DESEMPENHO:
+    MIDDLEWARE.append('djangosige.middleware.MonitorDesempenhoMiddleware')
+
 ROOT_URLCONF = 'djangosige.urls'
 
 TEMPLATES = [
@@ -169,6 +175,15 @@ MEDIA_URL = 'media/'
 
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
+# Com mais de um processo (gunicorn/uwsgi), configure um cache compartilhado;
+# com o LocMemCache padrao as permissoes nao ficam em cache entre requisicoes
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379',
+#     }
+# }
+
 LOGIN_NOT_REQUIRED = (
     '/login/',
     '/login/esqueceu/',
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
 import re
+import time
+
+from django.db import connection
 from django.shortcuts import redirect
 from django.utils.deprecation import MiddlewareMixin
 from django.urls import reverse # Usar reverse para evitar hardcoding
@@ -67,3 +70,43 @@ class LoginRequiredMiddleware(MiddlewareMixin):
             else:
                  # Se, por algum motivo, chegou aqui tentando acessar /login/ sem estar isento, permite
                  return None
+
+
+class MonitorDesempenhoMiddleware(object):
+    """
+    Opcional (MONITOR_DESEMPENHO): registra por view o numero de consultas,
+    o tempo de banco, as consultas repetidas (N+1), o tempo de
+    renderizacao e o tamanho da resposta. Ver base.desempenho.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from djangosige.apps.base.desempenho import ColetorConsultas, registrar_amostra
+
+        coletor = ColetorConsultas()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(coletor):
+            response = self.get_response(request)
+        tempo_total = time.perf_counter() - inicio
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is not None:
+            render = getattr(request, '_monitor_render', None)
+            registrar_amostra(resolver_match.view_name, {
+                'consultas': coletor.consultas,
+                'tempo_db': coletor.tempo_db,
+                'tempo_total': tempo_total,
+                'tempo_render': render[1] - render[0] if render and len(render) == 2 else None,
+                'tamanho': None if response.streaming else len(response.content),
+                'duplicadas': coletor.duplicadas(),
+            })
+        return response
+
+    def process_template_response(self, request, response):
+        # A renderizacao acontece logo apos este metodo
+        request._monitor_render = [time.perf_counter()]
+        response.add_post_render_callback(
+            lambda r: request._monitor_render.append(time.perf_counter()))
+        return response
@@ -155,6 +155,30 @@ $.Admin.messages = {
 
 //DataTable
 $.Admin.table = {
+    language: {
+        "sEmptyTable": "Nenhum registro encontrado",
+        "sInfo": "Mostrando de _START_ até _END_ de _TOTAL_ registros",
+        "sInfoEmpty": "Mostrando 0 até 0 de 0 registros",
+        "sInfoFiltered": "(Filtrados de _MAX_ registros)",
+        "sInfoPostFix": "",
+        "sInfoThousands": ".",
+        "sLengthMenu": "Mostrar _MENU_ resultados por página",
+        "sLoadingRecords": "Carregando...",
+        "sProcessing": "Processando...",
+        "sZeroRecords": "Nenhum registro encontrado",
+        "sSearch": "Pesquisar",
+        "oPaginate": {
+            "sNext": "Próximo",
+            "sPrevious": "Anterior",
+            "sFirst": "Primeiro",
+            "sLast": "Último"
+        },
+        "oAria": {
+            "sSortAscending": ": Ordenar colunas de forma ascendente",
+            "sSortDescending": ": Ordenar colunas de forma descendente"
+        },
+    },
+
     init: function() {
         var $btnRemove = $('.btn-remove');
 
@@ -192,29 +216,7 @@ $.Admin.table = {
         //Tabela DataTable
         dTable = $('#lista-database').DataTable({
             "dom" : 'ltipr',
-            "language" : {
-                "sEmptyTable": "Nenhum registro encontrado",
-                "sInfo": "Mostrando de _START_ até _END_ de _TOTAL_ registros",
-                "sInfoEmpty": "Mostrando 0 até 0 de 0 registros",
-                "sInfoFiltered": "(Filtrados de _MAX_ registros)",
-                "sInfoPostFix": "",
-                "sInfoThousands": ".",
-                "sLengthMenu": "Mostrar _MENU_ resultados por página",
-                "sLoadingRecords": "Carregando...",
-                "sProcessing": "Processando...",
-                "sZeroRecords": "Nenhum registro encontrado",
-                "sSearch": "Pesquisar",
-                "oPaginate": {
-                    "sNext": "Próximo",
-                    "sPrevious": "Anterior",
-                    "sFirst": "Primeiro",
-                    "sLast": "Último"
-                },
-                "oAria": {
-                    "sSortAscending": ": Ordenar colunas de forma ascendente",
-                    "sSortDescending": ": Ordenar colunas de forma descendente"
-                },
-            }
+            "language" : this.language
         });
 
         //Campo de busca
@@ -2441,7 +2443,7 @@ $.Admin.movimentoEstoqueForm = {
                     var postData = {
                         'vendaId': $(this).val(),
                     }
-                    $.Admin.ajaxRequest.ajaxPostRequest(req_urls['info_venda_url'], postData, _this.handlePedidoInfo);
+                    $.Admin.ajaxRequest.ajaxGetRequest(req_urls['info_venda_url'] + '?' + $.param(postData), _this.handlePedidoInfo);
                 }else{
                     _this.handlePedidoInfo(null);
                 }
@@ -2450,7 +2452,7 @@ $.Admin.movimentoEstoqueForm = {
                     var postData = {
                         'compraId': $(this).val(),
                     }
-                    $.Admin.ajaxRequest.ajaxPostRequest(req_urls['info_compra_url'], postData, _this.handlePedidoInfo);
+                    $.Admin.ajaxRequest.ajaxGetRequest(req_urls['info_compra_url'] + '?' + $.param(postData), _this.handlePedidoInfo);
                 }else{
                     _this.handlePedidoInfo(null);
                 }
@@ -2717,6 +2719,80 @@ $.Admin.lancamentoList = {
 }
 
 
+//Lista de movimentos de estoque (DataTable server-side)
+$.Admin.movimentoEstoqueList = {
+    init: function(req_urls) {
+        var _this = this;
+        //Cursor (keyset) do inicio de cada pagina ja visitada
+        _this.cursores = {};
+        _this.estado = null;
+
+        var mTable = $('#lista-movimentos').DataTable({
+            "dom" : 'ltipr',
+            "serverSide": true,
+            "processing": true,
+            "order": [[0, 'desc']],
+            "columnDefs": [{"orderable": false, "targets": [2, 5]}, {"className": "lista-remove", "targets": 5}],
+            "ajax": {
+                "url": req_urls.movimentos_url,
+                "data": function(d){
+                    $('.filtro-movimento').each(function(){
+                        d[$(this).prop('name')] = $(this).val();
+                    });
+                    //Ordem, busca ou filtros mudaram: cursores anteriores nao valem mais
+                    var estado = JSON.stringify([d.order, d.search, d.length, $('.filtro-movimento').serialize()]);
+                    if(estado != _this.estado){
+                        _this.estado = estado;
+                        _this.cursores = {};
+                    }
+                    if(d.start in _this.cursores){
+                        d.cursor = _this.cursores[d.start];
+                    }
+                    _this.proximoInicio = d.start + d.length;
+                },
+                "dataSrc": function(json){
+                    if(json.cursor){
+                        _this.cursores[_this.proximoInicio] = json.cursor;
+                    }
+                    return json.data;
+                },
+            },
+            "language" : $.Admin.table.language
+        });
+
+        $('#search-bar').keyup(function(){
+            mTable.search($(this).val()).draw();
+        });
+
+        $('.filtro-movimento').on('change', function(){
+            mTable.draw();
+        });
+
+        //Filtro de produto: sugestoes do servidor, sem listar o catalogo inteiro
+        var produto_input = $('#filtro-produto-movimento');
+        var produto_filtro = $('.filtro-movimento[name="produto"]');
+        produto_input.autocomplete({
+            minLength: 2,
+            source: req_urls.produtos_filtro_url,
+            select: function(event, ui){
+                produto_input.val(ui.item.label);
+                produto_filtro.val(ui.item.value).trigger('change');
+                return false;
+            },
+            messages: {
+                noResults:'',
+                results:function(){}
+            }
+        });
+        produto_input.on('input', function(){
+            if($(this).val() == '' && produto_filtro.val() != ''){
+                produto_filtro.val('').trigger('change');
+            }
+        });
+    },
+}
+
+
 $.Admin.notaFiscalForm = {
     init: function(req_urls, tipo_nf) {
         var _this = this;
@@ -2780,7 +2856,7 @@ $.Admin.notaFiscalForm = {
                     var postData = {
                         'vendaId': $(this).val(),
                     }
-                    $.Admin.ajaxRequest.ajaxPostRequest(req_urls['info_venda_url'], postData, _this.handleVendaInfo, initial);
+                    $.Admin.ajaxRequest.ajaxGetRequest(req_urls['info_venda_url'] + '?' + $.param(postData), _this.handleVendaInfo, initial);
                 }else{
                     _this.handleVendaInfo(null, initial);
                 }
@@ -2789,7 +2865,7 @@ $.Admin.notaFiscalForm = {
                     var postData = {
                         'compraId': $(this).val(),
                     }
-                    $.Admin.ajaxRequest.ajaxPostRequest(req_urls['info_compra_url'], postData, _this.handleCompraInfo, initial);
+                    $.Admin.ajaxRequest.ajaxGetRequest(req_urls['info_compra_url'] + '?' + $.param(postData), _this.handleCompraInfo, initial);
                 }else{
                     _this.handleCompraInfo(null, initial);
                 }
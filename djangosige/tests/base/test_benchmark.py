@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.test import TestCase
+
+from djangosige.apps.base.benchmark_views import executar_benchmark_views, contar_volumes
+from djangosige.apps.base.dados_benchmark import ESCALAS, gerar_dados_benchmark
+from djangosige.apps.cadastro.models import Produto
+from djangosige.apps.estoque.models import ProdutoEstocado
+from djangosige.apps.financeiro.models import MovimentoCaixa, ResumoMovimentoCaixa
+from djangosige.apps.vendas.models import PedidoVenda, OrcamentoVenda, ItensVenda
+
+VOLUMES_TESTE = {
+    'clientes': 30, 'fornecedores': 10, 'produtos': 20, 'vendas': 40, 'compras': 10,
+    'lancamentos': 50, 'dias': 30, 'movimentos': 30,
+}
+
+
+class DadosBenchmarkTestCase(TestCase):
+    """
+    Testa a geracao da empresa sintetica e a medicao dos endpoints
+    """
+
+    def test_gerar_dados_benchmark(self):
+        gerar_dados_benchmark('pequena', semente=1, data_final=date(2024, 6, 30), **VOLUMES_TESTE)
+        volumes = contar_volumes()
+        self.assertEqual(volumes['Cliente'], 30)
+        self.assertEqual(volumes['Venda'], 40)
+        self.assertEqual(PedidoVenda.objects.count() + OrcamentoVenda.objects.count(), 40)
+        self.assertGreater(volumes['MovimentoCaixa'], 0)
+        self.assertGreater(volumes['ItensMovimento'], 0)
+
+        # Estoque do produto coerente com os movimentos e os locais
+        for produto in Produto.objects.all():
+            self.assertEqual(produto.estoque_atual, sum(
+                ProdutoEstocado.objects.filter(produto=produto).values_list('quantidade', flat=True),
+                Decimal('0.00')))
+
+        # Deterministico: a mesma semente gera os mesmos itens
+        itens = list(ItensVenda.objects.order_by('pk').values_list('quantidade', 'valor_unit'))
+        ItensVenda.objects.all().delete()
+        gerar_dados_benchmark('pequena', semente=1, data_final=date(2024, 6, 30), **VOLUMES_TESTE)
+        self.assertEqual(list(ItensVenda.objects.order_by('pk').values_list('quantidade', 'valor_unit')), itens)
+
+        # A segunda geracao reaproveita os dias de caixa e continua os saldos
+        self.assertFalse(MovimentoCaixa.objects.values('data_movimento').annotate(
+            n=Count('pk')).filter(n__gt=1).exists())
+        saldo = Decimal('0.00')
+        for movimento in MovimentoCaixa.objects.order_by('data_movimento'):
+            self.assertEqual(movimento.saldo_inicial, saldo)
+            saldo = movimento.saldo_final
+            self.assertEqual(saldo, movimento.saldo_inicial + movimento.entradas - movimento.saidas)
+        totais = MovimentoCaixa.objects.aggregate(entradas=Sum('entradas'), saidas=Sum('saidas'))
+        self.assertEqual(ResumoMovimentoCaixa.objects.filter(periodo='A').aggregate(
+            entradas=Sum('entradas'), saidas=Sum('saidas')), totais)
+
+    def test_executar_benchmark_views(self):
+        ESCALAS['teste'] = dict(ESCALAS['pequena'], **VOLUMES_TESTE)
+        self.addCleanup(ESCALAS.pop, 'teste')
+        nomes = ['dashboard', 'lista_pedidos_venda', 'lista_movimentos_estoque_json', 'info_cliente']
+
+        relatorio = executar_benchmark_views(['teste'], repeticoes=1, nomes=nomes)
+        escala = relatorio['escalas'][0]
+        self.assertEqual(escala['volumes']['Venda'], 40)
+        self.assertEqual([e['nome'] for e in escala['endpoints']], nomes)
+        for endpoint in escala['endpoints']:
+            self.assertEqual(endpoint.get('status'), 200, endpoint)
+            self.assertGreater(endpoint['consultas'], 0)
+
+        # Os dados gerados sao descartados ao final
+        self.assertEqual(contar_volumes()['Venda'], 0)
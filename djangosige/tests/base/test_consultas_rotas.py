@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from datetime import date
+
+from django.db.models import Count
+
+from djangosige.apps.base.dados_benchmark import gerar_dados_benchmark
+from djangosige.apps.cadastro.models import Cliente, Fornecedor, Empresa, Transportadora, Produto, Marca, \
+    PessoaJuridica
+from djangosige.apps.estoque.models import LocalEstoque, SaidaEstoque, TransferenciaEstoque
+from djangosige.apps.fiscal.models import NaturezaOperacao, NotaFiscal
+from djangosige.apps.vendas.models import PedidoVenda, OrcamentoVenda, CondicaoPagamento
+from djangosige.apps.compras.models import PedidoCompra, OrcamentoCompra
+from djangosige.apps.financeiro.models import Entrada
+from djangosige.tests.test_case import ConsultasRotasTestCase
+
+# Volumes da primeira carga; a segunda (outra semente) dobra as linhas
+VOLUMES_CONSULTAS = {
+    'clientes': 8, 'fornecedores': 4, 'produtos': 8, 'vendas': 12, 'compras': 6,
+    'lancamentos': 12, 'dias': 10, 'movimentos': 8,
+}
+
+# {rota: [consultas com 1x os dados, consultas com 2x os dados, status]}
+ARQUIVO_REFERENCIA = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'consultas_rotas.json')
+
+# Variacao tolerada entre as duas cargas e em relacao a referencia. A carga
+# e deterministica, entao qualquer consulta a mais e uma mudanca real
+FOLGA_CONSULTAS = 0
+
+
+def _primeiro(model, **filtros):
+    return model.objects.filter(**filtros).order_by('pk').values_list('pk', flat=True).first()
+
+
+def _data_pedido(model):
+    # Dia com mais pedidos na carga (a data padrao, hoje, nao teria nenhum):
+    # com a segunda carga ele passa a ter mais pedidos
+    def dados(teste):
+        dia = model.objects.values('data_emissao').annotate(
+            pedidos=Count('pk')).order_by('-pedidos', 'data_emissao').first()
+        return {'data': dia['data_emissao'].strftime('%d/%m/%Y') if dia else None}
+    return dados
+
+
+def _pk(model, **filtros):
+    return lambda teste: {'pk': _primeiro(model, **filtros)}
+
+
+class ConsultasRotasViewsTestCase(ConsultasRotasTestCase):
+    """
+    Guarda de regressao do numero de consultas de todas as rotas dos apps.
+    Cada rota e medida com a carga sintetica e com o dobro dela: nenhuma
+    rota pode crescer com as linhas, nem passar das consultas gravadas na
+    referencia (consultas_rotas.json). Para regravar a referencia:
+    ATUALIZAR_REFERENCIA_CONSULTAS=1.
+    """
+    ROTAS_IGNORADAS = {
+        'login:logoutview': u'Encerra a sessao usada pelas demais rotas.',
+        'login:trocarsenhaview': u'Depende de um token de redefinicao de senha.',
+        'fiscal:nota_fiscal_emitir': u'Comunicacao com a SEFAZ.',
+        'fiscal:nota_fiscal_consultar_status': u'Comunicacao com a SEFAZ.',
+        'fiscal:nota_fiscal_cancelar': u'Comunicacao com a SEFAZ.',
+        # Rotas quebradas na arvore atual (respondem 500 com qualquer carga)
+        'login:deletarusuarioview': u'Template login/user_confirm_delete.html inexistente.',
+        'fiscal:configuracaonotafiscal': u'ConfiguracaoNotaFiscalView sem model/queryset (ImproperlyConfigured).',
+        'fiscal:nota_fiscal_detail': u'Template fiscal/nota_fiscal/notafiscal_detail.html inexistente.',
+        'fiscal:addnaturezaoperacaoview': u'Template fiscal/natureza_operacao/natureza_operacao_form.html inexistente.',
+        'fiscal:editarnaturezaoperacaoview': u'Template fiscal/natureza_operacao/natureza_operacao_form.html inexistente.',
+        'fiscal:consultarcadastro': u'Template fiscal/sefaz_forms/consultar_cadastro_form.html inexistente.',
+        'fiscal:inutilizarnotas': u'Template fiscal/sefaz_forms/inutilizar_notas_form.html inexistente.',
+        'fiscal:consultarnota': u'Template fiscal/sefaz_forms/consultar_nota_form.html inexistente.',
+        'fiscal:consultarnotapk': u'Template fiscal/sefaz_forms/consultar_nota_form.html inexistente.',
+        'fiscal:manifestacaodestinatario': u'Template base/pagina_em_construcao.html inexistente.',
+    }
+
+    PARAMETROS_ROTAS = {
+        'login:usuariodetailview': lambda teste: {'pk': teste.user.pk},
+        'login:permissoesusuarioview': lambda teste: {'pk': teste.user.pk},
+        'login:deletarusuarioview': lambda teste: {'pk': teste.user.pk},
+        'fiscal:baixarnota': _pk(NotaFiscal),
+        'fiscal:consultarnotapk': _pk(NotaFiscal),
+        'vendas:gerarpdforcamentovenda': _pk(OrcamentoVenda),
+        'vendas:gerarpdfpedidovenda': _pk(PedidoVenda),
+        'vendas:gerarpedidovenda': _pk(OrcamentoVenda),
+        'vendas:copiarorcamentovenda': _pk(OrcamentoVenda),
+        'vendas:copiarpedidovenda': _pk(PedidoVenda),
+        'vendas:cancelarorcamentovenda': _pk(OrcamentoVenda),
+        'vendas:cancelarpedidovenda': _pk(PedidoVenda),
+        'compras:gerarpdforcamentocompra': _pk(OrcamentoCompra),
+        'compras:gerarpdfpedidocompra': _pk(PedidoCompra),
+        'compras:gerarpedidocompra': _pk(OrcamentoCompra),
+        'compras:copiarorcamentocompra': _pk(OrcamentoCompra),
+        'compras:copiarpedidocompra': _pk(PedidoCompra),
+        'compras:cancelarorcamentocompra': _pk(OrcamentoCompra),
+        'compras:cancelarpedidocompra': _pk(PedidoCompra),
+        'compras:receberpedidocompra': _pk(PedidoCompra),
+        'financeiro:faturarpedidovenda': _pk(PedidoVenda),
+        'financeiro:faturarpedidocompra': _pk(PedidoCompra),
+    }
+
+    DADOS_ROTAS = {
+        'cadastro:infoempresa': lambda teste: {'pessoaId': _primeiro(Empresa)},
+        'cadastro:infocliente': lambda teste: {'pessoaId': _primeiro(Cliente)},
+        'cadastro:infofornecedor': lambda teste: {'pessoaId': _primeiro(Fornecedor)},
+        'cadastro:infotransportadora': lambda teste: {'transportadoraId': _primeiro(Transportadora)},
+        'cadastro:infoproduto': lambda teste: {'produtoId': _primeiro(Produto)},
+        'vendas:infocondpagamento': lambda teste: {'pagamentoId': _primeiro(CondicaoPagamento)},
+        'vendas:infovenda': lambda teste: {'vendaId': _primeiro(PedidoVenda)},
+        'compras:infocompra': lambda teste: {'compraId': _primeiro(PedidoCompra)},
+        'estoque:listaprodutosmovimentojson': lambda teste: {'term': u'Produto'},
+        'vendas:gerarpdfpedidosvendadia': _data_pedido(PedidoVenda),
+        'compras:gerarpdfpedidoscompradia': _data_pedido(PedidoCompra),
+        # Conta a receber em aberto, ainda sem movimento de caixa
+        'financeiro:gerarlancamento': lambda teste: {
+            'contaId': _primeiro(Entrada, status='1'), 'tipoConta': '0', 'dataPagamento': '01/06/2024'},
+    }
+
+    def setUp(self):
+        super(ConsultasRotasViewsTestCase, self).setUp()
+        # Cadastros que a carga sintetica nao gera, fora das duas medicoes
+        local = LocalEstoque.objects.create(descricao=u'Local consultas')
+        empresa = Empresa.objects.create(nome_razao_social=u'Empresa consultas', tipo_pessoa='PJ')
+        PessoaJuridica.objects.create(pessoa_id=empresa, cnpj=u'11.222.333/0001-81')
+        transportadora = Transportadora.objects.create(
+            nome_razao_social=u'Transportadora consultas', tipo_pessoa='PJ')
+        PessoaJuridica.objects.create(pessoa_id=transportadora, cnpj=u'44.555.666/0001-72')
+        Marca.objects.create(marca_desc=u'Marca consultas')
+        NaturezaOperacao.objects.create(codigo='5102', descricao=u'Venda')
+        NotaFiscal.objects.create(serie='1', numero=1, emitente=empresa)
+        SaidaEstoque.objects.create(local_orig=local, data_movimento=date(2024, 6, 1))
+        TransferenciaEstoque.objects.create(local_estoque_orig=local, local_estoque_dest=local,
+                                            data_movimento=date(2024, 6, 1))
+
+    def carregar_referencia(self):
+        if not os.path.exists(ARQUIVO_REFERENCIA):
+            return {}
+        with open(ARQUIVO_REFERENCIA) as arquivo:
+            return json.load(arquivo)
+
+    def gravar_referencia(self, medicoes):
+        with open(ARQUIVO_REFERENCIA, 'w') as arquivo:
+            json.dump(medicoes, arquivo, indent=1, sort_keys=True)
+            arquivo.write('\n')
+
+    def verificar_rota(self, nome, consultas, referencia):
+        """Retorna a mensagem de erro da rota, ou None."""
+        n1, n2, status = consultas
+        if status >= 500:
+            return u'%s: status %s' % (nome, status)
+        if n2 - n1 > FOLGA_CONSULTAS:
+            return u'%s (status %s): %s -> %s consultas ao dobrar os dados (O(n))' % (
+                nome, status, n1, n2)
+        if referencia is not None and n1 > referencia[0] + FOLGA_CONSULTAS:
+            return u'%s (status %s): %s consultas, referencia %s' % (nome, status, n1, referencia[0])
+        return None
+
+    def test_consultas_nao_crescem_com_os_dados(self):
+        data_final = date(2024, 6, 30)
+        gerar_dados_benchmark('pequena', semente=1, data_final=data_final, **VOLUMES_CONSULTAS)
+        primeira = self.medir_rotas()
+        self.assertEqual(self.rotas_sem_parametros, [],
+                         u'Rotas sem parametros: incluir em PARAMETROS_ROTAS, DADOS_ROTAS ou ROTAS_IGNORADAS')
+
+        gerar_dados_benchmark('pequena', semente=2, data_final=data_final, **VOLUMES_CONSULTAS)
+        segunda = self.medir_rotas()
+
+        medicoes = dict((nome, [primeira[nome]['consultas'], segunda[nome]['consultas'],
+                                segunda[nome]['status']]) for nome in primeira)
+        if os.environ.get('ATUALIZAR_REFERENCIA_CONSULTAS'):
+            self.gravar_referencia(medicoes)
+
+        referencia = self.carregar_referencia()
+        erros = [erro for erro in (self.verificar_rota(nome, medicoes[nome], referencia.get(nome))
+                                   for nome in sorted(medicoes)) if erro]
+        self.assertEqual(erros, [], u'\n'.join(erros))
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from djangosige.apps.base.dashboard import get_metricas_dashboard
+from djangosige.apps.cadastro.models import Cliente, Fornecedor, Produto
+from djangosige.apps.vendas.models import PedidoVenda
+from djangosige.apps.estoque.models import LocalEstoque
+from djangosige.apps.financeiro.models import Entrada, Saida, MovimentoCaixa
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+
+class DashboardMetricasTestCase(TestCase):
+    """
+    Testa os contadores da pagina inicial
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.hoje = datetime.now().date()
+        cliente = Cliente.objects.create(
+            nome_razao_social='Cliente', tipo_pessoa='PF')
+        Fornecedor.objects.create(
+            nome_razao_social='Fornecedor', tipo_pessoa='PJ')
+        Produto.objects.create(codigo='1', descricao='produto',
+                               estoque_atual=Decimal('1.00'), estoque_minimo=Decimal('5.00'))
+        Produto.objects.create(codigo='2', descricao='produto',
+                               estoque_atual=Decimal('10.00'), estoque_minimo=Decimal('5.00'))
+        local = LocalEstoque.objects.create(descricao='localTeste')
+        PedidoVenda.objects.create(
+            cliente=cliente, local_orig=local, data_entrega=self.hoje, status='0')
+        Entrada.objects.create(data_vencimento=self.hoje, status='1')
+        Saida.objects.create(
+            data_vencimento=self.hoje - timedelta(days=1), status='2')
+        MovimentoCaixa.objects.create(
+            data_movimento=self.hoje - timedelta(days=2), saldo_final=Decimal('42.00'))
+
+    def test_metricas_dashboard(self):
+        with self.assertNumQueries(6):
+            metricas = get_metricas_dashboard(self.hoje)
+        self.assertEqual(metricas['quantidade_cadastro']['clientes'], 1)
+        self.assertEqual(metricas['quantidade_cadastro']['fornecedores'], 1)
+        self.assertEqual(metricas['quantidade_cadastro']['produtos'], 2)
+        self.assertEqual(metricas['alertas']['produtos_baixo_estoque'], 1)
+        self.assertEqual(metricas['agenda_hoje']['pedido_venda_hoje'], 1)
+        self.assertEqual(metricas['alertas']['pedidos_venda_atrasados'], 1)
+        self.assertEqual(metricas['agenda_hoje']['contas_receber_hoje'], 1)
+        self.assertEqual(metricas['agenda_hoje']['contas_pagar_hoje'], 0)
+        self.assertEqual(metricas['alertas']['contas_pagar_atrasadas'], 1)
+        self.assertEqual(metricas['saldo'], Decimal('42.00'))
+
+    def test_metricas_dashboard_cache(self):
+        get_metricas_dashboard(self.hoje)
+        with self.assertNumQueries(0):
+            get_metricas_dashboard(self.hoje)
+
+        # Invalidar cache ao salvar um modelo relacionado
+        Cliente.objects.create(nome_razao_social='Cliente 2', tipo_pessoa='PF')
+        metricas = get_metricas_dashboard(self.hoje)
+        self.assertEqual(metricas['quantidade_cadastro']['clientes'], 2)
+
+    @override_settings(DASHBOARD_CACHE_TIMEOUT=0)
+    def test_metricas_dashboard_expiram(self):
+        # Alteracoes feitas por outros processos aparecem quando a entrada expira
+        get_metricas_dashboard(self.hoje)
+        with self.assertNumQueries(6):
+            get_metricas_dashboard(self.hoje)
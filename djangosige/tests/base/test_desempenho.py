@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from djangosige.apps.base.desempenho import ColetorConsultas, impressao_digital, limpar_amostras, \
+    carregar_amostras, gravar_amostras, resumir_amostras
+
+
+class MonitorDesempenhoTestCase(TestCase):
+    """
+    Testa o registro de consultas e tempos por view
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio)
+        limpar_amostras(self.diretorio)
+        self.user = User.objects.create_superuser(
+            username='admin', email='admin@teste.com', password='senha')
+        self.client.login(username='admin', password='senha')
+
+    def test_impressao_digital(self):
+        self.assertEqual(
+            impressao_digital("SELECT * FROM t WHERE id = 10 AND nome = 'a''b' AND x IN (%s, %s)"),
+            'SELECT * FROM t WHERE id = ? AND nome = ? AND x IN (...)')
+
+        coletor = ColetorConsultas()
+        for sql in ('SELECT 1 WHERE id = %s', 'SELECT 1 WHERE id = %s', 'SELECT 2'):
+            coletor(lambda *args: None, sql, None, False, {})
+        self.assertEqual(coletor.consultas, 3)
+        self.assertEqual(coletor.duplicadas(), {'SELECT ? WHERE id = %s': 2})
+
+    def test_middleware_e_relatorio(self):
+        middleware = settings.MIDDLEWARE + ['djangosige.middleware.MonitorDesempenhoMiddleware']
+        with override_settings(MIDDLEWARE=middleware, MONITOR_DESEMPENHO_DIR=self.diretorio):
+            self.client.get(reverse('base:index'))
+            self.client.get(reverse('base:index'))
+            response = self.client.get(reverse('base:desempenho'))
+            gravar_amostras()
+        self.assertContains(response, 'base:index')
+
+        relatorio = resumir_amostras(carregar_amostras(self.diretorio, incluir_processo=False))
+        linha = [item for item in relatorio if item['view'] == 'base:index'][0]
+        self.assertEqual(linha['requisicoes'], 2)
+        self.assertGreater(linha['consultas_max'], 0)
+        self.assertGreater(linha['tempo_render_medio'], 0)
+        self.assertGreater(linha['tamanho_medio'], 0)
+
+        saida = StringIO()
+        call_command('relatorio_desempenho', diretorio=self.diretorio, ordem='consultas',
+                     limpar=True, stdout=saida)
+        self.assertIn('base:index', saida.getvalue())
+        self.assertFalse(carregar_amostras(self.diretorio))
+
+    def test_pagina_apenas_superusuario(self):
+        self.user.is_superuser = False
+        self.user.save()
+        response = self.client.get(reverse('base:desempenho'))
+        self.assertRedirects(response, reverse('base:index'), fetch_redirect_response=False)
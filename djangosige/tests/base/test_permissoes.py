@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User, Group, Permission
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from djangosige.apps.base.permissoes import usuario_tem_permissoes
+
+
+class PermissoesCacheTestCase(TestCase):
+    """
+    Testa o cache de permissoes usado pelo CheckPermissionMixin
+    """
+
+    def setUp(self):
+        # Cache em arquivo: compartilhado entre os processos do servidor
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio, True)
+        configuracao = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': diretorio,
+        }})
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        cache.clear()
+        self.user = User.objects.create_user(username='usuario', password='senha')
+        self.grupo = Group.objects.create(name='vendas')
+        self.permissao = Permission.objects.get(
+            content_type__app_label='vendas', codename='view_pedidovenda')
+
+    def test_permissoes_em_cache(self):
+        self.user.user_permissions.add(self.permissao)
+        self.assertTrue(usuario_tem_permissoes(self.user, ['vendas.view_pedidovenda']))
+
+        # Novo objeto de usuario (nova requisicao) nao consulta o banco
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(usuario_tem_permissoes(user, ['vendas.view_pedidovenda']))
+            self.assertFalse(usuario_tem_permissoes(user, ['vendas.delete_pedidovenda']))
+
+    def test_invalidar_permissoes(self):
+        def tem_permissao():
+            # Cada requisicao carrega um novo objeto de usuario
+            return usuario_tem_permissoes(User.objects.get(pk=self.user.pk), ['vendas.view_pedidovenda'])
+
+        self.assertFalse(tem_permissao())
+
+        self.grupo.permissions.add(self.permissao)
+        self.user.groups.add(self.grupo)
+        self.assertTrue(tem_permissao())
+
+        self.grupo.permissions.remove(self.permissao)
+        self.assertFalse(tem_permissao())
+
+    def test_superusuario(self):
+        self.user.is_superuser = True
+        with self.assertNumQueries(0):
+            self.assertTrue(usuario_tem_permissoes(self.user, ['vendas.delete_pedidovenda']))
+
+    def test_cache_por_processo_consulta_o_banco(self):
+        self.user.user_permissions.add(self.permissao)
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertTrue(usuario_tem_permissoes(
+                User.objects.get(pk=self.user.pk), ['vendas.view_pedidovenda']))
+            # Revogacao feita por outro processo (sem sinal neste) vale na
+            # proxima requisicao
+            User.user_permissions.through.objects.filter(user=self.user).delete()
+            self.assertFalse(usuario_tem_permissoes(
+                User.objects.get(pk=self.user.pk), ['vendas.view_pedidovenda']))
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+from django.contrib.auth.models import User, Permission
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from djangosige.apps.base.cache_pedidos import get_versao_cadastros_pedido
+from djangosige.apps.base.dashboard import get_metricas_dashboard
+from djangosige.apps.cadastro.importacao_produtos import importar_produtos
+from djangosige.apps.cadastro.models import Cliente, Produto, Unidade, Marca, Categoria
+from djangosige.apps.estoque.models import LocalEstoque, EntradaEstoque, ItensMovimento, ProdutoEstocado
+from djangosige.apps.fiscal.models import GrupoFiscal
+from djangosige.apps.vendas.models import Venda, PedidoVenda, ItensVenda
+
+CABECALHO = u'codigo;descricao;unidade;marca;categoria;grupo_fiscal;custo;venda;estoque_inicial;local\n'
+
+
+class ImportacaoProdutosTestCase(TestCase):
+    """
+    Testa a importacao do catalogo de produtos em lotes
+    """
+
+    def setUp(self):
+        self.local = LocalEstoque.objects.create(descricao=u'Depósito')
+        self.loja = LocalEstoque.objects.create(descricao=u'Loja')
+        self.unidade = Unidade.objects.create(sigla_unidade='UN', unidade_desc=u'Unidade')
+        self.grupo = GrupoFiscal.objects.create(descricao=u'Padrão')
+
+    def arquivo(self, *linhas):
+        return BytesIO((CABECALHO + u''.join(linhas)).encode('utf-8'))
+
+    def importar(self, *linhas, **kwargs):
+        kwargs.setdefault('local_padrao', self.local.pk)
+        return importar_produtos(self.arquivo(*linhas), 'produtos.csv', **kwargs)
+
+    def test_criar_e_atualizar(self):
+        linhas = [u'P%03d;Produto %s;un;Marca A;Categoria %s;padrao;10,00;1.500,50;2;\n' % (i, i, i % 2)
+                  for i in range(25)]
+        relatorio = self.importar(*linhas, tamanho_lote=10)
+        self.assertEqual((relatorio.linhas, relatorio.novos, relatorio.atualizados, relatorio.total_erros),
+                         (25, 25, 0, 0))
+        produto = Produto.objects.get(codigo='P007')
+        self.assertEqual(produto.unidade, self.unidade)
+        self.assertEqual(produto.grupo_fiscal, self.grupo)
+        self.assertEqual(produto.venda, Decimal('1500.50'))
+        self.assertEqual(produto.estoque_atual, Decimal('2.00'))
+        self.assertEqual(produto.custo_medio, Decimal('10.00'))
+        # Marcas e categorias ausentes sao criadas uma vez
+        self.assertEqual(Marca.objects.count(), 1)
+        self.assertEqual(Categoria.objects.count(), 2)
+
+        # Uma entrada de estoque inicial para todos os lotes do local
+        entrada = EntradaEstoque.objects.get()
+        self.assertEqual((entrada.tipo_movimento, entrada.local_dest, entrada.quantidade_itens),
+                         ('3', self.local, 25))
+        self.assertEqual(entrada.valor_total, Decimal('500.00'))
+        self.assertEqual(ItensMovimento.objects.filter(movimento_id=entrada).count(), 25)
+        self.assertEqual(ProdutoEstocado.objects.filter(local=self.local).count(), 25)
+
+        # Reimportacao atualiza apenas as celulas preenchidas, sem novo estoque
+        relatorio = self.importar(u'P007;Produto novo nome;;;;;12,00;;5;\n')
+        self.assertEqual((relatorio.novos, relatorio.atualizados), (0, 1))
+        produto.refresh_from_db()
+        self.assertEqual(produto.descricao, u'Produto novo nome')
+        self.assertEqual(produto.custo, Decimal('12.00'))
+        self.assertEqual(produto.venda, Decimal('1500.50'))
+        self.assertEqual(produto.marca.marca_desc, u'Marca A')
+        self.assertEqual(produto.estoque_atual, Decimal('2.00'))
+        self.assertEqual(Produto.objects.count(), 25)
+
+    def test_entrada_por_local_e_erros(self):
+        relatorio = self.importar(
+            u'A1;Produto A;UN;;;;5;;1;Loja\n',
+            u'A2;Produto B;UN;;;;5;;3;\n',
+            u'A3;Produto C;KG;;;;5;;;\n',
+            u'A4;Produto D;UN;;;Inexistente;;;;\n',
+            u'A5;Produto E;UN;;;;abc;;;\n',
+            u';Sem codigo;UN;;;;;;;\n',
+            u'A6;Produto F;UN;;;;5;;2;Outro\n',
+            u'\n',
+        )
+        self.assertEqual((relatorio.linhas, relatorio.novos, relatorio.total_erros), (7, 2, 5))
+        self.assertEqual([linha for linha, _ in relatorio.erros], [4, 5, 6, 7, 8])
+        self.assertEqual(sorted(EntradaEstoque.objects.values_list('local_dest__descricao', 'quantidade_itens')),
+                         [(u'Depósito', 1), (u'Loja', 1)])
+
+    def test_simulacao_nao_grava(self):
+        relatorio = self.importar(u'S1;Produto;UN;Nova marca;;;5;;2;\n', simular=True)
+        self.assertEqual((relatorio.novos, relatorio.total_erros), (1, 0))
+        self.assertEqual(relatorio.entradas, [(u'Depósito', 1, Decimal('10.00'))])
+        self.assertFalse(Produto.objects.exists())
+        self.assertFalse(Marca.objects.exists())
+        self.assertFalse(EntradaEstoque.objects.exists())
+
+    def test_invalidar_caches(self):
+        cache.clear()
+        hoje = date.today()
+        self.assertEqual(get_metricas_dashboard(hoje)['quantidade_cadastro']['produtos'], 0)
+        versao = get_versao_cadastros_pedido()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.importar(u'S1;Produto;UN;;;;5;;;\n', simular=True)
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.importar(u'I1;Produto;UN;;;;5;;;\n')
+        self.assertEqual(get_metricas_dashboard(hoje)['quantidade_cadastro']['produtos'], 1)
+        self.assertNotEqual(get_versao_cadastros_pedido(), versao)
+
+    def test_controle_de_estoque_recalcula_pedidos(self):
+        produto = Produto.objects.create(codigo='E1', descricao=u'Produto', controlar_estoque=True)
+        venda = PedidoVenda.objects.create(
+            cliente=Cliente.objects.create(nome_razao_social=u'Cliente', tipo_pessoa='PF'), local_orig=self.local)
+        ItensVenda.objects.create(venda_id=venda, produto=produto, quantidade=Decimal('2.00'),
+                                  valor_unit=Decimal('4.00'))
+        self.assertEqual(Venda.objects.get(pk=venda.pk).total_produtos_estoque, Decimal('8.00'))
+
+        importar_produtos(BytesIO(u'codigo;descricao;controlar_estoque\nE1;Produto;nao\n'.encode('utf-8')),
+                          'produtos.csv')
+        self.assertFalse(Produto.objects.get(pk=produto.pk).controlar_estoque)
+        self.assertEqual(Venda.objects.get(pk=venda.pk).total_produtos_estoque, Decimal('0.00'))
+
+    def test_cabecalho_invalido(self):
+        with self.assertRaises(ValueError):
+            importar_produtos(BytesIO(b'nome;preco\nX;1\n'), 'produtos.csv')
+
+    def test_consultas_nao_crescem_com_o_arquivo(self):
+        def consultas(n):
+            linhas = [u'Q%s-%04d;Produto;UN;;;;1;;1;\n' % (n, i) for i in range(n)]
+            with CaptureQueriesContext(connection) as capturadas:
+                self.importar(*linhas)
+            return len(capturadas)
+        # Alguns INSERTs a mais por lote (o SQLite limita as variaveis por
+        # consulta), e nao consultas por linha
+        self.assertLess(consultas(200), consultas(10) + 10)
+
+    def test_comando(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as arquivo:
+            arquivo.write(self.arquivo(u'C1;Comando;UN;;;;1;;;\n').getvalue())
+        self.addCleanup(os.remove, arquivo.name)
+
+        saida = StringIO()
+        call_command('importar_produtos', arquivo.name, '--dry-run', stdout=saida)
+        self.assertIn(u'Simulação', saida.getvalue())
+        self.assertFalse(Produto.objects.exists())
+        call_command('importar_produtos', arquivo.name, '--local', str(self.local.pk), stdout=StringIO())
+        self.assertTrue(Produto.objects.filter(codigo='C1').exists())
+
+    def test_view(self):
+        user = User.objects.create_superuser('importador', 'importador@teste.com', 'senha')
+        self.client.force_login(user)
+        url = reverse('cadastro:importarprodutosview')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        upload = SimpleUploadedFile('produtos.csv', self.arquivo(u'V1;View;UN;;;;1;;;\n').getvalue())
+        response = self.client.post(url, {'arquivo': upload, 'local_dest': self.local.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['relatorio'].novos, 1)
+        self.assertTrue(Produto.objects.filter(codigo='V1').exists())
+
+        upload = SimpleUploadedFile('produtos.txt', b'codigo;descricao\n')
+        response = self.client.post(url, {'arquivo': upload})
+        self.assertTrue(response.context['form'].errors)
+
+    def test_view_permissoes(self):
+        user = User.objects.create_user('cadastrador', 'cadastrador@teste.com', 'senha')
+        user.user_permissions.add(Permission.objects.get(
+            content_type__app_label='cadastro', codename='add_produto'))
+        self.client.force_login(user)
+        url = reverse('cadastro:importarprodutosview')
+        self.assertRedirects(self.client.get(url), reverse('base:index'), fetch_redirect_response=False)
+
+        user.user_permissions.add(*Permission.objects.filter(
+            content_type__app_label__in=['cadastro', 'estoque'],
+            codename__in=['change_produto', 'add_movimentoestoque']))
+        self.assertEqual(self.client.get(url).status_code, 200)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from django.test import TestCase
+from djangosige.apps.cadastro.forms import PessoaJuridicaForm, PessoaFisicaForm
+from djangosige.apps.cadastro.models import Pessoa, Cliente, Fornecedor, PessoaFisica, PessoaJuridica
+
+
+class PessoaDocumentoTestCase(TestCase):
+    """
+    Testa a busca de pessoas pelo CPF/CNPJ
+    """
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(
+            nome_razao_social='Cliente PJ', tipo_pessoa='PJ')
+        PessoaJuridica.objects.create(
+            pessoa_id=self.cliente, cnpj='12.345.678/0001-90')
+        self.fornecedor = Fornecedor.objects.create(
+            nome_razao_social='Fornecedor PF', tipo_pessoa='PF')
+        PessoaFisica.objects.create(
+            pessoa_id=self.fornecedor, cpf='123.456.789-09')
+
+    def test_documento_digitos(self):
+        self.assertEqual(self.cliente.documento_digitos, '12345678000190')
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.documento_digitos, '12345678000190')
+        self.assertEqual(self.cliente.cpf_cnpj_apenas_digitos,
+                         '12345678000190')
+
+    def test_by_documento(self):
+        with self.assertNumQueries(1):
+            clientes = list(Cliente.objects.by_documento(
+                '12345678000190', tipo_pessoa='PJ'))
+        self.assertEqual(clientes, [self.cliente])
+        self.assertEqual(
+            Fornecedor.objects.by_documento('123.456.789-09').get(), self.fornecedor)
+        self.assertEqual(Pessoa.objects.by_documento('12345678909').count(), 1)
+        self.assertFalse(Cliente.objects.by_documento(
+            '12345678000190', tipo_pessoa='PF').exists())
+        self.assertFalse(Cliente.objects.by_documento('').exists())
+
+    def test_alterar_documento(self):
+        info = self.fornecedor.pessoa_fis_info
+        info.cpf = '987.654.321-00'
+        info.save()
+        self.assertFalse(Pessoa.objects.by_documento('12345678909').exists())
+        self.assertEqual(Fornecedor.objects.by_documento(
+            '98765432100').get(), self.fornecedor)
+
+    def test_documento_duplicado(self):
+        def form_pj(cnpj, pessoa):
+            return PessoaJuridicaForm({'pessoa_jur_form-cnpj': cnpj},
+                                      prefix='pessoa_jur_form', pessoa=pessoa)
+
+        # Mesmo CNPJ em outra formatacao para outro cliente
+        form = form_pj('12345678000190', Cliente(tipo_pessoa='PJ'))
+        self.assertFalse(form.is_valid())
+        self.assertIn('cnpj', form.errors)
+        self.assertFalse(form_pj(' 12.345.678/0001-90 ', Cliente(tipo_pessoa='PJ')).is_valid())
+        # O proprio cliente em edicao e outros tipos de cadastro nao conflitam
+        self.assertTrue(form_pj('12.345.678.0001.90', self.cliente).is_valid())
+        self.assertTrue(form_pj('12345678000190', Fornecedor(tipo_pessoa='PJ')).is_valid())
+
+        form = PessoaFisicaForm({'pessoa_fis_form-cpf': '123 456 789 09'},
+                                prefix='pessoa_fis_form', pessoa=Fornecedor(tipo_pessoa='PF'))
+        self.assertFalse(form.is_valid())
+        self.assertIn('cpf', form.errors)
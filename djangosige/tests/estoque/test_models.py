@@ -1,12 +1,25 @@
 # -*- coding: utf-8 -*-
 
+from datetime import date
+from decimal import Decimal
+
 from django.test import TestCase
 from djangosige.apps.cadastro.models import Produto
+from djangosige.apps.estoque.custo import calcular_cmv, recalcular_custos
+from djangosige.apps.estoque.fechamento import gerar_fechamentos_mensais, saldos_em
+from djangosige.apps.estoque.lancamento import lancar_movimento_estoque, excluir_movimentos_estoque
+from djangosige.apps.estoque.lista_movimentos import filtrar_movimentos, ordenar_movimentos, paginar_movimentos, \
+    buscar_produtos_filtro
 from djangosige.apps.estoque.models import (
+    MovimentoEstoque,
     LocalEstoque,
+    ProdutoEstocado,
     ItensMovimento,
     EntradaEstoque,
-    SaidaEstoque
+    SaidaEstoque,
+    TransferenciaEstoque,
+    FechamentoEstoque,
+    SaldoFechamentoEstoque
 )
 
 
@@ -66,3 +79,259 @@ class MovimentoEstoqueModelTestCase(TestCase):
         produto_estocado.refresh_from_db()
         self.assertEqual(int(produto.estoque_atual), 50)
         self.assertEqual(int(produto_estocado.quantidade), 50)
+
+
+class LancamentoEstoqueTestCase(TestCase):
+    """
+    Testa o lancamento de movimentos inteiros no estoque
+    """
+
+    def setUp(self):
+        self.local = LocalEstoque.objects.create(descricao="local1")
+        self.outro_local = LocalEstoque.objects.create(descricao="local2")
+        self.produtos = [Produto.objects.create(codigo=str(i), descricao="produto", estoque_atual=10)
+                         for i in range(20)]
+        ProdutoEstocado.objects.bulk_create([
+            ProdutoEstocado(local=self.local, produto=produto, quantidade=10)
+            for produto in self.produtos])
+
+    def itens(self, quantidade):
+        return [ItensMovimento(produto=produto, quantidade=Decimal(quantidade))
+                for produto in self.produtos]
+
+    def test_entrada_numero_constante_de_consultas(self):
+        # Savepoint, bloqueio de Produto e ProdutoEstocado, bulk_create dos
+        # locais novos e bulk_update de Produto
+        with self.assertNumQueries(6):
+            erros = lancar_movimento_estoque(self.itens('5'), local_dest=self.outro_local)
+        self.assertEqual(erros, [])
+        self.assertEqual(set(Produto.objects.values_list('estoque_atual', flat=True)), {Decimal('15')})
+        self.assertEqual(set(self.outro_local.local_produto_estocado.values_list(
+            'quantidade', flat=True)), {Decimal('5')})
+
+    def test_saida_sem_saldo(self):
+        itens = self.itens('4') + [ItensMovimento(produto=self.produtos[0], quantidade=Decimal('7'))]
+        erros = lancar_movimento_estoque(itens, local_orig=self.local)
+        self.assertEqual(len(erros), 1)
+        self.assertIs(erros[0].item, itens[-1])
+        self.assertEqual(erros[0].disponivel, Decimal('6'))
+        # Nada e gravado quando ha erros
+        self.assertEqual(set(Produto.objects.values_list('estoque_atual', flat=True)), {Decimal('10')})
+
+    def test_saida_limitada_ao_local(self):
+        itens = self.itens('12')
+        erros = lancar_movimento_estoque(itens, local_orig=self.local, limitar_ao_local=True)
+        self.assertEqual(erros, [])
+        self.assertEqual(itens[0].quantidade, Decimal('10'))
+        self.assertEqual(set(Produto.objects.values_list('estoque_atual', flat=True)), {Decimal('0')})
+
+    def test_transferencia(self):
+        lancar_movimento_estoque(self.itens('3'), local_orig=self.local, local_dest=self.outro_local)
+        self.assertEqual(set(self.local.local_produto_estocado.values_list(
+            'quantidade', flat=True)), {Decimal('7')})
+        self.assertEqual(set(self.outro_local.local_produto_estocado.values_list(
+            'quantidade', flat=True)), {Decimal('3')})
+        self.assertEqual(set(Produto.objects.values_list('estoque_atual', flat=True)), {Decimal('10')})
+
+    def test_excluir_movimentos_estoque(self):
+        entrada = EntradaEstoque.objects.create(local_dest=self.outro_local)
+        lancar_movimento_estoque(self.itens('5'), local_dest=self.outro_local)
+        ItensMovimento.objects.bulk_create([
+            ItensMovimento(produto=produto, movimento_id=entrada, quantidade=Decimal('5'))
+            for produto in self.produtos])
+        transferencias = []
+        for _ in range(10):
+            transferencia = TransferenciaEstoque.objects.create(
+                local_estoque_orig=self.local, local_estoque_dest=self.outro_local)
+            itens = self.itens('1')
+            lancar_movimento_estoque(itens, local_orig=self.local, local_dest=self.outro_local)
+            for item in itens:
+                item.movimento_id = transferencia
+            ItensMovimento.objects.bulk_create(itens)
+            transferencias.append(transferencia.pk)
+
+        # Numero fixo de consultas, independente da quantidade de movimentos
+        with self.assertNumQueries(21):
+            excluir_movimentos_estoque([entrada.pk] + transferencias)
+
+        self.assertFalse(ItensMovimento.objects.exists())
+        self.assertEqual(set(Produto.objects.values_list('estoque_atual', flat=True)), {Decimal('10')})
+        # Apenas os locais do movimento sao reajustados
+        self.assertEqual(set(self.local.local_produto_estocado.values_list(
+            'quantidade', flat=True)), {Decimal('10')})
+        self.assertEqual(set(self.outro_local.local_produto_estocado.values_list(
+            'quantidade', flat=True)), {Decimal('0')})
+
+
+class ListaMovimentosTestCase(TestCase):
+    """
+    Testa a listagem paginada de movimentos de estoque
+    """
+
+    def setUp(self):
+        self.local = LocalEstoque.objects.create(descricao="local1")
+        self.outro_local = LocalEstoque.objects.create(descricao="local2")
+        self.produto = Produto.objects.create(codigo="1", descricao="parafuso")
+        for dia in (1, 2, 2, None, 3, 1, None):
+            data = date(2020, 1, dia) if dia else None
+            EntradaEstoque.objects.create(local_dest=self.local, data_movimento=data)
+            SaidaEstoque.objects.create(local_orig=self.outro_local, data_movimento=data)
+        TransferenciaEstoque.objects.create(
+            local_estoque_orig=self.local, local_estoque_dest=self.outro_local)
+        ItensMovimento.objects.create(
+            produto=self.produto, movimento_id=MovimentoEstoque.objects.first(), quantidade=1)
+
+    def test_paginacao_por_cursor(self):
+        for campo, decrescente in (('data_movimento', True), ('data_movimento', False), ('id', True)):
+            movimentos = filtrar_movimentos()
+            esperado = list(ordenar_movimentos(movimentos, campo, decrescente))
+            obtido = []
+            pagina, cursor = paginar_movimentos(movimentos, campo, decrescente, tamanho=4)
+            while pagina:
+                obtido.extend(pagina)
+                if cursor is None:
+                    break
+                pagina, cursor = paginar_movimentos(movimentos, campo, decrescente, cursor, tamanho=4)
+            self.assertEqual(obtido, esperado)
+
+    def test_filtros(self):
+        self.assertEqual(filtrar_movimentos(tipo='E').count(), 7)
+        self.assertEqual(filtrar_movimentos(local=self.outro_local.pk).count(), 8)
+        self.assertEqual(filtrar_movimentos(produto=self.produto.pk).count(), 1)
+        self.assertEqual(filtrar_movimentos(busca='paraf').count(), 1)
+        self.assertEqual(filtrar_movimentos(
+            data_inicial=date(2020, 1, 2), data_final=date(2020, 1, 2)).count(), 4)
+
+    def test_subtipo_sem_consultas(self):
+        movimentos = list(filtrar_movimentos())
+        with self.assertNumQueries(0):
+            tipos = [m.get_movimento_especifico().get_tipo() for m in movimentos]
+        self.assertEqual(tipos.count('Transferência'), 1)
+
+    def test_buscar_produtos_filtro(self):
+        self.produto.controlar_estoque = True
+        self.produto.save()
+        Produto.objects.bulk_create([
+            Produto(codigo="P%s" % i, descricao="porca %s" % i, controlar_estoque=True) for i in range(30)])
+        Produto.objects.create(codigo="2", descricao="parafuso sem estoque", controlar_estoque=False)
+
+        self.assertEqual(buscar_produtos_filtro('paraf'),
+                         [{'value': self.produto.pk, 'label': '1 - parafuso'}])
+        self.assertEqual(len(buscar_produtos_filtro('porca', limite=20)), 20)
+        self.assertEqual(len(buscar_produtos_filtro('p1')), 11)
+        self.assertEqual(buscar_produtos_filtro('  '), [])
+
+
+class FechamentoEstoqueTestCase(TestCase):
+    """
+    Testa os fechamentos de estoque e o saldo em uma data
+    """
+
+    def setUp(self):
+        self.local = LocalEstoque.objects.create(descricao="local1")
+        self.outro_local = LocalEstoque.objects.create(descricao="local2")
+        self.produto = Produto.objects.create(codigo="1", descricao="produto")
+        self.movimentar(EntradaEstoque(local_dest=self.local), date(2020, 1, 10), 100)
+        self.movimentar(SaidaEstoque(local_orig=self.local), date(2020, 2, 5), 30)
+        self.movimentar(TransferenciaEstoque(
+            local_estoque_orig=self.local, local_estoque_dest=self.outro_local), date(2020, 2, 20), 20)
+        self.movimentar(EntradaEstoque(local_dest=self.outro_local), date(2020, 3, 15), 5)
+
+    def movimentar(self, movimento, data, quantidade):
+        movimento.data_movimento = data
+        movimento.save()
+        ItensMovimento.objects.create(produto=self.produto, movimento_id=movimento, quantidade=quantidade)
+        return movimento
+
+    def test_gerar_fechamentos_mensais(self):
+        fechamentos = gerar_fechamentos_mensais(ate=date(2020, 4, 10))
+        self.assertEqual([f.data_fechamento for f in fechamentos],
+                         [date(2020, 1, 31), date(2020, 2, 29), date(2020, 3, 31)])
+        fevereiro = SaldoFechamentoEstoque.objects.filter(fechamento__data_fechamento=date(2020, 2, 29))
+        self.assertEqual(sorted(fevereiro.values_list('local_id', 'quantidade')),
+                         [(self.local.pk, Decimal('50')), (self.outro_local.pk, Decimal('20'))])
+        # Incremental: nada a gerar ate o proximo mes completo
+        self.assertEqual(gerar_fechamentos_mensais(ate=date(2020, 4, 30)), [])
+
+    def test_saldos_em(self):
+        esperado = saldos_em(date(2020, 3, 20))
+        gerar_fechamentos_mensais(ate=date(2020, 4, 1))
+        # Fechamento de fevereiro + movimentos de marco
+        with self.assertNumQueries(3):
+            self.assertEqual(saldos_em(date(2020, 3, 20)), esperado)
+        self.assertEqual(esperado, {(self.produto.pk, self.local.pk): Decimal('50'),
+                                    (self.produto.pk, self.outro_local.pk): Decimal('25')})
+        self.assertEqual(saldos_em(date(2020, 2, 10), local=self.local),
+                         {(self.produto.pk, self.local.pk): Decimal('70')})
+
+    def test_movimento_retroativo_invalida_fechamentos(self):
+        gerar_fechamentos_mensais(ate=date(2020, 4, 1))
+        movimento = self.movimentar(SaidaEstoque(local_orig=self.local), date(2020, 2, 1), 10)
+        self.assertEqual(list(FechamentoEstoque.objects.values_list('data_fechamento', flat=True)),
+                         [date(2020, 1, 31)])
+        gerar_fechamentos_mensais(ate=date(2020, 4, 1))
+        movimento.delete()
+        self.assertEqual(FechamentoEstoque.objects.count(), 1)
+
+
+class CustoMedioTestCase(TestCase):
+    """
+    Testa o custo medio ponderado mantido pelo lancamento de movimentos
+    """
+
+    def setUp(self):
+        self.local = LocalEstoque.objects.create(descricao="local1")
+        self.produto = Produto.objects.create(codigo="1", descricao="produto")
+
+    def movimentar(self, movimento, quantidade, valor_unit=None):
+        movimento.save()
+        itens = [ItensMovimento(produto=self.produto, movimento_id=movimento,
+                                quantidade=Decimal(quantidade),
+                                valor_unit=Decimal(valor_unit) if valor_unit else None)]
+        lancar_movimento_estoque(itens, local_orig=getattr(movimento, 'local_orig', None),
+                                 local_dest=getattr(movimento, 'local_dest', None))
+        ItensMovimento.objects.bulk_create(itens)
+        self.produto.refresh_from_db()
+        return movimento
+
+    def test_custo_medio(self):
+        self.movimentar(EntradaEstoque(local_dest=self.local), 10, '10.00')
+        entrada = self.movimentar(EntradaEstoque(local_dest=self.local), 10, '20.00')
+        self.assertEqual(self.produto.custo_medio, Decimal('15.0000'))
+        self.assertEqual(self.produto.valor_estoque, Decimal('300.00'))
+
+        # Saida pelo custo medio nao altera o custo
+        saida = self.movimentar(SaidaEstoque(local_orig=self.local), 5)
+        self.assertEqual(self.produto.custo_medio, Decimal('15.0000'))
+        self.assertEqual(self.produto.valor_estoque, Decimal('225.00'))
+        self.assertEqual(calcular_cmv(SaidaEstoque.objects.all()), Decimal('75.00'))
+        self.assertEqual(ProdutoEstocado.objects.get().valor_estoque, Decimal('225.00'))
+
+        # Estorno da segunda entrada pelo custo gravado no item
+        excluir_movimentos_estoque([entrada.pk])
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.estoque_atual, Decimal('5'))
+        self.assertEqual(self.produto.valor_estoque, Decimal('25.00'))
+        self.assertEqual(self.produto.custo_medio, Decimal('5.0000'))
+
+        excluir_movimentos_estoque([saida.pk])
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.custo_medio, Decimal('10.0000'))
+        self.assertEqual(self.produto.valor_estoque, Decimal('100.00'))
+
+    def test_recalcular_custos(self):
+        self.movimentar(EntradaEstoque(local_dest=self.local), 10, '10.00')
+        self.movimentar(SaidaEstoque(local_orig=self.local), 10)
+        self.movimentar(EntradaEstoque(local_dest=self.local), 4, '16.00')
+        self.movimentar(EntradaEstoque(local_dest=self.local), 4, '20.00')
+        esperado = (self.produto.custo_medio, self.produto.valor_estoque)
+        self.assertEqual(esperado, (Decimal('18.0000'), Decimal('144.00')))
+
+        Produto.objects.update(custo_medio=0, valor_estoque=0)
+        ItensMovimento.objects.update(custo_unitario=None)
+        self.assertEqual(recalcular_custos(tamanho_lote=2), 4)
+
+        self.produto.refresh_from_db()
+        self.assertEqual((self.produto.custo_medio, self.produto.valor_estoque), esperado)
+        self.assertEqual(ProdutoEstocado.objects.get().valor_estoque, Decimal('144.00'))
+        self.assertEqual(calcular_cmv(SaidaEstoque.objects.all()), Decimal('100.00'))
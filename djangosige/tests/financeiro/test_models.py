@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from djangosige.apps.financeiro.models import MovimentoCaixa, Entrada, Saida, ResumoMovimentoCaixa, fluxo_caixa_agregado
+from djangosige.apps.financeiro.views.lancamento import MovimentoCaixaMixin
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+
+class MovimentoCaixaMixinTestCase(TestCase):
+    """
+    Testa o lancamento de valores no fluxo de caixa
+    """
+
+    def setUp(self):
+        self.mixin = MovimentoCaixaMixin()
+        self.mvmt_1 = MovimentoCaixa.objects.create(
+            data_movimento=date(2020, 1, 1), entradas=Decimal('100.00'),
+            saldo_final=Decimal('100.00'))
+        self.mvmt_2 = MovimentoCaixa.objects.create(
+            data_movimento=date(2020, 1, 2), saidas=Decimal('30.00'),
+            saldo_inicial=Decimal('100.00'), saldo_final=Decimal('70.00'))
+        self.mvmt_3 = MovimentoCaixa.objects.create(
+            data_movimento=date(2020, 1, 3), entradas=Decimal('10.00'),
+            saldo_inicial=Decimal('70.00'), saldo_final=Decimal('80.00'))
+        ResumoMovimentoCaixa.reconstruir()
+
+    def test_adicionar_entrada_desloca_saldos_posteriores(self):
+        """
+        Testa se uma entrada retroativa atualiza os movimentos seguintes
+        com uma quantidade constante de queries
+        """
+        entrada = Entrada(valor_liquido=Decimal('50.00'))
+        # Movimento do dia, deslocamento dos saldos e resumos mensal/anual
+        with self.assertNumQueries(4):
+            self.mixin.adicionar_novo_movimento_caixa(
+                lancamento=entrada, novo_movimento=self.mvmt_1)
+        for m in (self.mvmt_1, self.mvmt_2, self.mvmt_3):
+            m.refresh_from_db()
+        self.assertEqual(self.mvmt_1.entradas, Decimal('150.00'))
+        self.assertEqual(self.mvmt_1.saldo_final, Decimal('150.00'))
+        self.assertEqual(self.mvmt_2.saldo_inicial, Decimal('150.00'))
+        self.assertEqual(self.mvmt_2.saldo_final, Decimal('120.00'))
+        self.assertEqual(self.mvmt_3.saldo_inicial, Decimal('120.00'))
+        self.assertEqual(self.mvmt_3.saldo_final, Decimal('130.00'))
+
+    def test_remover_saida_desloca_saldos_posteriores(self):
+        """
+        Testa se a remocao de uma saida devolve o valor aos saldos
+        """
+        saida = Saida(valor_liquido=Decimal('30.00'))
+        self.mixin.remover_valor_movimento_caixa(
+            saida, self.mvmt_2, saida.valor_liquido)
+        self.mvmt_2.refresh_from_db()
+        self.mvmt_3.refresh_from_db()
+        self.assertEqual(self.mvmt_2.saidas, Decimal('0.00'))
+        self.assertEqual(self.mvmt_2.saldo_final, Decimal('100.00'))
+        self.assertEqual(self.mvmt_3.saldo_inicial, Decimal('100.00'))
+        self.assertEqual(self.mvmt_3.saldo_final, Decimal('110.00'))
+
+    def test_gerar_lancamento_troca_movimento(self):
+        """
+        Testa o recebimento de uma conta em outra data pela view
+        (a data do formulario chega como texto)
+        """
+        conta = Entrada.objects.create(
+            descricao='Conta', status='1', valor_total=Decimal('20.00'), valor_liquido=Decimal('20.00'),
+            movimentar_caixa=True, movimento_caixa=self.mvmt_1)
+        self.mixin.adicionar_novo_movimento_caixa(lancamento=conta, novo_movimento=self.mvmt_1)
+        self.client.force_login(User.objects.create_superuser('financeiro', 'financeiro@teste.com', 'senha'))
+        response = self.client.post(reverse('financeiro:gerarlancamento'), {
+            'contaId': conta.pk, 'tipoConta': '0', 'dataPagamento': '02/01/2020'})
+        self.assertEqual(response.status_code, 200)
+        conta.refresh_from_db()
+        self.assertEqual(conta.movimento_caixa, self.mvmt_2)
+        self.assertEqual(MovimentoCaixa.objects.get(pk=self.mvmt_1.pk).entradas, Decimal('100.00'))
+        self.assertEqual(MovimentoCaixa.objects.get(pk=self.mvmt_2.pk).entradas, Decimal('20.00'))
+        self.assertEqual(ResumoMovimentoCaixa.objects.get(periodo='M', data_inicio=date(2020, 1, 1)).entradas,
+                         Decimal('130.00'))
+
+
+class ResumoMovimentoCaixaTestCase(TestCase):
+    """
+    Testa os resumos mensais/anuais usados pelo fluxo de caixa agregado
+    """
+
+    def setUp(self):
+        saldo = Decimal('0.00')
+        data = date(2019, 12, 30)
+        while data <= date(2021, 1, 5):
+            MovimentoCaixa.objects.create(
+                data_movimento=data, entradas=Decimal('10.00'), saidas=Decimal('4.00'),
+                saldo_inicial=saldo, saldo_final=saldo + Decimal('6.00'))
+            saldo += Decimal('6.00')
+            data += timedelta(days=1)
+        ResumoMovimentoCaixa.reconstruir()
+
+    def test_registrar_movimento(self):
+        ResumoMovimentoCaixa.registrar_movimento(
+            date(2020, 5, 10), entradas=Decimal('1.00'))
+        resumo_mes = ResumoMovimentoCaixa.objects.get(
+            periodo='M', data_inicio=date(2020, 5, 1))
+        resumo_ano = ResumoMovimentoCaixa.objects.get(
+            periodo='A', data_inicio=date(2020, 1, 1))
+        self.assertEqual(resumo_mes.entradas, Decimal('311.00'))
+        self.assertEqual(resumo_ano.entradas, Decimal('3661.00'))
+
+    def test_fluxo_caixa_agregado_anual(self):
+        with self.assertNumQueries(3):
+            linhas = fluxo_caixa_agregado(
+                date(2019, 12, 31), date(2021, 1, 2), 'year')
+        self.assertEqual([linha.data_movimento for linha in linhas], [
+                         date(2019, 12, 31), date(2020, 1, 1), date(2021, 1, 1)])
+        self.assertEqual(linhas[0].saldo_inicial, Decimal('6.00'))
+        self.assertEqual(linhas[1].entradas, Decimal('3660.00'))
+        self.assertEqual(linhas[2].saidas, Decimal('8.00'))
+        self.assertEqual(linhas[2].saldo_final, MovimentoCaixa.objects.get(
+            data_movimento=date(2021, 1, 2)).saldo_final)
+
+    def test_fluxo_caixa_agregado_trimestral(self):
+        linhas = fluxo_caixa_agregado(
+            date(2020, 2, 15), date(2020, 7, 10), 'quarter')
+        self.assertEqual([linha.format_data_movimento for linha in linhas], [
+                         '1º Trim/2020', '2º Trim/2020', '3º Trim/2020'])
+        self.assertEqual(linhas[0].entradas, Decimal('460.00'))
+        self.assertEqual(linhas[2].data_fim, date(2020, 7, 10))
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509.oid import NameOID
+
+from djangosige.apps.fiscal.certificado import CacheCertificadoA1, PoolServicoNFe
+
+
+def gerar_pfx(caminho, senha, dias_validade=30):
+    chave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    nome = x509.Name([x509.NameAttribute(
+        NameOID.COMMON_NAME, u'EMPRESA TESTE:12345678000190')])
+    agora = datetime.utcnow()
+    certificado = x509.CertificateBuilder().subject_name(nome).issuer_name(nome).public_key(
+        chave.public_key()).serial_number(x509.random_serial_number()).not_valid_before(
+        agora - timedelta(days=1)).not_valid_after(
+        agora + timedelta(days=dias_validade)).sign(chave, hashes.SHA256())
+    with open(caminho, 'wb') as f:
+        f.write(pkcs12.serialize_key_and_certificates(
+            b'teste', chave, certificado, None,
+            serialization.BestAvailableEncryption(senha.encode('utf-8'))))
+
+
+class ServicoFalso(object):
+
+    def __init__(self, transmissao, uf, versao='4.00', ambiente='2'):
+        self.transmissao = transmissao
+        self.uf = uf
+        self.ambiente = ambiente
+
+
+class CacheCertificadoA1TestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.caminho = os.path.join(self.diretorio, 'certificado.pfx')
+        gerar_pfx(self.caminho, '1234')
+        self.cache = CacheCertificadoA1()
+
+    def tearDown(self):
+        shutil.rmtree(self.diretorio)
+
+    def test_certificado_reaproveitado(self):
+        certificado = self.cache.obter(self.caminho, '1234')
+        self.assertIs(self.cache.obter(self.caminho, '1234'), certificado)
+        self.assertFalse(certificado.expirado)
+
+    def test_certificado_recarregado_ao_alterar_arquivo(self):
+        certificado = self.cache.obter(self.caminho, '1234')
+        gerar_pfx(self.caminho, '1234')
+        mtime = os.stat(self.caminho).st_mtime + 10
+        os.utime(self.caminho, (mtime, mtime))
+        self.assertIsNot(self.cache.obter(self.caminho, '1234'), certificado)
+        self.assertEqual(len(self.cache._certificados), 1)
+
+    def test_senha_invalida(self):
+        with self.assertRaises(Exception):
+            self.cache.obter(self.caminho, 'errada')
+
+    def test_pool_servicos(self):
+        pool = PoolServicoNFe(self.cache, tamanho_maximo=1)
+        with pool.servico(ServicoFalso, self.caminho, '1234', 'SP') as servico:
+            self.assertEqual(servico.uf, '35')
+        with pool.servico(ServicoFalso, self.caminho, '1234', 'SP') as servico_2:
+            self.assertIs(servico_2, servico)
+            # Em uso, outro pedido simultaneo recebe um novo servico
+            with pool.servico(ServicoFalso, self.caminho, '1234', 'SP') as servico_3:
+                self.assertIsNot(servico_3, servico)
+        with pool.servico(ServicoFalso, self.caminho, '1234', 'RJ') as servico_rj:
+            self.assertIsNot(servico_rj, servico)
+
+        # Servico que falhou nao volta ao pool
+        with self.assertRaises(RuntimeError):
+            with pool.servico(ServicoFalso, self.caminho, '1234', 'SP') as servico:
+                raise RuntimeError()
+        with pool.servico(ServicoFalso, self.caminho, '1234', 'SP') as servico_4:
+            self.assertIsNot(servico_4, servico)
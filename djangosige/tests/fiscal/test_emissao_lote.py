@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from lxml import etree
+
+from djangosige.apps.cadastro.models import Empresa
+from djangosige.apps.fiscal.models import NotaFiscal, LoteNFe, FilaEmissaoNFe
+from djangosige.apps.fiscal.emissao_lote import enfileirar_notas, reservar_lote, processar_fila, \
+    RetornoEnvioLote, RetornoConsultaLote, NAMESPACE_NFE, LIMITE_LOTE_MONTADO, TENTATIVAS_RECONCILIACAO
+
+
+def gerar_chave(nota):
+    return '35200112345678000190550%s%s100000000' % (
+        str(nota.serie).zfill(2), str(nota.numero).zfill(9))
+
+
+class TransmissorStub(object):
+    """
+    Simula a SEFAZ: recebe o lote, responde 'em processamento' na primeira
+    consulta e depois autoriza todas as notas exceto as de numero_rejeitado.
+    Com falha_transporte o envio levanta a excecao depois de (recebido) ou
+    sem (nao recebido) a SEFAZ registrar o lote.
+    """
+
+    def __init__(self, numero_rejeitado=None, erro_envio=None, falha_transporte=None, recebido=True):
+        self.numero_rejeitado = numero_rejeitado
+        self.erro_envio = erro_envio
+        self.falha_transporte = falha_transporte
+        self.recebido = recebido
+        self.lotes = {}
+        self.notas = {}
+        self.consultados = set()
+
+    def assinar_notas(self, config, notas):
+        return [etree.fromstring(
+            '<NFe xmlns="%s"><infNFe Id="NFe%s" versao="4.00"/>'
+            '<Signature xmlns="http://www.w3.org/2000/09/xmldsig#"/></NFe>' % (NAMESPACE_NFE, gerar_chave(nota)))
+            for nota in notas]
+
+    def enviar_lote(self, config, id_lote, notas, xmls=None):
+        if self.erro_envio:
+            return RetornoEnvioLote(False, motivo=self.erro_envio)
+        recibo = str(id_lote).zfill(15)
+        if self.falha_transporte is None or self.recebido:
+            self.lotes[recibo] = notas
+            self.notas.update((gerar_chave(nota), nota) for nota in notas)
+        if self.falha_transporte is not None:
+            raise self.falha_transporte
+        return RetornoEnvioLote(True, recibo=recibo, tempo_medio=0, motivo='Lote recebido com sucesso')
+
+    def protocolo(self, nota):
+        if nota.numero == self.numero_rejeitado:
+            cstat, motivo = '539', 'Rejeição: Duplicidade de NF-e'
+        else:
+            cstat, motivo = '100', 'Autorizado o uso da NF-e'
+        xml = ('<protNFe xmlns="%s" versao="4.00"><infProt><chNFe>%s</chNFe><cStat>%s</cStat></infProt>'
+               '</protNFe>' % (NAMESPACE_NFE, gerar_chave(nota), cstat))
+        return {'chave': gerar_chave(nota), 'cStat': cstat, 'motivo': motivo,
+                'protocolo': '135200000000001', 'xml': xml}
+
+    def consultar_recibo(self, config, recibo):
+        if recibo not in self.consultados:
+            self.consultados.add(recibo)
+            return RetornoConsultaLote(em_processamento=True)
+        return RetornoConsultaLote(protocolos=[self.protocolo(nota) for nota in self.lotes[recibo]])
+
+    def consultar_protocolo(self, config, chave):
+        nota = self.notas.get(chave)
+        return self.protocolo(nota) if nota is not None else None
+
+
+class FilaEmissaoNFeTestCase(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            NotaFiscal, 'get_configuracao_servico', return_value={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.emitente = Empresa.objects.create(
+            nome_razao_social='Empresa', tipo_pessoa='PJ')
+        self.notas = [NotaFiscal.objects.create(
+            serie='1', numero=numero, emitente=self.emitente, status='V') for numero in range(1, 4)]
+        enfileirar_notas(self.notas)
+
+    def test_reservar_lote(self):
+        outro_emitente = Empresa.objects.create(
+            nome_razao_social='Empresa 2', tipo_pessoa='PJ')
+        nota = NotaFiscal.objects.create(
+            serie='1', numero=1, emitente=outro_emitente, status='V')
+        enfileirar_notas([nota])
+
+        lote = reservar_lote(tamanho_lote=50)
+        self.assertEqual(lote.itens_fila.count(), 3)
+        self.assertFalse(lote.itens_fila.filter(nota=nota).exists())
+        lote_2 = reservar_lote(tamanho_lote=50)
+        self.assertEqual(lote_2.emitente_id, outro_emitente.pk)
+        self.assertIsNone(reservar_lote())
+
+    def test_processar_fila(self):
+        transmissor = TransmissorStub(numero_rejeitado=3)
+        self.assertEqual(processar_fila(
+            transmissor, workers=1, tamanho_lote=2), (2, 0))
+        self.assertEqual(FilaEmissaoNFe.objects.filter(status='L').count(), 3)
+
+        # Primeira consulta: lote ainda em processamento
+        processar_fila(transmissor, workers=1)
+        self.assertEqual(LoteNFe.objects.filter(status='1').count(), 2)
+        LoteNFe.objects.filter(status='1').update(
+            proxima_consulta='2000-01-01T00:00:00Z')
+
+        self.assertEqual(processar_fila(transmissor, workers=1), (0, 2))
+        for nota in self.notas:
+            nota.refresh_from_db()
+        self.assertEqual([n.status for n in self.notas], ['A', 'A', 'R'])
+        self.assertEqual(self.notas[0].chave, gerar_chave(self.notas[0]))
+        self.assertEqual(self.notas[0].protocolo, '135200000000001')
+        self.assertIn('539', self.notas[2].motivo_erro)
+        self.assertEqual(LoteNFe.objects.filter(status='2').count(), 2)
+
+    def test_erro_envio_lote(self):
+        processar_fila(TransmissorStub(erro_envio='999 - Falha'), workers=1)
+        self.assertEqual(NotaFiscal.objects.filter(status='R').count(), 3)
+        self.assertEqual(FilaEmissaoNFe.objects.filter(status='R').count(), 3)
+
+        # Reenfileirar notas rejeitadas
+        enfileirar_notas(self.notas)
+        self.assertEqual(FilaEmissaoNFe.objects.filter(status='P').count(), 3)
+
+    def liberar_consultas(self):
+        LoteNFe.objects.filter(status__in=['1', '4']).update(proxima_consulta=timezone.now() - timedelta(seconds=1))
+
+    def test_xml_autorizado_nfe_proc(self):
+        transmissor = TransmissorStub()
+        processar_fila(transmissor, workers=1)
+        processar_fila(transmissor, workers=1)
+        self.liberar_consultas()
+        processar_fila(transmissor, workers=1)
+
+        nota = NotaFiscal.objects.get(pk=self.notas[0].pk)
+        self.assertEqual(nota.status, 'A')
+        nfe_proc = etree.fromstring(nota.xml_gerado.encode('utf-8'))
+        self.assertEqual(nfe_proc.tag, '{%s}nfeProc' % NAMESPACE_NFE)
+        self.assertEqual([filho.tag for filho in nfe_proc],
+                         ['{%s}NFe' % NAMESPACE_NFE, '{%s}protNFe' % NAMESPACE_NFE])
+        self.assertIsNotNone(nfe_proc.find('{ns}NFe/{ns}infNFe'.format(ns='{%s}' % NAMESPACE_NFE)))
+
+        self.client.force_login(User.objects.create_superuser('fiscal', 'fiscal@teste.com', 'senha'))
+        response = self.client.get(reverse('fiscal:baixarnota', kwargs={'pk': nota.pk}))
+        self.assertEqual(response.content.decode('utf-8'), nota.xml_gerado)
+
+    def test_falha_transporte_reconcilia_pela_chave(self):
+        transmissor = TransmissorStub(falha_transporte=IOError('timeout'))
+        processar_fila(transmissor, workers=1)
+        lote = LoteNFe.objects.get()
+        self.assertEqual(lote.status, '4')
+        # As notas nao sao rejeitadas nem voltam para a fila
+        self.assertEqual(FilaEmissaoNFe.objects.filter(status='L').count(), 3)
+        self.assertEqual(NotaFiscal.objects.filter(status='V').count(), 3)
+
+        self.liberar_consultas()
+        processar_fila(transmissor, workers=1)
+        self.assertEqual(LoteNFe.objects.get().status, '2')
+        self.assertEqual(NotaFiscal.objects.filter(status='A').count(), 3)
+        self.assertEqual(len(transmissor.lotes), 1)
+        self.assertIn('nfeProc', NotaFiscal.objects.get(pk=self.notas[0].pk).xml_gerado)
+
+    def test_falha_transporte_nota_nao_recebida(self):
+        transmissor = TransmissorStub(falha_transporte=IOError('timeout'), recebido=False)
+        processar_fila(transmissor, workers=1)
+        for _ in range(TENTATIVAS_RECONCILIACAO - 1):
+            self.liberar_consultas()
+            processar_fila(transmissor, workers=1)
+            self.assertEqual(FilaEmissaoNFe.objects.filter(status='L').count(), 3)
+
+        # Apos as consultas "nao consta" as notas voltam para a fila e sao reenviadas
+        transmissor.falha_transporte = None
+        self.liberar_consultas()
+        processar_fila(transmissor, workers=1)
+        self.assertEqual(LoteNFe.objects.filter(status='2').count(), 1)
+        self.assertEqual(FilaEmissaoNFe.objects.filter(status='P').count(), 3)
+        processar_fila(transmissor, workers=1)
+        self.assertEqual(LoteNFe.objects.filter(status='1').count(), 1)
+
+    def test_recuperar_lote_interrompido(self):
+        lote = reservar_lote()
+        LoteNFe.objects.filter(pk=lote.pk).update(
+            data_criacao=timezone.now() - timedelta(seconds=LIMITE_LOTE_MONTADO + 1))
+
+        # A nota nao e reenfileirada pela view: o lote passa a ser reconciliado
+        self.client.force_login(User.objects.create_superuser('fiscal', 'fiscal@teste.com', 'senha'))
+        NotaFiscal.objects.filter(pk=self.notas[0].pk).update(status='R')
+        self.client.post(reverse('fiscal:nota_fiscal_emitir', kwargs={'pk': self.notas[0].pk}))
+        lote.refresh_from_db()
+        self.assertEqual(lote.status, '4')
+        self.assertEqual(FilaEmissaoNFe.objects.filter(status='L', lote=lote).count(), 3)
+
+        # Notas sem chave nao chegaram a ser transmitidas: voltam para a fila
+        transmissor = TransmissorStub()
+        processar_fila(transmissor, workers=1)
+        self.assertEqual(FilaEmissaoNFe.objects.filter(status='P').count(), 3)
+        self.assertEqual(processar_fila(transmissor, workers=1)[0], 1)
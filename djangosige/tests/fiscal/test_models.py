@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+from decimal import Decimal
+
+from django.test import TestCase
+
+from djangosige.apps.cadastro.models import Produto
+from djangosige.apps.fiscal.models import NotaFiscal, ItemNotaFiscal, TributoICMS, TributoIPI, \
+    TributoPIS, TributoCOFINS
+
+
+class NotaFiscalTotaisTestCase(TestCase):
+
+    def setUp(self):
+        produto = Produto.objects.create(codigo='1', descricao='Produto')
+        self.nota = NotaFiscal.objects.create(
+            serie='1', numero=1, valor_frete=Decimal('10.00'), valor_desconto=Decimal('5.00'))
+        itens = ItemNotaFiscal.objects.bulk_create([
+            ItemNotaFiscal(nota_fiscal=self.nota, produto=produto, ordem=ordem, cfop='5102',
+                           quantidade=Decimal('3'), valor_unitario=Decimal('0.33'),
+                           valor_total=Decimal('0.99'))
+            for ordem in range(1, 101)])
+        TributoICMS.objects.bulk_create([
+            TributoICMS(item_nota_fiscal=item, cst='10', valor_bc=Decimal('0.99'),
+                        valor_icms=Decimal('0.18'), valor_st=Decimal('0.03'))
+            for item in itens])
+        TributoIPI.objects.bulk_create([
+            TributoIPI(item_nota_fiscal=item, valor_ipi=Decimal('0.05'),
+                       valor_ipi_devolvido=Decimal('0.01') if item.ordem <= 10 else Decimal('0.00'))
+            for item in itens[:50]])
+        TributoPIS.objects.bulk_create([
+            TributoPIS(item_nota_fiscal=item, valor_pis=Decimal('0.01')) for item in itens])
+        TributoCOFINS.objects.bulk_create([
+            TributoCOFINS(item_nota_fiscal=item, valor_cofins=Decimal('0.07')) for item in itens])
+
+    def test_calcular_totais(self):
+        # Uma consulta para os itens e tributos e outra para gravar os totais
+        with self.assertNumQueries(2):
+            self.nota.calcular_totais()
+
+        nota = NotaFiscal.objects.get(pk=self.nota.pk)
+        self.assertEqual(nota.valor_total_produtos, Decimal('99.00'))
+        self.assertEqual(nota.valor_bc_icms, Decimal('99.00'))
+        self.assertEqual(nota.valor_icms, Decimal('18.00'))
+        self.assertEqual(nota.valor_st, Decimal('3.00'))
+        self.assertEqual(nota.valor_ipi, Decimal('2.50'))
+        self.assertEqual(nota.valor_ipi_devolvido, Decimal('0.10'))
+        self.assertEqual(nota.valor_pis, Decimal('1.00'))
+        self.assertEqual(nota.valor_cofins, Decimal('7.00'))
+        # 99,00 - 5,00 (desconto) + 3,00 (ST) + 10,00 (frete) + 2,50 (IPI)
+        # - 0,10 (IPI devolvido)
+        self.assertEqual(nota.valor_total_nota, Decimal('109.40'))
+
+    def test_calcular_totais_sem_itens(self):
+        self.nota.itens.all().delete()
+        self.nota.calcular_totais(salvar=False)
+        self.assertEqual(self.nota.valor_total_produtos, Decimal('0.00'))
+        self.assertEqual(self.nota.valor_icms, Decimal('0.00'))
+        self.assertEqual(self.nota.valor_total_nota, Decimal('5.00'))
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from unittest import mock
+
+from django.db import DatabaseError, models
+from django.test import TestCase
+
+from djangosige.apps.cadastro.models import Empresa
+from djangosige.apps.fiscal.emissao_lote import TransmissorLoteNFe, enfileirar_notas
+from djangosige.apps.fiscal.models import NotaFiscal, SequenciaNumeracaoNFe, FaixaInutilizarNFe
+from djangosige.apps.fiscal.numeracao import reservar_numeros, proximo_numero, agrupar_faixas, \
+    inutilizar_faixas_pendentes, numerar_notas
+from djangosige.apps.fiscal.simulador_sefaz import servidor_simulador_sefaz
+
+
+class NumeracaoNFeTestCase(TestCase):
+
+    def setUp(self):
+        self.emitente = Empresa.objects.create(
+            nome_razao_social='Empresa', tipo_pessoa='PJ')
+
+    def test_reservar_numeros(self):
+        NotaFiscal.objects.bulk_create([
+            NotaFiscal(serie='1', numero=numero, emitente=self.emitente) for numero in (1, 2, 3)])
+
+        # Continua a partir do maior numero ja emitido
+        self.assertEqual(list(reservar_numeros(self.emitente, '1', 50)), list(range(4, 54)))
+        self.assertEqual(proximo_numero(self.emitente.pk, '1'), 54)
+        self.assertEqual(proximo_numero(self.emitente, '2'), 1)
+        self.assertEqual(proximo_numero(self.emitente, '1', modelo='65'), 1)
+        self.assertEqual(SequenciaNumeracaoNFe.objects.count(), 3)
+
+    def test_numerar_notas(self):
+        nota = NotaFiscal.objects.create(serie='1', emitente=self.emitente)
+        self.assertEqual(nota.numero, 1)
+
+        # Numero informado manualmente: a faixa pulada fica para inutilizacao
+        NotaFiscal.objects.create(serie='1', numero=5, emitente=self.emitente)
+        faixa = FaixaInutilizarNFe.objects.get()
+        self.assertEqual((faixa.numero_inicial, faixa.numero_final), (2, 4))
+
+        notas = NotaFiscal.objects.bulk_create([
+            NotaFiscal(serie='1', emitente=self.emitente, status='V') for _ in range(3)])
+        enfileirar_notas(notas)
+        self.assertEqual(sorted(NotaFiscal.objects.filter(
+            pk__in=[n.pk for n in notas]).values_list('numero', flat=True)), [6, 7, 8])
+
+    def test_falha_na_gravacao_devolve_numero(self):
+        NotaFiscal.objects.create(serie='1', emitente=self.emitente)
+        nota = NotaFiscal(serie='1', emitente=self.emitente)
+        gravar = models.Model.save_base
+
+        def falhar_insert_nota(obj, *args, **kwargs):
+            # Apenas o INSERT da nota falha; a sequencia e gravada normalmente
+            if isinstance(obj, NotaFiscal):
+                raise DatabaseError
+            return gravar(obj, *args, **kwargs)
+
+        with mock.patch.object(models.Model, 'save_base', autospec=True, side_effect=falhar_insert_nota):
+            with self.assertRaises(DatabaseError):
+                nota.save()
+        self.assertIsNone(nota.numero)
+        self.assertEqual(NotaFiscal.objects.create(serie='1', emitente=self.emitente).numero, 2)
+
+        notas = NotaFiscal.objects.bulk_create([
+            NotaFiscal(serie='1', emitente=self.emitente) for _ in range(2)])
+        with mock.patch.object(NotaFiscal.objects, 'bulk_update', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                numerar_notas(notas)
+        self.assertEqual([nota.numero for nota in notas], [None, None])
+        numerar_notas(notas)
+        self.assertEqual([nota.numero for nota in notas], [3, 4])
+        self.assertFalse(FaixaInutilizarNFe.objects.exists())
+
+    def test_liberar_numero_nota_excluida(self):
+        notas = [NotaFiscal.objects.create(serie='1', emitente=self.emitente) for _ in range(3)]
+        NotaFiscal.objects.filter(pk=notas[2].pk).update(status='A')
+        NotaFiscal.objects.filter(pk__in=[n.pk for n in notas]).delete()
+        # A nota autorizada (3) nao libera o numero
+        self.assertEqual(sorted(FaixaInutilizarNFe.objects.values_list(
+            'numero_inicial', 'numero_final')), [(1, 1), (2, 2)])
+
+    def test_agrupar_faixas(self):
+        self.assertEqual(agrupar_faixas([8, 1, 2, 3, 7, 3]), [(1, 3), (7, 8)])
+
+    @mock.patch('djangosige.apps.fiscal.numeracao.configuracao_servico_emitente',
+                return_value={'cnpj_empresa_emitente': '12345678000190', 'uf_sigla_emitente': 'SP'})
+    def test_inutilizar_faixas_pendentes(self, configuracao):
+        for inicial, final in ((2, 4), (5, 5), (9, 10)):
+            FaixaInutilizarNFe.objects.create(
+                emitente=self.emitente, serie='1', numero_inicial=inicial, numero_final=final)
+
+        with servidor_simulador_sefaz() as (url, simulador):
+            enviados = inutilizar_faixas_pendentes(TransmissorLoteNFe(url_sefaz=url))
+
+        # 2-4 e 5-5 sao contiguas e vao no mesmo pedido
+        self.assertEqual(enviados, 2)
+        self.assertFalse(FaixaInutilizarNFe.objects.exclude(status='I').exists())
+        self.assertFalse(FaixaInutilizarNFe.objects.filter(protocolo__isnull=True).exists())
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from djangosige.apps.cadastro.models import Produto
+from djangosige.apps.fiscal.models import GrupoFiscal, TributoICMS, TributoPIS, TributoCOFINS
+from djangosige.apps.fiscal.perfil_tributario import cache_perfis_tributarios, get_perfil_tributario, \
+    PERFIL_TRIBUTARIO_VERSAO_KEY
+from djangosige.apps.vendas.models import ItensVenda
+
+
+class PerfilTributarioTestCase(TestCase):
+
+    def setUp(self):
+        cache_perfis_tributarios.limpar()
+        self.addCleanup(cache_perfis_tributarios.limpar)
+        self.grupo = GrupoFiscal.objects.create(descricao='Tributado')
+        self.icms = TributoICMS.objects.create(
+            grupo_fiscal=self.grupo, cst='00', mot_des_icms='9')
+        self.pis = TributoPIS.objects.create(
+            grupo_fiscal=self.grupo, cst='01', p_pis=Decimal('1.65'), valiq_pis=None)
+        self.cofins = TributoCOFINS.objects.create(
+            grupo_fiscal=self.grupo, cst='01', p_cofins=Decimal('7.60'), valiq_cofins=None)
+
+    def test_perfil_memorizado(self):
+        with self.assertNumQueries(6):
+            perfil = get_perfil_tributario(self.grupo)
+        self.assertEqual(perfil.icms, self.icms)
+        self.assertEqual(perfil.pis, self.pis)
+        self.assertIsNone(perfil.ipi)
+        with self.assertNumQueries(0):
+            self.assertIs(get_perfil_tributario(self.grupo.pk), perfil)
+            self.assertIsNone(get_perfil_tributario(None).pis)
+
+    def test_invalidar_ao_salvar_tributo(self):
+        get_perfil_tributario(self.grupo)
+        self.pis.p_pis = Decimal('0.65')
+        self.pis.save()
+        self.assertEqual(get_perfil_tributario(self.grupo).pis.p_pis, Decimal('0.65'))
+
+        self.cofins.delete()
+        self.assertIsNone(get_perfil_tributario(self.grupo).cofins)
+
+    def test_invalidar_por_outro_processo(self):
+        get_perfil_tributario(self.grupo)
+        # Outro processo gravou um tributo e trocou a versao no cache
+        TributoPIS.objects.filter(pk=self.pis.pk).update(p_pis=Decimal('0.65'))
+        cache.incr(PERFIL_TRIBUTARIO_VERSAO_KEY)
+        self.assertEqual(get_perfil_tributario(self.grupo).pis.p_pis, Decimal('0.65'))
+
+    @override_settings(PERFIL_TRIBUTARIO_CACHE_TIMEOUT=0)
+    def test_perfil_expira(self):
+        get_perfil_tributario(self.grupo)
+        with self.assertNumQueries(6):
+            get_perfil_tributario(self.grupo)
+
+    def test_calcular_pis_cofins_item_venda(self):
+        produto = Produto.objects.create(
+            codigo='1', descricao='Produto', grupo_fiscal=self.grupo)
+        itens = [ItensVenda(produto=produto, quantidade=Decimal('2'), valor_unit=Decimal('50.00'),
+                            subtotal=Decimal('100.00')) for _ in range(10)]
+        get_perfil_tributario(self.grupo)
+
+        with self.assertNumQueries(0):
+            for item in itens:
+                item.calcular_pis_cofins()
+                self.assertEqual(item.get_aliquota_pis(format=False), Decimal('1.65'))
+                self.assertNotEqual(item.get_mot_deson_icms(), '')
+        self.assertEqual(itens[0].vpis, Decimal('1.65'))
+        self.assertEqual(itens[0].vcofins, Decimal('7.60'))
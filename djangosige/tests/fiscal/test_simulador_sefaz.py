@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+from django.test import SimpleTestCase
+
+from djangosige.apps.fiscal.simulador_sefaz import servidor_simulador_sefaz
+from djangosige.apps.fiscal.benchmark_emissao import NotaSintetica, TransmissorBenchmark, executar_benchmark_emissao
+
+
+class SimuladorSEFAZTestCase(SimpleTestCase):
+
+    def test_autorizacao_lote(self):
+        notas = [NotaSintetica(numero) for numero in range(1, 4)]
+        with servidor_simulador_sefaz(tempo_medio=0) as (url, simulador):
+            transmissor = TransmissorBenchmark(url_sefaz=url)
+            envio = transmissor.enviar_lote({}, 1, notas)
+            self.assertTrue(envio.sucesso)
+            retorno = transmissor.consultar_recibo({}, envio.recibo)
+            protocolo = transmissor.consultar_protocolo({}, notas[0].chave)
+            self.assertIsNone(transmissor.consultar_protocolo({}, '0' * 44))
+
+        self.assertEqual((protocolo['chave'], protocolo['cStat']), (notas[0].chave, '100'))
+        self.assertFalse(retorno.em_processamento)
+        self.assertEqual([p['chave'] for p in retorno.protocolos], [
+                         n.chave for n in notas])
+        self.assertEqual(set(p['cStat'] for p in retorno.protocolos), {'100'})
+        self.assertTrue(all(p['protocolo'] for p in retorno.protocolos))
+
+    def test_rejeicao_e_processamento(self):
+        with servidor_simulador_sefaz(taxa_rejeicao=1, cstat_rejeicao='204',
+                                      tempo_processamento=60) as (url, simulador):
+            transmissor = TransmissorBenchmark(url_sefaz=url)
+            envio = transmissor.enviar_lote({}, 1, [NotaSintetica(1)])
+            self.assertTrue(transmissor.consultar_recibo(
+                {}, envio.recibo).em_processamento)
+
+            simulador.tempo_processamento = 0
+            retorno = transmissor.consultar_recibo({}, envio.recibo)
+        self.assertEqual(retorno.protocolos[0]['cStat'], '204')
+        self.assertIsNone(retorno.protocolos[0]['protocolo'])
+
+    def test_benchmark_emissao(self):
+        resultado = executar_benchmark_emissao(
+            notas=20, tamanho_lote=5, workers=2, itens_por_nota=2, tempo_medio=0)
+        self.assertEqual(resultado['lotes'], 4)
+        self.assertEqual(resultado['autorizadas'], 20)
+        self.assertGreater(resultado['notas_por_segundo'], 0)
+        self.assertLessEqual(
+            resultado['latencia_p50'], resultado['latencia_p95'])
+        self.assertGreater(resultado['memoria_por_nota_kb'], 0)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User, AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory, override_settings
+
+from djangosige.apps.cadastro.models import Empresa, MinhaEmpresa
+from djangosige.apps.login.context_user import foto_usuario
+from djangosige.apps.login.models import Usuario
+
+
+class ContextoUsuarioTestCase(TestCase):
+    """
+    Testa o cache da foto e da empresa exibidas na sidebar
+    """
+
+    def setUp(self):
+        # Cache em arquivo: compartilhado entre os processos do servidor
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio, True)
+        configuracao = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': diretorio,
+        }})
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        cache.clear()
+        self.user = User.objects.create_user(username='usuario', password='senha')
+        self.perfil = Usuario.objects.create(user=self.user)
+        self.empresa = Empresa.objects.create(
+            nome_razao_social='Empresa', tipo_pessoa='PJ')
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def test_contexto_em_cache(self):
+        MinhaEmpresa.objects.create(m_usuario=self.perfil, m_empresa=self.empresa)
+        with self.assertNumQueries(2):
+            context_dict = foto_usuario(self.request)
+        self.assertEqual(context_dict['user_empresa'], self.empresa)
+        self.assertEqual(context_dict['user_foto_sidebar'], 'imagens/user.png')
+
+        with self.assertNumQueries(0):
+            context_dict = foto_usuario(self.request)
+        self.assertEqual(context_dict['user_empresa'].nome_razao_social, 'Empresa')
+
+    def test_invalidar_contexto(self):
+        self.assertNotIn('user_empresa', foto_usuario(self.request))
+        minha_empresa = MinhaEmpresa.objects.create(m_usuario=self.perfil, m_empresa=self.empresa)
+        self.assertEqual(foto_usuario(self.request)['user_empresa'], self.empresa)
+
+        self.empresa.nome_razao_social = 'Outra'
+        self.empresa.save()
+        self.assertEqual(foto_usuario(self.request)['user_empresa'].nome_razao_social, 'Outra')
+
+        minha_empresa.delete()
+        self.assertNotIn('user_empresa', foto_usuario(self.request))
+
+        self.perfil.user_foto = 'imagens/usuarios/fotos_perfil/usuario.png'
+        self.perfil.save()
+        self.assertEqual(foto_usuario(self.request)['user_foto_sidebar'],
+                         'imagens/usuarios/fotos_perfil/usuario.png')
+
+    def test_cache_por_processo(self):
+        MinhaEmpresa.objects.create(m_usuario=self.perfil, m_empresa=self.empresa)
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            foto_usuario(self.request)
+            with self.assertNumQueries(2):
+                self.assertEqual(foto_usuario(self.request)['user_empresa'], self.empresa)
+
+    def test_usuario_anonimo(self):
+        self.request.user = AnonymousUser()
+        with self.assertNumQueries(0):
+            self.assertEqual(foto_usuario(self.request), {})
@@ -1,11 +1,19 @@
 # -*- coding: utf-8 -*-
 
-from django.test import TestCase
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.contrib.auth.models import User
 from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection, transaction
 from django.db.models.fields.files import FieldFile
+from django.urls import get_resolver, reverse, URLResolver
+
+from djangosige.apps.login.models import Usuario
 
 import json
+import shutil
+import tempfile
 
 TEST_USERNAME = "test"
 TEST_PASSWORD = "testpass"
@@ -70,3 +78,98 @@ def replace_none_values_in_dictionary(dictionary):
     for key, value in dictionary.items():
         if value is None or isinstance(value, FieldFile):
             dictionary[key] = ''
+
+
+def listar_rotas(prefixo_modulo='djangosige.apps.'):
+    """
+    Rotas nomeadas (namespace:nome, URLPattern) de todos os urls.py cujo
+    modulo comeca com prefixo_modulo.
+    """
+    rotas = []
+
+    def percorrer(padroes, namespace, incluir):
+        for padrao in padroes:
+            if isinstance(padrao, URLResolver):
+                modulo = getattr(padrao.urlconf_module, '__name__', str(padrao.urlconf_name))
+                percorrer(padrao.url_patterns, padrao.namespace or namespace,
+                          incluir or modulo.startswith(prefixo_modulo))
+            elif incluir and padrao.name:
+                rotas.append((u'%s:%s' % (namespace, padrao.name) if namespace else padrao.name, padrao))
+
+    percorrer(get_resolver().url_patterns, None, False)
+    return rotas
+
+
+class ConsultasRotasTestCase(TestCase):
+    """
+    Mede o numero de consultas de cada rota dos apps. Rotas com parametros
+    usam PARAMETROS_ROTAS (nome -> funcao(self) que retorna os kwargs) ou,
+    para <pk>, o primeiro registro do model da view. DADOS_ROTAS (nome ->
+    funcao(self) que retorna os dados) vai na query string do GET ou no
+    corpo do POST; views apenas com post precisam dele.
+    """
+    ROTAS_IGNORADAS = {}
+    PARAMETROS_ROTAS = {}
+    DADOS_ROTAS = {}
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username=TEST_USERNAME, email=TEST_EMAIL, password=TEST_PASSWORD)
+        Usuario.objects.create(user=self.user)
+        self.client = Client(raise_request_exception=False)
+        self.client.force_login(self.user)
+        # PDFs gerados pelas rotas ficam fora do MEDIA_ROOT
+        diretorio_pdf = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio_pdf, True)
+        configuracao = override_settings(RELATORIOS_PDF_DIR=diretorio_pdf)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def preparar_rota(self, nome, padrao):
+        """Retorna (metodo, url, dados), ou None se a rota nao puder ser montada."""
+        view_class = getattr(padrao.callback, 'view_class', None)
+        parametros = list(padrao.pattern.regex.groupindex)
+        kwargs = {}
+        if nome in self.PARAMETROS_ROTAS:
+            kwargs = self.PARAMETROS_ROTAS[nome](self)
+        elif parametros == ['pk'] and getattr(view_class, 'model', None) is not None:
+            kwargs = {'pk': view_class.model.objects.order_by('pk').values_list('pk', flat=True).first()}
+        elif parametros:
+            return None
+        if None in kwargs.values():
+            return None
+
+        apenas_post = view_class is not None and not hasattr(view_class, 'get') and hasattr(view_class, 'post')
+        if nome in self.DADOS_ROTAS:
+            dados = self.DADOS_ROTAS[nome](self)
+        elif apenas_post:
+            return None
+        else:
+            dados = {}
+        if None in dados.values():
+            return None
+        return 'post' if apenas_post else 'get', reverse(nome, kwargs=kwargs), dados
+
+    def medir_rotas(self):
+        """
+        {nome: {'consultas': n, 'status': codigo}} das rotas medidas. As
+        rotas que nao puderam ser montadas ficam em self.rotas_sem_parametros.
+        """
+        medicoes = {}
+        self.rotas_sem_parametros = []
+        for nome, padrao in listar_rotas():
+            if nome in self.ROTAS_IGNORADAS:
+                continue
+            rota = self.preparar_rota(nome, padrao)
+            if rota is None:
+                self.rotas_sem_parametros.append(nome)
+                continue
+            metodo, url, dados = rota
+            # Cada rota parte do mesmo estado: cache vazio e alteracoes desfeitas
+            cache.clear()
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as consultas:
+                    response = getattr(self.client, metodo)(url, dados)
+                transaction.set_rollback(True)
+            medicoes[nome] = {'consultas': len(consultas), 'status': response.status_code}
+        return medicoes
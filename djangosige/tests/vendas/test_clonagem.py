@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from djangosige.apps.cadastro.models import Cliente, Fornecedor, Produto
+from djangosige.apps.compras.clonagem import clonar_compra
+from djangosige.apps.compras.models import OrcamentoCompra, PedidoCompra, ItensCompra
+from djangosige.apps.compras.models import Pagamento as PagamentoCompra
+from djangosige.apps.estoque.models import LocalEstoque
+from djangosige.apps.vendas.clonagem import clonar_venda
+from djangosige.apps.vendas.models import OrcamentoVenda, PedidoVenda, ItensVenda, Pagamento
+
+
+class ClonagemDocumentoTestCase(TestCase):
+    """
+    Testa a copia de orcamentos e pedidos com bulk_create
+    """
+
+    def setUp(self):
+        self.local = LocalEstoque.objects.create(descricao=u'Local')
+        self.produto = Produto.objects.create(descricao=u'Produto')
+        self.cliente = Cliente.objects.create(nome_razao_social=u'Cliente', tipo_pessoa='PF')
+        self.fornecedor = Fornecedor.objects.create(nome_razao_social=u'Fornecedor', tipo_pessoa='PJ')
+
+    def criar_orcamento_venda(self, n_itens):
+        orcamento = OrcamentoVenda.objects.create(
+            cliente=self.cliente, local_orig=self.local, valor_total=Decimal('10.00'),
+            data_vencimento='2024-06-30', observacoes=u'Obs')
+        ItensVenda.objects.bulk_create([
+            ItensVenda(venda_id=orcamento, produto=self.produto, quantidade=Decimal(i + 1),
+                       valor_unit=Decimal('2.00'), subtotal=Decimal(2 * (i + 1))) for i in range(n_itens)])
+        Pagamento.objects.create(venda_id=orcamento, indice_parcela=1, vencimento='2024-06-30',
+                                 valor_parcela=Decimal('10.00'))
+        return orcamento
+
+    def clonar_contando(self, funcao, *args, **kwargs):
+        with CaptureQueriesContext(connection) as consultas:
+            documento = funcao(*args, **kwargs)
+        return documento, len(consultas)
+
+    def test_clonar_venda(self):
+        orcamento = self.criar_orcamento_venda(3)
+        pedido, consultas = self.clonar_contando(clonar_venda, orcamento, PedidoVenda,
+                                                 status='0', orcamento=orcamento)
+        self.assertIsInstance(pedido, PedidoVenda)
+        self.assertNotEqual(pedido.pk, orcamento.pk)
+        self.assertEqual(pedido.orcamento, orcamento)
+        self.assertEqual(pedido.observacoes, u'Obs')
+        self.assertEqual(list(pedido.itens_venda.order_by('pk').values_list('quantidade', 'subtotal')),
+                         list(orcamento.itens_venda.order_by('pk').values_list('quantidade', 'subtotal')))
+        self.assertEqual(pedido.parcela_pagamento.count(), 1)
+        self.assertEqual(orcamento.itens_venda.count(), 3)
+
+        # Copia do mesmo modelo leva os campos proprios da subclasse
+        copia = clonar_venda(orcamento, status='0')
+        self.assertIsInstance(copia, OrcamentoVenda)
+        self.assertEqual(str(copia.data_vencimento), '2024-06-30')
+
+        # Um INSERT por lote de itens (o SQLite limita as variaveis por
+        # consulta), e nao dois por item
+        maior = self.criar_orcamento_venda(60)
+        _, consultas_maior = self.clonar_contando(clonar_venda, maior, PedidoVenda, status='0')
+        self.assertLess(consultas_maior, consultas + 5)
+
+    def test_clonar_compra(self):
+        orcamento = OrcamentoCompra.objects.create(fornecedor=self.fornecedor, local_dest=self.local)
+        ItensCompra.objects.bulk_create([
+            ItensCompra(compra_id=orcamento, produto=self.produto, quantidade=Decimal('1.00'),
+                        valor_unit=Decimal('3.00'), subtotal=Decimal('3.00')) for _ in range(4)])
+        PagamentoCompra.objects.create(compra_id=orcamento, indice_parcela=1, vencimento='2024-06-30',
+                                       valor_parcela=Decimal('12.00'))
+
+        pedido = clonar_compra(orcamento, PedidoCompra, status='0', orcamento=orcamento)
+        self.assertIsInstance(pedido, PedidoCompra)
+        self.assertEqual(pedido.itens_compra.count(), 4)
+        self.assertEqual(pedido.parcela_pagamento.count(), 1)
+
+        copia = clonar_compra(pedido, status='0', orcamento=None)
+        self.assertIsNone(copia.orcamento)
+        self.assertEqual(copia.itens_compra.count(), 4)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from djangosige.apps.cadastro.models import Cliente, Fornecedor, Produto, Unidade
+from djangosige.apps.compras.models import PedidoCompra, ItensCompra
+from djangosige.apps.estoque.models import LocalEstoque
+from djangosige.apps.vendas.models import PedidoVenda, ItensVenda, Pagamento
+
+
+class InfoPedidoTestCase(TestCase):
+    """
+    Testa o JSON de InfoVenda e InfoCompra: consultas fixas, cache e ETag
+    """
+
+    def setUp(self):
+        # Cache em arquivo: compartilhado entre os processos do servidor
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio, True)
+        configuracao = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': diretorio,
+        }})
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username='info', password='info'))
+        self.local = LocalEstoque.objects.create(descricao=u'Local')
+        self.unidade = Unidade.objects.create(sigla_unidade=u'UN', unidade_desc=u'Unidade')
+        self.produtos = [Produto.objects.create(descricao=u'Produto %s' % i, unidade=self.unidade)
+                         for i in range(3)]
+        self.venda = PedidoVenda.objects.create(
+            cliente=Cliente.objects.create(nome_razao_social=u'Cliente', tipo_pessoa='PF'),
+            local_orig=self.local, valor_total=Decimal('30.00'))
+        self.compra = PedidoCompra.objects.create(
+            fornecedor=Fornecedor.objects.create(nome_razao_social=u'Fornecedor', tipo_pessoa='PJ'),
+            local_dest=self.local)
+
+    def adicionar_itens(self, quantidade):
+        for i in range(quantidade):
+            produto = self.produtos[i % len(self.produtos)]
+            ItensVenda.objects.create(venda_id=self.venda, produto=produto, quantidade=Decimal('1.00'),
+                                      valor_unit=Decimal('10.00'), vicms=Decimal('1.00'))
+            ItensCompra.objects.create(compra_id=self.compra, produto=produto, quantidade=Decimal('2.00'),
+                                       valor_unit=Decimal('5.00'), vipi=Decimal('0.50'))
+
+    def info_venda(self, **headers):
+        return self.client.get(reverse('vendas:infovenda'), {'vendaId': self.venda.pk}, **headers)
+
+    def contar_consultas(self, url, dados):
+        # Sessao e usuario mais pedido, itens e parcelas
+        cache.clear()
+        with self.assertNumQueries(5):
+            response = self.client.get(url, dados)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_consultas_nao_dependem_dos_itens(self):
+        self.adicionar_itens(2)
+        Pagamento.objects.create(venda_id=self.venda, indice_parcela=1,
+                                 vencimento='2024-06-30', valor_parcela=Decimal('30.00'))
+        self.contar_consultas(reverse('vendas:infovenda'), {'vendaId': self.venda.pk})
+        self.adicionar_itens(10)
+        data = self.contar_consultas(reverse('vendas:infovenda'), {'vendaId': self.venda.pk})
+        self.assertEqual(data[0]['fields']['n_itens'], '12')
+        self.assertEqual(data[1]['hidden_fields']['unidade'], u'UN')
+        self.assertEqual(data[-1]['model'], 'vendas.pagamento')
+
+        data = self.contar_consultas(reverse('compras:infocompra'), {'compraId': self.compra.pk})
+        self.assertEqual(data[0]['fields']['n_itens'], '12')
+        self.assertEqual(len(data), 13)
+
+    def test_cache_e_etag(self):
+        self.adicionar_itens(2)
+        response = self.info_venda()
+        etag = response['ETag']
+
+        # Segunda leitura vem do cache (apenas sessao e usuario); com o ETag
+        # nem o cache do JSON e lido
+        with self.assertNumQueries(4):
+            self.assertEqual(self.info_venda().content, response.content)
+            self.assertEqual(self.info_venda(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Alterar um item gera nova versao do pedido
+        item = self.venda.itens_venda.first()
+        item.quantidade = Decimal('5.00')
+        item.save()
+        alterada = self.info_venda(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(alterada.status_code, 200)
+        self.assertNotEqual(alterada['ETag'], etag)
+        self.assertEqual(self.client.post(reverse('vendas:infovenda'), {'vendaId': self.venda.pk}).content,
+                         alterada.content)
+
+        # Cadastros usados no JSON tambem invalidam
+        self.unidade.sigla_unidade = u'KG'
+        self.unidade.save()
+        self.assertEqual(self.info_venda().json()[1]['hidden_fields']['unidade'], u'KG')
+
+    def test_cache_por_processo(self):
+        self.adicionar_itens(2)
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            response = self.info_venda()
+            self.assertFalse(response.has_header('ETag'))
+            # Sem ETag nem JSON guardado: cada leitura consulta o banco
+            with self.assertNumQueries(5):
+                self.assertEqual(self.info_venda().content, response.content)
+
+    def test_pedido_inexistente(self):
+        response = self.client.get(reverse('vendas:infovenda'), {'vendaId': self.venda.pk + 1000})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(reverse('compras:infocompra')).status_code, 404)
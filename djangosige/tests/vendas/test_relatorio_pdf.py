@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from pypdf import PdfReader
+
+from djangosige.apps.base.relatorios_pdf import get_executor
+from djangosige.apps.cadastro.models import Cliente, Fornecedor, Produto, PessoaFisica, PessoaJuridica
+from djangosige.apps.compras.relatorio_pdf import agendar_pdf_pedidos_compra
+from djangosige.apps.compras.models import PedidoCompra, ItensCompra
+from djangosige.apps.estoque.models import LocalEstoque
+from djangosige.apps.vendas.models import PedidoVenda, ItensVenda
+from djangosige.apps.vendas.relatorio_pdf import agendar_pdf_pedidos_venda
+
+
+class RelatorioPDFTestCase(TestCase):
+    """
+    Testa os PDFs de vendas e compras: cache em disco pelo conteudo,
+    geracao no pool e PDF unico dos pedidos do dia
+    """
+
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio, True)
+        configuracao = override_settings(RELATORIOS_PDF_DIR=self.diretorio)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.client.force_login(User.objects.create_superuser(username='pdf', password='pdf'))
+        self.data = date(2024, 6, 3)
+        local = LocalEstoque.objects.create(descricao=u'Local')
+        self.produto = Produto.objects.create(descricao=u'Produto')
+        cliente = Cliente.objects.create(nome_razao_social=u'Cliente', tipo_pessoa='PF')
+        self.vendas = [PedidoVenda.objects.create(cliente=cliente, local_orig=local, data_emissao=self.data,
+                                                  valor_total=Decimal('20.00')) for _ in range(2)]
+        for venda in self.vendas:
+            ItensVenda.objects.create(venda_id=venda, produto=self.produto, quantidade=Decimal('2.00'),
+                                      valor_unit=Decimal('10.00'))
+        self.compra = PedidoCompra.objects.create(
+            fornecedor=Fornecedor.objects.create(nome_razao_social=u'Fornecedor', tipo_pessoa='PJ'),
+            local_dest=local, data_emissao=self.data, valor_total=Decimal('5.00'))
+        ItensCompra.objects.create(compra_id=self.compra, produto=self.produto, quantidade=Decimal('1.00'),
+                                   valor_unit=Decimal('5.00'))
+
+    def arquivos(self):
+        return sorted(os.listdir(self.diretorio))
+
+    def baixar_pdf(self, url, dados=None):
+        response = self.client.get(url, dados)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        return PdfReader(BytesIO(b''.join(response.streaming_content)))
+
+    def test_cache_pelo_conteudo(self):
+        url = reverse('vendas:gerarpdfpedidovenda', kwargs={'pk': self.vendas[0].pk})
+        self.baixar_pdf(url)
+        arquivos = self.arquivos()
+        self.assertEqual(len(arquivos), 1)
+        self.assertTrue(arquivos[0].startswith('venda_%s_' % self.vendas[0].pk))
+
+        # Mesmo conteudo reaproveita o arquivo; alterar um item gera outro
+        self.baixar_pdf(url)
+        self.assertEqual(self.arquivos(), arquivos)
+        item = self.vendas[0].itens_venda.get()
+        item.quantidade = Decimal('3.00')
+        item.save()
+        self.baixar_pdf(url)
+        self.assertEqual(len(self.arquivos()), 2)
+
+        reader = self.baixar_pdf(reverse('compras:gerarpdfpedidocompra', kwargs={'pk': self.compra.pk}))
+        self.assertIn(u'Pedido de Compra nº %s' % self.compra.pk, reader.pages[0].extract_text())
+
+    def test_resposta_enquanto_gera(self):
+        # Ocupa todos os workers do pool
+        liberar = threading.Event()
+        self.addCleanup(liberar.set)
+        for _ in range(get_executor()._max_workers):
+            get_executor().submit(liberar.wait)
+
+        url = reverse('vendas:gerarpdfpedidovenda', kwargs={'pk': self.vendas[1].pk})
+        with override_settings(RELATORIOS_PDF_ESPERA=0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Refresh'], response['Retry-After'])
+        self.assertEqual(self.arquivos(), [])
+
+        # A nova consulta espera a mesma tarefa, que agora pode rodar
+        liberar.set()
+        self.baixar_pdf(url)
+        self.assertEqual(len(self.arquivos()), 1)
+
+    def test_pedidos_do_dia(self):
+        url = reverse('vendas:gerarpdfpedidosvendadia')
+        reader = self.baixar_pdf(url, {'data': '03/06/2024'})
+        self.assertEqual(len(reader.pages), 2)
+        self.assertIn(u'Pedido de venda nº %s' % self.vendas[1].pk, reader.pages[1].extract_text())
+        # Cada pedido fica no cache individual alem do lote
+        self.assertEqual(len(self.arquivos()), 3)
+        self.baixar_pdf(reverse('vendas:gerarpdfpedidovenda', kwargs={'pk': self.vendas[0].pk}))
+        self.assertEqual(len(self.arquivos()), 3)
+
+        self.assertEqual(len(self.baixar_pdf(reverse('compras:gerarpdfpedidoscompradia'),
+                                             {'data': '2024-06-03'}).pages), 1)
+
+        response = self.client.get(url, {'data': '04/06/2024'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(u'Nenhum pedido', response.content.decode('utf-8'))
+        self.assertEqual(self.client.get(url, {'data': '31/02/2024'}).status_code, 400)
+
+    def test_pedidos_do_dia_consultas(self):
+        def consultas(agendar):
+            with CaptureQueriesContext(connection) as capturadas:
+                agendar(self.data, None)[1].result()
+            return len(capturadas)
+
+        def adicionar_pedidos(i):
+            cliente = Cliente.objects.create(nome_razao_social=u'Cliente %s' % i, tipo_pessoa='PF')
+            PessoaFisica.objects.create(pessoa_id=cliente, cpf=u'123.456.789-%02d' % i)
+            PedidoVenda.objects.create(cliente=cliente, local_orig=self.compra.local_dest,
+                                       data_emissao=self.data)
+            fornecedor = Fornecedor.objects.create(nome_razao_social=u'Fornecedor %s' % i, tipo_pessoa='PJ')
+            PessoaJuridica.objects.create(pessoa_id=fornecedor, cnpj=u'11.222.333/0001-%02d' % i)
+            PedidoCompra.objects.create(fornecedor=fornecedor, local_dest=self.compra.local_dest,
+                                        data_emissao=self.data)
+
+        adicionar_pedidos(0)
+        venda, compra = consultas(agendar_pdf_pedidos_venda), consultas(agendar_pdf_pedidos_compra)
+        for i in range(1, 6):
+            adicionar_pedidos(i)
+        # CPF/CNPJ de cada cliente/fornecedor vem na mesma consulta dos pedidos
+        self.assertEqual(consultas(agendar_pdf_pedidos_venda), venda)
+        self.assertEqual(consultas(agendar_pdf_pedidos_compra), compra)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from djangosige.apps.cadastro.models import Cliente, Fornecedor, Produto
+from djangosige.apps.compras.models import Compra, PedidoCompra, ItensCompra
+from djangosige.apps.estoque.models import LocalEstoque
+from djangosige.apps.vendas.models import Venda, PedidoVenda, ItensVenda
+
+
+class TotaisPedidoTestCase(TestCase):
+    """
+    Testa os totais gravados em Venda e Compra e o comando de reparo
+    """
+
+    def setUp(self):
+        self.local = LocalEstoque.objects.create(descricao=u'Local')
+        self.produto = Produto.objects.create(descricao=u'Produto', controlar_estoque=True)
+        self.servico = Produto.objects.create(descricao=u'Servico', controlar_estoque=False)
+        self.venda = PedidoVenda.objects.create(
+            cliente=Cliente.objects.create(nome_razao_social=u'Cliente', tipo_pessoa='PF'),
+            local_orig=self.local)
+        self.compra = PedidoCompra.objects.create(
+            fornecedor=Fornecedor.objects.create(nome_razao_social=u'Fornecedor', tipo_pessoa='PJ'),
+            local_dest=self.local)
+
+    def test_totais_acompanham_os_itens(self):
+        item = ItensVenda.objects.create(venda_id=self.venda, produto=self.produto, quantidade=Decimal('3.00'),
+                                         valor_unit=Decimal('1.115'), vicms=Decimal('0.50'))
+        # Um aggregate e um UPDATE por item salvo
+        with self.assertNumQueries(3):
+            ItensVenda.objects.create(venda_id=self.venda, produto=self.servico, quantidade=Decimal('1.00'),
+                                      valor_unit=Decimal('10.00'), vipi=Decimal('1.00'), vicms_st=Decimal('0.25'))
+        venda = PedidoVenda.objects.get(pk=self.venda.pk)
+        self.assertEqual(venda.get_total_produtos(), Decimal('13.35'))
+        self.assertEqual(venda.get_total_impostos(), Decimal('1.75'))
+        self.assertEqual(venda.get_total_produtos_estoque(), Decimal('3.35'))
+        self.assertEqual(venda.quantidade_itens, 2)
+
+        item.delete()
+        venda = PedidoVenda.objects.get(pk=self.venda.pk)
+        self.assertEqual(venda.get_total_produtos(), Decimal('10.00'))
+        self.assertEqual(venda.get_total_produtos_estoque(), Decimal('0.00'))
+        self.assertEqual(venda.quantidade_itens, 1)
+
+        ItensCompra.objects.create(compra_id=self.compra, produto=self.produto, quantidade=Decimal('2.00'),
+                                   valor_unit=Decimal('5.00'), vicms=Decimal('0.80'), vipi=Decimal('0.20'))
+        compra = PedidoCompra.objects.get(pk=self.compra.pk)
+        self.assertEqual(compra.get_total_produtos(), Decimal('10.00'))
+        self.assertEqual(compra.get_total_impostos(), Decimal('1.00'))
+        self.assertEqual(compra.quantidade_itens, 1)
+
+    def test_total_itens_com_desconto(self):
+        ItensCompra.objects.create(compra_id=self.compra, produto=self.produto, quantidade=Decimal('2.00'),
+                                   valor_unit=Decimal('5.00'), tipo_desconto='1', desconto=Decimal('10.00'))
+        ItensCompra.objects.create(compra_id=self.compra, produto=self.servico, quantidade=Decimal('1.00'),
+                                   valor_unit=Decimal('7.00'), tipo_desconto='0', desconto=Decimal('1.50'))
+        compra = PedidoCompra.objects.get(pk=self.compra.pk)
+        compra.tipo_desconto = '1'
+        compra.desconto = Decimal('10.00')
+        with self.assertNumQueries(0):
+            self.assertEqual(compra.get_total_sem_imposto(), Decimal('14.50'))
+            self.assertEqual(compra.get_valor_desconto_total(), Decimal('1.45'))
+        self.assertEqual(compra.get_total_sem_imposto(), sum(
+            item.get_total() for item in compra.itens_compra.all()))
+
+    def test_alterar_controle_de_estoque(self):
+        ItensVenda.objects.create(venda_id=self.venda, produto=self.produto, quantidade=Decimal('2.00'),
+                                  valor_unit=Decimal('4.00'))
+        ItensCompra.objects.create(compra_id=self.compra, produto=self.produto, quantidade=Decimal('1.00'),
+                                   valor_unit=Decimal('7.00'))
+        self.produto.controlar_estoque = False
+        self.produto.save()
+        self.assertEqual(Venda.objects.get(pk=self.venda.pk).total_produtos_estoque, Decimal('0.00'))
+        self.assertEqual(Compra.objects.get(pk=self.compra.pk).total_produtos_estoque, Decimal('0.00'))
+
+        # Salvar sem alterar o campo nao recalcula nada
+        produto = Produto.objects.get(pk=self.produto.pk)
+        with self.assertNumQueries(1):
+            produto.save()
+
+        produto.controlar_estoque = True
+        produto.save()
+        self.assertEqual(Venda.objects.get(pk=self.venda.pk).total_produtos_estoque, Decimal('8.00'))
+        self.assertEqual(Compra.objects.get(pk=self.compra.pk).total_produtos_estoque, Decimal('7.00'))
+
+    def test_excluir_documento_nao_recalcula(self):
+        ItensVenda.objects.bulk_create([
+            ItensVenda(venda_id=self.venda, produto=self.produto, quantidade=Decimal('1.00'),
+                       valor_unit=Decimal('1.00')) for _ in range(5)])
+        # Cascata sem recalculo; com ele seriam dois comandos a mais por item
+        with self.assertNumQueries(6):
+            self.venda.delete()
+        self.assertFalse(ItensVenda.objects.exists())
+
+    def test_comando_corrige_totais(self):
+        ItensVenda.objects.create(venda_id=self.venda, produto=self.produto, quantidade=Decimal('2.00'),
+                                  valor_unit=Decimal('4.00'))
+        ItensCompra.objects.bulk_create([ItensCompra(compra_id=self.compra, produto=self.produto,
+                                                     quantidade=Decimal('1.00'), valor_unit=Decimal('7.00'))])
+        Venda.objects.update(total_produtos=Decimal('99.00'))
+
+        saida = StringIO()
+        call_command('recalcular_totais_pedidos', lote=1, stdout=saida)
+        self.assertIn(u'Vendas corrigidas: 1', saida.getvalue())
+        self.assertIn(u'Compras corrigidas: 1', saida.getvalue())
+        self.assertEqual(Venda.objects.get(pk=self.venda.pk).total_produtos, Decimal('8.00'))
+        compra = Compra.objects.get(pk=self.compra.pk)
+        self.assertEqual((compra.total_produtos, compra.quantidade_itens), (Decimal('7.00'), 1))
+
+        call_command('recalcular_totais_pedidos', stdout=saida)
+        self.assertIn(u'Vendas corrigidas: 0', saida.getvalue())